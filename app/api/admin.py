@@ -0,0 +1,69 @@
+# import fast api related libraries and packages
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import response model
+from app.schemas.response_model import ProfileResponse, AllocationsResponse, LoopLagResponse
+
+# import controllers
+from app.controllers.diagnostics_controllers import DiagnosticsController
+
+# import diagnostics switch
+from app.services.diagnostics import diagnostics_enabled
+
+# import error messages
+from app.utils.error_messages import ErrorMessages
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# import info logger messages
+from app.utils.logger_info_messages import LoggerInfoMessages
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+def require_diagnostics_enabled():
+    # off by default : the admin endpoints don't exist unless INGESTION_ADMIN_ENDPOINTS is set
+    if not diagnostics_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ErrorMessages.ADMIN_ENDPOINTS_DISABLED.value
+        )
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_diagnostics_enabled)])
+
+def get_diagnostics_controller():
+    return DiagnosticsController()
+
+@router.post("/profile", response_model=ProfileResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=MicroServiceConfigurations.PROFILE_MAX_SECONDS.value),
+    format: Literal["collapsed", "flamegraph"] = "collapsed",
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    ingestion_id: Optional[str] = None,
+    controller: DiagnosticsController = Depends(get_diagnostics_controller)
+):
+    info_logger.info(f"api_hit : /api/admin/profile : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    return await controller.profile(seconds, format, interval_ms, ingestion_id)
+
+@router.post("/tracemalloc", response_model=AllocationsResponse)
+async def tracemalloc_window(
+    seconds: float = Query(10, gt=0, le=MicroServiceConfigurations.TRACEMALLOC_MAX_SECONDS.value),
+    top: int = Query(MicroServiceConfigurations.TRACEMALLOC_TOP.value, ge=1, le=500),
+    group_by: Literal["lineno", "traceback"] = "lineno",
+    controller: DiagnosticsController = Depends(get_diagnostics_controller)
+):
+    info_logger.info(f"api_hit : /api/admin/tracemalloc : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    return await controller.allocations(seconds, top, group_by)
+
+@router.get("/loop-lag", response_model=LoopLagResponse)
+def loop_lag(controller: DiagnosticsController = Depends(get_diagnostics_controller)):
+    info_logger.info(f"api_hit : /api/admin/loop-lag : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    return controller.loop_lag()
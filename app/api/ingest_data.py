@@ -1,9 +1,10 @@
 # import fast api related libraries and packages
 from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi.responses import JSONResponse
 
 # import request response model
-from app.schemas.request_model import IngestionRequest
-from app.schemas.response_model import IngestStartResponse
+from app.schemas.request_model import IngestionRequest, ReconcileRequest
+from app.schemas.response_model import IngestStartResponse, IngestionStatusResponse, ReconcileResponse
 
 # import controllers
 from app.controllers.ingestion_controllers import IngestionController
@@ -31,4 +32,35 @@ def ingest_data(
     controller: IngestionController = Depends(get_ingestion_controller)
 ):
     info_logger.info(f"api_hit : /api/ingest : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
-    return controller.ingest(request,bg)
\ No newline at end of file
+    return controller.ingest(request,bg)
+
+@router.get("/ingest/{ingestion_id}/status", response_model=IngestionStatusResponse)
+def ingestion_status(
+    ingestion_id: str,
+    controller: IngestionController = Depends(get_ingestion_controller)
+):
+    info_logger.info(f"api_hit : /api/ingest/{ingestion_id}/status : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    return controller.status(ingestion_id)
+
+@router.post("/ingest/{ingestion_id}/reconcile", response_model=ReconcileResponse)
+def reconcile_ingestion(
+    ingestion_id: str,
+    reconcile_request: ReconcileRequest,
+    bg: BackgroundTasks,
+    controller: IngestionController = Depends(get_ingestion_controller)
+):
+    info_logger.info(f"api_hit : /api/ingest/{ingestion_id}/reconcile : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    # pim-core posts the chunks it holds, only the missing (or mismatched) ACKed chunks are sent again
+    return controller.reconcile(ingestion_id, reconcile_request, bg)
+
+@router.get("/ingest/{ingestion_id}/trace")
+def ingestion_trace(
+    ingestion_id: str,
+    controller: IngestionController = Depends(get_ingestion_controller)
+):
+    info_logger.info(f"api_hit : /api/ingest/{ingestion_id}/trace : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    # Chrome trace-event JSON, opens in chrome://tracing, ui.perfetto.dev or speedscope
+    return JSONResponse(
+        content=controller.trace(ingestion_id),
+        headers={"Content-Disposition": f'attachment; filename="trace-{ingestion_id}.json"'}
+    )
@@ -0,0 +1,29 @@
+# import fast api related libraries and packages
+from fastapi import APIRouter, Depends
+
+# import response model
+from app.schemas.response_model import MetricsResponse
+
+# import controllers
+from app.controllers.ingestion_controllers import IngestionController
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# import info logger messages
+from app.utils.logger_info_messages import LoggerInfoMessages
+
+router = APIRouter(tags=["Metrics"])
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+def get_ingestion_controller():
+    return IngestionController()
+
+@router.get("/metrics", response_model=MetricsResponse)
+def metrics(controller: IngestionController = Depends(get_ingestion_controller)):
+    info_logger.info(f"api_hit : /api/metrics : {LoggerInfoMessages.API_HIT_SUCCESS.value}")
+    return controller.metrics()
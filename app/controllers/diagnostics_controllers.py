@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from app.schemas.response_model import ProfileResponse, AllocationsResponse, LoopLagResponse
+from app.utils.error_messages import ErrorMessages
+from app.services.ingestion_supervisor import ingestion_supervisor
+from app.services import diagnostics
+from app.services.diagnostics import DiagnosticsBusyError, loop_lag_watchdog
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+class DiagnosticsController:
+
+    async def profile(self, seconds: float, output: str, interval_ms: Optional[float], ingestion_id: Optional[str]) -> ProfileResponse:
+        # the ingestion's tasks only exist in the worker process that runs it
+        if ingestion_id is not None and ingestion_id not in ingestion_supervisor.tasks:
+            error_logger.error(f"DiagnosticsController.profile | {ErrorMessages.INGESTION_NOT_RUNNING_HERE.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ErrorMessages.INGESTION_NOT_RUNNING_HERE.value
+            )
+        kwargs = {"interval": interval_ms / 1000} if interval_ms else {}
+        try:
+            result = await diagnostics.profile(seconds, output, ingestion_id, **kwargs)
+        except DiagnosticsBusyError:
+            error_logger.error(f"DiagnosticsController.profile | {ErrorMessages.PROFILE_ALREADY_RUNNING.value}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=ErrorMessages.PROFILE_ALREADY_RUNNING.value
+            )
+        return ProfileResponse(**result)
+
+    async def allocations(self, seconds: float, top: int, group_by: str) -> AllocationsResponse:
+        try:
+            result = await diagnostics.trace_allocations(seconds, top, group_by)
+        except DiagnosticsBusyError:
+            error_logger.error(f"DiagnosticsController.allocations | {ErrorMessages.TRACEMALLOC_ALREADY_RUNNING.value}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=ErrorMessages.TRACEMALLOC_ALREADY_RUNNING.value
+            )
+        return AllocationsResponse(**result)
+
+    def loop_lag(self) -> LoopLagResponse:
+        return LoopLagResponse(**loop_lag_watchdog.snapshot())
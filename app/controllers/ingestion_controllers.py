@@ -1,10 +1,15 @@
 from fastapi import HTTPException, status, BackgroundTasks
 import uuid
 
-from app.schemas.response_model import IngestStartResponse
+from app.schemas.request_model import IngestionRequest
+from app.schemas.response_model import IngestStartResponse, IngestionStatusResponse, MetricsResponse, ReconcileResponse
 from app.utils.error_messages import ErrorMessages
-from app.services.json_reader import JsonIngestionService
-from app.services.excel_reader import ExcelIngestionService
+from app.services.ingestion_supervisor import ingestion_supervisor
+from app.services.ingestion_state_store import get_state_store
+from app.services.ingestion_metrics import ingestion_metrics
+from app.services.memory_governor import memory_governor
+from app.services.ingestion_tracer import ingestion_traces
+from app.services.chunk_ledger import chunks_to_resend
 
 # import logging utility
 from app.utils.logger import LoggerFactory
@@ -23,9 +28,8 @@ debug_logger = LoggerFactory.get_debug_logger()
 
 class IngestionController:
     def __init__(self):
-        self.json_streamer = JsonIngestionService()
-        self.excel_streamer = ExcelIngestionService()
         self.ingesttion_and_file_id_generator = GenerateFileAndIngestionID()
+        self.state_store = get_state_store()
 
     def ingest(self, request, bg: BackgroundTasks) -> IngestStartResponse:
         file_id = self.ingesttion_and_file_id_generator.generate_file_id(request.file_path, request.file_type)
@@ -40,12 +44,26 @@ class IngestionController:
 
         ingestion_id = self.ingesttion_and_file_id_generator.generate_ingestion_id(file_id, version)
 
+        # a retried request for a running ingestion attaches to it instead of starting a second run,
+        # checked and reserved in one step : of two concurrent identical requests only one starts it
+        if not ingestion_supervisor.reserve(ingestion_id):
+            state = self.state_store.get_state(ingestion_id) or {"last_chunk": -1, "total_records": 0}
+            info_logger.info(f"IngestionController.ingest | status=IN_PROGRESS , ingestion_id = {ingestion_id} | attached to the running ingestion")
+            return IngestStartResponse(
+                status="IN_PROGRESS",
+                ingestion_id=ingestion_id,
+                attached=True,
+                last_chunk=state["last_chunk"],
+                total_records=state["total_records"]
+            )
+
         info_logger.info(f"IngestionController.ingest | This method will make decision based on what file type the client want to ingest data from and fire up the core logic of data ingestion based on the file type for either json files or for excel files.")
         try:
             if request.file_type.lower() == "json":
                 info_logger.info(f"IngestionController.ingest | {LoggerInfoMessages.PROCESS_JSON_FILES.value}")
+                # the ingestion runs as a supervised task, it is resumed on startup and drained on shutdown
                 bg.add_task(
-                    self.json_streamer.stream_and_push,
+                    ingestion_supervisor.launch,
                     ingestion_id,
                     request
                 )
@@ -53,7 +71,15 @@ class IngestionController:
             elif request.file_type.lower() == "excel":
                 info_logger.info(f"IngestionController.ingest | {LoggerInfoMessages.PROCESS_EXCEL_FILES.value}")
                 bg.add_task(
-                    self.excel_streamer.stream_and_push,
+                    ingestion_supervisor.launch,
+                    ingestion_id,
+                    request
+                )
+
+            elif request.file_type.lower() == "csv":
+                info_logger.info(f"IngestionController.ingest | {LoggerInfoMessages.PROCESS_CSV_FILES.value}")
+                bg.add_task(
+                    ingestion_supervisor.launch,
                     ingestion_id,
                     request
                 )
@@ -66,6 +92,8 @@ class IngestionController:
                 )
 
         except Exception as e:
+            # the ingestion is not launched, a later request must be able to start it
+            ingestion_supervisor.release(ingestion_id)
             error_logger.error(f"IngestionController.ingest | {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -76,3 +104,73 @@ class IngestionController:
             status="STARTED",
             ingestion_id=ingestion_id
         )
+
+    def status(self, ingestion_id: str) -> IngestionStatusResponse:
+        state = self.state_store.get_state(ingestion_id)
+        reserved_bytes = memory_governor.reserved_for(ingestion_id)
+
+        # nothing ACKed yet, but the ingestion may already be building its first chunk
+        if state is None and not reserved_bytes:
+            error_logger.error(f"IngestionController.status | {ErrorMessages.INGESTION_NOT_FOUND.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ErrorMessages.INGESTION_NOT_FOUND.value
+            )
+        state = state or {"ingestion_id": ingestion_id, "last_chunk": -1, "total_records": 0, "status": "STARTED"}
+
+        return IngestionStatusResponse(
+            **state,
+            memory_reserved_bytes=reserved_bytes,
+            metrics=ingestion_metrics.for_ingestion(ingestion_id)
+        )
+
+    def reconcile(self, ingestion_id: str, reconcile_request, bg: BackgroundTasks) -> ReconcileResponse:
+        request_json = self.state_store.get_request_json(ingestion_id)
+        if request_json is None:
+            error_logger.error(f"IngestionController.reconcile | {ErrorMessages.INGESTION_NOT_FOUND.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ErrorMessages.INGESTION_NOT_FOUND.value
+            )
+
+        # resent chunks must never race the run that sends the same chunk_ids
+        if ingestion_supervisor.is_running(ingestion_id, self.state_store):
+            error_logger.error(f"IngestionController.reconcile | {ErrorMessages.INGESTION_IS_RUNNING.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=ErrorMessages.INGESTION_IS_RUNNING.value
+            )
+
+        ledger = self.state_store.get_ledger(ingestion_id)
+        if not ledger:
+            error_logger.error(f"IngestionController.reconcile | {ErrorMessages.NO_CHUNK_LEDGER.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=ErrorMessages.NO_CHUNK_LEDGER.value
+            )
+
+        resend = chunks_to_resend(ledger, {chunk.chunk_id: chunk.checksum for chunk in reconcile_request.chunks})
+        if resend:
+            bg.add_task(ingestion_supervisor.reconcile, ingestion_id, IngestionRequest.model_validate_json(request_json), resend)
+        info_logger.info(f"IngestionController.reconcile | ingestion_id = {ingestion_id} | ledger_chunks = {len(ledger)} | resend = {len(resend)}")
+        return ReconcileResponse(
+            status="RECONCILING" if resend else "IN_SYNC",
+            ingestion_id=ingestion_id,
+            ledger_chunks=len(ledger),
+            missing=[chunk["chunk_id"] for chunk in resend if chunk["reason"] == "missing"],
+            mismatched=[chunk["chunk_id"] for chunk in resend if chunk["reason"] == "mismatched"],
+            resend_bytes=sum(chunk["byte_size"] for chunk in resend),
+        )
+
+    def metrics(self) -> MetricsResponse:
+        return MetricsResponse(**ingestion_metrics.snapshot())
+
+    def trace(self, ingestion_id: str) -> dict:
+        tracer = ingestion_traces.get(ingestion_id)
+        if tracer is None:
+            error_logger.error(f"IngestionController.trace | {ErrorMessages.TRACE_NOT_FOUND.value} | ingestion_id = {ingestion_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=ErrorMessages.TRACE_NOT_FOUND.value
+            )
+        return tracer.chrome_trace()
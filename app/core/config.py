@@ -19,4 +19,160 @@ class MicroServiceConfigurations(Enum):
     # DATABASE RELATED CONFIGURATIONS
     # ---------------------------------------------------------------------------------------------------------------------------------
     DB_FOLDER_NAME = "ingestion_state_data"
-    DB_NAME = "ingestion_state.db"
\ No newline at end of file
+    DB_NAME = "ingestion_state.db"
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # DATA INTEGRITY RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    DEFAULT_CHECKSUM_ALGORITHM = "sha256"
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # CHUNK TRANSPORT RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # size of the fragments a chunk envelope is streamed in
+    STREAM_FRAGMENT_BYTES = 64 * 1024
+    # upper bound of chunk envelopes per callback request in batch mode
+    MAX_BATCH_SIZE = 100
+
+    # process pool that encodes chunks (canonical serialization + checksum) on every core, None keeps encoding in-process
+    ENCODE_POOL_WORKERS = None
+    # environment variable overriding ENCODE_POOL_WORKERS (e.g. 16 on a 16-core ingestion node)
+    ENCODE_POOL_WORKERS_ENV = "INGESTION_ENCODE_POOL_WORKERS"
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # JSON RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # local json files are memory-mapped instead of read through fsspec
+    JSON_MMAP_LOCAL_SOURCES = True
+    # bytes the parser pulls from the source at a time (ijson buf_size), larger buffers measured slower with the C backend
+    JSON_READ_BUFFER_BYTES = 64 * 1024
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # EXCEL RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # multi-sheet ingestion : sheets parsed at the same time (one process each) per ingestion
+    MAX_SHEET_WORKERS = 4
+    # chunks a sheet process may parse ahead of delivery
+    SHEET_QUEUE_CHUNKS = 2
+    # remote sources (s3://, gs://, abfs://, https://) : fsspec block cache, "background" prefetches the next block
+    EXCEL_REMOTE_CACHE_TYPE = "background"
+    EXCEL_REMOTE_BLOCK_BYTES = 4 * 1024 * 1024
+    EXCEL_REMOTE_CACHE_BLOCKS = 16
+    # shared strings of a workbook past this size (python objects) are spilled to memory-mapped files
+    SHARED_STRINGS_SPILL_BYTES = 64 * 1024 * 1024
+    # directory of the spill files, None uses the system temporary directory
+    SHARED_STRINGS_SPILL_DIR = None
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # CSV RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # read buffer of csv sources (local buffered reads, fsspec block size of remote ones)
+    CSV_READ_BUFFER_BYTES = 1024 * 1024
+    # leading bytes the encoding and the delimiter are detected from
+    CSV_SNIFF_BYTES = 64 * 1024
+    # delimiters the detection chooses from when the request has no csv_delimiter
+    CSV_DELIMITERS = ",;\t|"
+    # encoding of sources that are not valid utf-8 (latin-1 when they are not valid in it either)
+    CSV_FALLBACK_ENCODING = "cp1252"
+    # encode pool enabled : byte range a pool process parses at a time, split at record boundaries
+    CSV_PARSE_RANGE_BYTES = 8 * 1024 * 1024
+    # records handed from the parser to the chunk builder at a time
+    CSV_BATCH_RECORDS = 1024
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # RECORD SELECTION (fields / filter) RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # bytes saved by fields / filter are estimated from the full canonical size of the first and every Nth record
+    SELECTION_BYTES_SAMPLE_EVERY = 100
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # MEMORY GOVERNOR RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # process wide budget for chunks of all concurrent ingestions
+    PROCESS_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+    # estimated size of one record, used to reserve the first chunk of a chunk_size_by_records ingestion
+    RECORD_BYTES_ESTIMATE = 4 * 1024
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # CALLBACK BACKPRESSURE RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # http status codes pim-core uses to signal overload
+    OVERLOAD_STATUS_CODES = (429, 503)
+    # exponential backoff with jitter
+    BACKOFF_BASE_SECONDS = 0.5
+    BACKOFF_MAX_SECONDS = 60
+    # a chunk gives up after waiting this long in total for an overloaded pim-core
+    OVERLOAD_MAX_WAIT_SECONDS = 30 * 60
+    # per callback host retry budget (token bucket)
+    RETRY_BUDGET_MIN_TOKENS = 10
+    RETRY_BUDGET_MAX_TOKENS = 100
+    RETRY_BUDGET_RATIO = 0.1
+    # per callback host AIMD limit of chunk requests in flight
+    AIMD_INITIAL_IN_FLIGHT = 4
+    AIMD_MIN_IN_FLIGHT = 1
+    AIMD_MAX_IN_FLIGHT = 64
+    # per callback host rate limits (token buckets) on requests/s and request bytes/s, None is unlimited
+    CALLBACK_REQUESTS_PER_SECOND = None
+    CALLBACK_BYTES_PER_SECOND = None
+    # environment variables overriding the rate limits
+    CALLBACK_REQUESTS_PER_SECOND_ENV = "INGESTION_CALLBACK_REQUESTS_PER_SECOND"
+    CALLBACK_BYTES_PER_SECOND_ENV = "INGESTION_CALLBACK_BYTES_PER_SECOND"
+    # the buckets hold this many seconds of their rate (burst after an idle period)
+    CALLBACK_RATE_BURST_SECONDS = 1.0
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # OUTPUT SINK RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # file sink (callback_url file:///...) : fsync every delivered body (a chunk, or a whole batch with batch_size) before its ACK
+    FILE_SINK_FSYNC = True
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # INGESTION LIFECYCLE RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # on SIGTERM running ingestions get this long to deliver and checkpoint the chunk in flight (below the usual 30s grace period)
+    SHUTDOWN_DRAIN_SECONDS = 25
+    # a running ingestion holds a lease in the state store, renewed by a heartbeat, so only one worker process runs it
+    LEASE_TTL_SECONDS = 30
+    LEASE_HEARTBEAT_SECONDS = 10
+    # worker processes (uvicorn workers, pods) pick up queued and orphaned ingestions from the state store
+    MAX_INGESTIONS_PER_WORKER = 8
+    WORK_POLL_SECONDS = 5
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # DIAGNOSTICS (ADMIN ENDPOINTS) RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # environment variable enabling /api/admin and the event loop lag watchdog ("1" / "true"), both are off when unset
+    ADMIN_ENDPOINTS_ENV = "INGESTION_ADMIN_ENDPOINTS"
+    # sampling profiler : one stack sample of the profiled threads every interval, for at most PROFILE_MAX_SECONDS
+    PROFILE_INTERVAL_SECONDS = 0.005
+    PROFILE_MAX_SECONDS = 60
+    # tracemalloc window : frames kept per allocation, allocation sites returned
+    TRACEMALLOC_FRAMES = 10
+    TRACEMALLOC_MAX_SECONDS = 60
+    TRACEMALLOC_TOP = 20
+    # event loop lag watchdog : expected wake-up every interval, the lag of the last LOOP_LAG_WINDOW wake-ups is kept
+    LOOP_LAG_INTERVAL_SECONDS = 0.1
+    LOOP_LAG_WINDOW = 600
+    # a lag past this is logged (something blocked the event loop : parsing, hashing, a synchronous state store write)
+    LOOP_LAG_LOG_SECONDS = 0.25
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # INGESTION TRACING (trace=true) RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # ring buffer of spans per traced ingestion, the oldest spans are dropped past it
+    TRACE_BUFFER_SPANS = 100_000
+    # traces of finished runs kept in memory for export, the oldest trace is dropped past it
+    TRACE_RETAINED_INGESTIONS = 16
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # STATE STORE RELATED CONFIGURATIONS
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # one ledger row per ACKed chunk (chunk_id, checksum, record range, size, ACK time), needed by POST /api/ingest/{ingestion_id}/reconcile
+    CHUNK_LEDGER = True
+    # ledger rows of a COMPLETED ingestion are deleted this long after its last ACK (reconcile answers 409 afterwards),
+    # 0 deletes them as soon as the ingestion completes
+    CHUNK_LEDGER_RETENTION_SECONDS = 7 * 24 * 3600
+    # environment variable with a SQLAlchemy database url (e.g. postgresql+psycopg://...), the SQLite file is used when unset
+    STATE_STORE_URL_ENV = "INGESTION_STATE_STORE_URL"
+    # SQLite : how long a write waits for the lock held by another worker process
+    STATE_STORE_LOCK_TIMEOUT_SECONDS = 15
@@ -1,8 +1,18 @@
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI,status, Request, HTTPException
 from fastapi.responses import JSONResponse
 
 # custom routes
 from app.api.ingest_data import router as ingest_data_router
+from app.api.metrics import router as metrics_router
+from app.api.admin import router as admin_router
+
+# import ingestion supervisor (resume on startup, drain on shutdown)
+from app.services.ingestion_supervisor import ingestion_supervisor
+
+# import diagnostics (event loop lag watchdog, only when the admin endpoints are enabled)
+from app.services.diagnostics import diagnostics_enabled, loop_lag_watchdog
 
 # import logging utility
 from app.utils.logger import LoggerFactory
@@ -15,11 +25,34 @@ info_logger = LoggerFactory.get_info_logger()
 error_logger = LoggerFactory.get_error_logger()
 debug_logger = LoggerFactory.get_debug_logger()
 
-app = FastAPI(title = "Data Ingestion Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the process wide state store : opened and migrated once here, before any request can race on the schema
+    ingestion_supervisor.state_store
+    # resume ingestions that were IN_PROGRESS when the previous process stopped, then keep claiming queued / orphaned ones
+    ingestion_supervisor.start_worker()
+    if diagnostics_enabled():
+        loop_lag_watchdog.start()
+    info_logger.info(f"lifespan | startup | worker_id = {ingestion_supervisor.worker_id} | running_ingestions = {len(ingestion_supervisor.tasks)}")
+    yield
+    # SIGTERM : drain the chunks in flight and flush their checkpoints within the deadline
+    await ingestion_supervisor.shutdown()
+    await loop_lag_watchdog.stop()
+    # the encode process pool only exists when a reader imported it, app.main does not import it for a fast cold start
+    encoder_pool = sys.modules.get("app.services.chunk_encoder_pool")
+    if encoder_pool is not None:
+        encoder_pool.shutdown_pool()
+    info_logger.info("lifespan | shutdown | ingestions drained")
+
+app = FastAPI(title = "Data Ingestion Service", lifespan=lifespan)
 
 # include custome routes here
 # ingest_data router
 app.include_router(ingest_data_router, prefix="/api")
+# metrics router
+app.include_router(metrics_router, prefix="/api")
+# admin router (profiling, allocations, event loop lag), answers 404 unless INGESTION_ADMIN_ENDPOINTS is set
+app.include_router(admin_router, prefix="/api")
 
 # Global error exception response handler
 @app.exception_handler(HTTPException)
@@ -1,8 +1,15 @@
 from pydantic import BaseModel, Field, model_validator
 from fastapi import HTTPException, status
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, Literal
 from app.utils.error_messages import ErrorMessages
 from app.utils.field_descriptions import RequestFieldDescriptions
+from app.core.config import MicroServiceConfigurations
+from app.services.data_integrity_manager import CHECKSUM_ALGORITHMS
+from app.services.memory_governor import memory_governor
+from app.services.record_selection import RecordSelection, SelectionError
+from app.utils.msgpack_codec import msgpack_available
+from app.services.chunk_sinks import SINK_KINDS, parse_sink_url
+from app.services.csv_format import csv_encoding_supported
 
 # import logging utility
 from app.utils.logger import LoggerFactory
@@ -15,6 +22,17 @@ info_logger = LoggerFactory.get_info_logger()
 error_logger = LoggerFactory.get_error_logger()
 debug_logger = LoggerFactory.get_debug_logger()
 
+class HeldChunk(BaseModel):
+    chunk_id: str = Field(description=RequestFieldDescriptions.HELD_CHUNK_ID.value)
+    checksum: Optional[str] = Field(default=None, description=RequestFieldDescriptions.HELD_CHUNK_CHECKSUM.value)
+
+class ReconcileRequest(BaseModel):
+    chunks: List[HeldChunk] = Field(default_factory=list, description=RequestFieldDescriptions.RECONCILE_CHUNKS.value)
+
+class FieldSelection(BaseModel):
+    include: Optional[List[str]] = Field(default=None, description=RequestFieldDescriptions.FIELDS_INCLUDE.value)
+    exclude: Optional[List[str]] = Field(default=None, description=RequestFieldDescriptions.FIELDS_EXCLUDE.value)
+
 class IngestionRequest(BaseModel):
     file_path : str = Field(default=None, description=RequestFieldDescriptions.FILE_PATH.value)
     file_type : str = Field(default="json", description=RequestFieldDescriptions.FILE_TYPE.value)
@@ -23,10 +41,84 @@ class IngestionRequest(BaseModel):
     # Do NOT exceed memory under ANY circumstances — even for the first row 
     chunk_size_by_memory: Optional[int] = Field(default=None,description = RequestFieldDescriptions.CHUNK_SIZE_BY_MEMORY.value)
     
+    checksum_algorithm: str = Field(
+        default=MicroServiceConfigurations.DEFAULT_CHECKSUM_ALGORITHM.value,
+        description=RequestFieldDescriptions.CHECKSUM_ALGORITHM.value
+    )
+
+    batch_size: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=MicroServiceConfigurations.MAX_BATCH_SIZE.value,
+        description=RequestFieldDescriptions.BATCH_SIZE.value
+    )
+
+    sheets: Optional[Union[Literal["all"], List[str]]] = Field(
+        default=None,
+        description=RequestFieldDescriptions.SHEETS.value
+    )
+
+    payload_format: Literal["records", "columnar"] = Field(
+        default="records",
+        description=RequestFieldDescriptions.PAYLOAD_FORMAT.value
+    )
+
+    fields: Optional[FieldSelection] = Field(
+        default=None,
+        description=RequestFieldDescriptions.FIELDS.value
+    )
+
+    filter: Optional[str] = Field(
+        default=None,
+        description=RequestFieldDescriptions.FILTER.value
+    )
+
+    priority: int = Field(
+        default=1,
+        ge=1,
+        le=100,
+        description=RequestFieldDescriptions.PRIORITY.value
+    )
+
+    number_mode: Literal["decimal", "float", "decimal_string"] = Field(
+        default="decimal",
+        description=RequestFieldDescriptions.NUMBER_MODE.value
+    )
+
+    integrity_mode: Literal["checksum", "merkle"] = Field(
+        default="checksum",
+        description=RequestFieldDescriptions.INTEGRITY_MODE.value
+    )
+
+    payload_encoding: Literal["json", "msgpack"] = Field(
+        default="json",
+        description=RequestFieldDescriptions.PAYLOAD_ENCODING.value
+    )
+
+    csv_delimiter: Optional[str] = Field(
+        default=None,
+        description=RequestFieldDescriptions.CSV_DELIMITER.value
+    )
+
+    csv_quotechar: Optional[str] = Field(
+        default=None,
+        description=RequestFieldDescriptions.CSV_QUOTECHAR.value
+    )
+
+    csv_encoding: Optional[str] = Field(
+        default=None,
+        description=RequestFieldDescriptions.CSV_ENCODING.value
+    )
+
     re_ingestion: bool = Field(
         default=False,
         description="Force a new ingestion execution for the same file"
     )
+
+    trace: bool = Field(
+        default=False,
+        description=RequestFieldDescriptions.TRACE.value
+    )
     
     @model_validator(mode="after")
     def validate_chunking_mode(self):
@@ -44,6 +136,21 @@ class IngestionRequest(BaseModel):
                 detail=ErrorMessages.CALL_BACK_URL_IS_NONE.value
             )
         
+        sink = parse_sink_url(self.callback_url)
+        if sink.kind not in SINK_KINDS or (sink.kind == "file" and not sink.path):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.UNSUPPORTED_CALLBACK_URL.value} | callback_url = {self.callback_url}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.UNSUPPORTED_CALLBACK_URL.value
+            )
+
+        if sink.kind == "file" and not sink.spool and self.payload_encoding == "msgpack":
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.NDJSON_SINK_NEEDS_JSON.value}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.NDJSON_SINK_NEEDS_JSON.value
+            )
+
         if not self.file_type:
             error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.FILE_TYPE_IS_NONE.value}")
             raise HTTPException(
@@ -65,4 +172,95 @@ class IngestionRequest(BaseModel):
                 detail=ErrorMessages.BOTH_CHUNK_SIZES_PROVIDED.value
             )
 
+        if self.sheets is not None:
+            if self.file_type.lower() != "excel":
+                error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.SHEETS_ONLY_FOR_EXCEL.value}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=ErrorMessages.SHEETS_ONLY_FOR_EXCEL.value
+                )
+            if self.sheets != "all" and not self.sheets:
+                error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.INVALID_SHEETS.value}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=ErrorMessages.INVALID_SHEETS.value
+                )
+            # every sheet has one checkpoint and one memory reservation, a sheet named twice would run twice on them
+            if self.sheets != "all" and len(set(self.sheets)) != len(self.sheets):
+                error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.DUPLICATE_SHEETS.value}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=ErrorMessages.DUPLICATE_SHEETS.value
+                )
+
+        if self.payload_format == "columnar" and self.file_type.lower() not in ("excel", "csv"):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.COLUMNAR_ONLY_FOR_EXCEL.value}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.COLUMNAR_ONLY_FOR_EXCEL.value
+            )
+
+        csv_options = (self.csv_delimiter, self.csv_quotechar, self.csv_encoding)
+        if any(option is not None for option in csv_options) and self.file_type.lower() != "csv":
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.CSV_OPTIONS_ONLY_FOR_CSV.value}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.CSV_OPTIONS_ONLY_FOR_CSV.value
+            )
+
+        characters = [character for character in (self.csv_delimiter, self.csv_quotechar) if character is not None]
+        if any(len(character) != 1 or character in "\r\n" for character in characters) or len(set(characters)) != len(characters):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.INVALID_CSV_CHARACTER.value} | csv_delimiter = {self.csv_delimiter!r} | csv_quotechar = {self.csv_quotechar!r}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.INVALID_CSV_CHARACTER.value
+            )
+
+        if self.csv_encoding is not None and not csv_encoding_supported(self.csv_encoding):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.UNSUPPORTED_CSV_ENCODING.value} | csv_encoding = {self.csv_encoding}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.UNSUPPORTED_CSV_ENCODING.value
+            )
+
+        if self.fields is not None and (self.fields.include == [] or (self.fields.include is None and not self.fields.exclude)):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.INVALID_FIELDS.value}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.INVALID_FIELDS.value
+            )
+
+        # the filter expression is compiled once here to refuse invalid ones, the readers compile their own copy
+        try:
+            RecordSelection.from_request(self)
+        except SelectionError as e:
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = invalid filter {self.filter!r} | {e}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.INVALID_FILTER.value.format(error=e)
+            )
+
+        if self.payload_encoding == "msgpack" and not msgpack_available():
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = {ErrorMessages.MSGPACK_NOT_INSTALLED.value}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.MSGPACK_NOT_INSTALLED.value
+            )
+
+        # refuse chunks that could never be reserved from the process wide memory budget
+        chunk_bytes = memory_governor.estimate_chunk_bytes(self) * (self.batch_size or 1)
+        if not memory_governor.can_ever_fit(chunk_bytes):
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = chunk of {chunk_bytes} bytes exceeds memory budget {memory_governor.budget_bytes}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.CHUNK_SIZE_EXCEEDS_MEMORY_BUDGET.value.format(chunk_bytes=chunk_bytes, budget_bytes=memory_governor.budget_bytes)
+            )
+
+        if self.checksum_algorithm not in CHECKSUM_ALGORITHMS:
+            error_logger.error(f"IngestionRequest.validate_chunking_mode | error = unsupported checksum_algorithm {self.checksum_algorithm}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=ErrorMessages.UNSUPPORTED_CHECKSUM_ALGORITHM.value.format(algorithms=", ".join(CHECKSUM_ALGORITHMS))
+            )
+
         return self
\ No newline at end of file
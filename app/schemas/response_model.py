@@ -1,6 +1,64 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Any, Optional 
 
 class IngestStartResponse(BaseModel):
     status: str
     ingestion_id: str
+    # True when the request attached to an ingestion that is already running (no second run is started)
+    attached: bool = False
+    last_chunk: Optional[int] = None
+    total_records: Optional[int] = None
+
+class IngestionStatusResponse(BaseModel):
+    ingestion_id: str
+    status: str
+    last_chunk: int
+    total_records: int
+    memory_reserved_bytes: int = 0
+    metrics: Dict[str, Any] = Field(default_factory=dict)
+
+class ReconcileResponse(BaseModel):
+    # IN_SYNC (pim-core holds every ACKed chunk) or RECONCILING (the chunks below are being sent again)
+    status: str
+    ingestion_id: str
+    ledger_chunks: int
+    missing: List[str] = Field(default_factory=list)
+    mismatched: List[str] = Field(default_factory=list)
+    resend_bytes: int = 0
+
+class MetricsResponse(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    counters: Dict[str, Any]
+    memory: Dict[str, Any]
+
+class ProfileResponse(BaseModel):
+    scope: str
+    ingestion_id: Optional[str] = None
+    seconds: float
+    interval_seconds: float
+    samples: int
+    sampled_stacks: int
+    sampling_seconds: float
+    format: str
+    # collapsed stacks ("frame;frame;frame count") or a flamegraph tree ({name, value, children})
+    profile: Any
+
+class AllocationsResponse(BaseModel):
+    seconds: float
+    group_by: str
+    traced_bytes: int
+    traced_peak_bytes: int
+    process_peak_rss_bytes: int
+    top_allocators: List[Dict[str, Any]]
+
+class LoopLagResponse(BaseModel):
+    running: bool
+    interval_seconds: float
+    samples: int
+    window: int
+    last_seconds: float
+    p50_seconds: float
+    p99_seconds: float
+    max_seconds: float
+    over_log_threshold: int
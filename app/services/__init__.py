@@ -1,7 +1,9 @@
-from app.services.json_reader import JsonIngestionService
-from app.services.excel_reader import ExcelIngestionService
-
 class IngestionController:
     def __init__(self):
+        # imported on first use : the readers pull in the format engines (ijson, openpyxl) and fsspec,
+        # importing app.services (e.g. through the request model) must stay cheap for a fast cold start
+        from app.services.json_reader import JsonIngestionService
+        from app.services.excel_reader import ExcelIngestionService
+
         self.json_streamer = JsonIngestionService()
         self.excel_streamer = ExcelIngestionService()
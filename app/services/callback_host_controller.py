@@ -0,0 +1,310 @@
+"""
+This file is responsible for not making an overloaded pim-core worse.
+
+There is one controller per callback host, shared by every ingestion that sends chunks to that host.
+[CONTROLS]
+- AIMD concurrency limit : chunk requests in flight to the host grow additively on success and are halved
+  when pim-core signals overload (429 / 503 / timeouts)
+- Retry budget : error retries spend tokens that are earned back by successful requests, so retries can never
+  multiply the load on a failing host
+- Backoff : exponential backoff with full jitter, Retry-After is honoured as the minimum wait
+- Rate limits : optional token buckets on requests/s and request bytes/s (CALLBACK_REQUESTS_PER_SECOND /
+  CALLBACK_BYTES_PER_SECOND), a request larger than the burst waits for a full bucket and leaves it in debt
+- Weighted fair queuing : requests waiting for the host are served by start-time fair queuing over the ingestions,
+  every ingestion gets a share of the request bytes proportional to its priority, so a big catalogue feed cannot
+  hold back small urgent ones
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import metrics registry
+from app.services.ingestion_metrics import ingestion_metrics
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+OVERLOAD_STATUS_CODES = MicroServiceConfigurations.OVERLOAD_STATUS_CODES.value
+BACKOFF_BASE_SECONDS = MicroServiceConfigurations.BACKOFF_BASE_SECONDS.value
+BACKOFF_MAX_SECONDS = MicroServiceConfigurations.BACKOFF_MAX_SECONDS.value
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with full jitter, never shorter than what the host asked for with Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After is either delay-seconds or an HTTP-date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Token bucket of retries, every successful request earns RETRY_BUDGET_RATIO of a retry.
+    """
+    def __init__(self):
+        self.max_tokens = MicroServiceConfigurations.RETRY_BUDGET_MAX_TOKENS.value
+        self.ratio = MicroServiceConfigurations.RETRY_BUDGET_RATIO.value
+        self.tokens = float(MicroServiceConfigurations.RETRY_BUDGET_MIN_TOKENS.value)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def rate_limit(name: str) -> Optional[float]:
+    """
+    Rate limit of the config name (CALLBACK_REQUESTS_PER_SECOND / CALLBACK_BYTES_PER_SECOND), its environment variable first.
+    """
+    value = os.environ.get(MicroServiceConfigurations[f"{name}_ENV"].value)
+    if value:
+        return float(value)
+    return MicroServiceConfigurations[name].value
+
+
+class TokenBucket:
+    """
+    Rate limit of a callback host, holds up to burst_seconds of its rate.
+    """
+    def __init__(self, rate: float, burst_seconds: float):
+        self.rate = float(rate)
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_seconds(self, amount: float, now: float) -> float:
+        """
+        0 when amount can be taken now, otherwise how long until it can.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # a request larger than the bucket only waits for a full one
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+
+class CallbackHostController:
+    def __init__(self, host: str):
+        self.host = host
+        self.min_limit = MicroServiceConfigurations.AIMD_MIN_IN_FLIGHT.value
+        self.max_limit = MicroServiceConfigurations.AIMD_MAX_IN_FLIGHT.value
+        self.limit = float(MicroServiceConfigurations.AIMD_INITIAL_IN_FLIGHT.value)
+        self.in_flight = 0
+        self.retry_budget = RetryBudget()
+        self.overload_events = 0
+        self.retry_budget_exhausted = 0
+        self._last_decrease = 0.0
+        # waiting requests by start tag (start-time fair queuing), a cancelled one leaves the queue right away
+        self._waiters = []
+        self._order = itertools.count()
+        # virtual time of the queue and the finish tag of the last request of every ingestion
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        burst_seconds = MicroServiceConfigurations.CALLBACK_RATE_BURST_SECONDS.value
+        requests_per_second = rate_limit("CALLBACK_REQUESTS_PER_SECOND")
+        bytes_per_second = rate_limit("CALLBACK_BYTES_PER_SECOND")
+        self.request_bucket = TokenBucket(requests_per_second, burst_seconds) if requests_per_second else None
+        self.byte_bucket = TokenBucket(bytes_per_second, burst_seconds) if bytes_per_second else None
+        self.rate_limited = 0
+        self._timer = None
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # in-flight limit
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def _has_room(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_limit)
+
+    def _start_tag(self, flow: str, weight: float, cost: int) -> float:
+        # an ingestion that was idle starts at the current virtual time, a busy one after its previous request
+        start = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+        self._finish_tags[flow] = start + max(cost, 1) / weight
+        return start
+
+    def _cancel_tag(self, flow: str, start: float, weight: float, cost: int) -> None:
+        # a request that was never sent must not push the next requests of its ingestion back
+        share = max(cost, 1) / weight
+        tag = self._finish_tags.get(flow)
+        if tag is not None and tag >= start + share:
+            self._finish_tags[flow] = tag - share
+
+    def _rate_wait(self, cost: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = self.request_bucket.wait_seconds(1, now)
+        if self.byte_bucket is not None:
+            wait = max(wait, self.byte_bucket.wait_seconds(cost, now))
+        return wait
+
+    def _admit(self, start: float, cost: int) -> None:
+        self._virtual_time = max(self._virtual_time, start)
+        self.in_flight += 1
+        if self.request_bucket is not None:
+            self.request_bucket.take(1)
+        if self.byte_bucket is not None:
+            self.byte_bucket.take(cost)
+
+    async def acquire(self, flow: str = "", weight: float = 1.0, cost: int = 1) -> None:
+        """
+        Waits for a request slot of the host. flow is the ingestion, weight its priority and cost the request bytes.
+        """
+        start = self._start_tag(flow, weight, cost)
+        if not self._waiters and self._has_room() and not self._rate_wait(cost):
+            self._admit(start, cost)
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiter = (start, next(self._order), future, cost)
+        heapq.heappush(self._waiters, waiter)
+        self._wake_waiters()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # already admitted, the slot goes back
+                self.release()
+            else:
+                # the queue (fast path, finish tag cleanup) goes on as if the waiter never queued
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                self._cancel_tag(flow, start, weight, cost)
+                self._wake_waiters()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._has_room():
+            start, _, future, cost = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._rate_wait(cost)
+            if wait:
+                # the head of the queue keeps its turn until the rate limit lets it through
+                self._wake_later(wait)
+                return
+            heapq.heappop(self._waiters)
+            self._admit(start, cost)
+            future.set_result(None)
+        if not self._waiters:
+            # ingestions that are idle at the current virtual time start over from it anyway
+            self._finish_tags = {flow: tag for flow, tag in self._finish_tags.items() if tag > self._virtual_time}
+
+    def _wake_later(self, wait: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer[0] is loop:
+            return
+        self.rate_limited += 1
+        self._timer = (loop, loop.call_later(wait, self._on_timer))
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, flow: str = "", weight: float = 1.0, cost: int = 1):
+        await self.acquire(flow, weight, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # AIMD signals
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def on_success(self) -> None:
+        # additive increase : about +1 in-flight chunk per window of successful requests
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.retry_budget.deposit()
+        self._wake_waiters()
+
+    def on_overload(self) -> None:
+        self.overload_events += 1
+        now = time.monotonic()
+        # multiplicative decrease, once per backoff window so a burst of 429s doesn't collapse the limit to 1 at once
+        if now - self._last_decrease >= BACKOFF_BASE_SECONDS:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+            self._last_decrease = now
+        debug_logger.debug(f"CallbackHostController.on_overload | host = {self.host} | limit = {self.limit:.2f} | in_flight = {self.in_flight}")
+
+    def try_spend_retry(self) -> bool:
+        if self.retry_budget.try_spend():
+            return True
+        self.retry_budget_exhausted += 1
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": sum(not future.done() for _, _, future, _ in self._waiters),
+            "requests_per_second_limit": self.request_bucket.rate if self.request_bucket else None,
+            "bytes_per_second_limit": self.byte_bucket.rate if self.byte_bucket else None,
+            "rate_limited": self.rate_limited,
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+            "overload_events": self.overload_events,
+            "retry_budget_exhausted": self.retry_budget_exhausted,
+        }
+
+
+class CallbackHostRegistry:
+    def __init__(self):
+        self.hosts: Dict[str, CallbackHostController] = {}
+
+    def for_url(self, url: str) -> CallbackHostController:
+        host = urlsplit(url).netloc or url
+        if host not in self.hosts:
+            self.hosts[host] = CallbackHostController(host)
+        return self.hosts[host]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {host: controller.snapshot() for host, controller in self.hosts.items()}
+
+
+# one controller per callback host for the whole process
+callback_hosts = CallbackHostRegistry()
+ingestion_metrics.register_snapshot("callback_hosts", callback_hosts.snapshot)
@@ -0,0 +1,178 @@
+"""
+This file is responsible for the optional process pool that encodes chunks off the event loop.
+
+Canonical serialization and the checksum of a chunk are CPU bound and hold the GIL, with the pool they run on
+every core of the node while the reader keeps parsing and the sender keeps delivering.
+[GUARANTEES]
+- Records travel to the pool as one pre-encoded bytes object per chunk (compact JSON or msgpack rows), never as pickled dicts :
+  the parent pays one orjson.dumps per chunk, which is cheaper than pickling the same rows (see bench_encode_pool)
+- The pool returns the canonical bytes of the chunk and its checksum, identical to the in-process encoding
+- Chunks are handed to the sender in chunk order, at most ENCODE_POOL_WORKERS chunks are encoded at a time per ingestion
+- Only chunk_size_by_records ingestions use the pool, chunk_size_by_memory needs the canonical size of every record
+  to place the chunk boundaries
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple, Any
+
+import orjson
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import data integrity manager
+from app.services.data_integrity_manager import ChunkIntegrityManager, PrecomputedChecksum
+
+# ort json parser
+from app.utils.json_decimal_encoder import orjson_default, decimal_string_default
+
+# msgpack codec (payload_encoding=msgpack)
+from app.utils import msgpack_codec
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def pool_workers() -> int:
+    """
+    Size of the encode pool, 0 when encoding stays in-process.
+    """
+    value = os.environ.get(MicroServiceConfigurations.ENCODE_POOL_WORKERS_ENV.value)
+    if value is not None:
+        return int(value)
+    return MicroServiceConfigurations.ENCODE_POOL_WORKERS.value or 0
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = pool_workers()
+        info_logger.info(f"chunk_encoder_pool.get_pool | starting encode pool | workers = {workers}")
+        # spawned, not forked : the service process runs an event loop and threads that must not be copied
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def encode_chunk(payload: bytes, headers: Optional[List[str]], checksum_algorithm: str, columnar: bool = False, payload_encoding: str = "json", merkle: bool = False) -> Tuple[Any, str, int]:
+    """
+    Runs in a pool process. payload is the array of the chunk's rows (records, or value rows when headers are given),
+    JSON or msgpack following payload_encoding, returns the canonical record bytes joined by the separator of the
+    encoding, the chunk checksum and the number of records. A columnar chunk keeps its value rows.
+    With merkle the canonical bytes are returned as one fragment per record (the leaves of the chunk).
+    """
+    rows = msgpack_codec.unpackb(payload) if payload_encoding == "msgpack" else orjson.loads(payload)
+    if columnar:
+        width = len(headers)
+        rows = (row[:width] + [None] * (width - len(row)) for row in rows)
+    elif headers is not None:
+        rows = ({headers[i]: row[i] if i < len(row) else None for i in range(len(headers))} for row in rows)
+    chunk_checksum = ChunkIntegrityManager.new_checksum(checksum_algorithm, headers if columnar else None, payload_encoding)
+    encode_record = ChunkIntegrityManager.record_encoder(payload_encoding)
+    fragments = []
+    for record in rows:
+        canonical_record = encode_record(record)
+        chunk_checksum.update(canonical_record)
+        fragments.append(canonical_record)
+    if merkle:
+        return fragments, chunk_checksum.hexdigest(), len(fragments)
+    separator = b"" if payload_encoding == "msgpack" else b","
+    return separator.join(fragments), chunk_checksum.hexdigest(), len(fragments)
+
+
+class PooledChunkEncoder:
+    """
+    Reader side of the pool : collects raw rows, submits full chunks and pushes the encoded chunks in order.
+    """
+    def __init__(self, sender, request, headers: Optional[List[str]] = None):
+        self.sender = sender
+        self.request = request
+        self.headers = headers
+        self.depth = max(pool_workers(), 1)
+        self.in_flight = deque()
+        self.in_flight_bytes = 0
+
+    @staticmethod
+    def enabled(request) -> bool:
+        return bool(request.chunk_size_by_records) and pool_workers() > 0
+
+    async def submit(self, chunk_number: int, rows: List[Any], total_records: int, is_last: bool) -> None:
+        """
+        Dumps the rows of the chunk to one bytes object and hands it to the pool, without waiting for the encoding.
+        """
+        # one compact bytes object per chunk crosses the process boundary (msgpack keeps Decimal / datetime values exact)
+        if self.request.payload_encoding == "msgpack":
+            payload = msgpack_codec.packb(rows)
+        else:
+            # Decimal values cross as the json of the number_mode, the pool encodes them back to the same canonical bytes
+            payload = orjson.dumps(rows, default=decimal_string_default if self.request.number_mode == "decimal_string" else orjson_default)
+        future = asyncio.get_running_loop().run_in_executor(
+            get_pool(), encode_chunk, payload, self.headers, self.request.checksum_algorithm,
+            self.request.payload_format == "columnar", self.request.payload_encoding, self.request.integrity_mode == "merkle",
+        )
+        tracer = self.sender.tracer
+        if tracer.enabled:
+            # from the hand-over to the pool until the encoded chunk is back (queueing + encoding + checksum),
+            # at most depth chunks are in flight so chunk_number % depth gives every one of them its own track
+            started = time.perf_counter()
+            track = f"encode pool {chunk_number % self.depth}"
+            future.add_done_callback(lambda _, chunk_number=chunk_number, size=len(payload): tracer.complete(
+                "encode chunk", track, started, time.perf_counter(), chunk_number=chunk_number, bytes=size
+            ))
+        self.in_flight.append((chunk_number, future, total_records, is_last, len(payload)))
+        self.in_flight_bytes += len(payload)
+        # the raw payloads of the chunks being encoded count towards this ingestion's memory reservation
+        self.sender.track(self.in_flight_bytes)
+
+        if len(self.in_flight) >= self.depth:
+            await self._push_oldest()
+
+    async def drain(self) -> None:
+        while self.in_flight:
+            await self._push_oldest()
+
+    async def _push_oldest(self) -> None:
+        chunk_number, future, total_records, is_last, payload_bytes = self.in_flight.popleft()
+        self.in_flight_bytes -= payload_bytes
+        try:
+            encoded, checksum, records = await future
+            # one joined fragment, or one fragment per record (integrity_mode=merkle)
+            fragments = encoded if isinstance(encoded, list) else [encoded]
+            await self.sender.push(
+                chunk_number,
+                fragments,
+                PrecomputedChecksum(self.request.checksum_algorithm, checksum, records),
+                total_records,
+                sum(len(fragment) for fragment in fragments),
+                is_last,
+            )
+        except BaseException:
+            # nothing after a failed (or interrupted) chunk may be delivered
+            self.cancel()
+            raise
+        # chunks still being encoded stay accounted after the delivered one released its reservation
+        if self.in_flight:
+            self.sender.track(self.in_flight_bytes)
+
+    def cancel(self) -> None:
+        for _, future, *_ in self.in_flight:
+            future.cancel()
+        self.in_flight.clear()
+        self.in_flight_bytes = 0
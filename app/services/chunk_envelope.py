@@ -0,0 +1,177 @@
+"""
+This file is responsible for turning a chunk into the request body that is sent to the pim-core callback url.
+
+The chunk only keeps the canonical bytes of its records (the same bytes that were fed into the checksum),
+the envelope is streamed to pim-core fragment by fragment so the whole payload is never built as one bytes object.
+Chunk envelopes are JSON, or MessagePack with payload_encoding=msgpack, the completion event is always JSON.
+"""
+import orjson
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# msgpack codec (payload_encoding=msgpack)
+from app.utils import msgpack_codec
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+RECORDS_SUFFIX = b"]}"
+
+
+class ChunkEnvelope:
+    """
+    Chunk envelope with pre-encoded record fragments and a precomputed Content-Length.
+    """
+    CONTENT_TYPE = "application/json"
+    SEPARATOR = b","
+    SUFFIX = RECORDS_SUFFIX
+
+    def __init__(self, header: Dict[str, Any], record_fragments: List[bytes], total_records: int = 0, records_key: str = "records", record_count: Optional[int] = None):
+        self.header = header
+        self.chunk_number = header["chunk_number"]
+        # records ACKed in total once this chunk is ACKed (checkpointed with the chunk)
+        self.total_records = total_records
+        self.record_fragments = record_fragments
+        # a fragment may hold several records already joined (encode pool, sheet processes)
+        self.record_count = len(record_fragments) if record_count is None else record_count
+        # (offset, length) of the source bytes the records were read from (csv), recorded in the chunk ledger
+        self.source_range: Optional[Tuple[int, int]] = None
+        # header object without its closing brace, records array ("rows" of a columnar chunk) is spliced in after it
+        self._prefix = self.encode_prefix(header, records_key, self.record_count)
+        self.content_length = (
+            len(self._prefix)
+            + sum(len(fragment) for fragment in record_fragments)
+            + len(self.SEPARATOR) * max(len(record_fragments) - 1, 0)
+            + len(self.SUFFIX)
+        )
+
+    @staticmethod
+    def encode_prefix(header: Dict[str, Any], records_key: str, record_count: int) -> bytes:
+        return orjson.dumps(header)[:-1] + b',"' + records_key.encode() + b'":['
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": self.CONTENT_TYPE,
+            "Content-Length": str(self.content_length),
+        }
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """
+        Yields the envelope in bounded fragments. Every call starts a new stream, so retries can regenerate the body.
+        """
+        fragment_size = MicroServiceConfigurations.STREAM_FRAGMENT_BYTES.value
+        buffer = bytearray(self._prefix)
+        for index, fragment in enumerate(self.record_fragments):
+            if index:
+                buffer += self.SEPARATOR
+            buffer += fragment
+            if len(buffer) >= fragment_size:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += self.SUFFIX
+        yield bytes(buffer)
+
+    def to_bytes(self) -> bytes:
+        """
+        Whole envelope as one bytes object (tests / debugging only).
+        """
+        return self._prefix + self.SEPARATOR.join(self.record_fragments) + self.SUFFIX
+
+
+class MsgpackChunkEnvelope(ChunkEnvelope):
+    """
+    payload_encoding=msgpack : the header map gets one more key holding the array of the records, the record
+    fragments (canonical msgpack) follow the array header back to back, there is nothing to close.
+    """
+    CONTENT_TYPE = msgpack_codec.MSGPACK_CONTENT_TYPE
+    SEPARATOR = b""
+    SUFFIX = b""
+
+    @staticmethod
+    def encode_prefix(header: Dict[str, Any], records_key: str, record_count: int) -> bytes:
+        return msgpack_codec.map_prefix(header, records_key, record_count)
+
+
+class ChunkBatchEnvelope:
+    """
+    Ordered list of chunk envelopes sent in one callback request (opt-in batch mode).
+    """
+    CONTENT_TYPE = "application/json"
+    SEPARATOR = b","
+    SUFFIX = RECORDS_SUFFIX
+
+    def __init__(self, ingestion_id: str, envelopes: List[ChunkEnvelope], is_last: bool):
+        self.envelopes = envelopes
+        # the batch object without its closing brace, the envelopes array is spliced in after it
+        self._prefix = self.encode_prefix({"ingestion_id": ingestion_id, "is_last": is_last}, len(envelopes))
+        self.content_length = (
+            len(self._prefix)
+            + sum(envelope.content_length for envelope in envelopes)
+            + len(self.SEPARATOR) * max(len(envelopes) - 1, 0)
+            + len(self.SUFFIX)
+        )
+
+    @staticmethod
+    def encode_prefix(fields: Dict[str, Any], envelopes: int) -> bytes:
+        return orjson.dumps(fields)[:-1] + b',"batch":['
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": self.CONTENT_TYPE,
+            "Content-Length": str(self.content_length),
+        }
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        yield self._prefix
+        for index, envelope in enumerate(self.envelopes):
+            if index and self.SEPARATOR:
+                yield self.SEPARATOR
+            async for fragment in envelope.iter_body():
+                yield fragment
+        if self.SUFFIX:
+            yield self.SUFFIX
+
+    def to_bytes(self) -> bytes:
+        return self._prefix + self.SEPARATOR.join(envelope.to_bytes() for envelope in self.envelopes) + self.SUFFIX
+
+
+class MsgpackChunkBatchEnvelope(ChunkBatchEnvelope):
+    """
+    Batch of msgpack chunk envelopes, a map whose "batch" key holds the array of the envelopes.
+    """
+    CONTENT_TYPE = msgpack_codec.MSGPACK_CONTENT_TYPE
+    SEPARATOR = b""
+    SUFFIX = b""
+
+    @staticmethod
+    def encode_prefix(fields: Dict[str, Any], envelopes: int) -> bytes:
+        return msgpack_codec.map_prefix(fields, "batch", envelopes)
+
+
+class CallbackEvent:
+    """
+    Small control message (e.g. the COMPLETED event), exposes the same body interface as the chunk envelopes.
+    """
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self._body = orjson.dumps(payload)
+        self.content_length = len(self._body)
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Content-Length": str(self.content_length),
+        }
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        yield self._body
+
+    def to_bytes(self) -> bytes:
+        return self._body
@@ -0,0 +1,107 @@
+"""
+This file is responsible for reconciling an ingestion with what pim-core actually holds (after a rollback or a data loss
+on the pim-core side) through the chunk ledger of the state store : one row per ACKed chunk with its chunk_id, checksum,
+record range, size and ACK time.
+[GUARANTEES]
+- Only the chunks pim-core is missing (or holds with another checksum) are sent again, never the whole ingestion
+- A resend stream starts at its first missing chunk : the records before it are skipped by the reader the same way
+  resume skips ACKed records (parsed, never encoded nor sent), csv sources seek straight to the byte offset of the
+  chunk recorded in the ledger, the stream stops right after its last missing chunk
+- Resent chunks are rebuilt from the source and must have the checksum recorded in the ledger, a source that changed
+  since the ingestion fails the reconciliation instead of sending other data under the same chunk_id
+- The ingestion state (last_chunk, total_records, status) is never touched, resent chunks only refresh their acked_at
+- Multi-sheet excel : every sheet with missing chunks is resent as its own stream
+"""
+from typing import Any, Dict, List, Optional
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+def chunks_to_resend(ledger: List[dict], held: Dict[str, Optional[str]]) -> List[dict]:
+    """
+    Ledger rows of the chunks pim-core does not hold, held maps the chunk_ids pim-core has to their checksum
+    (None when pim-core only reports presence).
+    """
+    resend = []
+    for chunk in ledger:
+        if chunk["chunk_id"] not in held:
+            resend.append({**chunk, "reason": "missing"})
+        elif held[chunk["chunk_id"]] is not None and held[chunk["chunk_id"]] != chunk["checksum"]:
+            resend.append({**chunk, "reason": "mismatched"})
+    return resend
+
+
+class ReplayStateStore:
+    """
+    State store seen by the reader and the chunk sender of a resend stream : progress starts right before the first
+    chunk to resend, checkpoints only refresh the ledger, every other call goes to the real state store.
+    """
+    def __init__(self, store, sheet: Optional[str], chunks: List[dict]):
+        self.store = store
+        self.sheet = sheet
+        first = min(chunks, key=lambda chunk: chunk["chunk_number"])
+        self.last_chunk = first["chunk_number"] - 1
+        self.records_before = first["first_record"]
+        # chunk_number -> checksum recorded when pim-core ACKed it
+        self.resend_checksums = {chunk["chunk_number"]: chunk["checksum"] for chunk in chunks}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+    def get_last_chunk(self, ingestion_id: str) -> int:
+        return self.last_chunk
+
+    def get_total_records(self, ingestion_id: str) -> int:
+        return self.records_before
+
+    def get_sheet_states(self, ingestion_id: str) -> Dict[str, dict]:
+        return {self.sheet: {"last_chunk": self.last_chunk, "total_records": self.records_before, "status": "IN_PROGRESS"}}
+
+    def update_chunk(self, ingestion_id, chunk_number, total_records):
+        pass
+
+    def update_sheet_chunk(self, ingestion_id: str, sheet: str, chunk_number: int, total_records: int):
+        pass
+
+    def mark_sheet_completed(self, ingestion_id: str, sheet: str):
+        pass
+
+    def mark_completed(self, ingestion_id: str):
+        pass
+
+
+async def resend_chunks(service, ingestion_id: str, request, resend: List[dict]) -> int:
+    """
+    Rebuilds and sends the chunks of resend with the reader service of the ingestion, returns the number of resent chunks.
+    """
+    # imported here : the chunk sender imports this module
+    from app.services.chunk_sender import ReconciliationFinished
+
+    store = service.state_store
+    streams: Dict[Optional[str], List[dict]] = {}
+    for chunk in resend:
+        streams.setdefault(chunk["sheet"], []).append(chunk)
+
+    resent = 0
+    try:
+        for sheet, chunks in streams.items():
+            service.state_store = ReplayStateStore(store, sheet, chunks)
+            # a sheet is resent on its own, the sheets pim-core holds completely are not read at all
+            stream_request = request.model_copy(update={"sheets": [sheet]}) if sheet is not None else request
+            info_logger.info(
+                f"resend_chunks | ingestion_id = {ingestion_id} | sheet = {sheet} | chunks = {[chunk['chunk_number'] for chunk in chunks]} | records_skipped = {service.state_store.records_before}"
+            )
+            try:
+                await service.stream_and_push(ingestion_id, stream_request)
+            except ReconciliationFinished:
+                pass
+            resent += len(chunks)
+    finally:
+        service.state_store = store
+    return resent
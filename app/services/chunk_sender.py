@@ -0,0 +1,482 @@
+"""
+This file is responsible for delivering the chunks of one ingestion to the pim-core callback url (or to the file / null
+sink named by it, see chunk_sinks). It is shared by the json, excel and csv ingestion services.
+[GUARANTEES]
+- Already ACKed chunks are never resent (resume)
+- Progress is persisted ONLY after pim-core ACKed a chunk
+- In batch mode one callback request carries an ordered list of chunk envelopes, progress is checkpointed
+  up to the highest contiguous ACK and only the remaining chunks are retried
+- Each ingestion keeps its chunks inside its reservation from the process wide memory governor
+- On shutdown the chunk in flight (and a partial batch) is delivered and checkpointed, then the ingestion stops
+  before the next chunk so the next start resumes at the exact last ACK
+- Overload signals of pim-core (429 / 503, Retry-After) are waited out with backoff, error retries are limited
+  by a per callback host retry budget and chunk requests in flight per host follow an AIMD limit
+- integrity_mode=merkle : a NACK naming the damaged records (mismatched_leaves) is answered with a repair message
+  carrying only those records, anything else resends the whole chunk (batch mode always resends whole chunks)
+- Every checkpoint records the ACKed chunks in the chunk ledger, reconciliation (see chunk_ledger) resends only the
+  chunks pim-core lost and stops after the last of them
+"""
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+
+# import chunk envelopes (streamed request bodies)
+from app.services.chunk_envelope import (
+    ChunkEnvelope,
+    ChunkBatchEnvelope,
+    MsgpackChunkEnvelope,
+    MsgpackChunkBatchEnvelope,
+    CallbackEvent,
+)
+
+# import data integrity manager
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+# import process wide memory governor and metrics
+from app.services.memory_governor import memory_governor
+from app.services.ingestion_metrics import ingestion_metrics
+
+# import per callback host backpressure controller (AIMD, retry budget, backoff)
+from app.services.callback_host_controller import (
+    callback_hosts,
+    backoff_delay,
+    parse_retry_after,
+    OVERLOAD_STATUS_CODES,
+)
+
+# import output sinks (http, file, null)
+from app.services.chunk_sinks import sink_for
+
+# import chunk ledger (reconciliation resend streams)
+from app.services.chunk_ledger import ReplayStateStore
+
+# import per-ingestion timeline (trace=true)
+from app.services.ingestion_tracer import tracer_for
+
+# import shutdown flag of the ingestion supervisor
+from app.services.ingestion_supervisor import ingestion_supervisor
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import error messages
+from app.utils.error_messages import ChunkErrorMessages
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+MAX_ATTEMPTS = 3
+OVERLOAD_MAX_WAIT_SECONDS = MicroServiceConfigurations.OVERLOAD_MAX_WAIT_SECONDS.value
+
+
+class ChunkRejectedError(Exception):
+    pass
+
+
+class CallbackOverloadedError(Exception):
+    pass
+
+
+class IngestionInterruptedError(Exception):
+    pass
+
+
+class ReconciliationFinished(Exception):
+    pass
+
+
+class SourceChangedError(Exception):
+    pass
+
+
+class ChunkSender:
+    def __init__(self, client, request, ingestion_id: str, state_store, last_chunk: int, sheet: Optional[str] = None):
+        self.client = client
+        self.url = request.callback_url
+        # shared with every ingestion that sends to the same pim-core host
+        self.host = callback_hosts.for_url(request.callback_url)
+        # pim-core over http, or a local file / null sink for offline runs
+        self.sink = sink_for(client, request, ingestion_id)
+        self.request = request
+        self.ingestion_id = ingestion_id
+        self.state_store = state_store
+        # last chunk ACKed by pim-core before this run (or -1)
+        self.last_chunk = last_chunk
+        # multi-sheet excel : every sheet has its own chunk sequence, checkpoints and memory reservation
+        self.sheet = sheet
+        self.reservation_key = f"{ingestion_id}:{sheet}" if sheet is not None else ingestion_id
+        # payload_format=columnar : the header row of the chunks, sent once per chunk instead of once per record
+        self.columns: Optional[List[str]] = None
+        # payload_encoding=msgpack : chunk envelopes (and batches) are sent as application/msgpack
+        msgpack = request.payload_encoding == "msgpack"
+        self.envelope_class = MsgpackChunkEnvelope if msgpack else ChunkEnvelope
+        self.batch_class = MsgpackChunkBatchEnvelope if msgpack else ChunkBatchEnvelope
+        self.batch_size = request.batch_size or 1
+        self.pending: List[ChunkEnvelope] = []
+        self.pending_bytes = 0
+        self.reserved_bytes = 0
+        self.previous_chunk_bytes: Optional[int] = None
+        # reconciliation : only these chunks (chunk_number -> checksum in the ledger) are sent, the stream stops after the last one
+        self.resend_checksums = state_store.resend_checksums if isinstance(state_store, ReplayStateStore) else None
+        # trace=true : send attempts, ACKs and checkpoints go on their own track of the ingestion's timeline
+        self.tracer = tracer_for(request, ingestion_id)
+        self.trace_track = "sender" if sheet is None else f"sheet {sheet} / sender"
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # memory budget
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    async def begin_chunk(self) -> None:
+        """
+        Called before a new chunk is built. Reserves memory for the next chunk (or the next batch of chunks),
+        waits (pauses the parser) while the process wide budget is exhausted.
+        """
+        if self.reserved_bytes:
+            return
+        self.reserved_bytes = memory_governor.estimate_chunk_bytes(self.request, self.previous_chunk_bytes) * self.batch_size
+        with self.tracer.span("reserve memory", self.trace_track, bytes=self.reserved_bytes):
+            await memory_governor.reserve(self.reservation_key, self.reserved_bytes)
+
+    def track(self, chunk_bytes: int) -> None:
+        """
+        Accounts for a chunk that grew past the estimate it was reserved with.
+        """
+        in_memory = self.pending_bytes + chunk_bytes
+        if in_memory > self.reserved_bytes:
+            self.reserved_bytes = in_memory
+            memory_governor.adjust(self.reservation_key, self.reserved_bytes)
+
+    def release(self) -> None:
+        self.reserved_bytes = 0
+        memory_governor.release(self.reservation_key)
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # delivery
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def build_envelope(self, chunk_number: int, record_fragments: List[bytes], chunk_checksum, total_records: int, is_last: bool) -> ChunkEnvelope:
+        # the checksum was fed incrementally while the chunk was being built
+        with self.tracer.span("checksum", self.trace_track, chunk_number=chunk_number, algorithm=chunk_checksum.algorithm):
+            checksum = chunk_checksum.hexdigest()
+        header = {
+            "ingestion_id": self.ingestion_id,
+            "chunk_number": chunk_number,
+            "chunk_id": ChunkIntegrityManager.build_chunk_id(self.ingestion_id, chunk_number, self.sheet),
+            "checksum": checksum,
+            "checksum_algorithm": chunk_checksum.algorithm,
+            "is_last": is_last,
+        }
+        if self.sheet is not None:
+            # chunk_number is local to the sheet
+            header["sheet"] = self.sheet
+        if self.columns is not None:
+            header["payload_format"] = "columnar"
+            header["columns"] = self.columns
+        if self.request.integrity_mode == "merkle":
+            # one fragment per record, pim-core can tell which records did not arrive intact
+            with self.tracer.span("merkle tree", self.trace_track, chunk_number=chunk_number, leaves=len(record_fragments)):
+                leaves = ChunkIntegrityManager.merkle_leaves(record_fragments, chunk_checksum.algorithm)
+                header["merkle_root"] = ChunkIntegrityManager.merkle_root(leaves, chunk_checksum.algorithm)
+            header["leaf_hashes"] = leaves
+        return self.envelope_class(
+            header=header,
+            record_fragments=record_fragments,
+            total_records=total_records,
+            records_key="rows" if self.columns is not None else "records",
+            record_count=chunk_checksum.records,
+        )
+
+    async def push(self, chunk_number: int, record_fragments: List[bytes], chunk_checksum, total_records: int, chunk_bytes: int, is_last: bool, source_range: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Hands a finished chunk over for delivery. total_records is the number of records ACKed once this chunk is ACKed,
+        source_range the (offset, length) of the source bytes of the chunk when the reader knows it.
+        """
+        self.previous_chunk_bytes = chunk_bytes
+
+        # SKIP already ACKed chunks (and the chunks pim-core still holds when reconciling)
+        if chunk_number <= self.last_chunk or (self.resend_checksums is not None and chunk_number not in self.resend_checksums):
+            debug_logger.debug(f"ChunkSender.push | ingestion_id = {self.ingestion_id} | chunk_number = {chunk_number} | action = SKIPPED (Already ACKed)")
+            if not self.pending:
+                self.release()
+            self._stop_if_requested(is_last)
+            return
+
+        envelope = self.build_envelope(chunk_number, record_fragments, chunk_checksum, total_records, is_last)
+        envelope.source_range = source_range
+        resent_last = False
+        if self.resend_checksums is not None:
+            self._check_resent(envelope)
+            resent_last = chunk_number == max(self.resend_checksums)
+        self.pending.append(envelope)
+        self.pending_bytes += chunk_bytes
+
+        if is_last or resent_last or ingestion_supervisor.stopping or len(self.pending) >= self.batch_size:
+            await self.flush()
+        if resent_last:
+            info_logger.info(f"ChunkSender.push | ingestion_id = {self.ingestion_id} | sheet = {self.sheet} | chunks = {len(self.resend_checksums)} | action = RESENT")
+            raise ReconciliationFinished(f"Ingestion {self.ingestion_id} resent its missing chunks up to chunk {chunk_number}")
+        self._stop_if_requested(is_last)
+
+    def _check_resent(self, envelope: ChunkEnvelope) -> None:
+        """
+        A rebuilt chunk must be the chunk pim-core ACKed before, same chunk_id must mean same records.
+        """
+        expected = self.resend_checksums[envelope.chunk_number]
+        if envelope.header["checksum"] != expected:
+            message = ChunkErrorMessages.SOURCE_CHANGED.value.format(
+                ingestion_id=self.ingestion_id, chunk_number=envelope.chunk_number, reason=f"checksum {envelope.header['checksum']} != {expected} in the ledger"
+            )
+            error_logger.error(message)
+            raise SourceChangedError(message)
+
+    def _stop_if_requested(self, is_last: bool) -> None:
+        """
+        Graceful shutdown : everything handed over so far is ACKed and checkpointed, stop before the next chunk is built.
+        """
+        if ingestion_supervisor.stopping and not is_last:
+            info_logger.info(f"ChunkSender.push | ingestion_id = {self.ingestion_id} | last_chunk = {self.last_chunk} | action = INTERRUPTED (Shutdown)")
+            raise IngestionInterruptedError(f"Ingestion {self.ingestion_id} interrupted by shutdown after chunk {self.last_chunk}")
+
+    async def flush(self) -> None:
+        """
+        Sends every pending chunk, called when the batch is full, for the last chunk and before the completion event.
+        """
+        if self.pending:
+            if self.request.batch_size:
+                await self._send_batch()
+            else:
+                await self._send_chunk(self.pending[0])
+            self.pending = []
+            self.pending_bytes = 0
+        self.release()
+
+    async def _post(self, body, **trace_args) -> dict:
+        """
+        Posts one envelope (or batch) to pim-core and returns its JSON answer.
+        Overload signals (429 / 503) are waited out with backoff and Retry-After instead of failing the chunk.
+        """
+        overload_attempt = 0
+        overload_waited = 0.0
+        while True:
+            waiting = time.perf_counter()
+            # fair share of the callback host between the ingestions sending to it, weighted by their priority
+            async with self.host.slot(self.ingestion_id, self.request.priority, body.content_length):
+                # time spent waiting for a free AIMD slot of the callback host
+                self.tracer.complete("wait host slot", self.trace_track, waiting, time.perf_counter())
+                with self.tracer.span("send", self.trace_track, bytes=body.content_length, **trace_args) as span:
+                    try:
+                        resp = await self.sink.send(body)
+                    except httpx.TimeoutException:
+                        # a callback that stops answering in time is overloaded as well
+                        self._on_overload(None)
+                        raise
+                    span.set(status_code=resp.status_code)
+            ingestion_metrics.increment("callback_requests", ingestion_id=self.ingestion_id)
+
+            if resp.status_code not in OVERLOAD_STATUS_CODES:
+                self.host.on_success()
+                return resp.json()
+
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            self._on_overload(retry_after)
+            delay = backoff_delay(overload_attempt, retry_after)
+            if overload_waited + delay > OVERLOAD_MAX_WAIT_SECONDS:
+                error_logger.error(ChunkErrorMessages.CALLBACK_OVERLOADED.value.format(
+                    ingestion_id=self.ingestion_id, status_code=resp.status_code, waited=round(overload_waited, 1)
+                ))
+                raise CallbackOverloadedError(f"Callback {self.host.host} stayed overloaded for {round(overload_waited, 1)}s")
+
+            debug_logger.debug(f"ChunkSender._post | ingestion_id = {self.ingestion_id} | status_code = {resp.status_code} | retry_after = {retry_after} | backoff = {delay:.2f}")
+            with self.tracer.span("overload backoff", self.trace_track, status_code=resp.status_code, retry_after=retry_after):
+                await asyncio.sleep(delay)
+            overload_attempt += 1
+            overload_waited += delay
+
+    def _on_overload(self, retry_after: Optional[float]) -> None:
+        self.host.on_overload()
+        ingestion_metrics.increment("overload_events", ingestion_id=self.ingestion_id)
+        if retry_after:
+            ingestion_metrics.increment("retry_after_seconds", retry_after, ingestion_id=self.ingestion_id)
+
+    async def _retry_or_raise(self, attempt: int, error: Exception) -> None:
+        """
+        Backs off before the next attempt, raises the error when attempts or the host retry budget are exhausted.
+        """
+        if attempt >= MAX_ATTEMPTS - 1:
+            raise error
+        if not self.host.try_spend_retry():
+            ingestion_metrics.increment("retry_budget_exhausted", ingestion_id=self.ingestion_id)
+            raise error
+        ingestion_metrics.increment("retries", ingestion_id=self.ingestion_id)
+        with self.tracer.span("retry backoff", self.trace_track, attempt=attempt + 1, error=type(error).__name__):
+            await asyncio.sleep(backoff_delay(attempt))
+
+    def _repair_envelope(self, envelope: ChunkEnvelope, mismatched_leaves) -> Optional[ChunkEnvelope]:
+        """
+        integrity_mode=merkle : envelope carrying only the records pim-core named in mismatched_leaves of its NACK,
+        None when the NACK names no usable subset of the chunk (the whole chunk is sent again).
+        """
+        if self.request.integrity_mode != "merkle" or not isinstance(mismatched_leaves, list) or not mismatched_leaves:
+            return None
+        records = len(envelope.record_fragments)
+        if not all(type(index) is int and 0 <= index < records for index in mismatched_leaves):
+            return None
+        leaf_indices = sorted(set(mismatched_leaves))
+        if len(leaf_indices) == records:
+            return None
+        # same chunk identity, checksum and merkle root : pim-core checks the repaired chunk as a whole
+        header = {key: value for key, value in envelope.header.items() if key != "leaf_hashes"}
+        header["repair"] = True
+        header["leaf_indices"] = leaf_indices
+        ingestion_metrics.increment("chunks_repaired", ingestion_id=self.ingestion_id)
+        ingestion_metrics.increment("records_repaired", len(leaf_indices), ingestion_id=self.ingestion_id)
+        info_logger.info(
+            f"ChunkSender._repair_envelope | ingestion_id = {self.ingestion_id} | chunk_number = {envelope.chunk_number} | records = {len(leaf_indices)}/{records}"
+        )
+        return self.envelope_class(
+            header=header,
+            record_fragments=[envelope.record_fragments[index] for index in leaf_indices],
+            total_records=envelope.total_records,
+            records_key="rows" if "columns" in header else "records",
+        )
+
+    async def _send_chunk(self, envelope: ChunkEnvelope) -> None:
+        # the whole chunk, or the records pim-core asked to be repaired
+        body = envelope
+        for attempt in range(MAX_ATTEMPTS):
+            debug_logger.debug(
+                f"ChunkSender._send_chunk | ingestion_id = {self.ingestion_id} | chunk_number = {envelope.chunk_number} | attempt = {attempt + 1} | bytes = {body.content_length}"
+            )
+            try:
+                # Added checksum mechanism to make sure chunk wise data ingegrity along with ack validation for fault tolerant system and re-tries
+                ack_response = await self._post(body, chunk_number=envelope.chunk_number, attempt=attempt + 1, repair=body is not envelope)
+                debug_logger.debug(f"ChunkSender._send_chunk | response from pim core callback url = {ack_response}")
+                self.tracer.instant("ACK" if ack_response.get("ack") is True else "NACK", self.trace_track, chunk_number=envelope.chunk_number, error=ack_response.get("error"))
+
+                # raise exception when the chunk is rejected due to errors
+                if ack_response.get("ack") is not True:
+                    error_logger.error(ChunkErrorMessages.CHUNK_REJECTED.value.format(
+                        ingestion_id=self.ingestion_id, chunk_number=envelope.chunk_number, reason=ack_response.get("error")
+                    ))
+                    body = self._repair_envelope(envelope, ack_response.get("mismatched_leaves")) or envelope
+                    raise ChunkRejectedError(f"Chunk {envelope.chunk_number} rejected: {ack_response.get('error')}")
+
+                # Persist progress ONLY after ACK
+                self._checkpoint([envelope])
+                return
+            except CallbackOverloadedError:
+                raise
+            except Exception as e:
+                error_logger.error(ChunkErrorMessages.CHUNK_PUSH_FAILED.value.format(
+                    ingestion_id=self.ingestion_id, chunk_number=envelope.chunk_number, attempt=attempt + 1, error=str(e)
+                ))
+                await self._retry_or_raise(attempt, e)
+
+    async def _send_batch(self) -> None:
+        remaining = list(self.pending)
+        attempt = 0
+        while remaining:
+            batch = self.batch_class(self.ingestion_id, remaining, is_last=remaining[-1].header["is_last"])
+            debug_logger.debug(
+                f"ChunkSender._send_batch | ingestion_id = {self.ingestion_id} | chunks = {[envelope.chunk_number for envelope in remaining]} | attempt = {attempt + 1} | bytes = {batch.content_length}"
+            )
+            try:
+                ack_response = await self._post(batch, chunks=[envelope.chunk_number for envelope in remaining], attempt=attempt + 1)
+                debug_logger.debug(f"ChunkSender._send_batch | response from pim core callback url = {ack_response}")
+
+                acked = self._contiguous_acks(remaining, ack_response.get("results") or [])
+                self.tracer.instant("ACK" if acked == len(remaining) else "NACK", self.trace_track, chunks=len(remaining), acked=acked)
+                if acked:
+                    # Persist progress ONLY up to the highest contiguous ACK
+                    self._checkpoint(remaining[:acked])
+                    remaining = remaining[acked:]
+                    # progress was made, the attempts start over for the rest of the batch
+                    attempt = 0
+                    continue
+
+                reason = next((result.get("error") for result in ack_response.get("results") or [] if not result.get("ack")), ack_response.get("error"))
+                error_logger.error(ChunkErrorMessages.CHUNK_REJECTED.value.format(
+                    ingestion_id=self.ingestion_id, chunk_number=remaining[0].chunk_number, reason=reason
+                ))
+                raise ChunkRejectedError(f"Chunk {remaining[0].chunk_number} rejected: {reason}")
+            except CallbackOverloadedError:
+                raise
+            except Exception as e:
+                error_logger.error(ChunkErrorMessages.CHUNK_PUSH_FAILED.value.format(
+                    ingestion_id=self.ingestion_id, chunk_number=remaining[0].chunk_number, attempt=attempt + 1, error=str(e)
+                ))
+                await self._retry_or_raise(attempt, e)
+                attempt += 1
+
+    async def send_completion(self, chunk_number: int, total_records: int, sheets: Optional[dict] = None) -> bool:
+        """
+        Completion handshake, returns True when pim-core ACKed the COMPLETED event.
+        """
+        if self.resend_checksums is not None:
+            # a resend stream stops after its last chunk, reaching the end means the source lost records
+            message = ChunkErrorMessages.SOURCE_CHANGED.value.format(
+                ingestion_id=self.ingestion_id, chunk_number=max(self.resend_checksums), reason="source ended before the chunk"
+            )
+            error_logger.error(message)
+            raise SourceChangedError(message)
+        event = {
+            "ingestion_id": self.ingestion_id,
+            "status": "COMPLETED",
+            "chunk_number": chunk_number,
+            "total_records": total_records,
+        }
+        if sheets is not None:
+            # progress of every sheet of a multi-sheet excel ingestion
+            event["sheets"] = sheets
+        ack_response = await self._post(CallbackEvent(event), event="COMPLETED")
+        debug_logger.debug(f"ChunkSender.send_completion | COMPLETION EVENT | response from pim core callback url = {ack_response}")
+        return ack_response.get("ack") is True
+
+    @staticmethod
+    def _contiguous_acks(envelopes: List[ChunkEnvelope], results: list) -> int:
+        """
+        Number of leading chunks of the batch that pim-core ACKed, in order.
+        """
+        acks = {result.get("chunk_number"): result.get("ack") is True for result in results}
+        acked = 0
+        for envelope in envelopes:
+            if not acks.get(envelope.chunk_number):
+                break
+            acked += 1
+        return acked
+
+    def _checkpoint(self, envelopes: List[ChunkEnvelope]) -> None:
+        envelope = envelopes[-1]
+        chunks = len(envelopes)
+        with self.tracer.span("checkpoint", self.trace_track, chunk_number=envelope.chunk_number, chunks=chunks):
+            if MicroServiceConfigurations.CHUNK_LEDGER.value:
+                # ledger first : a chunk checkpointed is always in the ledger
+                self.state_store.record_chunks(self.ingestion_id, self.sheet, [self._ledger_row(acked) for acked in envelopes])
+            if self.sheet is not None:
+                self.state_store.update_sheet_chunk(self.ingestion_id, self.sheet, envelope.chunk_number, envelope.total_records)
+            else:
+                self.state_store.update_chunk(self.ingestion_id, envelope.chunk_number, envelope.total_records)
+        self.last_chunk = envelope.chunk_number
+        ingestion_metrics.increment("chunks_acked", chunks, ingestion_id=self.ingestion_id)
+
+    @staticmethod
+    def _ledger_row(envelope: ChunkEnvelope) -> dict:
+        return {
+            "chunk_number": envelope.chunk_number,
+            "chunk_id": envelope.header["chunk_id"],
+            "checksum": envelope.header["checksum"],
+            "checksum_algorithm": envelope.header["checksum_algorithm"],
+            # records of the ingestion (of the sheet) before this chunk, what a resend stream skips
+            "first_record": envelope.total_records - envelope.record_count,
+            "record_count": envelope.record_count,
+            "byte_size": envelope.content_length,
+            "is_last": envelope.header["is_last"],
+            # where a resend stream (or a resumed csv ingestion) can seek to, None for readers without byte offsets
+            "source_offset": envelope.source_range[0] if envelope.source_range else None,
+            "source_length": envelope.source_range[1] if envelope.source_range else None,
+        }
@@ -0,0 +1,215 @@
+"""
+This file is responsible for where the chunk sender delivers the chunks, chosen by the scheme of callback_url.
+- http:// https://            : pim-core (HttpSink), the callback protocol with its ACK / NACK answers
+- file:///dir                 : NDJSON file <dir>/<ingestion_id>.ndjson, one line per delivered body (FileSink)
+- file:///dir?format=files    : spooled files <dir>/<ingestion_id>/<chunk>.json (or .msgpack), one per delivered body
+- null://                     : nothing is kept, every chunk is ACKed at once (NullSink)
+[GUARANTEES]
+- A body is written (and fsynced with FILE_SINK_FSYNC) before the file sink ACKs it, so resume after a crash never
+  skips a chunk that is not on disk. A chunk written but not yet checkpointed is written again on resume : NDJSON
+  readers deduplicate on chunk_id like pim-core does, a spooled file is replaced by the same content
+- A body is written as it is generated, STREAM_FRAGMENT_BYTES at a time, it is never joined into one bytes object.
+  A body that fails is removed again, one cut by a crash leaves a partial last NDJSON line (readers skip lines that
+  do not parse) and the next body starts on a new line
+- fsync is not batched across bodies : every delivered body costs one fsync, so without batch_size every chunk does.
+  batch_size is what amortizes it, a batch of chunks is one body and one fsync
+- Spooled files are written to a temporary name and renamed, a reader of the directory never sees a partial file
+- The null sink still generates every body, it measures the read / parse / serialize ceiling of the service
+- Sinks answer like an ACKing pim-core, the chunk sender does not know which sink it talks to
+"""
+import asyncio
+import contextlib
+import os
+import weakref
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import url2pathname
+
+# import chunk envelopes (streamed request bodies)
+from app.services.chunk_envelope import ChunkBatchEnvelope, CallbackEvent
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+SINK_KINDS = ("http", "file", "null")
+
+_ndjson_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class SinkTarget(NamedTuple):
+    kind: str
+    path: Optional[str] = None
+    spool: bool = False
+
+
+def parse_sink_url(url: str) -> SinkTarget:
+    parts = urlsplit(url)
+    if parts.scheme == "file":
+        spool = parse_qs(parts.query).get("format", ["ndjson"])[-1] == "files"
+        return SinkTarget("file", url2pathname(parts.path), spool)
+    if parts.scheme in ("http", "https"):
+        return SinkTarget("http")
+    # "null", or the scheme of an unsupported url (refused by the request validation)
+    return SinkTarget(parts.scheme)
+
+
+class SinkResponse:
+    """
+    Answer of a file or null sink, the part of an httpx response the chunk sender reads.
+    """
+    status_code = 200
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.headers: Dict[str, str] = {}
+        self._payload = payload
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+
+def ack_answer(body) -> Dict[str, Any]:
+    """
+    What an ACKing pim-core answers to body.
+    """
+    if isinstance(body, ChunkBatchEnvelope):
+        return {"ack": True, "results": [{"ack": True, "chunk_number": envelope.chunk_number} for envelope in body.envelopes]}
+    if isinstance(body, CallbackEvent):
+        return {"ack": True, "status": body.payload.get("status"), "chunk_number": body.payload.get("chunk_number")}
+    return {"ack": True, "chunk_number": body.chunk_number}
+
+
+class HttpSink:
+    def __init__(self, client, url: str):
+        self.client = client
+        self.url = url
+
+    async def send(self, body):
+        # a fresh body stream per attempt, the envelope is never materialized as one bytes object
+        return await self.client.post(self.url, content=body.iter_body(), headers=body.headers())
+
+
+class NullSink:
+    async def send(self, body) -> SinkResponse:
+        async for _ in body.iter_body():
+            pass
+        return SinkResponse(ack_answer(body))
+
+
+class FileSink:
+    def __init__(self, target: SinkTarget, ingestion_id: str):
+        self.directory = target.path
+        self.spool = target.spool
+        self.ingestion_id = ingestion_id
+        self.fsync = MicroServiceConfigurations.FILE_SINK_FSYNC.value
+
+    def _spool_name(self, body) -> str:
+        extension = "msgpack" if body.headers()["Content-Type"] != "application/json" else "json"
+        if isinstance(body, CallbackEvent):
+            return f"{body.payload.get('status', 'event').lower()}.json"
+        if isinstance(body, ChunkBatchEnvelope):
+            first, last = body.envelopes[0], body.envelopes[-1]
+            return f"{self._chunk_name(first)}-{last.chunk_number:08d}.{extension}"
+        return f"{self._chunk_name(body)}.{extension}"
+
+    @staticmethod
+    def _chunk_name(envelope) -> str:
+        # chunk numbers are local to the sheet in a multi-sheet excel ingestion
+        sheet = envelope.header.get("sheet")
+        return f"chunk-{envelope.chunk_number:08d}" if sheet is None else f"sheet-{sheet}-chunk-{envelope.chunk_number:08d}"
+
+    def _open(self, path: str, append: bool) -> Tuple[Any, int]:
+        """
+        File a body is streamed into and the size to truncate it back to when the body fails.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not append:
+            return open(f"{path}.tmp", "wb"), 0
+        f = open(path, "a+b")
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            f.seek(size - 1)
+            # a body cut by a crash left a partial last line, the next body starts on a line of its own
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+                size += 1
+        return f, size
+
+    def _finish(self, f, path: str, append: bool, data: bytes) -> None:
+        f.write(data)
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        f.close()
+        if not append:
+            os.replace(f"{path}.tmp", path)
+
+    @staticmethod
+    def _abort(f, path: str, append: bool, size: int) -> None:
+        if append:
+            f.flush()
+            f.truncate(size)
+            f.close()
+            return
+        f.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(f"{path}.tmp")
+
+    async def send(self, body) -> SinkResponse:
+        name = self._spool_name(body) if self.spool else None
+        if name is None:
+            path = os.path.join(self.directory, f"{self.ingestion_id}.ndjson")
+            # the senders of the sheets of an ingestion share the file, their bodies are appended one at a time
+            async with _ndjson_lock(path):
+                written = await self._stream(body, path, True)
+        else:
+            written = await self._stream(body, os.path.join(self.directory, self.ingestion_id, name), False)
+        debug_logger.debug(f"FileSink.send | ingestion_id = {self.ingestion_id} | directory = {self.directory} | name = {name} | bytes = {written}")
+        return SinkResponse(ack_answer(body))
+
+    async def _stream(self, body, path: str, append: bool) -> int:
+        # the body is written as it is generated, STREAM_FRAGMENT_BYTES at a time, disk writes and fsync off the event loop
+        fragment_size = MicroServiceConfigurations.STREAM_FRAGMENT_BYTES.value
+        f, size = await asyncio.to_thread(self._open, path, append)
+        written = 0
+        buffer = bytearray()
+        try:
+            async for fragment in body.iter_body():
+                buffer += fragment
+                if len(buffer) >= fragment_size:
+                    await asyncio.to_thread(f.write, buffer)
+                    written += len(buffer)
+                    buffer = bytearray()
+            if append:
+                buffer += b"\n"
+            await asyncio.to_thread(self._finish, f, path, append, bytes(buffer))
+        except BaseException:
+            # nothing of a failed body stays on disk (an ndjson file is truncated back, a spooled file never appears)
+            await asyncio.to_thread(self._abort, f, path, append, size)
+            raise
+        return written + len(buffer)
+
+
+def _ndjson_lock(path: str) -> asyncio.Lock:
+    # one lock per ndjson file, dropped once no sender holds it
+    lock = _ndjson_locks.get(path)
+    if lock is None:
+        lock = _ndjson_locks[path] = asyncio.Lock()
+    return lock
+
+
+def sink_for(client, request, ingestion_id: str):
+    target = parse_sink_url(request.callback_url)
+    if target.kind == "file":
+        return FileSink(target, ingestion_id)
+    if target.kind == "null":
+        return NullSink()
+    return HttpSink(client, request.callback_url)
@@ -0,0 +1,259 @@
+"""
+This file is responsible for the byte level side of csv sources : opening them, detecting their encoding and delimiter,
+reading records together with the byte offset right after each of them, and splitting a file into byte ranges that
+the encode pool parses in parallel while the file is still being read.
+[GUARANTEES]
+- Only ASCII compatible encodings are read : line breaks, delimiters and quote characters are single bytes that never
+  occur inside a multi-byte character, so lines are split on bytes and offsets are byte offsets of the source
+- The offset after a record is exact, quoted fields spanning several lines included (csv.reader pulls exactly the lines
+  of a record), a chunk can be resumed by seeking to the offset where it starts
+- Range boundaries are line breaks after an even number of quote characters, a range is parsed strictly and fails when
+  it does not end on a record boundary (stray quote characters fooled the scan), the reader then parses the rest of
+  the file itself : ranges never produce other records than one pass over the file
+- Headers and rows follow the excel reader : headers are stripped, column_{i} for empty header cells, completely empty
+  rows are no records, empty cells are null, short rows are padded and extra cells dropped
+"""
+import codecs
+import contextlib
+import csv
+import io
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import data integrity manager
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+# fields / filter of the request
+from app.services.record_selection import RecordSelection
+
+# local path or remote url
+from app.services.excel_source import is_remote_path
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+# ASCII bytes every supported encoding must decode as themselves
+_ASCII_PROBE = b"\r\n,;\t|\"'azAZ09"
+
+
+class CsvFormatError(ValueError):
+    pass
+
+
+class CsvFormat(NamedTuple):
+    encoding: str
+    delimiter: str
+    quotechar: str
+    # byte offset of the header row (after a utf-8 byte order mark)
+    start: int
+
+
+def csv_encoding_supported(encoding: str) -> bool:
+    try:
+        return _ASCII_PROBE.decode(encoding) == _ASCII_PROBE.decode("ascii")
+    except (LookupError, UnicodeDecodeError):
+        return False
+
+
+@contextlib.contextmanager
+def open_csv_source(file_path: str):
+    """
+    Seekable binary file of a local path or remote url, read CSV_READ_BUFFER_BYTES at a time.
+    """
+    buffer_bytes = MicroServiceConfigurations.CSV_READ_BUFFER_BYTES.value
+    path = file_path
+    fs = None
+    if is_remote_path(file_path) or file_path.startswith("file://"):
+        # fsspec (and the filesystem of the protocol, e.g. s3fs) is only imported for a url
+        import fsspec
+        from fsspec.implementations.local import LocalFileSystem
+
+        fs, path = fsspec.core.url_to_fs(file_path)
+        if isinstance(fs, LocalFileSystem):
+            fs = None
+    if fs is None:
+        with open(path, "rb", buffering=buffer_bytes) as f:
+            yield f
+        return
+    with fs.open(path, "rb", block_size=buffer_bytes) as raw:
+        # readline of the buffered reader runs in C, the fsspec file only serves block reads
+        yield io.BufferedReader(raw, buffer_size=buffer_bytes)
+
+
+def detect_encoding(sample: bytes) -> str:
+    try:
+        # final=False : the sample may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    fallback = MicroServiceConfigurations.CSV_FALLBACK_ENCODING.value
+    try:
+        sample.decode(fallback)
+        return fallback
+    except UnicodeDecodeError:
+        # every byte is a latin-1 character
+        return "latin-1"
+
+
+def detect_format(sample: bytes, csv_delimiter: Optional[str] = None, csv_quotechar: Optional[str] = None, csv_encoding: Optional[str] = None) -> CsvFormat:
+    """
+    Format of a csv source from its first bytes, the csv_* options of the request win over the detection.
+    """
+    start = 0
+    if sample.startswith(codecs.BOM_UTF8):
+        start = len(codecs.BOM_UTF8)
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        raise CsvFormatError("utf-16 / utf-32 byte order mark")
+
+    encoding = csv_encoding or ("utf-8" if start else detect_encoding(sample))
+    if codecs.lookup(encoding).name == "utf-8-sig":
+        # the byte order mark is skipped by offset, not by the decoder
+        encoding = "utf-8"
+    if not csv_encoding_supported(encoding):
+        raise CsvFormatError(encoding)
+
+    quotechar = csv_quotechar or '"'
+    delimiter = csv_delimiter
+    if delimiter is None:
+        text = sample[start:].decode(encoding, errors="ignore")
+        # complete lines only, the sample ends anywhere
+        if text.rfind("\n") > 0:
+            text = text[:text.rfind("\n")]
+        try:
+            delimiter = csv.Sniffer().sniff(text, delimiters=MicroServiceConfigurations.CSV_DELIMITERS.value).delimiter
+        except csv.Error:
+            # a single column (or nothing to tell from)
+            delimiter = ","
+    return CsvFormat(encoding, delimiter, quotechar, start)
+
+
+class ByteOffsetLines:
+    """
+    Decoded lines of a binary file for csv.reader, offset is the byte offset right after the last line handed out.
+    """
+    def __init__(self, f, encoding: str, offset: int):
+        self.readline = f.readline
+        self.encoding = encoding
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode(self.encoding)
+
+
+def new_reader(lines: ByteOffsetLines, fmt: CsvFormat, strict: bool = False):
+    return csv.reader(lines, delimiter=fmt.delimiter, quotechar=fmt.quotechar, strict=strict)
+
+
+def read_headers(f, fmt: CsvFormat) -> Tuple[Optional[List[str]], int]:
+    """
+    Headers of the source and the byte offset of its first data row, None when the header row is empty.
+    """
+    f.seek(fmt.start)
+    lines = ByteOffsetLines(f, fmt.encoding, fmt.start)
+    header_row = next(new_reader(lines, fmt), None)
+    if not header_row or not any(header_row):
+        return None, lines.offset
+    return [col.strip() if col else f"column_{i}" for i, col in enumerate(header_row)], lines.offset
+
+
+def csv_records(lines: ByteOffsetLines, fmt: CsvFormat, headers: List[str], select_row, columnar: bool, payload_encoding: str, strict: bool = False) -> Iterator[Tuple[List[bytes], List[int]]]:
+    """
+    Canonical bytes of the records read from lines and the byte offset right after each of them, in batches of
+    CSV_BATCH_RECORDS. headers are the projected headers when select_row is given.
+    """
+    encode_record = ChunkIntegrityManager.record_encoder(payload_encoding)
+    batch_records = MicroServiceConfigurations.CSV_BATCH_RECORDS.value
+    width = len(headers)
+    fragments: List[bytes] = []
+    ends: List[int] = []
+    for row in new_reader(lines, fmt, strict):
+        # ignore completely empty rows (they don't count toward processed-records)
+        if not any(row):
+            continue
+        row = [value or None for value in row]
+        if select_row is not None:
+            row = select_row(row)
+            if row is None:
+                continue
+        if len(row) != width:
+            row = list(row[:width]) + [None] * (width - len(row))
+        fragments.append(encode_record(row if columnar else dict(zip(headers, row))))
+        ends.append(lines.offset)
+        if len(fragments) >= batch_records:
+            yield fragments, ends
+            fragments, ends = [], []
+    if fragments:
+        yield fragments, ends
+
+
+def split_ranges(f, start: int, fmt: CsvFormat, range_bytes: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    (start, bytes) of consecutive ranges of about range_bytes from start to the end of the file, split after line breaks
+    outside quotes as far as the quote characters tell. A range is yielded as soon as its end is read, together with its
+    bytes : the file is read once, the pool processes never open it again.
+    """
+    quote = fmt.quotechar.encode(fmt.encoding)
+    # bytes of the range being scanned (and the start of the next one)
+    pending = bytearray()
+    range_start = start
+    # quote characters of pending are counted up to counted, target is where the next line break may end the range
+    quotes = 0
+    counted = 0
+    target = range_bytes
+    f.seek(start)
+    for block in iter(lambda: f.read(range_bytes), b""):
+        pending += block
+        while True:
+            line_break = pending.find(b"\n", max(target, counted))
+            if line_break == -1:
+                break
+            quotes += pending.count(quote, counted, line_break)
+            counted = line_break
+            if quotes % 2 == 0:
+                yield range_start, bytes(pending[:line_break + 1])
+                del pending[:line_break + 1]
+                range_start += line_break + 1
+                quotes = 0
+                counted = 0
+                target = range_bytes
+            else:
+                # inside a quoted field, the next line break may end the record
+                target = line_break + 1
+    if pending:
+        yield range_start, bytes(pending)
+
+
+def parse_csv_range(data: bytes, start: int, fmt: Tuple, headers: List[str], columnar: bool, payload_encoding: str, selection_spec) -> Tuple[List[bytes], List[int], Optional[Dict[str, int]]]:
+    """
+    Runs in a pool process : canonical bytes of the records of the range starting at byte offset start with the byte
+    offset after each of them and the selection stats of the range. headers are the headers of the source,
+    selection_spec is (include, exclude, filter) of the request or None. Raises csv.Error when the range does not end on
+    a record boundary.
+    """
+    fmt = CsvFormat(*fmt)
+    selection = RecordSelection(*selection_spec) if selection_spec else None
+    select_row = None
+    if selection is not None:
+        headers, select_row = selection.bind_headers(headers, text_cells=True)
+    fragments: List[bytes] = []
+    ends: List[int] = []
+    # strict : a quoted field cut by the end of the range raises instead of ending the record
+    for batch_fragments, batch_ends in csv_records(ByteOffsetLines(io.BytesIO(data), fmt.encoding, start), fmt, headers, select_row, columnar, payload_encoding, strict=True):
+        fragments.extend(batch_fragments)
+        ends.extend(batch_ends)
+    return fragments, ends, selection.stats() if selection is not None else None
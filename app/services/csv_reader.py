@@ -0,0 +1,268 @@
+"""
+This file is responsible for ingesting csv sources (file_type=csv), local paths and remote urls alike.
+[GUARANTEES]
+- The source is streamed with CSV_READ_BUFFER_BYTES reads, never loaded whole, records are encoded to their canonical
+  bytes as they are parsed (the same records, chunks and checksums an excel sheet with the same cells gives)
+- Every chunk carries the byte range of the source it was read from into the chunk ledger : a resumed ingestion and a
+  reconciliation seek to the first chunk to send instead of parsing and skipping the records before it
+  (without a ledger range, e.g. CHUNK_LEDGER off, ACKed records are skipped like the other readers do)
+- Encode pool enabled : the source is still read once, here, and cut into byte ranges of CSV_PARSE_RANGE_BYTES that are
+  handed with their bytes to the pool processes as soon as each one is read, at most one range per pool worker ahead of
+  delivery, chunks are still built here in source order with the same boundaries
+"""
+import asyncio
+import contextlib
+import csv
+import time
+from collections import deque
+from typing import Dict
+
+import httpx
+
+# import data integrity manager
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+# import chunk sender (delivery, retries and checkpoints)
+from app.services.chunk_sender import ChunkSender
+
+# import the process pool the byte ranges are parsed on
+from app.services.chunk_encoder_pool import get_pool, pool_workers
+
+# import csv byte level helpers (format detection, offsets, ranges)
+from app.services.csv_format import (
+    ByteOffsetLines, CsvFormatError, csv_records, detect_format, open_csv_source, parse_csv_range, read_headers, split_ranges,
+)
+
+# import the utility to store the state of data ingestion process
+from app.services.ingestion_state_store import get_state_store
+
+# import process wide memory governor
+from app.services.memory_governor import memory_governor
+
+# import fields / filter pushed down into the parser
+from app.services.record_selection import RecordSelection, report_selection_stats, selection_spec
+
+# import per-ingestion timeline (trace=true)
+from app.services.ingestion_tracer import ingestion_traces, NULL_TRACER
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+from app.utils.logger_info_messages import CsvInfoMessages
+from app.utils.error_messages import CsvErrorMessages
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+class CsvIngestionService:
+
+    def __init__(self):
+        self.state_store = get_state_store()
+        self.total_records = 0
+        self.selection = None
+        # selection stats of the byte ranges parsed by the pool
+        self.range_selection_stats: Dict[str, int] = {}
+        self.tracer = NULL_TRACER
+
+    async def stream_and_push(self, ingestion_id: str, request):
+        # fields / filter compiled once per ingestion (every pool process compiles its own copy)
+        self.selection = RecordSelection.from_request(request)
+        self.range_selection_stats = {}
+        # trace=true : a new timeline for this run, the chunk sender records on it as well
+        self.tracer = ingestion_traces.start(ingestion_id) if request.trace else NULL_TRACER
+        try:
+            with self.tracer.span("ingestion", "ingestion", file_type="csv"):
+                await self._stream_and_push(ingestion_id, request)
+        finally:
+            # never leak this ingestion's share of the process wide memory budget, even when it failed
+            memory_governor.release(ingestion_id)
+            if self.selection is not None and self.selection.records_seen:
+                report_selection_stats(ingestion_id, self.selection.stats())
+            if self.range_selection_stats:
+                report_selection_stats(ingestion_id, self.range_selection_stats)
+
+    async def _stream_and_push(self, ingestion_id: str, request):
+        # Recover state from DB
+        last_chunk = self.state_store.get_last_chunk(ingestion_id)  # last ACKed chunk num (or -1)
+        # next chunk number to attempt to send
+        chunk_number = last_chunk + 1
+
+        # total_records is authoritative: number of records already ACKed (not raw rows)
+        self.total_records = self.state_store.get_total_records(ingestion_id) or 0
+        records_to_skip = int(self.total_records)
+
+        tracer = self.tracer
+        info_logger.info(CsvInfoMessages.STREAM_START.value.format(ingestion_id=ingestion_id))
+
+        with open_csv_source(request.file_path) as f:
+            try:
+                fmt = detect_format(f.read(MicroServiceConfigurations.CSV_SNIFF_BYTES.value), request.csv_delimiter, request.csv_quotechar, request.csv_encoding)
+            except CsvFormatError as e:
+                message = CsvErrorMessages.UNSUPPORTED_ENCODING.value.format(ingestion_id=ingestion_id, encoding=e)
+                error_logger.error(f"CsvIngestionService._stream_and_push | {message}")
+                raise
+            info_logger.info(CsvInfoMessages.FORMAT_DETECTED.value.format(encoding=fmt.encoding, delimiter=fmt.delimiter, quotechar=fmt.quotechar))
+
+            source_headers, offset = read_headers(f, fmt)
+            debug_logger.debug(f"CsvIngestionService._stream_and_push | headers = {source_headers} | data_offset = {offset}")
+            if source_headers is None:
+                error_logger.error(CsvErrorMessages.EMPTY_HEADER.value.format(ingestion_id=ingestion_id))
+                return
+
+            # resume (and reconciliation) seek to the byte offset where the next chunk starts when the ledger has it
+            if last_chunk >= 0:
+                resume_offset = self.state_store.get_source_offset(ingestion_id, chunk_number)
+                if resume_offset is not None:
+                    offset = resume_offset
+                    records_to_skip = 0
+            debug_logger.debug(f"CsvIngestionService._stream_and_push | ingestion_id = {ingestion_id} | next_chunk = {chunk_number} | offset = {offset} | records_to_skip = {records_to_skip}")
+
+            # fields / filter : unused columns are dropped by index, rows are projected before anything else sees them
+            headers, select_row = source_headers, None
+            if self.selection is not None:
+                headers, select_row = self.selection.bind_headers(source_headers, text_cells=True)
+
+            # payload_format=columnar : headers once per chunk, the value rows are encoded as they are
+            columns = headers if request.payload_format == "columnar" else None
+
+            if pool_workers() > 0:
+                # ranges are found while the file is read, each one is parsed as soon as its end is known
+                ranges = split_ranges(f, offset, fmt, MicroServiceConfigurations.CSV_PARSE_RANGE_BYTES.value)
+                batches = self._range_batches(ingestion_id, request, f, fmt, source_headers, headers, select_row, ranges)
+            else:
+                f.seek(offset)
+                batches = self._local_batches(ByteOffsetLines(f, fmt.encoding, offset), fmt, headers, select_row, request)
+            debug_logger.debug(f"CsvIngestionService._stream_and_push | ingestion_id = {ingestion_id} | pooled_ranges = {pool_workers() > 0}")
+
+            chunk = []
+            chunk_bytes = 0
+            chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
+            chunk_started = time.perf_counter()
+            # byte offset after the last record read, where the source range of the next chunk starts
+            previous_end = offset
+            chunk_start = offset
+            skipped_records = 0
+
+            async with httpx.AsyncClient(timeout=60) as client:
+                # delivers chunks (single or batch mode), skips already ACKed chunks and persists progress after ACK
+                sender = ChunkSender(client, request, ingestion_id, self.state_store, last_chunk)
+                sender.columns = columns
+
+                async with contextlib.aclosing(batches):
+                    async for fragments, ends in batches:
+                        for canonical_record, record_end in zip(fragments, ends):
+                            # no ledger range : ACKed records are read again and skipped
+                            if skipped_records < records_to_skip:
+                                skipped_records += 1
+                                previous_end = record_end
+                                continue
+
+                            # If we have a configured chunk-size-by-memory, flush before the record would exceed it
+                            if request.chunk_size_by_memory and chunk and chunk_bytes + len(canonical_record) > request.chunk_size_by_memory:
+                                tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                                await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, False, (chunk_start, previous_end - chunk_start))
+                                chunk_number += 1
+                                chunk = []
+                                chunk_bytes = 0
+                                chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
+
+                            if not chunk:
+                                # reserve memory before building a new chunk, waits (pauses the reader) while the budget is exhausted
+                                await sender.begin_chunk()
+                                chunk_started = time.perf_counter()
+                                chunk_start = previous_end
+
+                            chunk.append(canonical_record)
+                            chunk_bytes += len(canonical_record)
+                            chunk_checksum.update(canonical_record)
+                            self.total_records += 1
+                            previous_end = record_end
+                            sender.track(chunk_bytes)
+
+                            # If we have a configured chunk-size-by-records, flush when reached
+                            if request.chunk_size_by_records and len(chunk) >= request.chunk_size_by_records:
+                                tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                                await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, False, (chunk_start, previous_end - chunk_start))
+                                chunk_number += 1
+                                chunk = []
+                                chunk_bytes = 0
+                                chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
+
+                # Final chunk (if any)
+                if chunk:
+                    tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                    await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, True, (chunk_start, previous_end - chunk_start))
+
+                # chunks still waiting for a batch to fill up
+                await sender.flush()
+
+                # Final completion callback
+                info_logger.info(CsvInfoMessages.INGESTION_COMPLETED.value.format(total_records=self.total_records))
+
+                ack = await sender.send_completion(chunk_number, self.total_records)
+                if ack:
+                    self.state_store.mark_completed(ingestion_id)
+
+    @staticmethod
+    async def _local_batches(lines: ByteOffsetLines, fmt, headers, select_row, request):
+        columnar = request.payload_format == "columnar"
+        for batch in csv_records(lines, fmt, headers, select_row, columnar, request.payload_encoding):
+            yield batch
+
+    async def _range_batches(self, ingestion_id: str, request, f, fmt, source_headers, headers, select_row, ranges):
+        """
+        Batches of the byte ranges parsed by the pool, in source order. ranges yields (start, bytes) while the file is
+        read, a range is submitted as soon as it is found. A range the pool refuses (it does not end on a record
+        boundary) and everything after it is parsed here.
+        """
+        loop = asyncio.get_running_loop()
+        columnar = request.payload_format == "columnar"
+        spec = selection_spec(request)
+        in_flight = deque()
+        depth = max(pool_workers(), 1)
+        scanned = False
+
+        async def submit():
+            nonlocal scanned
+            while not scanned and len(in_flight) < depth:
+                # reading up to the end of the next range blocks, the event loop keeps delivering meanwhile
+                found = await asyncio.to_thread(next, ranges, None)
+                if found is None:
+                    scanned = True
+                    return
+                start, data = found
+                future = loop.run_in_executor(
+                    get_pool(), parse_csv_range, data, start, tuple(fmt), source_headers, columnar, request.payload_encoding, spec,
+                )
+                in_flight.append((start, future))
+
+        try:
+            await submit()
+            while in_flight:
+                start, future = in_flight.popleft()
+                try:
+                    fragments, ends, stats = await future
+                except csv.Error as e:
+                    info_logger.info(f"CsvIngestionService._range_batches | ingestion_id = {ingestion_id} | offset = {start} | error = {e} | action = PARSING THE REST IN PROCESS")
+                    for _, other in in_flight:
+                        other.cancel()
+                    in_flight.clear()
+                    f.seek(start)
+                    async for batch in self._local_batches(ByteOffsetLines(f, fmt.encoding, start), fmt, headers, select_row, request):
+                        yield batch
+                    return
+                await submit()
+                for name, value in (stats or {}).items():
+                    self.range_selection_stats[name] = self.range_selection_stats.get(name, 0) + value
+                if fragments:
+                    yield fragments, ends
+        finally:
+            # nothing after a failed (or interrupted) chunk may be parsed
+            for _, future in in_flight:
+                future.cancel()
@@ -6,13 +6,22 @@ This file is responsible for making sure that pim-core callback url gets the exa
 - Corrupted JSON
 - Duplicate chunk retry
 - Out-of-order chunk
+[MERKLE MODE (integrity_mode=merkle)]
+- Every record is a leaf : H(0x00 + canonical record bytes), inner nodes are H(0x01 + left + right) over the raw digests,
+  an odd node is carried up unchanged (RFC 6962 tree hash), H is the checksum algorithm of the ingestion
+- The root and the leaf hashes travel in the chunk envelope, pim-core can name the records that did not arrive intact
+  and only those are sent again in a repair message
 """
 import hashlib
+import zlib
 import orjson
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
 
 # ort json parser
-from app.utils.json_decimal_encoder import orjson_default
+from app.utils.json_decimal_encoder import orjson_default, decimal_string_default
+
+# msgpack codec (payload_encoding=msgpack)
+from app.utils.msgpack_codec import canonical_msgpack_bytes
 
 # import logging utility
 from app.utils.logger import LoggerFactory
@@ -24,6 +33,95 @@ debug_logger = LoggerFactory.get_debug_logger()
 
 CANONICAL_OPTS = orjson.OPT_SORT_KEYS
 
+
+class _Crc32Hash:
+    """
+    hashlib-like wrapper around zlib.crc32 (fast, non-cryptographic)
+    """
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data: bytes) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+# checksum algorithms that can be negotiated per ingestion
+CHECKSUM_ALGORITHMS = {
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+    "crc32": _Crc32Hash,
+}
+
+
+class ChunkChecksum:
+    """
+    Incremental checksum over the canonical form of a chunk.
+
+    The canonical form of a chunk is the sorted-keys JSON array of its records, i.e.
+    b"[" + b",".join(canonical(record)) + b"]". Feeding each record's canonical bytes as they
+    are produced gives the same digest as hashing the whole dump, without building it.
+
+    A columnar chunk (payload_format=columnar) is canonically {"columns": [...], "rows": [[...], ...]}
+    with sorted keys, its rows are fed the same way.
+
+    With payload_encoding=msgpack the canonical form is the concatenation of the canonical msgpack bytes of the
+    records (no array header, its length is only known once the chunk is complete), preceded by the canonical
+    msgpack bytes of the columns for a columnar chunk.
+    """
+    def __init__(self, algorithm: str = "sha256", columns: Optional[List[str]] = None, encoding: str = "json"):
+        self.algorithm = algorithm
+        self._hash = CHECKSUM_ALGORITHMS[algorithm]()
+        if encoding == "msgpack":
+            self._separator = self._suffix = b""
+            if columns is not None:
+                self._hash.update(canonical_msgpack_bytes(columns))
+        else:
+            self._separator = b","
+            self._suffix = b"]"
+            if columns is not None:
+                self._hash.update(b'{"columns":' + orjson.dumps(columns) + b',"rows":')
+                self._suffix = b"]}"
+            self._hash.update(b"[")
+        self.records = 0
+        self._digest = None
+
+    def update(self, record_bytes: bytes) -> None:
+        if self.records:
+            self._hash.update(self._separator)
+        self._hash.update(record_bytes)
+        self.records += 1
+
+    def hexdigest(self) -> str:
+        # closing the array is done once, the digest is cached for retries
+        if self._digest is None:
+            self._hash.update(self._suffix)
+            self._digest = self._hash.hexdigest()
+        return self._digest
+
+
+class PrecomputedChecksum:
+    """
+    Checksum of a chunk that was encoded elsewhere (e.g. the encode process pool), same interface as ChunkChecksum.
+    """
+    def __init__(self, algorithm: str, digest: str, records: int):
+        self.algorithm = algorithm
+        self._digest = digest
+        self.records = records
+
+    def hexdigest(self) -> str:
+        return self._digest
+
+
+def _digest(algorithm: str, *parts: bytes) -> bytes:
+    hasher = CHECKSUM_ALGORITHMS[algorithm]()
+    for part in parts:
+        hasher.update(part)
+    return bytes.fromhex(hasher.hexdigest())
+
+
 class ChunkIntegrityManager:
     @staticmethod
     def canonical_dumps(obj) -> bytes:
@@ -34,21 +132,88 @@ class ChunkIntegrityManager:
         )
         debug_logger.debug(f"ChunkIntegrityManager.canonical_dumps | dump = {dump}")
         return dump 
-    
+
     @staticmethod
-    def compute_checksum(records: List[Dict[str, Any]]) -> str:
+    def canonical_record_bytes(record) -> bytes:
+        """
+        Canonical bytes of a single record (no debug dump, this runs once per record).
+        """
+        return orjson.dumps(record, option=CANONICAL_OPTS, default=orjson_default)
+
+    @staticmethod
+    def canonical_decimal_string_bytes(record) -> bytes:
+        """
+        Canonical bytes of a single record with its Decimal values as their exact text (number_mode=decimal_string).
+        """
+        return orjson.dumps(record, option=CANONICAL_OPTS, default=decimal_string_default)
+
+    @staticmethod
+    def record_encoder(encoding: str = "json", number_mode: str = "decimal") -> Callable[[Any], bytes]:
+        """
+        Canonical record encoder of a payload_encoding. msgpack keeps Decimal values exact (extension type) whatever
+        the number_mode, json sends them as floats or, with decimal_string, as strings.
+        """
+        if encoding == "msgpack":
+            return canonical_msgpack_bytes
+        if number_mode == "decimal_string":
+            return ChunkIntegrityManager.canonical_decimal_string_bytes
+        return ChunkIntegrityManager.canonical_record_bytes
+
+    @staticmethod
+    def new_checksum(algorithm: str = "sha256", columns: Optional[List[str]] = None, encoding: str = "json") -> ChunkChecksum:
+        return ChunkChecksum(algorithm, columns, encoding)
+
+    @staticmethod
+    def compute_checksum(records: List[Dict[str, Any]], algorithm: str = "sha256", encoding: str = "json", number_mode: str = "decimal") -> str:
         """
         Computes deterministic checksum for a chunk.
         """
-        payload_bytes = ChunkIntegrityManager.canonical_dumps(records)
-        checksum = hashlib.sha256(payload_bytes).hexdigest()
-        debug_logger.debug(f"ChunkIntegrityManager.compute_checksum | chunk checksum value = {checksum}")
+        chunk_checksum = ChunkChecksum(algorithm, encoding=encoding)
+        encode_record = ChunkIntegrityManager.record_encoder(encoding, number_mode)
+        for record in records:
+            chunk_checksum.update(encode_record(record))
+        checksum = chunk_checksum.hexdigest()
+        debug_logger.debug(f"ChunkIntegrityManager.compute_checksum | algorithm = {algorithm} | chunk checksum value = {checksum}")
         return checksum
 
     @staticmethod
-    def build_chunk_id(ingestion_id: str, chunk_number: int) -> str:
+    def compute_columnar_checksum(columns: List[str], rows: List[List[Any]], algorithm: str = "sha256", encoding: str = "json") -> str:
+        """
+        Deterministic checksum of a columnar chunk.
+        """
+        chunk_checksum = ChunkChecksum(algorithm, columns, encoding)
+        encode_record = ChunkIntegrityManager.record_encoder(encoding)
+        for row in rows:
+            chunk_checksum.update(encode_record(row))
+        return chunk_checksum.hexdigest()
+
+    @staticmethod
+    def merkle_leaves(record_fragments: List[bytes], algorithm: str = "sha256") -> List[str]:
+        """
+        Leaf hashes (hex) of the canonical bytes of every record of a chunk, one fragment per record.
+        """
+        return [_digest(algorithm, b"\x00", fragment).hex() for fragment in record_fragments]
+
+    @staticmethod
+    def merkle_root(leaves: List[str], algorithm: str = "sha256") -> str:
+        """
+        Root (hex) of the tree over the leaf hashes, the empty tree is the hash of nothing.
+        """
+        if not leaves:
+            return _digest(algorithm).hex()
+        level = [bytes.fromhex(leaf) for leaf in leaves]
+        while len(level) > 1:
+            parents = [_digest(algorithm, b"\x01", level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            level = parents
+        return level[0].hex()
+
+    @staticmethod
+    def build_chunk_id(ingestion_id: str, chunk_number: int, sheet: Optional[str] = None) -> str:
         """
         Unique identity for a chunk.
         """
-        debug_logger.debug(f"ChunkIntegrityManager.build_chunk_id | generated chunk_id = {ingestion_id}:{chunk_number}")
-        return f"{ingestion_id}:{chunk_number}"
+        chunk_id = f"{ingestion_id}:{chunk_number}" if sheet is None else f"{ingestion_id}:{sheet}:{chunk_number}"
+        debug_logger.debug(f"ChunkIntegrityManager.build_chunk_id | generated chunk_id = {chunk_id}")
+        return chunk_id
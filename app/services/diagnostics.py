@@ -0,0 +1,329 @@
+"""
+This file is responsible for the on-demand diagnostics of a worker process behind /api/admin : a sampling profiler,
+tracemalloc allocation windows and the event loop lag watchdog.
+
+Nothing here runs unless INGESTION_ADMIN_ENDPOINTS is set, and even then the profiler thread and tracemalloc only
+exist for the window that was asked for.
+[GUARANTEES]
+- The profiler samples the python stacks of the process (every thread) or of one ingestion : the event loop thread
+  while one of the ingestion's tasks is the current task. Sheet processes and the encode pool are not sampled
+- Samples land where a profiled thread hands the GIL over (switch interval, blocking I/O), the usual bias of an
+  in-process sampler : an event loop waiting in select() is idle and is not counted for an ingestion
+- Profiles are returned as collapsed stacks (flamegraph.pl, speedscope) or as a flamegraph tree (d3-flame-graph)
+- An allocation window reports the allocation sites of the window (tracemalloc) with the traced and the process peak
+- The loop lag watchdog measures how late its own wake-ups are, a lag means something blocked the event loop
+- One profile and one allocation window at a time per process
+"""
+import asyncio
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import process wide metrics
+from app.services.ingestion_metrics import ingestion_metrics
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+PROJECT_ROOT = str(Path(__file__).resolve().parents[2]) + os.sep
+
+
+def diagnostics_enabled() -> bool:
+    return os.environ.get(MicroServiceConfigurations.ADMIN_ENDPOINTS_ENV.value, "").lower() in ("1", "true", "yes")
+
+
+class DiagnosticsBusyError(RuntimeError):
+    pass
+
+
+def ingestion_task_name(ingestion_id: str) -> str:
+    # the supervisor's task, the tasks it starts for the ingestion are named <name>:<part>
+    return f"ingestion-{ingestion_id}"
+
+
+# -------------------------------------------------------------------------------------------------------------------------------------
+# sampling profiler
+# -------------------------------------------------------------------------------------------------------------------------------------
+_short_paths: Dict[str, str] = {}
+
+
+def _short_path(filename: str) -> str:
+    short = _short_paths.get(filename)
+    if short is None:
+        if filename.startswith(PROJECT_ROOT):
+            short = filename[len(PROJECT_ROOT):]
+        elif "site-packages" + os.sep in filename:
+            short = filename.split("site-packages" + os.sep, 1)[1]
+        else:
+            short = os.path.basename(filename)
+        _short_paths[filename] = short
+    return short
+
+
+def _collapse(frame, root: str) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.append(root)
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the other threads every interval from its own thread, the profiled code is not instrumented.
+    With a task prefix only the given loop thread is sampled, and only while the current task of the loop has that name.
+    """
+    def __init__(self, interval: float = MicroServiceConfigurations.PROFILE_INTERVAL_SECONDS.value,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, loop_thread_id: Optional[int] = None, task_name: Optional[str] = None):
+        self.interval = interval
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.task_name = task_name
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="diagnostics-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _in_task(self) -> bool:
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            return False
+        name = task.get_name()
+        return name == self.task_name or name.startswith(self.task_name + ":")
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            self.sample(own_id)
+            self.sampling_seconds += time.perf_counter() - started
+
+    def sample(self, own_id: Optional[int] = None) -> None:
+        self.samples += 1
+        if self.task_name is not None:
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None and self._in_task():
+                self.stacks[_collapse(frame, self.task_name)] += 1
+            return
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own_id:
+                self.stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+
+    def collapsed(self) -> List[str]:
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def flamegraph(self) -> Dict[str, Any]:
+        root = {"name": "root", "value": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            root["value"] += count
+            node = root
+            for name in stack.split(";"):
+                node = node["children"].setdefault(name, {"name": name, "value": 0, "children": {}})
+                node["value"] += count
+
+        def as_lists(node):
+            return {"name": node["name"], "value": node["value"], "children": [as_lists(child) for child in node["children"].values()]}
+
+        return as_lists(root)
+
+
+_profile_lock = threading.Lock()
+
+
+async def profile(seconds: float, output: str = "collapsed", ingestion_id: Optional[str] = None,
+                  interval: float = MicroServiceConfigurations.PROFILE_INTERVAL_SECONDS.value) -> Dict[str, Any]:
+    """
+    Samples the process (or the tasks of one ingestion, they run on this event loop) for seconds.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise DiagnosticsBusyError("profile")
+    try:
+        seconds = min(seconds, MicroServiceConfigurations.PROFILE_MAX_SECONDS.value)
+        if ingestion_id is None:
+            profiler = SamplingProfiler(interval)
+        else:
+            profiler = SamplingProfiler(interval, asyncio.get_running_loop(), threading.get_ident(), ingestion_task_name(ingestion_id))
+        info_logger.info(f"profile | started | ingestion_id = {ingestion_id} | seconds = {seconds} | interval = {interval}")
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    finally:
+        _profile_lock.release()
+    info_logger.info(f"profile | done | ingestion_id = {ingestion_id} | samples = {profiler.samples} | stacks = {len(profiler.stacks)}")
+    return {
+        "scope": "process" if ingestion_id is None else "ingestion",
+        "ingestion_id": ingestion_id,
+        "seconds": seconds,
+        "interval_seconds": interval,
+        "samples": profiler.samples,
+        "sampled_stacks": sum(profiler.stacks.values()),
+        # time the sampler thread held the GIL, the overhead paid by the profiled code
+        "sampling_seconds": round(profiler.sampling_seconds, 6),
+        "format": output,
+        "profile": profiler.flamegraph() if output == "flamegraph" else profiler.collapsed(),
+    }
+
+
+# -------------------------------------------------------------------------------------------------------------------------------------
+# allocations
+# -------------------------------------------------------------------------------------------------------------------------------------
+_tracemalloc_lock = threading.Lock()
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on linux and in bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def trace_allocations(seconds: float, top: int = MicroServiceConfigurations.TRACEMALLOC_TOP.value, group_by: str = "lineno") -> Dict[str, Any]:
+    """
+    Traces the allocations for seconds and returns the top allocation sites of the window with the peak memory.
+    tracemalloc slows every allocation down while it traces, it is stopped after the window unless it was already on.
+    """
+    if not _tracemalloc_lock.acquire(blocking=False):
+        raise DiagnosticsBusyError("tracemalloc")
+    try:
+        seconds = min(seconds, MicroServiceConfigurations.TRACEMALLOC_MAX_SECONDS.value)
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start(MicroServiceConfigurations.TRACEMALLOC_FRAMES.value)
+        tracemalloc.reset_peak()
+        info_logger.info(f"trace_allocations | started | seconds = {seconds} | already_tracing = {already_tracing}")
+        try:
+            await asyncio.sleep(seconds)
+            snapshot = tracemalloc.take_snapshot()
+            traced_bytes, traced_peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()
+    finally:
+        _tracemalloc_lock.release()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    statistics = snapshot.statistics(group_by)
+    allocators = [
+        {
+            "site": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+            "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback],
+        }
+        for stat in statistics[:top]
+    ]
+    info_logger.info(f"trace_allocations | done | traced_bytes = {traced_bytes} | traced_peak_bytes = {traced_peak_bytes}")
+    return {
+        "seconds": seconds,
+        "group_by": group_by,
+        "traced_bytes": traced_bytes,
+        "traced_peak_bytes": traced_peak_bytes,
+        "process_peak_rss_bytes": _peak_rss_bytes(),
+        "top_allocators": allocators,
+    }
+
+
+# -------------------------------------------------------------------------------------------------------------------------------------
+# event loop lag
+# -------------------------------------------------------------------------------------------------------------------------------------
+class LoopLagWatchdog:
+    """
+    Background task sleeping interval seconds, the time it wakes up late is the time the event loop was blocked.
+    """
+    def __init__(self, interval: float = MicroServiceConfigurations.LOOP_LAG_INTERVAL_SECONDS.value,
+                 window: int = MicroServiceConfigurations.LOOP_LAG_WINDOW.value,
+                 log_seconds: float = MicroServiceConfigurations.LOOP_LAG_LOG_SECONDS.value):
+        self.interval = interval
+        self.log_seconds = log_seconds
+        self.lags = deque(maxlen=window)
+        self.samples = 0
+        self.max_lag = 0.0
+        self.over_log_threshold = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._watch(), name="loop-lag-watchdog")
+        ingestion_metrics.register_snapshot("loop_lag", self.snapshot)
+        info_logger.info(f"LoopLagWatchdog.start | interval = {self.interval} | log_seconds = {self.log_seconds}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _watch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - expected))
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.log_seconds:
+            self.over_log_threshold += 1
+            info_logger.info(f"LoopLagWatchdog.record | event loop blocked | lag_seconds = {lag:.3f}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+
+        def percentile(fraction: float) -> float:
+            return round(lags[min(len(lags) - 1, int(fraction * len(lags)))], 6) if lags else 0.0
+
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "window": len(lags),
+            "last_seconds": round(self.lags[-1], 6) if self.lags else 0.0,
+            "p50_seconds": percentile(0.5),
+            "p99_seconds": percentile(0.99),
+            "max_seconds": round(self.max_lag, 6),
+            "over_log_threshold": self.over_log_threshold,
+        }
+
+
+# one watchdog per process, started by the lifespan when the diagnostics are enabled
+loop_lag_watchdog = LoopLagWatchdog()
@@ -1,27 +1,169 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+
 import httpx
-import orjson
-from openpyxl import load_workbook
 
+from app.core.config import MicroServiceConfigurations
 from app.utils.logger import LoggerFactory
-from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.services.data_integrity_manager import ChunkIntegrityManager, PrecomputedChecksum
+from app.services.chunk_sender import ChunkSender
+from app.services.chunk_encoder_pool import PooledChunkEncoder
+from app.services.excel_source import ExcelSource, report_source_stats
+from app.services.record_selection import RecordSelection, report_selection_stats, selection_spec
+from app.services.ingestion_tracer import ingestion_traces, NULL_TRACER
+# openpyxl workbook loader whose shared strings spill to disk past a threshold
+from app.services.excel_shared_strings import load_workbook
 from app.utils.logger_info_messages import ExcelInfoMessages
 from app.utils.error_messages import ExcelErrorMessages
 
 # Import the state store utility
-from app.services.ingestion_state_store import IngestionStateStore
+from app.services.ingestion_state_store import get_state_store
+
+# import process wide memory governor
+from app.services.memory_governor import memory_governor
 
 info_logger = LoggerFactory.get_info_logger()
 error_logger = LoggerFactory.get_error_logger()
 debug_logger = LoggerFactory.get_debug_logger()
 
+# how long the event loop side waits on a sheet queue before checking that its process is still alive
+SHEET_QUEUE_POLL_SECONDS = 1
+
+
+class SheetReaderError(Exception):
+    pass
+
+
+def fit_row(row: tuple, width: int) -> tuple:
+    """
+    Value row of a columnar chunk : one value per header, like the records built from the row.
+    """
+    if len(row) == width:
+        return row
+    return row[:width] + (None,) * (width - len(row))
+
+
+def read_sheet_chunks(file_path: str, sheet_name: str, chunk_number: int, records_to_skip: int, chunk_size_by_records, chunk_size_by_memory, checksum_algorithm: str, columnar: bool, payload_encoding: str, selection_spec, out_queue, merkle: bool = False) -> None:
+    """
+    Runs in a sheet process : parses one sheet (its own header row) and puts ("header", headers), the encoded chunks as
+    ("chunk", chunk_number, record_bytes, checksum, records, total_records, chunk_bytes, is_last), then
+    ("done", source_stats, selection_stats) or ("error", message) on out_queue.
+    record_bytes is the joined canonical bytes of the records, the list of them with merkle (one leaf per record).
+    selection_spec is (include, exclude, filter) of the request or None, it is compiled in the sheet process.
+    Chunk numbers and total_records are local to the sheet, chunk boundaries are the ones of the single sheet path.
+    """
+    wb = None
+    source = ExcelSource(file_path)
+    try:
+        wb = load_workbook(filename=source.open(), read_only=True, data_only=True)
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if not header_row:
+            out_queue.put(("done", source.stats(), None))
+            return
+        headers = [str(col).strip() if col is not None else f"column_{i}" for i, col in enumerate(header_row)]
+        selection = RecordSelection(*selection_spec) if selection_spec else None
+        select_row = None
+        if selection is not None:
+            headers, select_row = selection.bind_headers(headers)
+        out_queue.put(("header", headers))
+        columns = headers if columnar else None
+        width = len(headers)
+        encode_record = ChunkIntegrityManager.record_encoder(payload_encoding)
+        separator = b"" if payload_encoding == "msgpack" else b","
+
+        total_records = records_to_skip
+        skipped_records = 0
+        chunk = []
+        chunk_bytes = 0
+        chunk_checksum = ChunkIntegrityManager.new_checksum(checksum_algorithm, columns, payload_encoding)
+        # one finished chunk is held back so the last chunk of the sheet goes out with is_last=True
+        held = None
+
+        def finish_chunk():
+            nonlocal held, chunk_number
+            if held is not None:
+                out_queue.put(held)
+            held = ("chunk", chunk_number, chunk if merkle else separator.join(chunk), chunk_checksum.hexdigest(), len(chunk), total_records, chunk_bytes, False)
+            chunk_number += 1
+
+        for row in rows:
+            if not any(row):
+                continue
+            if select_row is not None:
+                row = select_row(row)
+                if row is None:
+                    continue
+            if skipped_records < records_to_skip:
+                skipped_records += 1
+                continue
+
+            if columnar:
+                canonical_record = encode_record(fit_row(row, width))
+            else:
+                record = {headers[i]: row[i] if i < len(row) else None for i in range(len(headers))}
+                canonical_record = encode_record(record)
+
+            if chunk_size_by_memory and chunk and chunk_bytes + len(canonical_record) > chunk_size_by_memory:
+                finish_chunk()
+                chunk, chunk_bytes, chunk_checksum = [], 0, ChunkIntegrityManager.new_checksum(checksum_algorithm, columns, payload_encoding)
+
+            chunk.append(canonical_record)
+            chunk_bytes += len(canonical_record)
+            chunk_checksum.update(canonical_record)
+            total_records += 1
+
+            if chunk_size_by_records and len(chunk) >= chunk_size_by_records:
+                finish_chunk()
+                chunk, chunk_bytes, chunk_checksum = [], 0, ChunkIntegrityManager.new_checksum(checksum_algorithm, columns, payload_encoding)
+
+        if chunk:
+            finish_chunk()
+        if held is not None:
+            out_queue.put(held[:-1] + (True,))
+        out_queue.put(("done", source.stats(), selection.stats() if selection is not None else None))
+    except Exception as e:
+        out_queue.put(("error", str(e)))
+    finally:
+        if wb is not None:
+            wb.close()
+        source.close()
+
 
 class ExcelIngestionService:
 
     def __init__(self):
-        self.state_store = IngestionStateStore()
+        self.state_store = get_state_store()
         self.total_records = 0
+        self.source = None
+        self.selection = None
+        self.tracer = NULL_TRACER
 
     async def stream_and_push(self, ingestion_id: str, request):
+        # fields / filter compiled once per ingestion (every sheet process compiles its own copy)
+        self.selection = RecordSelection.from_request(request)
+        # trace=true : a new timeline for this run, the chunk senders record on it as well
+        self.tracer = ingestion_traces.start(ingestion_id) if request.trace else NULL_TRACER
+        try:
+            with self.tracer.span("ingestion", "ingestion", file_type="excel", sheets=bool(request.sheets)):
+                await self._stream_and_push(ingestion_id, request)
+        finally:
+            # never leak this ingestion's share of the process wide memory budget, even when it failed
+            memory_governor.release(ingestion_id)
+            if self.source is not None:
+                self.source.close()
+                report_source_stats(ingestion_id, self.source.stats())
+                self.source = None
+            if self.selection is not None and self.selection.records_seen:
+                report_selection_stats(ingestion_id, self.selection.stats())
+
+    async def _stream_and_push(self, ingestion_id: str, request):
+        if request.sheets:
+            await self._stream_sheets(ingestion_id, request)
+            return
+
         # Recover state from DB
         last_chunk = self.state_store.get_last_chunk(ingestion_id)  # last ACKed chunk num (or -1)
         # next chunk number to attempt to send
@@ -32,146 +174,273 @@ class ExcelIngestionService:
         records_to_skip = int(self.total_records)  # number of non-empty records already processed
 
         chunk = []
+        chunk_bytes = 0
+        tracer = self.tracer
+        chunk_started = time.perf_counter()
         info_logger.info(ExcelInfoMessages.STREAM_START.value.format(ingestion_id=ingestion_id))
         info_logger.info(ExcelInfoMessages.WORKBOOK_LOAD_START.value)
 
-        wb = load_workbook(filename=request.file_path, read_only=True, data_only=True)
+        # local path or remote url (fsspec with a block cache)
+        self.source = ExcelSource(request.file_path)
+        with tracer.span("load workbook", "reader"):
+            wb = load_workbook(filename=self.source.open(), read_only=True, data_only=True)
         info_logger.info(ExcelInfoMessages.WORKBOOK_LOADED.value)
 
-        sheet = wb.active
-        rows = sheet.iter_rows(values_only=True)
+        # the workbook (its archive and spilled shared strings) is closed however the ingestion ends
+        try:
+            sheet = wb.active
+            rows = sheet.iter_rows(values_only=True)
 
-        # header
-        header_row = next(rows, None)
-        debug_logger.debug(f"Header row detected | header_row={header_row}")
+            # header
+            header_row = next(rows, None)
+            debug_logger.debug(f"Header row detected | header_row={header_row}")
 
-        if not header_row:
-            error_logger.error(ExcelErrorMessages.EMPTY_HEADER.value.format(ingestion_id=ingestion_id))
-            wb.close()
-            return
+            if not header_row:
+                error_logger.error(ExcelErrorMessages.EMPTY_HEADER.value.format(ingestion_id=ingestion_id))
+                return
 
-        headers = [str(col).strip() if col is not None else f"column_{i}" for i, col in enumerate(header_row)]
-        debug_logger.debug(f"Headers parsed | headers={headers}")
+            headers = [str(col).strip() if col is not None else f"column_{i}" for i, col in enumerate(header_row)]
+            debug_logger.debug(f"Headers parsed | headers={headers}")
 
-        # We will skip 'records_to_skip' non-empty rows (not raw rows), because earlier runs may have skipped empties.
-        skipped_records = 0
+            # fields / filter : unused columns are dropped by index, rows are projected before anything else sees them
+            select_row = None
+            if self.selection is not None:
+                headers, select_row = self.selection.bind_headers(headers)
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            for row in rows:
-                # ignore completely empty rows (they don't count toward processed-records)
-                if not any(row):
-                    continue
+            # payload_format=columnar : headers once per chunk, the row tuples are encoded as they are (no dict per row)
+            columns = headers if request.payload_format == "columnar" else None
+            width = len(headers)
+            # canonical record encoding of the negotiated payload_encoding (json or msgpack)
+            encode_record = ChunkIntegrityManager.record_encoder(request.payload_encoding)
+            chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
 
-                # If we haven't yet skipped up to the saved count, keep skipping
-                if skipped_records < records_to_skip:
-                    skipped_records += 1
-                    # keep chunk_number as-is (we haven't produced any new chunk here)
-                    continue
+            # We will skip 'records_to_skip' non-empty rows (not raw rows), because earlier runs may have skipped empties.
+            skipped_records = 0
 
-                # This is a new record to process
-                record = {headers[i]: row[i] if i < len(row) else None for i in range(len(headers))}
-                chunk.append(record)
-                self.total_records += 1  # increment only for newly processed record
-
-                # If we have a configured chunk-size-by-records, flush when reached
-                if request.chunk_size_by_records and len(chunk) >= request.chunk_size_by_records:
-                    # Only send if this chunk hasn't been ACKed yet
-                    if chunk_number > last_chunk:
-                        debug_logger.debug(
-                            f"Chunk processing | ingestion_id={ingestion_id} | "
-                            f"chunk_number={chunk_number} | size={len(chunk)} | action=SENDING"
-                        )
-                        await self._send_chunk(
-                            client,
-                            request.callback_url,
-                            ingestion_id,
-                            chunk_number,
-                            chunk,
-                            False
-                        )
+            async with httpx.AsyncClient(timeout=60) as client:
+                # delivers chunks (single or batch mode), skips already ACKed chunks and persists progress after ACK
+                sender = ChunkSender(client, request, ingestion_id, self.state_store, last_chunk)
+                sender.columns = columns
+                # value rows are turned into records, encoded and checksummed by the process pool when it is enabled
+                encoder = PooledChunkEncoder(sender, request, headers) if PooledChunkEncoder.enabled(request) else None
+
+                for row in rows:
+                    # ignore completely empty rows (they don't count toward processed-records)
+                    if not any(row):
+                        continue
+
+                    # filtered rows don't count toward processed-records either
+                    if select_row is not None:
+                        row = select_row(row)
+                        if row is None:
+                            continue
+
+                    # If we haven't yet skipped up to the saved count, keep skipping
+                    if skipped_records < records_to_skip:
+                        skipped_records += 1
+                        # keep chunk_number as-is (we haven't produced any new chunk here)
+                        continue
+
+                    if encoder:
+                        if not chunk:
+                            await sender.begin_chunk()
+                            chunk_started = time.perf_counter()
+                        chunk.append(row)
+                        self.total_records += 1
+                        if len(chunk) >= request.chunk_size_by_records:
+                            tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk))
+                            await encoder.submit(chunk_number, chunk, self.total_records, False)
+                            chunk_number += 1
+                            chunk = []
+                        continue
+
+                    # This is a new record to process
+                    if columns is not None:
+                        canonical_record = encode_record(fit_row(row, width))
                     else:
-                        debug_logger.debug(
-                            f"Chunk skipping | ingestion_id={ingestion_id} | "
-                            f"chunk_number={chunk_number} | action=SKIPPED (Already ACKed)"
-                        )
-
-                    chunk_number += 1
-                    chunk.clear()
-
-            # Final chunk (if any)
-            if chunk:
-                if chunk_number > last_chunk:
-                    debug_logger.debug(
-                        f"Final chunk created | ingestion_id={ingestion_id} | "
-                        f"chunk_number={chunk_number} | size={len(chunk)}"
-                    )
-                    await self._send_chunk(client, request.callback_url, ingestion_id, chunk_number, chunk, True)
-                else:
-                    debug_logger.debug(
-                        f"Final chunk skipping | ingestion_id={ingestion_id} | "
-                        f"chunk_number={chunk_number} | action=SKIPPED (Already ACKed)"
-                    )
-
-            # Final completion callback
-            info_logger.info(ExcelInfoMessages.INGESTION_COMPLETED.value.format(total_records=self.total_records))
+                        record = {headers[i]: row[i] if i < len(row) else None for i in range(len(headers))}
+                        # the chunk keeps only the canonical bytes of the record (one copy per in-flight chunk)
+                        canonical_record = encode_record(record)
 
-            resp = await client.post(
-                request.callback_url,
-                json={
-                    "ingestion_id": ingestion_id,
-                    "status": "COMPLETED",
-                    "chunk_number": chunk_number,
-                    "total_records": self.total_records,
-                }
-            )
+                    # If we have a configured chunk-size-by-memory, flush before the record would exceed it
+                    if request.chunk_size_by_memory and chunk and chunk_bytes + len(canonical_record) > request.chunk_size_by_memory:
+                        tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                        await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, False)
+                        chunk_number += 1
+                        chunk = []
+                        chunk_bytes = 0
+                        chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
+
+                    if not chunk:
+                        # reserve memory before building a new chunk, waits (pauses the reader) while the budget is exhausted
+                        await sender.begin_chunk()
+                        chunk_started = time.perf_counter()
+
+                    chunk.append(canonical_record)
+                    chunk_bytes += len(canonical_record)
+                    chunk_checksum.update(canonical_record)
+                    self.total_records += 1  # increment only for newly processed record
+                    sender.track(chunk_bytes)
+
+                    # If we have a configured chunk-size-by-records, flush when reached
+                    if request.chunk_size_by_records and len(chunk) >= request.chunk_size_by_records:
+                        # reading and parsing the rows (openpyxl), canonical encoding and checksum updates of the chunk
+                        tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                        await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, False)
+                        chunk_number += 1
+                        chunk = []
+                        chunk_bytes = 0
+                        chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, columns, request.payload_encoding)
+
+                # Final chunk (if any)
+                if chunk:
+                    if encoder:
+                        tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk))
+                        await encoder.submit(chunk_number, chunk, self.total_records, True)
+                    else:
+                        tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                        await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, True)
+
+                # chunks still being encoded by the process pool
+                if encoder:
+                    await encoder.drain()
 
-            ack_response = resp.json()
-            ack = ack_response.get("ack")
+                # chunks still waiting for a batch to fill up
+                await sender.flush()
+
+                # Final completion callback
+                info_logger.info(ExcelInfoMessages.INGESTION_COMPLETED.value.format(total_records=self.total_records))
+
+                ack = await sender.send_completion(chunk_number, self.total_records)
+                if ack:
+                    self.state_store.mark_completed(ingestion_id)
+        finally:
+            wb.close()
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # multi-sheet ingestion
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def _resolve_sheets(self, ingestion_id: str, request):
+        source = ExcelSource(request.file_path)
+        try:
+            wb = load_workbook(filename=source.open(), read_only=True)
+            sheet_names = list(wb.sheetnames)
+            wb.close()
+        finally:
+            source.close()
+            report_source_stats(ingestion_id, source.stats())
+        if request.sheets == "all":
+            return sheet_names
+        missing = [name for name in request.sheets if name not in sheet_names]
+        if missing:
+            message = ExcelErrorMessages.SHEET_NOT_FOUND.value.format(ingestion_id=ingestion_id, sheets=", ".join(missing))
+            error_logger.error(f"ExcelIngestionService._resolve_sheets | {message}")
+            raise SheetReaderError(message)
+        return list(request.sheets)
+
+    async def _stream_sheets(self, ingestion_id: str, request):
+        """
+        Every sheet is parsed by its own process (at most MAX_SHEET_WORKERS at a time) and delivered as its own chunk sequence,
+        a sheet checkpoints on its own and a resumed ingestion skips the sheets that are already COMPLETED.
+        """
+        info_logger.info(ExcelInfoMessages.STREAM_START.value.format(ingestion_id=ingestion_id))
+        sheet_names = self._resolve_sheets(ingestion_id, request)
+        sheet_states = self.state_store.get_sheet_states(ingestion_id)
+        pending = [name for name in sheet_names if sheet_states.get(name, {}).get("status") != "COMPLETED"]
+        debug_logger.debug(f"ExcelIngestionService._stream_sheets | ingestion_id = {ingestion_id} | sheets = {sheet_names} | pending = {pending}")
+
+        slots = asyncio.Semaphore(MicroServiceConfigurations.MAX_SHEET_WORKERS.value)
+        async with httpx.AsyncClient(timeout=60) as client:
+            tasks = [
+                # named after the ingestion's task, a profile of the ingestion samples its sheets as well
+                asyncio.create_task(self._stream_sheet(client, slots, ingestion_id, request, name, sheet_states.get(name)), name=f"ingestion-{ingestion_id}:sheet-{name}")
+                for name in pending
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # a failed (or interrupted) sheet stops its siblings, every sheet resumes from its own checkpoint
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            sheet_states = self.state_store.get_sheet_states(ingestion_id)
+            sheets = {
+                name: {"last_chunk": sheet_states[name]["last_chunk"], "total_records": sheet_states[name]["total_records"]}
+                for name in sheet_names
+            }
+            self.total_records = sum(sheet["total_records"] for sheet in sheets.values())
+            info_logger.info(ExcelInfoMessages.INGESTION_COMPLETED.value.format(total_records=self.total_records))
+
+            sender = ChunkSender(client, request, ingestion_id, self.state_store, -1)
+            chunks = sum(sheet["last_chunk"] + 1 for sheet in sheets.values())
+            ack = await sender.send_completion(chunks - 1, self.total_records, sheets=sheets)
             if ack:
                 self.state_store.mark_completed(ingestion_id)
 
-        wb.close()
+    async def _stream_sheet(self, client, slots: asyncio.Semaphore, ingestion_id: str, request, sheet_name: str, sheet_state) -> None:
+        last_chunk = sheet_state["last_chunk"] if sheet_state else -1
+        records_to_skip = sheet_state["total_records"] if sheet_state else 0
+        sender = ChunkSender(client, request, ingestion_id, self.state_store, last_chunk, sheet=sheet_name)
 
-    async def _send_chunk(self, client, url, ingestion_id, chunk_number, records, is_last):
-        checksum = ChunkIntegrityManager.compute_checksum(records)
-        chunk_id = ChunkIntegrityManager.build_chunk_id(ingestion_id, chunk_number)
+        async with slots:
+            ctx = multiprocessing.get_context("spawn")
+            # bounded : a sheet process parses at most SHEET_QUEUE_CHUNKS chunks ahead of delivery
+            out_queue = ctx.Queue(maxsize=MicroServiceConfigurations.SHEET_QUEUE_CHUNKS.value)
+            process = ctx.Process(
+                target=read_sheet_chunks,
+                args=(
+                    request.file_path, sheet_name, last_chunk + 1, records_to_skip,
+                    request.chunk_size_by_records, request.chunk_size_by_memory, request.checksum_algorithm,
+                    request.payload_format == "columnar", request.payload_encoding, selection_spec(request), out_queue,
+                    request.integrity_mode == "merkle",
+                ),
+                name=f"sheet-{ingestion_id}-{sheet_name}",
+                daemon=True,
+            )
+            process.start()
+            info_logger.info(f"ExcelIngestionService._stream_sheet | ingestion_id = {ingestion_id} | sheet = {sheet_name} | next_chunk = {last_chunk + 1} | pid = {process.pid}")
+            loop = asyncio.get_running_loop()
+            track = f"sheet {sheet_name} / reader"
+            waiting = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        message = await loop.run_in_executor(None, out_queue.get, True, SHEET_QUEUE_POLL_SECONDS)
+                    except queue.Empty:
+                        if not process.is_alive():
+                            raise SheetReaderError(ExcelErrorMessages.SHEET_FAILED.value.format(
+                                ingestion_id=ingestion_id, sheet=sheet_name, error=f"sheet process exited with code {process.exitcode}"
+                            ))
+                        continue
 
-        payload = {
-            "ingestion_id": ingestion_id,
-            "chunk_number": chunk_number,
-            "chunk_id": chunk_id,
-            "checksum": checksum,
-            "records": records,
-            "is_last": is_last,
-        }
+                    if message[0] == "done":
+                        report_source_stats(ingestion_id, message[1])
+                        report_selection_stats(ingestion_id, message[2])
+                        break
+                    if message[0] == "header":
+                        if request.payload_format == "columnar":
+                            sender.columns = message[1]
+                        continue
+                    if message[0] == "error":
+                        raise SheetReaderError(ExcelErrorMessages.SHEET_FAILED.value.format(ingestion_id=ingestion_id, sheet=sheet_name, error=message[1]))
 
-        for attempt in range(3):
-            try:
-                debug_logger.debug(
-                    f"Sending chunk | chunk_number={chunk_number} | attempt={attempt + 1} | records={len(records)}"
-                )
-                resp = await client.post(url, content=orjson.dumps(payload), headers={"Content-Type": "application/json"})
-                ack_response = resp.json()
-                debug_logger.debug(f"Pimcore callback response | response={ack_response}")
-                ack = ack_response.get("ack")
-
-                if ack is not True:
-                    error = ack_response.get("error")
-                    error_logger.error(
-                        ExcelErrorMessages.CHUNK_REJECTED.value.format(chunk_number=chunk_number, reason=error)
-                    )
-                    raise Exception(f"Chunk {chunk_number} rejected: {error}")
-
-                # Persist progress only after successful ACK
-                self.state_store.update_chunk(ingestion_id, chunk_number, self.total_records)
-                return
+                    _, chunk_number, encoded, checksum, records, total_records, chunk_bytes, is_last = message
+                    # the sheet process parses, encodes and checksums the chunk : a long wait means the parser is the bottleneck
+                    self.tracer.complete("wait sheet chunk", track, waiting, time.perf_counter(), chunk_number=chunk_number, records=records, bytes=chunk_bytes)
+                    await sender.begin_chunk()
+                    sender.track(chunk_bytes)
+                    fragments = encoded if isinstance(encoded, list) else [encoded]
+                    await sender.push(chunk_number, fragments, PrecomputedChecksum(request.checksum_algorithm, checksum, records), total_records, chunk_bytes, is_last)
+                    waiting = time.perf_counter()
 
-            except Exception as e:
-                error_logger.error(
-                    ExcelErrorMessages.CHUNK_PUSH_FAILED.value.format(
-                        chunk_number=chunk_number, attempt=attempt + 1, error=str(e)
-                    ),
-                    exc_info=True,
-                )
-                if attempt == 2:
-                    raise
+                await sender.flush()
+                self.state_store.mark_sheet_completed(ingestion_id, sheet_name)
+                info_logger.info(f"ExcelIngestionService._stream_sheet | ingestion_id = {ingestion_id} | sheet = {sheet_name} | last_chunk = {sender.last_chunk} | status = COMPLETED")
+            finally:
+                sender.release()
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+                out_queue.close()
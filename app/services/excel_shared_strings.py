@@ -0,0 +1,175 @@
+"""
+This file is responsible for the shared-strings table of the excel workbooks read by the excel reader.
+
+openpyxl loads the whole shared-strings table of a workbook into a python list before the first row can be read,
+a workbook with millions of unique strings needs gigabytes of memory for it.
+[GUARANTEES]
+- Up to SHARED_STRINGS_SPILL_BYTES the table stays a python list (same as openpyxl)
+- Past the threshold the table is spilled to an on-disk table : utf-8 string data plus an offset index, both
+  memory-mapped, a lookup by index reads the string from the mmap. Peak memory stays bounded whatever the
+  number of unique strings of the workbook
+- The spill files are anonymous temporary files (unlinked), they disappear with the workbook even after a crash
+"""
+import mmap
+import struct
+import sys
+import tempfile
+from typing import List, Optional
+
+from openpyxl.cell.text import Text
+from openpyxl.reader.excel import ExcelReader, SHARED_STRINGS
+from openpyxl.xml.constants import SHEET_MAIN_NS
+from openpyxl.xml.functions import iterparse
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+STRING_TAG = "{%s}si" % SHEET_MAIN_NS
+# one little-endian uint64 start offset per string, plus the end offset of the last string
+OFFSET = struct.Struct("<Q")
+OFFSET_PAIR = struct.Struct("<QQ")
+
+
+class SharedStringTable:
+    """
+    List-like table (append, len, lookup by index) that spills to memory-mapped files past spill_bytes.
+    """
+    def __init__(self, spill_bytes: int, spill_dir: Optional[str] = None):
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.strings: Optional[List[str]] = []
+        self.in_memory_bytes = 0
+        self.count = 0
+        self.data_file = None
+        self.offsets_file = None
+        self.data_size = 0
+        self.data = None
+        self.offsets = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.strings is None
+
+    def append(self, text: str) -> None:
+        self.count += 1
+        if not self.spilled:
+            self.strings.append(text)
+            self.in_memory_bytes += sys.getsizeof(text)
+            if self.in_memory_bytes > self.spill_bytes:
+                self._spill()
+            return
+        self._write(text)
+
+    def _spill(self) -> None:
+        debug_logger.debug(f"SharedStringTable._spill | strings = {self.count} | in_memory_bytes = {self.in_memory_bytes} | spill_dir = {self.spill_dir}")
+        self.data_file = tempfile.TemporaryFile(dir=self.spill_dir)
+        self.offsets_file = tempfile.TemporaryFile(dir=self.spill_dir)
+        strings, self.strings = self.strings, None
+        for text in strings:
+            self._write(text)
+        self.in_memory_bytes = 0
+
+    def _write(self, text: str) -> None:
+        encoded = text.encode("utf-8")
+        self.offsets_file.write(OFFSET.pack(self.data_size))
+        self.data_file.write(encoded)
+        self.data_size += len(encoded)
+
+    def seal(self) -> None:
+        """
+        Called once the table is complete : maps the spill files for lookups.
+        """
+        if not self.spilled:
+            return
+        self.offsets_file.write(OFFSET.pack(self.data_size))
+        self.offsets_file.flush()
+        self.data_file.flush()
+        self.offsets = mmap.mmap(self.offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+        # an empty file can not be mapped (every string of the table is empty)
+        self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ) if self.data_size else b""
+        info_logger.info(f"SharedStringTable.seal | strings = {self.count} | spilled_bytes = {self.data_size}")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> str:
+        if not self.spilled:
+            return self.strings[index]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("shared string index out of range")
+        start, end = OFFSET_PAIR.unpack_from(self.offsets, index * OFFSET.size)
+        return str(self.data[start:end], "utf-8")
+
+    def close(self) -> None:
+        for mapped in (self.data, self.offsets):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        for spill_file in (self.data_file, self.offsets_file):
+            if spill_file is not None:
+                spill_file.close()
+        self.data = self.offsets = self.data_file = self.offsets_file = None
+
+
+def read_shared_strings(xml_source, spill_bytes: int, spill_dir: Optional[str] = None) -> SharedStringTable:
+    """
+    Same parsing as openpyxl's read_string_table, into a table that spills to disk.
+    """
+    table = SharedStringTable(spill_bytes, spill_dir)
+    root = None
+    for event, node in iterparse(xml_source, events=("start", "end")):
+        if root is None:
+            root = node
+        if event == "end" and node.tag == STRING_TAG:
+            text = Text.from_tree(node).content
+            table.append(text.replace("x005F_", ""))
+            # detach the parsed <si> elements, a cleared element still attached to <sst> costs memory per string
+            root.clear()
+    table.seal()
+    return table
+
+
+class BoundedStringsExcelReader(ExcelReader):
+    """
+    openpyxl workbook reader whose read-only workbooks keep the shared strings in a SharedStringTable.
+    """
+    def read_strings(self):
+        if not self.read_only or self.rich_text:
+            return super().read_strings()
+        self.shared_strings = SharedStringTable(0)
+        ct = self.package.find(SHARED_STRINGS)
+        if ct is not None:
+            with self.archive.open(ct.PartName[1:]) as src:
+                self.shared_strings = read_shared_strings(
+                    src,
+                    MicroServiceConfigurations.SHARED_STRINGS_SPILL_BYTES.value,
+                    MicroServiceConfigurations.SHARED_STRINGS_SPILL_DIR.value,
+                )
+
+
+def load_workbook(filename, read_only: bool = False, data_only: bool = False):
+    """
+    Drop-in for openpyxl.load_workbook, wb.close() also releases the spilled shared strings.
+    """
+    reader = BoundedStringsExcelReader(filename, read_only=read_only, data_only=data_only)
+    reader.read()
+    wb = reader.wb
+    shared_strings = reader.shared_strings
+    if isinstance(shared_strings, SharedStringTable):
+        close_workbook = wb.close
+
+        def close():
+            close_workbook()
+            shared_strings.close()
+
+        wb.close = close
+    return wb
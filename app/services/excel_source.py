@@ -0,0 +1,123 @@
+"""
+This file is responsible for opening excel sources, local paths and remote urls (s3://, gs://, abfs://, https://, ...) alike.
+
+An xlsx file is a zip archive : openpyxl reads the central directory at the end of the file first, then seeks to the
+shared-strings and sheet members. Remote sources are read through fsspec with a block cache instead of being copied
+to local disk first.
+[GUARANTEES]
+- Local paths are handed to openpyxl unchanged (no extra layer, fsspec is not even imported)
+- Remote sources keep the last EXCEL_REMOTE_CACHE_BLOCKS blocks of EXCEL_REMOTE_BLOCK_BYTES, the tail block holding
+  the central directory is fetched on open, the next block is prefetched in the background while a member is streamed
+- Bytes fetched and cache hits / misses are reported per ingestion (status endpoint, /api/metrics counters)
+"""
+from typing import Any, Dict, Optional
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import in-process metrics
+from app.services.ingestion_metrics import ingestion_metrics
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+def is_remote_path(file_path: str) -> bool:
+    """
+    Local paths (and file:// urls) are read by openpyxl directly, anything with another protocol goes through fsspec.
+    """
+    return ("://" in file_path or "::" in file_path) and not file_path.startswith("file://")
+
+
+class ExcelSource:
+    """
+    open() returns what load_workbook accepts (a path or a file object), also usable as a context manager.
+    """
+    def __init__(self, file_path: str, block_size: Optional[int] = None):
+        self.file_path = file_path
+        self.block_size = block_size or MicroServiceConfigurations.EXCEL_REMOTE_BLOCK_BYTES.value
+        self.file = None
+        self.bytes_fetched = 0
+        self._stats = None
+
+    def _counting_fetcher(self, fetcher):
+        def fetch(start, end):
+            data = fetcher(start, end)
+            self.bytes_fetched += len(data)
+            return data
+        return fetch
+
+    def open(self):
+        if not is_remote_path(self.file_path):
+            return self.file_path
+
+        # fsspec (and the filesystem of the protocol, e.g. s3fs) is only imported for a remote source
+        import fsspec
+        from fsspec.implementations.local import LocalFileSystem
+
+        fs, path = fsspec.core.url_to_fs(self.file_path)
+        if isinstance(fs, LocalFileSystem):
+            return self.file_path
+
+        block_size = self.block_size
+        self.file = fs.open(
+            path,
+            mode="rb",
+            block_size=block_size,
+            cache_type=MicroServiceConfigurations.EXCEL_REMOTE_CACHE_TYPE.value,
+            cache_options={"maxblocks": MicroServiceConfigurations.EXCEL_REMOTE_CACHE_BLOCKS.value},
+        )
+        if getattr(self.file, "cache", None) is not None:
+            # bytes actually received from the remote store (the cache counts whole blocks)
+            self.file.cache.fetcher = self._counting_fetcher(self.file.cache.fetcher)
+        size = getattr(self.file, "size", None)
+        if size:
+            # central directory first : the zip reader's first seeks land in this block
+            self.file.seek(max(size - block_size, 0))
+            self.file.read()
+            self.file.seek(0)
+        debug_logger.debug(f"ExcelSource.open | file_system = {fs} | path = {path} | size = {size}")
+        return self.file
+
+    def close(self) -> None:
+        if self.file is not None:
+            # the file drops its cache on close
+            self._stats = self.stats()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Cache statistics of a remote source, None for a local path.
+        """
+        cache = getattr(self.file, "cache", None)
+        if cache is None:
+            return self._stats
+        return {
+            "source_bytes_fetched": self.bytes_fetched,
+            "source_cache_hits": cache.hit_count,
+            "source_cache_misses": cache.miss_count,
+        }
+
+
+def report_source_stats(ingestion_id: str, stats: Optional[Dict[str, Any]]) -> None:
+    if not stats:
+        return
+    for name, value in stats.items():
+        ingestion_metrics.increment(name, value, ingestion_id=ingestion_id)
+    counters = ingestion_metrics.for_ingestion(ingestion_id)
+    lookups = counters["source_cache_hits"] + counters["source_cache_misses"]
+    hit_rate = counters["source_cache_hits"] / lookups if lookups else 0.0
+    ingestion_metrics.set("source_cache_hit_rate", round(hit_rate, 4), ingestion_id=ingestion_id)
+    info_logger.info(f"report_source_stats | ingestion_id = {ingestion_id} | bytes_fetched = {int(counters['source_bytes_fetched'])} | cache_hit_rate = {hit_rate:.2%}")
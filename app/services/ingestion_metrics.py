@@ -0,0 +1,47 @@
+"""
+This file keeps in-process metrics of the ingestion pipeline, they are exposed through /api/metrics and the status endpoint.
+"""
+from collections import defaultdict
+from typing import Dict, Any, Optional, Callable
+
+# import process wide memory governor
+from app.services.memory_governor import memory_governor
+
+
+class IngestionMetrics:
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.ingestion_counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        # other components expose their own state under a name in the metrics output
+        self.snapshot_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register_snapshot(self, name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+        self.snapshot_providers[name] = provider
+
+    def increment(self, name: str, value: float = 1, ingestion_id: Optional[str] = None) -> None:
+        self.counters[name] += value
+        if ingestion_id is not None:
+            self.ingestion_counters[ingestion_id][name] += value
+
+    def set(self, name: str, value: float, ingestion_id: Optional[str] = None) -> None:
+        """
+        Gauge (e.g. a ratio) : replaces the value instead of adding to it.
+        """
+        if ingestion_id is None:
+            self.counters[name] = value
+        else:
+            self.ingestion_counters[ingestion_id][name] = value
+
+    def for_ingestion(self, ingestion_id: str) -> Dict[str, float]:
+        return dict(self.ingestion_counters.get(ingestion_id, {}))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "memory": memory_governor.snapshot(),
+            **{name: provider() for name, provider in self.snapshot_providers.items()},
+        }
+
+
+# one metrics registry per process
+ingestion_metrics = IngestionMetrics()
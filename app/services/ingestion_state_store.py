@@ -1,7 +1,10 @@
 import sqlite3
-from typing import Optional
+from abc import ABC, abstractmethod
+from typing import Optional, List, Tuple, Any, Dict
 import os
-from pathlib import Path 
+import threading
+import time
+from pathlib import Path
 
 # import get current project's directory utility
 from app.utils.get_project_dir import get_current_project_dir
@@ -12,57 +15,441 @@ from app.core.config import MicroServiceConfigurations
 PROJECT_DIR = Path(get_current_project_dir()).parent
 DATABASE_DIR = os.path.join(PROJECT_DIR , MicroServiceConfigurations.DB_FOLDER_NAME.value, MicroServiceConfigurations.DB_NAME.value)
 
-class IngestionStateStore:
-    def __init__(self, db_path=DATABASE_DIR):
-        # Ensure parent directory exists
+
+class BaseIngestionStateStore(ABC):
+    """
+    Ingestion state (progress, persisted request) and leases shared by every worker process using the same database.
+
+    The statements are written in the SQL understood by both SQLite and PostgreSQL (named parameters, ON CONFLICT upserts),
+    a backend only provides _execute, _execute_many and _columns.
+    """
+
+    @abstractmethod
+    def _execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[List[tuple], int]:
         """
-        This will create the directory if it does not exists
+        Runs one statement in its own transaction, returns (rows, rowcount).
+        """
+
+    @abstractmethod
+    def _execute_many(self, sql: str, params: List[Dict[str, Any]]) -> None:
+        """
+        Runs one statement for every parameter set of params, all of them in one transaction.
+        """
+
+    @abstractmethod
+    def _columns(self, table: str) -> set:
+        """
+        Column names of an existing table (schema migrations).
         """
-        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self._init()
 
     def _init(self):
-        self.conn.execute("""
+        self._execute("""
         CREATE TABLE IF NOT EXISTS ingestion_state (
             ingestion_id TEXT PRIMARY KEY,
-            last_chunk INTEGER,
-            total_records INTEGER,
+            last_chunk BIGINT,
+            total_records BIGINT,
             status TEXT
         )
         """)
-        self.conn.commit()
+        # the original request is persisted so IN_PROGRESS ingestions can be resumed on startup, queued_at orders the queue
+        columns = self._columns("ingestion_state")
+        if "request_json" not in columns:
+            self._execute("ALTER TABLE ingestion_state ADD COLUMN request_json TEXT")
+        if "queued_at" not in columns:
+            self._execute("ALTER TABLE ingestion_state ADD COLUMN queued_at DOUBLE PRECISION")
+        # one live lease per ingestion_id, shared by every worker process using this database
+        self._execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_lease (
+            ingestion_id TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at DOUBLE PRECISION
+        )
+        """)
+        # multi-sheet excel : every sheet is checkpointed on its own, resume skips the COMPLETED sheets
+        self._execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_sheet_state (
+            ingestion_id TEXT,
+            sheet TEXT,
+            last_chunk BIGINT,
+            total_records BIGINT,
+            status TEXT,
+            PRIMARY KEY (ingestion_id, sheet)
+        )
+        """)
+        # one row per ACKed chunk (sheet is '' outside multi-sheet excel), reconciliation resends the chunks pim-core lost
+        self._execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_chunk_ledger (
+            ingestion_id TEXT,
+            sheet TEXT,
+            chunk_number BIGINT,
+            chunk_id TEXT,
+            checksum TEXT,
+            checksum_algorithm TEXT,
+            first_record BIGINT,
+            record_count BIGINT,
+            byte_size BIGINT,
+            is_last BOOLEAN,
+            acked_at DOUBLE PRECISION,
+            PRIMARY KEY (ingestion_id, sheet, chunk_number)
+        )
+        """)
+        # byte range of the source a chunk was read from (csv), resume and reconciliation seek to it instead of skipping records
+        columns = self._columns("ingestion_chunk_ledger")
+        if "source_offset" not in columns:
+            self._execute("ALTER TABLE ingestion_chunk_ledger ADD COLUMN source_offset BIGINT")
+        if "source_length" not in columns:
+            self._execute("ALTER TABLE ingestion_chunk_ledger ADD COLUMN source_length BIGINT")
+
+    def register(self, ingestion_id: str, request_json: str):
+        """
+        Persists the request of a starting (or resuming) ingestion, a COMPLETED ingestion stays COMPLETED.
+        """
+        self._execute("""
+        INSERT INTO ingestion_state (ingestion_id, last_chunk, total_records, status, request_json, queued_at)
+        VALUES (:ingestion_id, -1, 0, 'IN_PROGRESS', :request_json, :now)
+        ON CONFLICT(ingestion_id)
+        DO UPDATE SET
+            request_json=excluded.request_json,
+            queued_at=excluded.queued_at,
+            status=CASE WHEN ingestion_state.status='COMPLETED' THEN ingestion_state.status ELSE 'IN_PROGRESS' END
+        """, {"ingestion_id": ingestion_id, "request_json": request_json, "now": time.time()})
+
+    def get_request_json(self, ingestion_id: str) -> Optional[str]:
+        rows, _ = self._execute(
+            "SELECT request_json FROM ingestion_state WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
+        )
+        return rows[0][0] if rows else None
+
+    def list_in_progress(self) -> List[Tuple[str, str]]:
+        rows, _ = self._execute(
+            "SELECT ingestion_id, request_json FROM ingestion_state WHERE status='IN_PROGRESS' AND request_json IS NOT NULL ORDER BY queued_at"
+        )
+        return [tuple(row) for row in rows]
 
     def get_last_chunk(self, ingestion_id: str) -> int:
-        cur = self.conn.execute(
-            "SELECT last_chunk FROM ingestion_state WHERE ingestion_id=?",
-            (ingestion_id,)
+        rows, _ = self._execute(
+            "SELECT last_chunk FROM ingestion_state WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
         )
-        row = cur.fetchone()
-        return row[0] if row else -1
-    
+        return rows[0][0] if rows else -1
+
     def get_total_records(self, ingestion_id):
-        cur = self.conn.execute(
-            "SELECT total_records FROM ingestion_state WHERE ingestion_id=?",
-            (ingestion_id,)
+        rows, _ = self._execute(
+            "SELECT total_records FROM ingestion_state WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
+        )
+        return rows[0][0] if rows else 0
+
+    def get_state(self, ingestion_id: str) -> Optional[dict]:
+        rows, _ = self._execute(
+            "SELECT ingestion_id, last_chunk, total_records, status FROM ingestion_state WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
         )
-        row = cur.fetchone()
-        return row[0] if row else 0
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "ingestion_id": row[0],
+            "last_chunk": row[1],
+            "total_records": row[2],
+            "status": row[3],
+        }
 
     def update_chunk(self, ingestion_id, chunk_number, total_records):
-        self.conn.execute("""
+        self._execute("""
         INSERT INTO ingestion_state (ingestion_id, last_chunk, total_records, status)
-        VALUES (?, ?, ?, 'IN_PROGRESS')
+        VALUES (:ingestion_id, :chunk_number, :total_records, 'IN_PROGRESS')
         ON CONFLICT(ingestion_id)
         DO UPDATE SET
             last_chunk=excluded.last_chunk,
             total_records=excluded.total_records
-        """, (ingestion_id, chunk_number, total_records))
-        self.conn.commit()
+        """, {"ingestion_id": ingestion_id, "chunk_number": chunk_number, "total_records": total_records})
+
+    def get_sheet_states(self, ingestion_id: str) -> Dict[str, dict]:
+        rows, _ = self._execute(
+            "SELECT sheet, last_chunk, total_records, status FROM ingestion_sheet_state WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
+        )
+        return {row[0]: {"last_chunk": row[1], "total_records": row[2], "status": row[3]} for row in rows}
+
+    def update_sheet_chunk(self, ingestion_id: str, sheet: str, chunk_number: int, total_records: int):
+        """
+        Sheet checkpoint, the ingestion's total_records is kept as the sum over its sheets.
+        """
+        self._execute("""
+        INSERT INTO ingestion_sheet_state (ingestion_id, sheet, last_chunk, total_records, status)
+        VALUES (:ingestion_id, :sheet, :chunk_number, :total_records, 'IN_PROGRESS')
+        ON CONFLICT(ingestion_id, sheet)
+        DO UPDATE SET
+            last_chunk=excluded.last_chunk,
+            total_records=excluded.total_records
+        """, {"ingestion_id": ingestion_id, "sheet": sheet, "chunk_number": chunk_number, "total_records": total_records})
+        self._execute("""
+        INSERT INTO ingestion_state (ingestion_id, last_chunk, total_records, status)
+        VALUES (:ingestion_id, -1, 0, 'IN_PROGRESS')
+        ON CONFLICT(ingestion_id) DO NOTHING
+        """, {"ingestion_id": ingestion_id})
+        self._execute("""
+        UPDATE ingestion_state
+        SET total_records=(SELECT SUM(total_records) FROM ingestion_sheet_state WHERE ingestion_id=:ingestion_id)
+        WHERE ingestion_id=:ingestion_id
+        """, {"ingestion_id": ingestion_id})
+
+    def mark_sheet_completed(self, ingestion_id: str, sheet: str):
+        self._execute("""
+        INSERT INTO ingestion_sheet_state (ingestion_id, sheet, last_chunk, total_records, status)
+        VALUES (:ingestion_id, :sheet, -1, 0, 'COMPLETED')
+        ON CONFLICT(ingestion_id, sheet)
+        DO UPDATE SET status='COMPLETED'
+        """, {"ingestion_id": ingestion_id, "sheet": sheet})
+
+    def record_chunks(self, ingestion_id: str, sheet: Optional[str], chunks: List[dict]):
+        """
+        Ledger rows of ACKed chunks (one transaction for the whole checkpoint), a chunk ACKed again (resume,
+        reconciliation) gets a new acked_at.
+        """
+        if not chunks:
+            return
+        now = time.time()
+        self._execute_many("""
+        INSERT INTO ingestion_chunk_ledger (ingestion_id, sheet, chunk_number, chunk_id, checksum, checksum_algorithm, first_record, record_count, byte_size, is_last, acked_at, source_offset, source_length)
+        VALUES (:ingestion_id, :sheet, :chunk_number, :chunk_id, :checksum, :checksum_algorithm, :first_record, :record_count, :byte_size, :is_last, :acked_at, :source_offset, :source_length)
+        ON CONFLICT(ingestion_id, sheet, chunk_number)
+        DO UPDATE SET
+            chunk_id=excluded.chunk_id,
+            checksum=excluded.checksum,
+            checksum_algorithm=excluded.checksum_algorithm,
+            first_record=excluded.first_record,
+            record_count=excluded.record_count,
+            byte_size=excluded.byte_size,
+            is_last=excluded.is_last,
+            acked_at=excluded.acked_at,
+            source_offset=excluded.source_offset,
+            source_length=excluded.source_length
+        """, [{"ingestion_id": ingestion_id, "sheet": sheet or "", "acked_at": now, "source_offset": None, "source_length": None, **chunk} for chunk in chunks])
+
+    def get_ledger(self, ingestion_id: str) -> List[dict]:
+        rows, _ = self._execute("""
+        SELECT sheet, chunk_number, chunk_id, checksum, checksum_algorithm, first_record, record_count, byte_size, is_last, acked_at, source_offset, source_length
+        FROM ingestion_chunk_ledger WHERE ingestion_id=:ingestion_id ORDER BY sheet, chunk_number
+        """, {"ingestion_id": ingestion_id})
+        return [
+            {
+                "sheet": row[0] or None,
+                "chunk_number": row[1],
+                "chunk_id": row[2],
+                "checksum": row[3],
+                "checksum_algorithm": row[4],
+                "first_record": row[5],
+                "record_count": row[6],
+                "byte_size": row[7],
+                "is_last": bool(row[8]),
+                "acked_at": row[9],
+                "source_offset": row[10],
+                "source_length": row[11],
+            }
+            for row in rows
+        ]
+
+    def get_source_offset(self, ingestion_id: str, chunk_number: int, sheet: Optional[str] = None) -> Optional[int]:
+        """
+        Byte offset of the source where chunk_number starts : its own source_offset in the ledger, else the end of the
+        chunk before it. None when the ledger has no byte range for either.
+        """
+        rows, _ = self._execute("""
+        SELECT chunk_number, source_offset, source_length FROM ingestion_chunk_ledger
+        WHERE ingestion_id=:ingestion_id AND sheet=:sheet AND chunk_number IN (:chunk_number, :previous)
+        """, {"ingestion_id": ingestion_id, "sheet": sheet or "", "chunk_number": chunk_number, "previous": chunk_number - 1})
+        ranges = {row[0]: (row[1], row[2]) for row in rows}
+        offset, _ = ranges.get(chunk_number, (None, None))
+        if offset is not None:
+            return offset
+        offset, length = ranges.get(chunk_number - 1, (None, None))
+        if offset is not None and length is not None:
+            return offset + length
+        return None
 
     def mark_completed(self, ingestion_id: str):
-        self.conn.execute(
-            "UPDATE ingestion_state SET status='COMPLETED' WHERE ingestion_id=?",
-            (ingestion_id,)
+        self._execute(
+            "UPDATE ingestion_state SET status='COMPLETED' WHERE ingestion_id=:ingestion_id",
+            {"ingestion_id": ingestion_id}
         )
-        self.conn.commit()
+        self.prune_ledger()
+
+    def prune_ledger(self) -> int:
+        """
+        Deletes the ledger rows of the COMPLETED ingestions last ACKed more than CHUNK_LEDGER_RETENTION_SECONDS ago,
+        returns the number of rows deleted. Running and FAILED ingestions keep theirs (resume seeks with it).
+        """
+        _, deleted = self._execute("""
+        DELETE FROM ingestion_chunk_ledger
+        WHERE ingestion_id IN (SELECT ingestion_id FROM ingestion_state WHERE status='COMPLETED')
+        AND ingestion_id IN (
+            SELECT ingestion_id FROM ingestion_chunk_ledger GROUP BY ingestion_id HAVING MAX(acked_at) <= :cutoff
+        )
+        """, {"cutoff": time.time() - MicroServiceConfigurations.CHUNK_LEDGER_RETENTION_SECONDS.value})
+        return deleted
+
+    def mark_failed(self, ingestion_id: str):
+        """
+        A failed ingestion is not resumed on startup, pim-core re-POSTing the request resumes it from the last ACK.
+        """
+        self._execute(
+            "UPDATE ingestion_state SET status='FAILED' WHERE ingestion_id=:ingestion_id AND status='IN_PROGRESS'",
+            {"ingestion_id": ingestion_id}
+        )
+
+    def acquire_lease(self, ingestion_id: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Takes the lease of an ingestion unless another owner holds a live one. Re-acquiring an own lease renews it.
+        """
+        now = time.time()
+        self._execute("""
+        INSERT INTO ingestion_lease (ingestion_id, owner, expires_at)
+        VALUES (:ingestion_id, :owner, :expires_at)
+        ON CONFLICT(ingestion_id)
+        DO UPDATE SET
+            owner=excluded.owner,
+            expires_at=excluded.expires_at
+        WHERE ingestion_lease.owner=excluded.owner OR ingestion_lease.expires_at < :now
+        """, {"ingestion_id": ingestion_id, "owner": owner, "expires_at": now + ttl_seconds, "now": now})
+        return self.lease_owner(ingestion_id) == owner
+
+    def renew_lease(self, ingestion_id: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Heartbeat of a running ingestion, returns False when the lease was lost (expired and taken over).
+        """
+        _, rowcount = self._execute(
+            "UPDATE ingestion_lease SET expires_at=:expires_at WHERE ingestion_id=:ingestion_id AND owner=:owner",
+            {"expires_at": time.time() + ttl_seconds, "ingestion_id": ingestion_id, "owner": owner}
+        )
+        return rowcount == 1
+
+    def release_lease(self, ingestion_id: str, owner: str):
+        self._execute(
+            "DELETE FROM ingestion_lease WHERE ingestion_id=:ingestion_id AND owner=:owner",
+            {"ingestion_id": ingestion_id, "owner": owner}
+        )
+
+    def lease_owner(self, ingestion_id: str) -> Optional[str]:
+        """
+        Owner of the live lease of an ingestion, None when nobody is running it.
+        """
+        rows, _ = self._execute(
+            "SELECT owner FROM ingestion_lease WHERE ingestion_id=:ingestion_id AND expires_at >= :now",
+            {"ingestion_id": ingestion_id, "now": time.time()}
+        )
+        return rows[0][0] if rows else None
+
+    def claim_next(self, owner: str, ttl_seconds: float) -> Optional[Tuple[str, str]]:
+        """
+        Leases the oldest IN_PROGRESS ingestion nobody is running (queued, or left behind by a crashed worker).
+        Returns (ingestion_id, request_json) or None when there is nothing to claim.
+        """
+        rows, _ = self._execute("""
+        SELECT s.ingestion_id, s.request_json
+        FROM ingestion_state s
+        LEFT JOIN ingestion_lease l ON l.ingestion_id = s.ingestion_id AND l.expires_at >= :now
+        WHERE s.status='IN_PROGRESS' AND s.request_json IS NOT NULL AND l.ingestion_id IS NULL
+        ORDER BY s.queued_at
+        LIMIT 10
+        """, {"now": time.time()})
+        for ingestion_id, request_json in rows:
+            # another worker may claim the same row in between, the lease upsert decides
+            if self.acquire_lease(ingestion_id, owner, ttl_seconds):
+                return ingestion_id, request_json
+        return None
+
+
+class IngestionStateStore(BaseIngestionStateStore):
+    """
+    SQLite backend (default), several worker processes on the same host share the database file.
+    """
+    def __init__(self, db_path=DATABASE_DIR):
+        # Ensure parent directory exists
+        """
+        This will create the directory if it does not exists
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # the connection is shared by the event loop and the request threads, a statement, its rows and its commit
+        # run under this lock so no thread commits in the middle of the transaction of another one
+        self._lock = threading.Lock()
+        # writers of other worker processes are waited for instead of failing with "database is locked"
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=MicroServiceConfigurations.STATE_STORE_LOCK_TIMEOUT_SECONDS.value)
+        # readers don't block the writer (and the other way around) across worker processes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._init()
+
+    def _execute(self, sql, params=None):
+        with self._lock:
+            cur = self.conn.execute(sql, params or {})
+            rows = cur.fetchall()
+            self.conn.commit()
+            return rows, cur.rowcount
+
+    def _execute_many(self, sql, params):
+        # one transaction for every row, the lock keeps the commits of other threads out of it until it is committed
+        with self._lock:
+            self.conn.executemany(sql, params)
+            self.conn.commit()
+
+    def _columns(self, table):
+        with self._lock:
+            return {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+
+class SqlAlchemyIngestionStateStore(BaseIngestionStateStore):
+    """
+    Server database backend (e.g. PostgreSQL shared by several pods), any SQLAlchemy database url.
+    """
+    def __init__(self, url: str):
+        # imported here : only deployments with a server database need SQLAlchemy and its driver
+        from sqlalchemy import create_engine
+        self.engine = create_engine(url, pool_pre_ping=True)
+        self._init()
+
+    def _execute(self, sql, params=None):
+        from sqlalchemy import text
+        with self.engine.begin() as conn:
+            result = conn.execute(text(sql), params or {})
+            rows = result.fetchall() if result.returns_rows else []
+            return rows, result.rowcount
+
+    def _execute_many(self, sql, params):
+        from sqlalchemy import text
+        # a list of parameter sets runs as one executemany in the transaction of the block
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), params)
+
+    def _columns(self, table):
+        from sqlalchemy import inspect
+        return {column["name"] for column in inspect(self.engine).get_columns(table)}
+
+
+def create_state_store() -> BaseIngestionStateStore:
+    """
+    State store of this process : the database url in INGESTION_STATE_STORE_URL, otherwise the local SQLite file.
+    """
+    url = os.environ.get(MicroServiceConfigurations.STATE_STORE_URL_ENV.value)
+    if url:
+        return SqlAlchemyIngestionStateStore(url)
+    return IngestionStateStore()
+
+
+_process_store: Optional[BaseIngestionStateStore] = None
+_process_store_lock = threading.Lock()
+
+
+def get_state_store() -> BaseIngestionStateStore:
+    """
+    The one state store of this process (supervisor, controllers and readers), created and migrated on first use :
+    one SQLite connection or one SQLAlchemy engine / pool, and the schema migration runs once instead of per request.
+    """
+    global _process_store
+    if _process_store is None:
+        # readers running in worker threads may ask for it at the same time as a request
+        with _process_store_lock:
+            if _process_store is None:
+                _process_store = create_state_store()
+    return _process_store
@@ -0,0 +1,261 @@
+"""
+This file is responsible for the lifecycle of the ingestions running in this process.
+
+Every ingestion runs as its own asyncio task registered here, it is not bound to the request that started it.
+[GUARANTEES]
+- One run per ingestion_id : a duplicate request attaches to the running job, in this process through the task
+  registry and across worker processes through a lease (with heartbeats) in the state store, /api/ingest checks and
+  reserves the ingestion in one step (under a lock, with the lease) so two concurrent identical requests start it once
+- The original request is persisted with the ingestion state before the first chunk is built
+- On startup every IN_PROGRESS ingestion is re-queued under the same ingestion_id (resume from the last ACK)
+- Work sharing : a worker runs at most MAX_INGESTIONS_PER_WORKER ingestions, the others stay queued in the state store
+  and are claimed by whichever worker has room, an ingestion whose worker crashed (lease expired) is taken over
+  from its last ACKed chunk
+- On shutdown (SIGTERM) ingestions stop after the chunk in flight is ACKed and checkpointed, ingestions that do not
+  stop within the deadline are cancelled and resume from their last checkpoint on the next start
+- A reconciliation (resend of the chunks pim-core lost) runs under the lease of its ingestion like a regular run,
+  it never races a run of the same ingestion and a failed one leaves the ingestion state as it was
+"""
+import asyncio
+import os
+import socket
+import threading
+import uuid
+from typing import Dict, List, Optional, Set
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import ingestion state store
+from app.services.ingestion_state_store import BaseIngestionStateStore, get_state_store
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# import error messages
+from app.utils.error_messages import ErrorMessages
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+class IngestionSupervisor:
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # ingestions accepted by /api/ingest whose background task has not started them yet
+        self.reserved: Set[str] = set()
+        # /api/ingest runs in the threadpool, the check and the reservation of an ingestion happen under this lock
+        self._reserve_lock = threading.Lock()
+        # checked by the chunk sender between chunks
+        self.stopping = False
+        self._state_store = None
+        # owner of the leases taken by this worker process
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = MicroServiceConfigurations.LEASE_TTL_SECONDS.value
+        self.heartbeat_interval = MicroServiceConfigurations.LEASE_HEARTBEAT_SECONDS.value
+        self.max_ingestions = MicroServiceConfigurations.MAX_INGESTIONS_PER_WORKER.value
+        self.poll_interval = MicroServiceConfigurations.WORK_POLL_SECONDS.value
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def state_store(self) -> BaseIngestionStateStore:
+        # opened on first use, so importing this module never touches the database
+        if self._state_store is None:
+            self._state_store = get_state_store()
+        return self._state_store
+
+    @staticmethod
+    def _service_for(file_type: str):
+        # imported here : the readers import the chunk sender, which checks the shutdown flag of this module
+        if file_type.lower() == "excel":
+            from app.services.excel_reader import ExcelIngestionService
+            return ExcelIngestionService()
+        if file_type.lower() == "csv":
+            from app.services.csv_reader import CsvIngestionService
+            return CsvIngestionService()
+        from app.services.json_reader import JsonIngestionService
+        return JsonIngestionService()
+
+    def is_running(self, ingestion_id: str, state_store: Optional[BaseIngestionStateStore] = None) -> bool:
+        """
+        True when the ingestion runs in this process or holds a live lease in another worker.
+        """
+        if ingestion_id in self.tasks or ingestion_id in self.reserved:
+            return True
+        return (state_store or self.state_store).lease_owner(ingestion_id) is not None
+
+    def reserve(self, ingestion_id: str) -> bool:
+        """
+        Reserves the ingestion for a launch by this worker, False when it runs or is reserved here or another worker
+        holds its lease (the request attaches). The reservation holds the lease until launch starts or queues it.
+        """
+        with self._reserve_lock:
+            if ingestion_id in self.tasks or ingestion_id in self.reserved:
+                return False
+            if not self.state_store.acquire_lease(ingestion_id, self.worker_id, self.lease_ttl):
+                return False
+            self.reserved.add(ingestion_id)
+        debug_logger.debug(f"IngestionSupervisor.reserve | ingestion_id = {ingestion_id} | action = RESERVED")
+        return True
+
+    def release(self, ingestion_id: str) -> None:
+        """
+        Drops the reservation of an ingestion that will not be launched, and its lease.
+        """
+        with self._reserve_lock:
+            if ingestion_id not in self.reserved:
+                return
+            self.reserved.discard(ingestion_id)
+            self.state_store.release_lease(ingestion_id, self.worker_id)
+
+    def has_capacity(self) -> bool:
+        return len(self.tasks) < self.max_ingestions
+
+    async def launch(self, ingestion_id: str, request) -> None:
+        """
+        Starts the ingestion as a supervised task and returns immediately (used as the background task of /api/ingest).
+        A worker without room only queues it, the next worker with room claims it.
+        """
+        if ingestion_id not in self.tasks and not self.has_capacity():
+            info_logger.info(f"IngestionSupervisor.launch | ingestion_id = {ingestion_id} | status = QUEUED | running = {len(self.tasks)}")
+            self.state_store.register(ingestion_id, request.model_dump_json())
+            # the lease of the reservation would keep the other workers from claiming it
+            self.release(ingestion_id)
+            return
+        try:
+            # re-acquiring the lease of the reservation renews it
+            self.start(ingestion_id, request)
+        finally:
+            self.reserved.discard(ingestion_id)
+
+    def start(self, ingestion_id: str, request, resend: Optional[List[dict]] = None) -> Optional[asyncio.Task]:
+        """
+        Returns the task running the ingestion (only the ledger chunks of resend with a reconciliation), None when
+        another worker process holds its lease.
+        """
+        # a duplicate request attaches to the running job
+        if ingestion_id in self.tasks:
+            debug_logger.debug(f"IngestionSupervisor.start | ingestion_id = {ingestion_id} | action = ATTACHED (already running in this worker)")
+            return self.tasks[ingestion_id]
+
+        if not self.state_store.acquire_lease(ingestion_id, self.worker_id, self.lease_ttl):
+            info_logger.info(f"IngestionSupervisor.start | ingestion_id = {ingestion_id} | action = ATTACHED (leased by {self.state_store.lease_owner(ingestion_id)})")
+            return None
+
+        if resend is None:
+            self.state_store.register(ingestion_id, request.model_dump_json())
+        task = asyncio.get_running_loop().create_task(self._run(ingestion_id, request, resend), name=f"ingestion-{ingestion_id}")
+        self.tasks[ingestion_id] = task
+        return task
+
+    async def _heartbeat(self, ingestion_id: str, task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self.state_store.renew_lease(ingestion_id, self.worker_id, self.lease_ttl):
+                # the lease expired and another worker took the ingestion over, two runs must never race
+                error_logger.error(f"IngestionSupervisor._heartbeat | {ErrorMessages.INGESTION_LEASE_LOST.value} | ingestion_id = {ingestion_id}")
+                task.cancel()
+                return
+
+    async def reconcile(self, ingestion_id: str, request, resend: List[dict]) -> None:
+        """
+        Resends the ledger chunks of resend as a supervised task (background task of /api/ingest/{ingestion_id}/reconcile).
+        """
+        if self.start(ingestion_id, request, resend) is None:
+            info_logger.info(f"IngestionSupervisor.reconcile | ingestion_id = {ingestion_id} | status = SKIPPED (leased by {self.state_store.lease_owner(ingestion_id)})")
+
+    async def _run(self, ingestion_id: str, request, resend: Optional[List[dict]] = None) -> None:
+        # imported here for the same reason as the readers
+        from app.services.chunk_sender import IngestionInterruptedError
+        from app.services.chunk_ledger import resend_chunks
+
+        service = self._service_for(request.file_type)
+        service.state_store = self.state_store
+        heartbeat = asyncio.create_task(self._heartbeat(ingestion_id, asyncio.current_task()), name=f"ingestion-{ingestion_id}:heartbeat")
+        try:
+            if resend is None:
+                await service.stream_and_push(ingestion_id, request)
+            else:
+                resent = await resend_chunks(service, ingestion_id, request, resend)
+                info_logger.info(f"IngestionSupervisor._run | ingestion_id = {ingestion_id} | status = RECONCILED | resent_chunks = {resent}")
+        except IngestionInterruptedError:
+            info_logger.info(f"IngestionSupervisor._run | ingestion_id = {ingestion_id} | status = INTERRUPTED | resumes on the next start")
+        except asyncio.CancelledError:
+            info_logger.info(f"IngestionSupervisor._run | ingestion_id = {ingestion_id} | status = CANCELLED | resumes on the next start")
+            raise
+        except Exception as e:
+            if resend is not None:
+                error_logger.error(f"IngestionSupervisor._run | {ErrorMessages.RECONCILIATION_FAILED.value} | ingestion_id = {ingestion_id} | error = {str(e)}")
+                return
+            error_logger.error(f"IngestionSupervisor._run | {ErrorMessages.INGESTION_FAILED.value} | ingestion_id = {ingestion_id} | error = {str(e)}")
+            self.state_store.mark_failed(ingestion_id)
+        finally:
+            heartbeat.cancel()
+            self.state_store.release_lease(ingestion_id, self.worker_id)
+            self.tasks.pop(ingestion_id, None)
+
+    def resume_in_progress(self) -> int:
+        """
+        Claims IN_PROGRESS ingestions nobody is running (queued, interrupted, or orphaned by a crashed worker)
+        while this worker has room, returns the number of started ingestions.
+        """
+        # imported here : the request model imports app.services, whose readers import the chunk sender
+        from app.schemas.request_model import IngestionRequest
+
+        resumed = 0
+        while self.has_capacity() and not self.stopping:
+            claimed = self.state_store.claim_next(self.worker_id, self.lease_ttl)
+            if claimed is None:
+                break
+            ingestion_id, request_json = claimed
+            try:
+                request = IngestionRequest.model_validate_json(request_json)
+            except Exception as e:
+                error_logger.error(f"IngestionSupervisor.resume_in_progress | {ErrorMessages.INGESTION_RESUME_FAILED.value} | ingestion_id = {ingestion_id} | error = {getattr(e, 'detail', str(e))}")
+                self.state_store.mark_failed(ingestion_id)
+                self.state_store.release_lease(ingestion_id, self.worker_id)
+                continue
+            if self.start(ingestion_id, request) is not None:
+                info_logger.info(f"IngestionSupervisor.resume_in_progress | ingestion_id = {ingestion_id} | worker_id = {self.worker_id} | status = RESUMED")
+                resumed += 1
+        return resumed
+
+    async def _work_loop(self) -> None:
+        while not self.stopping:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.resume_in_progress()
+            except Exception as e:
+                # a state store hiccup must not stop this worker from claiming work later
+                error_logger.error(f"IngestionSupervisor._work_loop | worker_id = {self.worker_id} | error = {str(e)}")
+
+    def start_worker(self) -> None:
+        """
+        Resumes what can be resumed now and keeps claiming queued / orphaned ingestions every WORK_POLL_SECONDS.
+        """
+        self.resume_in_progress()
+        self._worker = asyncio.get_running_loop().create_task(self._work_loop(), name="ingestion-worker")
+
+    async def shutdown(self, deadline_seconds: float = MicroServiceConfigurations.SHUTDOWN_DRAIN_SECONDS.value) -> None:
+        """
+        Lets running ingestions drain the chunk in flight, cancels whatever is still running after the deadline.
+        """
+        self.stopping = True
+        if self._worker is not None:
+            self._worker.cancel()
+        tasks = list(self.tasks.values())
+        if not tasks:
+            return
+        info_logger.info(f"IngestionSupervisor.shutdown | draining {len(tasks)} ingestions | deadline_seconds = {deadline_seconds}")
+        _, pending = await asyncio.wait(tasks, timeout=deadline_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            error_logger.error(f"IngestionSupervisor.shutdown | {len(pending)} ingestions did not drain within {deadline_seconds}s and were cancelled")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+# one supervisor per process
+ingestion_supervisor = IngestionSupervisor()
@@ -0,0 +1,192 @@
+"""
+This file is responsible for the per-ingestion timeline of a traced run (trace=true) : spans for the reads, chunk builds,
+checksums, send attempts, ACKs and checkpoints, exported as a Chrome trace (chrome://tracing, Perfetto, speedscope).
+[GUARANTEES]
+- Off by default : an ingestion without trace=true gets NULL_TRACER, whose spans do nothing
+- Spans go into a ring buffer of TRACE_BUFFER_SPANS per ingestion, a long run keeps its most recent spans and
+  reports how many were dropped
+- The traces of the last TRACE_RETAINED_INGESTIONS runs of this process are kept for export, a new run of the same
+  ingestion_id starts a new trace
+- Timestamps are time.perf_counter, the reader and the sender of a chunk are on their own tracks (rows of the viewer)
+  so a stall (a chunk waiting on a slow ACK while nothing is parsed) is visible as a gap
+"""
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "track", "args", "started")
+
+    def __init__(self, tracer, name: str, track: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.track = track
+        self.args = args
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(self.name, self.track, self.started, time.perf_counter(), **self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class IngestionTracer:
+    enabled = True
+
+    def __init__(self, ingestion_id: str, capacity: int = MicroServiceConfigurations.TRACE_BUFFER_SPANS.value):
+        self.ingestion_id = ingestion_id
+        self.spans = deque(maxlen=capacity)
+        self.recorded = 0
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+
+    def span(self, name: str, track: str, **args) -> _Span:
+        return _Span(self, name, track, args)
+
+    def complete(self, name: str, track: str, started: float, finished: float, **args) -> None:
+        """
+        Span from two perf_counter timestamps (work that was timed without a with block).
+        """
+        self.recorded += 1
+        self.spans.append((name, track, started, finished - started, args))
+
+    def instant(self, name: str, track: str, **args) -> None:
+        self.recorded += 1
+        self.spans.append((name, track, time.perf_counter(), None, args))
+
+    @property
+    def dropped(self) -> int:
+        return self.recorded - len(self.spans)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """
+        Chrome trace-event JSON : one complete event (ph X) per span, one instant event (ph i) per ACK / NACK,
+        one thread (tid) per track.
+        """
+        pid = os.getpid()
+        tracks: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        for name, track, started, duration, args in self.spans:
+            tid = tracks.setdefault(track, len(tracks) + 1)
+            event = {"name": name, "cat": track, "pid": pid, "tid": tid, "ts": round((started - self.started) * 1e6, 3), "args": args}
+            if duration is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round(duration * 1e6, 3))
+            events.append(event)
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"ingestion {self.ingestion_id}"}}]
+        for track, tid in tracks.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}})
+            metadata.append({"name": "thread_sort_index", "ph": "M", "pid": pid, "tid": tid, "args": {"sort_index": tid}})
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "ingestion_id": self.ingestion_id,
+                "started_at": self.started_at,
+                "spans": len(self.spans),
+                "dropped_spans": self.dropped,
+            },
+        }
+
+
+class _NullTracer:
+    enabled = False
+
+    def span(self, name: str, track: str, **args) -> _NullSpan:
+        return _NULL_SPAN
+
+    def complete(self, name: str, track: str, started: float, finished: float, **args) -> None:
+        pass
+
+    def instant(self, name: str, track: str, **args) -> None:
+        pass
+
+
+NULL_TRACER = _NullTracer()
+
+
+class IngestionTraces:
+    """
+    Traces of the recent traced runs of this process, by ingestion_id.
+    """
+    def __init__(self, retained: int = MicroServiceConfigurations.TRACE_RETAINED_INGESTIONS.value):
+        self.retained = retained
+        self.traces: "OrderedDict[str, IngestionTracer]" = OrderedDict()
+
+    def start(self, ingestion_id: str) -> IngestionTracer:
+        tracer = IngestionTracer(ingestion_id)
+        self.traces.pop(ingestion_id, None)
+        self.traces[ingestion_id] = tracer
+        while len(self.traces) > self.retained:
+            self.traces.popitem(last=False)
+        info_logger.info(f"IngestionTraces.start | ingestion_id = {ingestion_id} | capacity = {tracer.spans.maxlen}")
+        return tracer
+
+    def get(self, ingestion_id: str) -> Optional[IngestionTracer]:
+        return self.traces.get(ingestion_id)
+
+
+# one trace registry per process
+ingestion_traces = IngestionTraces()
+
+
+def tracer_for(request, ingestion_id: str):
+    """
+    Tracer of the current run of a traced ingestion (started by its reader), NULL_TRACER otherwise.
+    """
+    if not request.trace:
+        return NULL_TRACER
+    return ingestion_traces.get(ingestion_id) or NULL_TRACER
+
+
+class TracedFile:
+    """
+    File object whose reads are recorded as spans (the parser pulls the source through read()).
+    """
+    def __init__(self, file, tracer: IngestionTracer, track: str):
+        self.file = file
+        self.tracer = tracer
+        self.track = track
+
+    def read(self, size: int = -1) -> bytes:
+        started = time.perf_counter()
+        data = self.file.read(size)
+        self.tracer.complete("read", self.track, started, time.perf_counter(), bytes=len(data))
+        return data
@@ -1,20 +1,36 @@
+import time
+
 import ijson
 import fsspec
 
-# ort json parser
-from app.utils.json_decimal_encoder import orjson_default
-
 # import data integrity manager
 from app.services.data_integrity_manager import ChunkIntegrityManager
 
-# import error messages
-from app.utils.error_messages import ErrorMessages
+# import chunk sender (delivery, retries and checkpoints)
+from app.services.chunk_sender import ChunkSender
+
+# import optional process pool stage (canonical serialization + checksum on other cores)
+from app.services.chunk_encoder_pool import PooledChunkEncoder
 
 import httpx
-import orjson
 
 # import the utility to store the state of data ingestion process
-from app.services.ingestion_state_store import IngestionStateStore
+from app.services.ingestion_state_store import get_state_store
+
+# import process wide memory governor
+from app.services.memory_governor import memory_governor
+
+# import fields / filter pushed down into the parser
+from app.services.record_selection import RecordSelection, report_selection_stats
+
+# import json source opener (memory-mapped local files, fsspec for remote urls)
+from app.services.json_source import open_json_source
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import per-ingestion timeline (trace=true)
+from app.services.ingestion_tracer import ingestion_traces, NULL_TRACER, TracedFile
 
 # import logging utility
 from app.utils.logger import LoggerFactory
@@ -30,28 +46,59 @@ class JsonIngestionService:
     This method will read json using read stream method
     """
     def __init__(self):
-        self.state_store = IngestionStateStore()
+        self.state_store = get_state_store()
         self.total_records = 0
-
-    async def stream_and_push(self, ingestion_id: str, request):   
+        self.tracer = NULL_TRACER
+
+    async def stream_and_push(self, ingestion_id: str, request):
+        # fields / filter compiled once per ingestion
+        self.selection = RecordSelection.from_request(request)
+        # trace=true : a new timeline for this run, the chunk sender records on it as well
+        self.tracer = ingestion_traces.start(ingestion_id) if request.trace else NULL_TRACER
+        try:
+            with self.tracer.span("ingestion", "ingestion", file_type="json"):
+                await self._stream_and_push(ingestion_id, request)
+        finally:
+            if self.selection is not None and self.selection.records_seen:
+                report_selection_stats(ingestion_id, self.selection.stats())
+            # never leak this ingestion's share of the process wide memory budget, even when it failed
+            memory_governor.release(ingestion_id)
+
+    async def _stream_and_push(self, ingestion_id: str, request):
         # Adding resume data stream support after container re-starts
         # Save the last cunk in the database
         last_chunk = self.state_store.get_last_chunk(ingestion_id)
         chunk_number = last_chunk + 1
 
+        selection = self.selection
+        tracer = self.tracer
         fs, _, paths = fsspec.get_fs_token_paths(request.file_path)
         debug_logger.debug(f"JsonIngestionService.stream_and_push | file_system={fs} | paths = {paths}")
 
         chunk = []
         chunk_bytes = 0
+        chunk_started = time.perf_counter()
+        # canonical record encoding of the negotiated payload_encoding (json or msgpack)
+        encode_record = ChunkIntegrityManager.record_encoder(request.payload_encoding, request.number_mode)
+        # number_mode=float : the parser builds floats, no Decimal is created and none goes through the orjson default callback
+        use_float = request.number_mode == "float"
+        chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, encoding=request.payload_encoding)
 
         # Resume total_records from persisted state
         """
         In case where the database doesn't have the total_records saved in it then it will return zero hence reseting the total_records properly as I have intended to be.
         """
         self.total_records = self.state_store.get_total_records(ingestion_id)
+        # records of the ACKed chunks are skipped while parsing (same as the excel reader), chunk numbering continues after last_chunk
+        records_to_skip = int(self.total_records)
+        skipped_records = 0
 
         async with httpx.AsyncClient(timeout=60) as client:
+            # delivers chunks (single or batch mode), skips already ACKed chunks and persists progress after ACK
+            sender = ChunkSender(client, request, ingestion_id, self.state_store, last_chunk)
+            # raw records are encoded and checksummed by the process pool when it is enabled
+            encoder = PooledChunkEncoder(sender, request) if PooledChunkEncoder.enabled(request) else None
+
             for base_path in paths:
                 files = (
                     fs.glob(f"{base_path.rstrip('/')}/**/*.json")
@@ -61,11 +108,37 @@ class JsonIngestionService:
 
                 for file in files:
                     debug_logger.debug(f"JsonIngestionService.stream_and_push | Processing file = {file}")
-                    with fs.open(file, "rb") as f:
-                        for record in ijson.items(f, "item"):
-                            record_bytes = len(orjson.dumps(record, default=orjson_default)
-
-)
+                    with open_json_source(fs, file) as f:
+                        # traced runs record every read of the source (the parser pulls it through read())
+                        source = TracedFile(f, tracer, "reader") if tracer.enabled else f
+                        for record in ijson.items(source, "item", buf_size=MicroServiceConfigurations.JSON_READ_BUFFER_BYTES.value, use_float=use_float):
+                            # filtered records are dropped before they count towards resume, projected ones before they are encoded
+                            if selection is not None:
+                                record = selection.select(record)
+                                if record is None:
+                                    continue
+
+                            if skipped_records < records_to_skip:
+                                skipped_records += 1
+                                continue
+
+                            if encoder:
+                                # same chunk boundaries as the in-process path, the pool encodes whole chunks
+                                if len(chunk) >= request.chunk_size_by_records:
+                                    tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk))
+                                    await encoder.submit(chunk_number, chunk, self.total_records, False)
+                                    chunk_number += 1
+                                    chunk = []
+                                if not chunk:
+                                    await sender.begin_chunk()
+                                    chunk_started = time.perf_counter()
+                                chunk.append(record)
+                                self.total_records += 1
+                                continue
+
+                            # canonical bytes are produced once per record and feed both the size estimate and the chunk checksum
+                            canonical_record = encode_record(record)
+                            record_bytes = len(canonical_record)
 
                             if self._should_flush(
                                 request,
@@ -73,55 +146,50 @@ class JsonIngestionService:
                                 chunk_bytes,
                                 record_bytes
                             ):
-                                # SKIP already ACKed chunks
                                 debug_logger.debug(f"JsonIngestionService.stream_and_push| Operation : if self._should_flush | Only send chunks that are not ACKed by pim-core : {chunk_number > last_chunk}")
-                                if chunk_number > last_chunk:
-                                    await self._send_chunk(
-                                        client,
-                                        request.callback_url,
-                                        ingestion_id,
-                                        chunk_number,
-                                        chunk,
-                                        False
-                                    )
+                                # parsing, canonical encoding and checksum updates of the chunk's records
+                                tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                                await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, False)
 
                                 chunk_number += 1
-                                chunk.clear()
+                                chunk = []
                                 chunk_bytes = 0
+                                chunk_checksum = ChunkIntegrityManager.new_checksum(request.checksum_algorithm, encoding=request.payload_encoding)
+
+                            if not chunk:
+                                # reserve memory before building a new chunk, waits (pauses the parser) while the budget is exhausted
+                                await sender.begin_chunk()
+                                chunk_started = time.perf_counter()
 
-                            chunk.append(record)
+                            # the chunk keeps only the canonical bytes, the record dict is not held twice
+                            chunk.append(canonical_record)
                             chunk_bytes += record_bytes
+                            chunk_checksum.update(canonical_record)
+                            sender.track(chunk_bytes)
                             self.total_records += 1
 
             # Final chunk
             if chunk:
                 debug_logger.debug(f"JsonIngestionService.stream_and_push | Processing chunks | ingestion_id = {ingestion_id} | chunk_number = {chunk_number}")
-                debug_logger.debug(f"JsonIngestionService.stream_and_push| Operation : if chunk = {chunk} | Only send chunks that are not ACKed by pim-core : {chunk_number > last_chunk}")
-                if chunk_number > last_chunk:
-                    await self._send_chunk(
-                        client,
-                        request.callback_url,
-                        ingestion_id,
-                        chunk_number,
-                        chunk,
-                        True
-                    )
+                debug_logger.debug(f"JsonIngestionService.stream_and_push| Operation : if chunk | records = {len(chunk)} | Only send chunks that are not ACKed by pim-core : {chunk_number > last_chunk}")
+                if encoder:
+                    tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk))
+                    await encoder.submit(chunk_number, chunk, self.total_records, True)
+                else:
+                    tracer.complete("build chunk", "reader", chunk_started, time.perf_counter(), chunk_number=chunk_number, records=len(chunk), bytes=chunk_bytes)
+                    await sender.push(chunk_number, chunk, chunk_checksum, self.total_records, chunk_bytes, True)
+
+            # chunks still being encoded by the process pool
+            if encoder:
+                await encoder.drain()
+
+            # chunks still waiting for a batch to fill up
+            await sender.flush()
 
             # Completion event
             debug_logger.debug(f"JsonIngestionService.stream_and_push | Processed and completed all the chunks | ingestion_id = {ingestion_id} | chunk_number = {chunk_number} | total_records = {self.total_records} | status = COMPLETED")
 
-            resp = await client.post(
-                request.callback_url,
-                json={
-                    "ingestion_id": ingestion_id,
-                    "status": "COMPLETED",
-                    "chunk_number":chunk_number,
-                    "total_records": self.total_records
-                }
-            )
-            ack_response = resp.json()
-            debug_logger.debug(f"JsonIngestionService._send_chunk | COMPLETION EVENT | response from pim core callback url ={ack_response}")
-            ack = ack_response.get("ack")
+            ack = await sender.send_completion(chunk_number, self.total_records)
             # Mark the chunk being commit by pim-core into the database hence the ingestion is complete.
             if ack:
                 self.state_store.mark_completed(ingestion_id)
@@ -134,65 +202,3 @@ class JsonIngestionService:
         )
         debug_logger.debug(f"JsonIngestionService._should_flush | should_flush={should_flush}")
         return should_flush
-
-    async def _send_chunk(
-        self,
-        client,
-        url,
-        ingestion_id,
-        chunk_number,
-        records,
-        is_last
-    ):
-        # Data integrity check related logic (checksum mechanism)
-        checksum = ChunkIntegrityManager.compute_checksum(records)
-        chunk_id = ChunkIntegrityManager.build_chunk_id(
-            ingestion_id, chunk_number
-        )
-
-
-        payload = {
-            "ingestion_id": ingestion_id,
-            "chunk_number": chunk_number,
-            "chunk_id":chunk_id,
-            "checksum":checksum,
-            "records": records,
-            "is_last": is_last
-        }
-
-        for attempt in range(3):
-            debug_logger.debug(f"JsonIngestionService._send_chunk | Attempting to send chunk | attempt = {attempt}")
-            try:
-                resp = await client.post(
-                    url,
-                    content=orjson.dumps(payload, default=orjson_default),
-                    headers={"Content-Type": "application/json"}
-                )
-
-                # Added checksum mechanism to make sure chunk wise data ingegrity along with ack validation for fault tolerant system and re-tries
-                ack_response = resp.json()
-                debug_logger.debug(f"JsonIngestionService._send_chunk | response from pim core callback url ={ack_response}")
-                ack = ack_response.get("ack")
-
-                # raise exception when the chunk is rejected due to errors 
-                if ack is not True:
-                    if ack_response.get("error") == ErrorMessages.OUT_OF_ORDER_CHUNK.value:
-                        # Write the logic to handle the case when we get the chunk out of order error 
-                        error_logger.error(f"JsonIngestionService._send_chunk | Chunk {chunk_number} rejected: {ack_response.get('error')}")
-                        raise Exception(
-                                f"Chunk {chunk_number} rejected: {ack_response.get('error')}"
-                        )
-                    error_logger.error(f"JsonIngestionService._send_chunk | Chunk {chunk_number} rejected: {ack_response.get('error')}") 
-                    raise Exception(
-                        f"Chunk {chunk_number} rejected: {ack_response.get('error')}"
-                )
-
-                # Persist progress ONLY after ACK
-                self.state_store.update_chunk(ingestion_id, chunk_number, self.total_records)
-                return
-            except Exception as e:
-                error_logger.error(f"JsonIngestionService._send_chunk | Retry {attempt + 1} for chunk {chunk_number}: {e}")
-                if attempt == 2:
-                    raise
-
-
@@ -0,0 +1,52 @@
+"""
+This file is responsible for opening json sources for the parser, local paths and remote urls (s3://, gs://, https://, ...) alike.
+[GUARANTEES]
+- Local files are memory-mapped (read only, sequential access advised) and handed to ijson as they are : no fsspec file
+  wrapper and no read syscalls, the parser pulls JSON_READ_BUFFER_BYTES at a time straight from the page cache
+- Remote sources (and local files when JSON_MMAP_LOCAL_SOURCES is off) are read through fsspec as before
+- An empty local file cannot be mapped, it is opened as a regular file
+"""
+import contextlib
+import mmap
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+def is_local_filesystem(fs) -> bool:
+    from fsspec.implementations.local import LocalFileSystem
+
+    return isinstance(fs, LocalFileSystem)
+
+
+@contextlib.contextmanager
+def open_json_source(fs, path: str):
+    """
+    Binary file object of one json file of fs (what ijson reads), memory-mapped when it is a local file.
+    """
+    if not (MicroServiceConfigurations.JSON_MMAP_LOCAL_SOURCES.value and is_local_filesystem(fs)):
+        with fs.open(path, "rb") as f:
+            yield f
+        return
+
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            yield f
+            return
+        with mapped:
+            if hasattr(mapped, "madvise"):
+                # read ahead aggressively, pages behind the parser can be dropped first
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            debug_logger.debug(f"open_json_source | path = {path} | bytes = {len(mapped)} | action = MEMORY_MAPPED")
+            yield mapped
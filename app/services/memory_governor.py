@@ -0,0 +1,133 @@
+"""
+This file is responsible for keeping the memory used by chunks of ALL concurrent ingestions inside one process-wide budget.
+
+Every ingestion reserves bytes from the governor before it starts building a chunk and releases them once the chunk
+was sent. When the budget is exhausted the reservation waits, which pauses that ingestion's parser (backpressure)
+instead of allocating more memory.
+[RULES]
+- An ingestion holds at most one chunk reservation at a time, it only waits while holding nothing (no deadlocks)
+- Waiters are served in FIFO order so a big chunk is not starved by small ones
+- A chunk that grows past its reservation (chunk_size_by_records estimate) is accounted for, never blocked mid-chunk
+"""
+import asyncio
+from collections import deque
+from typing import Dict, Any, Optional
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+
+class MemoryGovernor:
+    def __init__(self, budget_bytes: int = MicroServiceConfigurations.PROCESS_MEMORY_BUDGET_BYTES.value):
+        self.budget_bytes = budget_bytes
+        self.reserved_bytes = 0
+        self.reservations: Dict[str, int] = {}
+        self.peak_reserved_bytes = 0
+        self.total_wait_seconds = 0.0
+        self._waiters = deque()
+
+    def can_ever_fit(self, nbytes: int) -> bool:
+        return nbytes <= self.budget_bytes
+
+    @staticmethod
+    def estimate_chunk_bytes(request, previous_chunk_bytes: Optional[int] = None) -> int:
+        """
+        Bytes to reserve for the next chunk of an ingestion.
+        chunk_size_by_memory is a hard upper bound, chunk_size_by_records is estimated from the previous chunk.
+        """
+        if request.chunk_size_by_memory:
+            return request.chunk_size_by_memory
+        if previous_chunk_bytes:
+            return previous_chunk_bytes
+        return request.chunk_size_by_records * MicroServiceConfigurations.RECORD_BYTES_ESTIMATE.value
+
+    def _fits(self, nbytes: int) -> bool:
+        # a lone reservation is always granted, so progress is guaranteed even at the budget edge
+        return self.reserved_bytes == 0 or self.reserved_bytes + nbytes <= self.budget_bytes
+
+    def _grant(self, ingestion_id: str, nbytes: int) -> None:
+        self.reservations[ingestion_id] = self.reservations.get(ingestion_id, 0) + nbytes
+        self.reserved_bytes += nbytes
+        self.peak_reserved_bytes = max(self.peak_reserved_bytes, self.reserved_bytes)
+
+    async def reserve(self, ingestion_id: str, nbytes: int) -> None:
+        """
+        Reserve nbytes for the chunk ingestion_id is about to build, waits while the budget is exhausted.
+        """
+        if not self._waiters and self._fits(nbytes):
+            self._grant(ingestion_id, nbytes)
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter = (loop.create_future(), ingestion_id, nbytes)
+        self._waiters.append(waiter)
+        debug_logger.debug(
+            f"MemoryGovernor.reserve | backpressure | ingestion_id = {ingestion_id} | bytes = {nbytes} | reserved = {self.reserved_bytes} | budget = {self.budget_bytes}"
+        )
+        started = loop.time()
+        try:
+            await waiter[0]
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter[0].cancelled():
+                # granted right before the cancellation, hand the bytes back
+                self.release(ingestion_id)
+            raise
+        finally:
+            self.total_wait_seconds += loop.time() - started
+
+    def adjust(self, ingestion_id: str, nbytes: int) -> None:
+        """
+        Re-account the reservation of ingestion_id to the real size of its chunk.
+        """
+        current = self.reservations.get(ingestion_id, 0)
+        self.reserved_bytes += nbytes - current
+        self.reservations[ingestion_id] = nbytes
+        self.peak_reserved_bytes = max(self.peak_reserved_bytes, self.reserved_bytes)
+        if nbytes < current:
+            self._wake_waiters()
+
+    def release(self, ingestion_id: str) -> None:
+        nbytes = self.reservations.pop(ingestion_id, 0)
+        self.reserved_bytes -= nbytes
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters:
+            future, ingestion_id, nbytes = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(nbytes):
+                break
+            self._waiters.popleft()
+            self._grant(ingestion_id, nbytes)
+            future.set_result(None)
+
+    def reserved_for(self, ingestion_id: str) -> int:
+        # a multi-sheet excel ingestion reserves per sheet under "<ingestion_id>:<sheet>"
+        prefix = f"{ingestion_id}:"
+        return sum(nbytes for key, nbytes in self.reservations.items() if key == ingestion_id or key.startswith(prefix))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "reserved_bytes": self.reserved_bytes,
+            "peak_reserved_bytes": self.peak_reserved_bytes,
+            "waiting_ingestions": len(self._waiters),
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "reservations": dict(self.reservations),
+        }
+
+
+# one governor per process, shared by every ingestion
+memory_governor = MemoryGovernor()
@@ -0,0 +1,341 @@
+"""
+This file is responsible for the field projection (fields) and the record filter (filter) of an ingestion request.
+
+Both are compiled once per ingestion and applied by the readers while parsing, before a record is encoded : records
+rejected by the filter and the fields left out are never serialized, checksummed or sent to pim-core.
+[GUARANTEES]
+- fields.include / fields.exclude take dotted paths for nested json ("dimensions.weight"), a path through an array
+  applies to every element of the array. For excel a path is a header name, unused columns are dropped by index
+- filter is a small expression : <path> <op> <json literal>, joined by and / or (and binds tighter than or),
+  ops are == != < <= > >= in, "not in". Paths with spaces are written between backticks (`Product Name`)
+- The filter sees the whole record, it can test fields that are not projected. A missing path is null and a
+  comparison between incompatible types is false
+- csv cells are text : compared with a number literal (or a list holding numbers), a cell holding a number is compared
+  as that number ("7" > 5, "7.50" == 7.5), any other cell stays text
+- Resume counts only the records that passed the filter (the ones that were sent)
+- records_filtered is exact, bytes_saved is estimated from the canonical JSON size of a sample of the records
+"""
+import decimal
+import json
+import operator
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+# import centralized configs for this microservice
+from app.core.config import MicroServiceConfigurations
+
+# import process wide metrics
+from app.services.ingestion_metrics import ingestion_metrics
+
+# ort json parser
+from app.utils.json_decimal_encoder import orjson_default
+
+# import logging utility
+from app.utils.logger import LoggerFactory
+
+# initialize logging utility
+info_logger = LoggerFactory.get_info_logger()
+error_logger = LoggerFactory.get_error_logger()
+debug_logger = LoggerFactory.get_debug_logger()
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<op>==|!=|<=|>=|<|>)
+      | (?P<word>and|or|not\s+in|in)(?![\w.])
+      | `(?P<quoted>[^`]+)`
+      | (?P<literal>"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.])|(?:true|false|null)(?![\w.])|\[[^\]]*\])
+      | (?P<path>[A-Za-z_][\w.]*)
+    )""", re.VERBOSE)
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, literal: value in literal,
+    "not in": lambda value, literal: value not in literal,
+}
+
+
+class SelectionError(ValueError):
+    pass
+
+
+def _coerce(value, literal):
+    # json records hold Decimal values (ijson), excel records floats, literals are parsed as Decimal
+    if isinstance(value, float) and isinstance(literal, decimal.Decimal):
+        return value, float(literal)
+    return value, literal
+
+
+def _is_number(literal) -> bool:
+    return isinstance(literal, (int, decimal.Decimal)) and not isinstance(literal, bool)
+
+
+def _number_of_text(value, literal):
+    # csv cells are text : a cell holding a number is compared as that number with a number literal
+    if not isinstance(value, str):
+        return value
+    if not (_is_number(literal) or (isinstance(literal, list) and any(_is_number(item) for item in literal))):
+        return value
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        return value
+
+
+def _compare(op: str, value, literal, text_cells: bool = False) -> bool:
+    try:
+        if text_cells:
+            value = _number_of_text(value, literal)
+        if op in ("in", "not in"):
+            value = float(value) if isinstance(value, decimal.Decimal) else value
+            literal = [float(item) if isinstance(item, decimal.Decimal) else item for item in literal]
+            return OPERATORS[op](value, literal)
+        return OPERATORS[op](*_coerce(value, literal))
+    except (TypeError, decimal.InvalidOperation):
+        # decimal.InvalidOperation : ordering a NaN cell
+        return False
+
+
+class RecordFilter:
+    """
+    Compiled filter expression : or-groups of and-ed conditions (path, op, literal).
+    """
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.groups: List[List[Tuple[str, str, Any]]] = self._parse(self._tokenize(expression))
+
+    @staticmethod
+    def _tokenize(expression: str) -> List[Tuple[str, str]]:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = _TOKEN.match(expression, position)
+            if not match or match.end() == position:
+                raise SelectionError(f"unexpected input at position {position}: {expression[position:position + 20]!r}")
+            kind = match.lastgroup
+            text = match.group(kind)
+            if kind == "quoted":
+                kind = "path"
+            elif kind == "word":
+                text = " ".join(text.split())
+            tokens.append((kind, text))
+            position = match.end()
+        return tokens
+
+    @staticmethod
+    def _parse(tokens: List[Tuple[str, str]]) -> List[List[Tuple[str, str, Any]]]:
+        groups = [[]]
+        index = 0
+        while True:
+            condition = tokens[index:index + 3]
+            if len(condition) < 3 or condition[0][0] != "path" or condition[2][0] != "literal" \
+                    or (condition[1][0] != "op" and condition[1][1] not in ("in", "not in")):
+                raise SelectionError("expected <path> <op> <literal>")
+            (_, path), (_, op), (_, text) = condition
+            literal = json.loads(text, parse_float=decimal.Decimal)
+            if op in ("in", "not in") and not isinstance(literal, list):
+                raise SelectionError(f"{op} expects a list literal")
+            groups[-1].append((path, op, literal))
+            index += 3
+            if index == len(tokens):
+                return groups
+            kind, word = tokens[index]
+            if kind != "word" or word not in ("and", "or"):
+                raise SelectionError(f"expected and / or, got {word!r}")
+            if word == "or":
+                groups.append([])
+            index += 1
+
+    @property
+    def paths(self) -> List[str]:
+        return [path for group in self.groups for path, _, _ in group]
+
+    def matches(self, lookup: Callable[[str], Any], text_cells: bool = False) -> bool:
+        """
+        text_cells : the values are text (csv cells), the ones holding a number compare as numbers with number literals.
+        """
+        return any(all(_compare(op, lookup(path), literal, text_cells) for path, op, literal in group) for group in self.groups)
+
+
+def lookup_path(record, path: str):
+    """
+    Value at a dotted path of a json record (objects only), None when it is missing.
+    """
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _path_tree(paths: List[str]) -> Dict[str, Any]:
+    """
+    Nested dict of the path parts, None marks a path that ends there (the whole subtree).
+    """
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:
+                break
+            node = child
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _include(value, tree: Dict[str, Any]):
+    if isinstance(value, list):
+        # elements that are not objects have none of the paths
+        return [_include(item, tree) for item in value if isinstance(item, (dict, list))]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is None:
+            projected[key] = value[key]
+        elif isinstance(value[key], (dict, list)):
+            projected[key] = _include(value[key], subtree)
+    return projected
+
+
+def _exclude(value, tree: Dict[str, Any]):
+    if isinstance(value, list):
+        return [_exclude(item, tree) if isinstance(item, (dict, list)) else item for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, item in value.items():
+        if key not in tree:
+            projected[key] = item
+        elif tree[key] is not None:
+            projected[key] = _exclude(item, tree[key]) if isinstance(item, (dict, list)) else item
+    return projected
+
+
+class RecordSelection:
+    """
+    fields + filter of one ingestion, with the counters of what they saved.
+    """
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None, filter_expression: Optional[str] = None):
+        if include is not None and not include:
+            raise SelectionError("fields.include must not be empty")
+        self.include = include
+        self.exclude = exclude or None
+        self._include_tree = _path_tree(include) if include else None
+        self._exclude_tree = _path_tree(exclude) if exclude else None
+        self.filter = RecordFilter(filter_expression) if filter_expression else None
+        self.sample_every = MicroServiceConfigurations.SELECTION_BYTES_SAMPLE_EVERY.value
+        self.records_seen = 0
+        self.records_filtered = 0
+        self.samples = 0
+        self.sampled_bytes_saved = 0
+
+    @classmethod
+    def from_request(cls, request) -> Optional["RecordSelection"]:
+        spec = selection_spec(request)
+        return cls(*spec) if spec is not None else None
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # json records
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def project(self, record):
+        if self._include_tree is not None:
+            record = _include(record, self._include_tree)
+        if self._exclude_tree is not None:
+            record = _exclude(record, self._exclude_tree)
+        return record
+
+    def select(self, record) -> Optional[Dict[str, Any]]:
+        """
+        Projected record, None when the filter rejects it.
+        """
+        self.records_seen += 1
+        selected = None
+        if self.filter is None or self.filter.matches(lambda path: lookup_path(record, path)):
+            selected = self.project(record)
+        else:
+            self.records_filtered += 1
+        if self._sampled():
+            self._sample(record, selected)
+        return selected
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # excel rows
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def bind_headers(self, headers: List[str], text_cells: bool = False) -> Tuple[List[str], Callable[[tuple], Optional[tuple]]]:
+        """
+        Projected headers and a row selector : projected row (kept columns only), None when the filter rejects it.
+        text_cells for csv rows, see RecordFilter.matches.
+        """
+        kept = [
+            index for index, header in enumerate(headers)
+            if (self.include is None or header in self.include) and not (self.exclude and header in self.exclude)
+        ]
+        positions = {header: index for index, header in enumerate(headers)}
+        width = len(headers)
+
+        def cell(row: tuple, index: Optional[int]):
+            return row[index] if index is not None and index < len(row) else None
+
+        def select_row(row: tuple) -> Optional[tuple]:
+            self.records_seen += 1
+            selected = None
+            if self.filter is None or self.filter.matches(lambda path: cell(row, positions.get(path)), text_cells):
+                selected = tuple(cell(row, index) for index in kept)
+            else:
+                self.records_filtered += 1
+            if self._sampled():
+                full = {headers[index]: cell(row, index) for index in range(width)}
+                self._sample(full, None if selected is None else dict(zip((headers[index] for index in kept), selected)))
+            return selected
+
+        debug_logger.debug(f"RecordSelection.bind_headers | headers = {width} | kept = {len(kept)}")
+        return [headers[index] for index in kept], select_row
+
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    # savings
+    # ---------------------------------------------------------------------------------------------------------------------------------
+    def _sampled(self) -> bool:
+        return self.records_seen == 1 or self.records_seen % self.sample_every == 0
+
+    def _sample(self, record, selected) -> None:
+        full = len(orjson.dumps(record, default=orjson_default))
+        kept = len(orjson.dumps(selected, default=orjson_default)) if selected is not None else 0
+        self.samples += 1
+        self.sampled_bytes_saved += full - kept
+
+    def stats(self) -> Dict[str, int]:
+        bytes_saved = self.sampled_bytes_saved * self.records_seen // self.samples if self.samples else 0
+        return {"records_filtered": self.records_filtered, "bytes_saved": bytes_saved}
+
+
+def selection_spec(request) -> Optional[Tuple[Optional[List[str]], Optional[List[str]], Optional[str]]]:
+    """
+    fields / filter of the request as (include, exclude, filter), the form pool and sheet processes compile with
+    RecordSelection(*spec), None without them.
+    """
+    if request.fields is None and request.filter is None:
+        return None
+    fields = request.fields
+    return (fields.include if fields is not None else None, fields.exclude if fields is not None else None, request.filter)
+
+
+def report_selection_stats(ingestion_id: str, stats: Optional[Dict[str, int]]) -> None:
+    if not stats:
+        return
+    for name, value in stats.items():
+        ingestion_metrics.increment(name, value, ingestion_id=ingestion_id)
+    info_logger.info(f"report_selection_stats | ingestion_id = {ingestion_id} | records_filtered = {stats['records_filtered']} | bytes_saved = {stats['bytes_saved']}")
@@ -9,6 +9,32 @@ class ErrorMessages(Enum):
     NEITHER_CHUNK_SIZE_PROVIDED = "Either chunk_size_by_records or chunk_size_by_memory must be provided"
     BOTH_CHUNK_SIZES_PROVIDED = "Provide only one: chunk_size_by_records OR chunk_size_by_memory"
     CALL_BACK_URL_IS_NONE = "Callback url is required!"
+    CHUNK_SIZE_EXCEEDS_MEMORY_BUDGET = "Chunk size of {chunk_bytes} bytes can never fit into the process memory budget of {budget_bytes} bytes"
+    INGESTION_NOT_FOUND = "Ingestion not found"
+    UNSUPPORTED_CHECKSUM_ALGORITHM = "Unsupported checksum_algorithm, use one of: {algorithms}"
+    INGESTION_FAILED = "Ingestion failed, re-POST the request to resume from the last ACK"
+    INGESTION_LEASE_LOST = "Lease of the ingestion was lost to another worker, this run is cancelled"
+    SHEETS_ONLY_FOR_EXCEL = "sheets can only be used with file_type excel"
+    INVALID_SHEETS = "sheets must be \"all\" or a non-empty list of sheet names"
+    DUPLICATE_SHEETS = "sheets must not name a sheet more than once"
+    COLUMNAR_ONLY_FOR_EXCEL = "payload_format columnar can only be used with file_type excel or csv"
+    CSV_OPTIONS_ONLY_FOR_CSV = "csv_delimiter, csv_quotechar and csv_encoding can only be used with file_type csv"
+    INVALID_CSV_CHARACTER = "csv_delimiter and csv_quotechar must be single characters other than a line break, and differ"
+    UNSUPPORTED_CSV_ENCODING = "csv_encoding must be an ASCII compatible encoding known to python (utf-8, cp1252, latin-1, ...)"
+    INVALID_FIELDS = "fields must have a non-empty include list and / or an exclude list of field paths"
+    INVALID_FILTER = "Invalid filter expression: {error}"
+    MSGPACK_NOT_INSTALLED = "payload_encoding msgpack needs the msgpack package, it is not installed"
+    INGESTION_RESUME_FAILED = "Persisted request of the ingestion is no longer valid, ingestion is not resumed"
+    UNSUPPORTED_CALLBACK_URL = "callback_url must be an http(s)://, file:/// or null:// url"
+    NDJSON_SINK_NEEDS_JSON = "payload_encoding msgpack cannot be written to an NDJSON file sink, add ?format=files to the file:/// callback_url"
+    INGESTION_IS_RUNNING = "Ingestion is running, reconcile it once the run is over"
+    NO_CHUNK_LEDGER = "Ingestion has no chunk ledger (CHUNK_LEDGER was off or nothing was ACKed), re-ingest it instead"
+    RECONCILIATION_FAILED = "Reconciliation failed, the ingestion state is unchanged"
+    TRACE_NOT_FOUND = "No trace of this ingestion in this worker process, trace=true records one"
+    ADMIN_ENDPOINTS_DISABLED = "Not Found"
+    INGESTION_NOT_RUNNING_HERE = "Ingestion is not running in this worker process"
+    PROFILE_ALREADY_RUNNING = "A profile is already running in this worker process"
+    TRACEMALLOC_ALREADY_RUNNING = "An allocation trace is already running in this worker process"
 
     # error message sent by pim-core in the response
     OUT_OF_ORDER_CHUNK = "Out-of-order chunk"
@@ -16,5 +42,15 @@ class ErrorMessages(Enum):
 
 class ExcelErrorMessages(Enum):
     EMPTY_HEADER = "Excel header row is empty | ingestion_id={ingestion_id}"
-    CHUNK_REJECTED = "Excel chunk rejected | chunk_number={chunk_number} | reason={reason}"
-    CHUNK_PUSH_FAILED = "Excel chunk push failed | chunk_number={chunk_number} | attempt={attempt} | error={error}"
\ No newline at end of file
+    SHEET_NOT_FOUND = "Excel sheet not found | ingestion_id={ingestion_id} | sheets={sheets}"
+    SHEET_FAILED = "Excel sheet failed | ingestion_id={ingestion_id} | sheet={sheet} | error={error}"
+
+class CsvErrorMessages(Enum):
+    EMPTY_HEADER = "CSV header row is empty | ingestion_id={ingestion_id}"
+    UNSUPPORTED_ENCODING = "CSV source is not in an ASCII compatible encoding | ingestion_id={ingestion_id} | encoding={encoding}"
+
+class ChunkErrorMessages(Enum):
+    CHUNK_REJECTED = "Chunk rejected | ingestion_id={ingestion_id} | chunk_number={chunk_number} | reason={reason}"
+    CHUNK_PUSH_FAILED = "Chunk push failed | ingestion_id={ingestion_id} | chunk_number={chunk_number} | attempt={attempt} | error={error}"
+    SOURCE_CHANGED = "Source changed since the ingestion, chunk cannot be resent | ingestion_id={ingestion_id} | chunk_number={chunk_number} | reason={reason}"
+    CALLBACK_OVERLOADED = "Callback stayed overloaded | ingestion_id={ingestion_id} | status_code={status_code} | waited_seconds={waited}"
\ No newline at end of file
@@ -2,7 +2,27 @@ from enum import Enum
 class RequestFieldDescriptions(Enum):
     # IngestionRequest model field descriptions
     FILE_PATH = "Input file path or url"
-    FILE_TYPE = "Type of input file you want to ingest (JSON or EXCEL)"
-    CALLBACK_URL = "Send data to pim-core using this call-back url"
+    FILE_TYPE = "Type of input file you want to ingest (JSON, EXCEL or CSV)"
+    CALLBACK_URL = "Send data to pim-core using this call-back url. file:///dir writes the chunks to <dir>/<ingestion_id>.ndjson (file:///dir?format=files : one file per chunk in <dir>/<ingestion_id>/), null:// ACKs every chunk and keeps nothing"
     CHUNK_SIZE_BY_RECORDS = "Define your chunk size by number of records per chunk"
-    CHUNK_SIZE_BY_MEMORY = "Define your chunk size by memory taken by dataframe in bytes"
\ No newline at end of file
+    CHUNK_SIZE_BY_MEMORY = "Define your chunk size by memory taken by dataframe in bytes"
+    CHECKSUM_ALGORITHM = "Checksum algorithm used for every chunk (sha256, blake2b or crc32), sent in the chunk envelope as checksum_algorithm"
+    BATCH_SIZE = "Opt-in batch mode: number of chunk envelopes sent in one callback request, pim-core answers with per-chunk ACK/NACK results"
+    SHEETS = "Excel only: \"all\" or a list of sheet names, every sheet is parsed in parallel with its own header row and chunk sequence (sheet-local chunk_number, sheet name in the envelope)"
+    FIELDS = "Projection applied while parsing: include and / or exclude lists of field paths (dotted paths for nested json, header names for excel and csv)"
+    FIELDS_INCLUDE = "Only these field paths are sent"
+    FIELDS_EXCLUDE = "These field paths are never sent"
+    FILTER = "Records sent only when they match, e.g. status != \"discontinued\" and price >= 10 (ops: == != < <= > >= in, not in; and / or)"
+    PAYLOAD_ENCODING = "json (default): chunks are sent as application/json, msgpack: chunks are sent as application/msgpack with Decimal and datetime values kept exact (extension types)"
+    PRIORITY = "Weight of the ingestion when several ingestions send to the same callback host, e.g. 10 for an urgent price feed next to a catalogue feed at 1, each gets a share of the request bytes proportional to its priority"
+    NUMBER_MODE = "Non-integer numbers of json sources, decimal (default): parsed as Decimal and sent as floats, float: parsed as floats (fastest, same payload as decimal), decimal_string: sent as their exact text, e.g. \"19.99\" (msgpack keeps them exact in every mode but float)"
+    INTEGRITY_MODE = "checksum (default): one checksum per chunk, a rejected chunk is sent again whole, merkle: the envelope also carries the leaf hashes of the records and their merkle_root, pim-core can answer with mismatched_leaves and only those records are sent again in a repair message"
+    TRACE = "Opt-in timeline of the run (reads, chunk builds, checksums, send attempts, ACKs, checkpoints), exported as a Chrome trace by GET /api/ingest/{ingestion_id}/trace"
+    PAYLOAD_FORMAT = "records (default): every record is an object, columnar (excel and csv only): the header row is sent once per chunk as columns and the records as value rows"
+    CSV_DELIMITER = "CSV only: field delimiter, detected from the start of the file (one of , ; tab |) when omitted"
+    CSV_QUOTECHAR = "CSV only: quote character of fields holding delimiters, quotes (doubled) or line breaks, default \""
+    CSV_ENCODING = "CSV only: text encoding of the file (ASCII compatible, e.g. utf-8, cp1252, latin-1), detected when omitted : utf-8 (with or without BOM), else cp1252, else latin-1"
+    # ReconcileRequest model field descriptions
+    RECONCILE_CHUNKS = "Chunks pim-core actually holds for the ingestion, every ACKed chunk of the ledger missing from this list (or held with another checksum) is sent again"
+    HELD_CHUNK_ID = "chunk_id of a chunk envelope pim-core holds"
+    HELD_CHUNK_CHECKSUM = "checksum pim-core holds for the chunk, omit it to report presence only"
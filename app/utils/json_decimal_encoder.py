@@ -6,4 +6,11 @@ import decimal
 def orjson_default(obj):
     if isinstance(obj, decimal.Decimal):
         return float(obj)   # OR: return str(obj)
+    raise TypeError
+
+
+def decimal_string_default(obj):
+    # number_mode=decimal_string : the exact text of the value, e.g. "19.99"
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
     raise TypeError
\ No newline at end of file
@@ -10,12 +10,16 @@ class LogInitializer:
     Responsible for creating log directories and files if they don't exist.
     """
     LOG_STRUCTURE = MicroServiceConfigurations.LOG_STRUCTURE.value
+    # every module asks for its loggers at import time, the filesystem checks only run for the first one
+    _initialized = False
     
     @classmethod
     def initialize(cls) -> None:
         """
-        Create log directories and files if they do not exist.
+        Create log directories and files if they do not exist (once per process).
         """
+        if cls._initialized:
+            return
         for folder, filename in cls.LOG_STRUCTURE.items():
             dir_path =  BASE_LOG_DIR / folder
             file_path = dir_path / filename
@@ -26,3 +30,5 @@ class LogInitializer:
             # Create empty log file if missing
             if not file_path.exists():
                 file_path.touch()
+
+        cls._initialized = True
@@ -4,9 +4,15 @@ class LoggerInfoMessages(Enum):
     API_HIT_SUCCESS = "Success check ok!"
     PROCESS_JSON_FILES = "Processing JSON FILES"
     PROCESS_EXCEL_FILES = "Processing Excel FILES"
+    PROCESS_CSV_FILES = "Processing CSV FILES"
     
 class ExcelInfoMessages(Enum):
     STREAM_START = "Excel ingestion started | ingestion_id={ingestion_id}"
     WORKBOOK_LOAD_START = "Excel workbook load started"
     WORKBOOK_LOADED = "Excel workbook loaded successfully"
     INGESTION_COMPLETED = "Excel ingestion completed | total_records={total_records}"
+
+class CsvInfoMessages(Enum):
+    STREAM_START = "CSV ingestion started | ingestion_id={ingestion_id}"
+    FORMAT_DETECTED = "CSV format detected | encoding={encoding} | delimiter={delimiter!r} | quotechar={quotechar!r}"
+    INGESTION_COMPLETED = "CSV ingestion completed | total_records={total_records}"
@@ -0,0 +1,111 @@
+# msgpack codec
+"""
+This file is responsible for the MessagePack encoding of the chunk payloads (payload_encoding=msgpack).
+[GUARANTEES]
+- Canonical form : maps are packed with their keys sorted, integers in their smallest encoding and floats as float64,
+  equal records always give equal bytes (same role as orjson OPT_SORT_KEYS for the json encoding)
+- Decimal, datetime, date and time travel as extension types and are decoded back exactly, unlike orjson_default
+  that turns a Decimal into a float
+- msgpack is an optional dependency, it is only imported when an ingestion asks for payload_encoding=msgpack
+"""
+import datetime
+import decimal
+from typing import Any, Dict
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# extension type codes, the payload of every extension is the utf-8 text form of the value
+EXT_DECIMAL = 1
+EXT_DATETIME = 2
+EXT_DATE = 3
+EXT_TIME = 4
+
+_msgpack = None
+
+
+def _load_msgpack():
+    global _msgpack
+    if _msgpack is None:
+        import msgpack
+        _msgpack = msgpack
+    return _msgpack
+
+
+def msgpack_available() -> bool:
+    try:
+        _load_msgpack()
+    except ImportError:
+        return False
+    return True
+
+
+def msgpack_default(obj):
+    msgpack = _load_msgpack()
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(obj).encode("utf-8"))
+    # datetime before date, a datetime is a date as well
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(EXT_DATE, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, datetime.time):
+        return msgpack.ExtType(EXT_TIME, obj.isoformat().encode("utf-8"))
+    raise TypeError(f"Object of type {type(obj).__name__} is not msgpack serializable")
+
+
+def msgpack_ext_hook(code: int, data: bytes):
+    text = data.decode("utf-8")
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(text)
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(text)
+    if code == EXT_DATE:
+        return datetime.date.fromisoformat(text)
+    if code == EXT_TIME:
+        return datetime.time.fromisoformat(text)
+    return _load_msgpack().ExtType(code, data)
+
+
+_CONTAINERS = (dict, list, tuple)
+
+
+def _sorted_keys(obj):
+    # scalars are taken as they are, only nested maps / arrays are rebuilt
+    if isinstance(obj, dict):
+        return {key: _sorted_keys(obj[key]) if isinstance(obj[key], _CONTAINERS) else obj[key] for key in sorted(obj)}
+    return [_sorted_keys(value) if isinstance(value, _CONTAINERS) else value for value in obj]
+
+
+def canonical_msgpack_bytes(obj) -> bytes:
+    """
+    Canonical MessagePack bytes of a record (or a columnar value row).
+    """
+    if isinstance(obj, _CONTAINERS):
+        obj = _sorted_keys(obj)
+    return _load_msgpack().packb(obj, default=msgpack_default, use_bin_type=True, datetime=False)
+
+
+def packb(obj) -> bytes:
+    """
+    Plain (not canonical) MessagePack bytes, e.g. the raw rows handed over to the encode pool.
+    """
+    return _load_msgpack().packb(obj, default=msgpack_default, use_bin_type=True, datetime=False)
+
+
+def unpackb(data: bytes) -> Any:
+    return _load_msgpack().unpackb(data, ext_hook=msgpack_ext_hook, raw=False, strict_map_key=False)
+
+
+def map_prefix(fields: Dict[str, Any], key: str, items: int) -> bytes:
+    """
+    Start of a map made of fields plus one last key whose value is an array of items elements,
+    the elements are appended right after it (already encoded).
+    """
+    packer = _load_msgpack().Packer(default=msgpack_default, use_bin_type=True, datetime=False)
+    prefix = bytearray(packer.pack_map_header(len(fields) + 1))
+    for name, value in fields.items():
+        prefix += packer.pack(name)
+        prefix += packer.pack(value)
+    prefix += packer.pack(key)
+    prefix += packer.pack_array_header(items)
+    return bytes(prefix)
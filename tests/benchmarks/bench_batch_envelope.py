@@ -0,0 +1,48 @@
+"""
+Batch envelope benchmark : many small chunks per callback request vs one request per chunk.
+"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, Timer, report
+
+RECORDS = 20000
+CHUNK_SIZE_BY_RECORDS = 10
+
+
+async def run(source, state_db, ingestion_id, batch_size):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=CHUNK_SIZE_BY_RECORDS,
+        batch_size=batch_size,
+    )
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, mock_pim_core_transport():
+        source = write_json_source(Path(tmp) / "source.json", RECORDS)
+        for batch_size in (None, 10, 50, 100):
+            with Timer() as timer:
+                asyncio.run(run(source, str(Path(tmp) / "state.db"), f"bench-batch-{batch_size}", batch_size))
+            chunks = RECORDS // CHUNK_SIZE_BY_RECORDS
+            rows.append({
+                "batch_size": batch_size or 1,
+                "callback_requests": -(-chunks // (batch_size or 1)),
+                "seconds": round(timer.seconds, 3),
+                "records_per_second": int(RECORDS / timer.seconds),
+            })
+    report(f"batch envelope | records={RECORDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+CSV reader benchmark : records/s of a whole ingestion of the same table as a csv file (in-process, and byte ranges
+parsed by the encode pool) and as an xlsx workbook with shared strings (the way Excel writes text cells).
+
+Chunks go to the null:// sink, so the numbers are read + parse + encode + checksum of the service, not the transport.
+"""
+import asyncio
+import csv
+import os
+import tempfile
+from pathlib import Path
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import shutdown_pool
+from app.services.csv_reader import CsvIngestionService
+from app.services.excel_reader import ExcelIngestionService
+from app.services.ingestion_state_store import IngestionStateStore
+
+from tests.benchmarks.harness import write_shared_strings_xlsx, Timer, report
+
+RECORDS = 100000
+FIELDS = 10
+CHUNK_SIZE_BY_RECORDS = 1000
+POOL_WORKERS = (2, 4)
+
+
+def table():
+    yield ["sku"] + [f"attribute_{j}" for j in range(FIELDS)]
+    for i in range(RECORDS):
+        yield [f"SKU-{i}"] + [f"value {i}-{j}" for j in range(FIELDS)]
+
+
+def write_csv(path: Path) -> str:
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(table())
+    return str(path)
+
+
+def write_xlsx(path: Path) -> str:
+    strings = {}
+
+    def index(text):
+        return strings.setdefault(text, len(strings))
+
+    rows = [[index(text) for text in row] for row in table()]
+    return write_shared_strings_xlsx(path, strings, rows)
+
+
+def ingest(service, state_db, ingestion_id, source, file_type):
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(file_path=source, file_type=file_type, callback_url="null://", chunk_size_by_records=CHUNK_SIZE_BY_RECORDS)
+    with Timer() as timer:
+        asyncio.run(service.stream_and_push(ingestion_id, request))
+    return timer.seconds
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_source = write_csv(Path(tmp) / "source.csv")
+        xlsx_source = write_xlsx(Path(tmp) / "source.xlsx")
+        state_db = str(Path(tmp) / "state.db")
+
+        xlsx_seconds = ingest(ExcelIngestionService(), state_db, "bench-xlsx", xlsx_source, "excel")
+        runs = [("xlsx", 0, xlsx_seconds), ("csv", 0, ingest(CsvIngestionService(), state_db, "bench-csv", csv_source, "csv"))]
+        for workers in POOL_WORKERS:
+            os.environ["INGESTION_ENCODE_POOL_WORKERS"] = str(workers)
+            try:
+                # the first run starts the pool processes
+                ingest(CsvIngestionService(), state_db, f"bench-csv-warmup-{workers}", csv_source, "csv")
+                runs.append(("csv", workers, ingest(CsvIngestionService(), state_db, f"bench-csv-{workers}", csv_source, "csv")))
+            finally:
+                del os.environ["INGESTION_ENCODE_POOL_WORKERS"]
+                shutdown_pool()
+
+        for source, workers, seconds in runs:
+            rows.append({
+                "source": source,
+                "pool_workers": workers,
+                "seconds": round(seconds, 3),
+                "records_s": round(RECORDS / seconds),
+                "vs_xlsx": f"{xlsx_seconds / seconds:.1f}x",
+            })
+        report(f"csv reader | records={RECORDS} | fields={FIELDS + 1} | csv {round(os.path.getsize(csv_source) / 1024 / 1024, 1)} MB | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Fair sharing benchmark : CATALOGUES big catalogue feeds and PRICE_FEEDS small price feeds sent at the same time to one
+callback host limited to BYTES_PER_SECOND (token bucket) :
+- fifo : one queue for every ingestion, in arrival order (the host queue before weighted fair queuing)
+- fair : weighted fair queuing, every feed at priority 1
+- fair + priority : the price feeds at priority 10
+
+Reports the overall throughput (request MB/s over the whole run) and the completion time of the small price feeds,
+which are started after the catalogues, when the host is already busy.
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.core.config import MicroServiceConfigurations
+from app.schemas.request_model import IngestionRequest
+from app.services.callback_host_controller import CallbackHostController, callback_hosts
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, report
+
+CATALOGUES = 8
+CATALOGUE_RECORDS = 20000
+CATALOGUE_CHUNK_SIZE_BY_RECORDS = 2000
+PRICE_FEEDS = 4
+PRICE_RECORDS = 1000
+PRICE_CHUNK_SIZE_BY_RECORDS = 500
+BYTES_PER_SECOND = 4 * 1024 * 1024
+PRICE_FEEDS_DELAY_SECONDS = 1.0
+# variant : (one queue for every ingestion, priority of the price feeds)
+VARIANTS = {"fifo": (True, 1), "fair": (False, 1), "fair + priority 10": (False, 10)}
+
+fair_slot = CallbackHostController.slot
+
+
+def fifo_slot(self, flow: str = "", weight: float = 1.0, cost: int = 1):
+    # every request in the same flow : served in arrival order
+    return fair_slot(self, "", 1.0, cost)
+
+
+async def ingest(source, state_db, ingestion_id, chunk_size_by_records, priority, delay):
+    # completion time counts from when the feed was submitted, waiting for the event loop included
+    submitted = time.perf_counter() + delay
+    await asyncio.sleep(delay)
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=chunk_size_by_records,
+        priority=priority,
+    )
+    await service.stream_and_push(ingestion_id, request)
+    return time.perf_counter() - submitted
+
+
+async def run(catalogue, prices, state_db, variant, price_priority):
+    jobs = [ingest(catalogue, state_db, f"{variant}-catalogue-{i}", CATALOGUE_CHUNK_SIZE_BY_RECORDS, 1, 0) for i in range(CATALOGUES)]
+    jobs += [
+        ingest(prices, state_db, f"{variant}-prices-{i}", PRICE_CHUNK_SIZE_BY_RECORDS, price_priority, PRICE_FEEDS_DELAY_SECONDS)
+        for i in range(PRICE_FEEDS)
+    ]
+    seconds = await asyncio.gather(*jobs)
+    return seconds[:CATALOGUES], seconds[CATALOGUES:]
+
+
+def main():
+    os.environ[MicroServiceConfigurations.CALLBACK_BYTES_PER_SECOND_ENV.value] = str(BYTES_PER_SECOND)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        catalogue = write_json_source(Path(tmp) / "catalogue.json", CATALOGUE_RECORDS)
+        prices = write_json_source(Path(tmp) / "prices.json", PRICE_RECORDS, fields=2)
+        for variant, (fifo, price_priority) in VARIANTS.items():
+            # a fresh host controller (token bucket, AIMD limit) per variant
+            callback_hosts.hosts = {}
+            CallbackHostController.slot = fifo_slot if fifo else fair_slot
+            traffic = {}
+            started = time.perf_counter()
+            try:
+                with mock_pim_core_transport(traffic=traffic):
+                    catalogue_seconds, price_seconds = asyncio.run(run(catalogue, prices, str(Path(tmp) / "state.db"), variant, price_priority))
+            finally:
+                CallbackHostController.slot = fair_slot
+            seconds = time.perf_counter() - started
+            rows.append({
+                "variant": variant,
+                "throughput_mb_s": round(traffic["bytes"] / 1024 / 1024 / seconds, 2),
+                "price_feeds_median_seconds": round(statistics.median(price_seconds), 2),
+                "price_feeds_max_seconds": round(max(price_seconds), 2),
+                "catalogues_max_seconds": round(max(catalogue_seconds), 2),
+            })
+    report(
+        f"fair sharing | catalogues={CATALOGUES}x{CATALOGUE_RECORDS} | price feeds={PRICE_FEEDS}x{PRICE_RECORDS} | "
+        f"host limit={BYTES_PER_SECOND // 1024 // 1024} MB/s",
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+JSON source benchmark : raw read MB/s and read + parse MB/s (ijson, C backend) of a local json file opened through
+fsspec vs memory-mapped (open_json_source), for a few parser buffer sizes.
+
+The file is read once before measuring, every run reads it from the page cache : the numbers compare the read paths,
+not the disk. On a cold cache the disk (NVMe or not) is in the measure for both paths alike.
+"""
+import os
+import statistics
+import tempfile
+from pathlib import Path
+
+import fsspec
+import ijson
+
+from app.core.config import MicroServiceConfigurations
+from app.services.json_source import open_json_source
+
+from tests.benchmarks.harness import write_json_source, Timer, report
+
+RECORDS = 200000
+FIELDS = 10
+RUNS = 5
+BUFFER_SIZES = (16 * 1024, MicroServiceConfigurations.JSON_READ_BUFFER_BYTES.value, 1024 * 1024)
+
+
+def fsspec_open(fs, path):
+    return fs.open(path, "rb")
+
+
+def raw_read(opener, fs, path, buffer_size) -> None:
+    with opener(fs, path) as f:
+        while f.read(buffer_size):
+            pass
+
+
+def read_and_parse(opener, fs, path, buffer_size) -> None:
+    with opener(fs, path) as f:
+        for _ in ijson.items(f, "item", buf_size=buffer_size):
+            pass
+
+
+def median_seconds(measure, *args) -> float:
+    seconds = []
+    for _ in range(RUNS):
+        with Timer() as timer:
+            measure(*args)
+        seconds.append(timer.seconds)
+    return statistics.median(seconds)
+
+
+def main():
+    fs = fsspec.filesystem("file")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_json_source(Path(tmp) / "source.json", RECORDS, FIELDS)
+        mb = os.path.getsize(path) / 1024 / 1024
+        # warm the page cache
+        raw_read(fsspec_open, fs, path, 1024 * 1024)
+        for buffer_size in BUFFER_SIZES:
+            for name, opener in (("fsspec", fsspec_open), ("mmap", open_json_source)):
+                rows.append({
+                    "path": name,
+                    "buffer_kb": buffer_size // 1024,
+                    "read_mb_s": round(mb / median_seconds(raw_read, opener, fs, path, buffer_size)),
+                    "read_parse_mb_s": round(mb / median_seconds(read_and_parse, opener, fs, path, buffer_size), 1),
+                })
+    report(f"json source | {round(mb, 1)} MB | records={RECORDS} | ijson backend={ijson.backend} | runs={RUNS}", rows)
+
+
+if __name__ == "__main__":
+    main()
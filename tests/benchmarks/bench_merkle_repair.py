@@ -0,0 +1,99 @@
+"""
+Merkle repair benchmark : bytes sent again when the network damages one record of every DAMAGED_EVERY-th chunk,
+with integrity_mode checksum (pim-core NACKs, the whole chunk is resent) vs merkle (pim-core names the damaged
+record, only that record is resent in a repair message).
+
+The damage is done by the transport in front of the mock pim-core on the first delivery of a chunk : one byte of
+the first record is changed, the body keeps its length and stays valid JSON.
+"""
+import asyncio
+import re
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from app.schemas.request_model import IngestionRequest
+from app.services import callback_host_controller
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import SlowASGITransport, mock_pim_core_transport, write_json_source, Timer, report
+
+RECORDS = 50000
+FIELDS = 10
+CHUNK_SIZE_BY_RECORDS = 500
+DAMAGED_EVERY = 10
+
+
+class DamagingASGITransport(SlowASGITransport):
+    """
+    Damages the first record of every DAMAGED_EVERY-th chunk the first time it is sent.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.damaged = set()
+
+    async def handle_async_request(self, request):
+        body = b"".join([fragment async for fragment in request.stream])
+        chunk_number = re.search(rb'"chunk_number":(\d+)', body)
+        if chunk_number and b'"records":[' in body:
+            chunk_number = int(chunk_number.group(1))
+            if chunk_number % DAMAGED_EVERY == DAMAGED_EVERY - 1 and chunk_number not in self.damaged:
+                self.damaged.add(chunk_number)
+                body = body.replace(b'"value ', b'"valuE ', 1)
+        request = httpx.Request(request.method, request.url, headers=request.headers, content=body)
+        return await super().handle_async_request(request)
+
+
+async def run(source, state_db, ingestion_id, integrity_mode):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=CHUNK_SIZE_BY_RECORDS,
+        integrity_mode=integrity_mode,
+    )
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    # no backoff sleeps between a NACK and the next attempt, the benchmark measures bytes
+    callback_host_controller.BACKOFF_BASE_SECONDS = 0
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_json_source(Path(tmp) / "source.json", RECORDS, FIELDS)
+        for integrity_mode in ("checksum", "merkle"):
+            results = {}
+            for damaged in (False, True):
+                traffic = {}
+                with mock_pim_core_transport(traffic=traffic) as mock, Timer() as timer:
+                    if damaged:
+                        original_client = httpx.AsyncClient
+
+                        class DamagingClient(original_client):
+                            def __init__(self, *args, **kwargs):
+                                super().__init__(*args, **kwargs)
+                                self._transport = DamagingASGITransport(app=mock.app, traffic=traffic)
+
+                        httpx.AsyncClient = DamagingClient
+                    try:
+                        asyncio.run(run(source, str(Path(tmp) / "state.db"), f"bench-{integrity_mode}-{damaged}", integrity_mode))
+                    finally:
+                        if damaged:
+                            httpx.AsyncClient = original_client
+                results[damaged] = (traffic, timer.seconds)
+            clean, damaged = results[False][0], results[True][0]
+            rows.append({
+                "integrity_mode": integrity_mode,
+                "wire_mb": round(clean["bytes"] / 1024 / 1024, 2),
+                "resent_kb": round((damaged["bytes"] - clean["bytes"]) / 1024, 1),
+                "extra_requests": damaged["requests"] - clean["requests"],
+                "seconds_damaged": round(results[True][1], 3),
+            })
+    report(f"merkle repair | records={RECORDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS} | damaged=1 record of every {DAMAGED_EVERY}th chunk", rows)
+
+
+if __name__ == "__main__":
+    main()
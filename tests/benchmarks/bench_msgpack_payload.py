@@ -0,0 +1,95 @@
+"""
+MessagePack payload benchmark : wire size and time of a json source sent with payload_encoding json vs msgpack,
+then encoding (canonical bytes + checksum, the service side) and decoding (the pim-core side) of the same records.
+
+The prices of the source are Decimal values (ijson), json sends them as floats, msgpack as exact extension types.
+"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+import ijson
+import orjson
+
+from app.schemas.request_model import IngestionRequest
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+from app.utils.msgpack_codec import unpackb
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, Timer, report
+
+RECORDS = 50000
+FIELDS = 10
+CHUNK_SIZE_BY_RECORDS = 500
+
+
+async def run(source, state_db, ingestion_id, payload_encoding):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=CHUNK_SIZE_BY_RECORDS,
+        payload_encoding=payload_encoding,
+    )
+    await service.stream_and_push(ingestion_id, request)
+
+
+def encode_and_decode(records, payload_encoding) -> dict:
+    encode_record = ChunkIntegrityManager.record_encoder(payload_encoding)
+    separator = b"" if payload_encoding == "msgpack" else b","
+    chunks = []
+    with Timer() as encode_timer:
+        for start in range(0, len(records), CHUNK_SIZE_BY_RECORDS):
+            chunk_checksum = ChunkIntegrityManager.new_checksum("sha256", encoding=payload_encoding)
+            fragments = []
+            for record in records[start:start + CHUNK_SIZE_BY_RECORDS]:
+                canonical_record = encode_record(record)
+                chunk_checksum.update(canonical_record)
+                fragments.append(canonical_record)
+            chunk_checksum.hexdigest()
+            chunks.append(separator.join(fragments))
+    # the records array of every chunk, as pim-core receives it
+    if payload_encoding == "msgpack":
+        bodies = [bytes([0xdc]) + CHUNK_SIZE_BY_RECORDS.to_bytes(2, "big") + chunk for chunk in chunks]
+        decode = unpackb
+    else:
+        bodies = [b"[" + chunk + b"]" for chunk in chunks]
+        decode = orjson.loads
+    with Timer() as decode_timer:
+        for body in bodies:
+            decode(body)
+    return {
+        "payload_encoding": payload_encoding,
+        "encode_seconds": round(encode_timer.seconds, 3),
+        "decode_seconds": round(decode_timer.seconds, 3),
+        "records_mb": round(sum(len(body) for body in bodies) / 1024 / 1024, 2),
+    }
+
+
+def main():
+    rows = []
+    codec_rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_json_source(Path(tmp) / "source.json", RECORDS, FIELDS)
+        for payload_encoding in ("json", "msgpack"):
+            traffic = {}
+            with mock_pim_core_transport(traffic=traffic), Timer() as timer:
+                asyncio.run(run(source, str(Path(tmp) / "state.db"), f"bench-{payload_encoding}", payload_encoding))
+            rows.append({
+                "payload_encoding": payload_encoding,
+                "seconds": round(timer.seconds, 3),
+                "records_per_second": int(RECORDS / timer.seconds),
+                "wire_mb": round(traffic["bytes"] / 1024 / 1024, 2),
+            })
+        with open(source, "rb") as f:
+            records = list(ijson.items(f, "item"))
+        for payload_encoding in ("json", "msgpack"):
+            codec_rows.append(encode_and_decode(records, payload_encoding))
+    report(f"payload encoding, end to end | records={RECORDS} | fields={FIELDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+    report("payload encoding, encode (canonical bytes + checksum) and decode of the records", codec_rows)
+
+
+if __name__ == "__main__":
+    main()
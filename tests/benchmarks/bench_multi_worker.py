@@ -0,0 +1,79 @@
+"""
+Multi-worker load test : N worker processes share one state store and claim queued ingestions through leases.
+
+Every callback request waits PIM_CORE_LATENCY_SECONDS (pim-core committing the chunk) and a worker runs one ingestion
+at a time, so the throughput should grow roughly linearly with the number of workers.
+"""
+import asyncio
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.ingestion_supervisor import IngestionSupervisor
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, Timer, report
+
+INGESTIONS = 8
+RECORDS = 2000
+CHUNK_SIZE_BY_RECORDS = 100
+PIM_CORE_LATENCY_SECONDS = 0.02
+WORKERS = (1, 2, 4)
+
+
+async def work(state_db):
+    supervisor = IngestionSupervisor()
+    supervisor._state_store = IngestionStateStore(db_path=state_db)
+    supervisor.max_ingestions = 1
+    # claim until the queue is drained
+    while True:
+        supervisor.resume_in_progress()
+        if not supervisor.tasks:
+            return
+        await asyncio.wait(list(supervisor.tasks.values()))
+
+
+def worker_process(state_db):
+    with mock_pim_core_transport(latency_seconds=PIM_CORE_LATENCY_SECONDS):
+        asyncio.run(work(state_db))
+
+
+def enqueue(state_db, sources):
+    store = IngestionStateStore(db_path=state_db)
+    for index, source in enumerate(sources):
+        request = IngestionRequest(file_path=source, callback_url="http://pim-core/callback", chunk_size_by_records=CHUNK_SIZE_BY_RECORDS)
+        store.register(f"bench-worker-{index}", request.model_dump_json())
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = [write_json_source(Path(tmp) / f"source-{index}.json", RECORDS) for index in range(INGESTIONS)]
+        for workers in WORKERS:
+            state_db = str(Path(tmp) / f"state-{workers}.db")
+            enqueue(state_db, sources)
+            processes = [multiprocessing.Process(target=worker_process, args=(state_db,)) for _ in range(workers)]
+            with Timer() as timer:
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+            completed = sum(
+                IngestionStateStore(db_path=state_db).get_state(f"bench-worker-{index}")["status"] == "COMPLETED"
+                for index in range(INGESTIONS)
+            )
+            rows.append({
+                "workers": workers,
+                "completed": f"{completed}/{INGESTIONS}",
+                "seconds": round(timer.seconds, 3),
+                "records_per_second": int(INGESTIONS * RECORDS / timer.seconds),
+            })
+    report(
+        f"multi-worker | ingestions={INGESTIONS} | records={RECORDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS} | pim_core_latency={PIM_CORE_LATENCY_SECONDS}s",
+        rows
+    )
+
+
+if __name__ == "__main__":
+    main()
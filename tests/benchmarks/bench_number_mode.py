@@ -0,0 +1,78 @@
+"""
+Number mode benchmark : parse + canonical encoding + checksum of a price-heavy json feed (every attribute a
+non-integer number) with number_mode decimal (ijson Decimal, orjson default callback per value), float (ijson floats,
+no callback) and decimal_string (Decimal sent as its exact text), then the whole ingestion of the feed per mode.
+"""
+import asyncio
+import io
+import json
+import tempfile
+from pathlib import Path
+
+import ijson
+
+from app.schemas.request_model import IngestionRequest
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, Timer, report
+
+RECORDS = 50000
+PRICES = 20
+CHUNK_SIZE_BY_RECORDS = 500
+NUMBER_MODES = ("decimal", "float", "decimal_string")
+
+
+def write_price_feed(path: Path) -> str:
+    with open(path, "w") as f:
+        json.dump([{"sku": f"SKU-{i}", **{f"price_{j}": round(i * 0.37 + j * 1.01, 2) for j in range(PRICES)}} for i in range(RECORDS)], f)
+    return str(path)
+
+
+def parse_and_encode(data: bytes, number_mode: str) -> dict:
+    encode_record = ChunkIntegrityManager.record_encoder("json", number_mode)
+    with Timer() as parse_timer:
+        records = list(ijson.items(io.BytesIO(data), "item", use_float=number_mode == "float"))
+    with Timer() as encode_timer:
+        chunk_checksum = ChunkIntegrityManager.new_checksum("sha256")
+        for record in records:
+            chunk_checksum.update(encode_record(record))
+        chunk_checksum.hexdigest()
+    return {"parse_seconds": parse_timer.seconds, "encode_seconds": encode_timer.seconds}
+
+
+async def ingest(source, state_db, ingestion_id, number_mode):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=CHUNK_SIZE_BY_RECORDS,
+        number_mode=number_mode,
+    )
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_price_feed(Path(tmp) / "prices.json")
+        data = Path(source).read_bytes()
+        for number_mode in NUMBER_MODES:
+            micro = parse_and_encode(data, number_mode)
+            traffic = {}
+            with mock_pim_core_transport(traffic=traffic), Timer() as timer:
+                asyncio.run(ingest(source, str(Path(tmp) / "state.db"), f"bench-{number_mode}", number_mode))
+            rows.append({
+                "number_mode": number_mode,
+                "parse_seconds": round(micro["parse_seconds"], 3),
+                "encode_checksum_seconds": round(micro["encode_seconds"], 3),
+                "ingestion_seconds": round(timer.seconds, 3),
+                "wire_mb": round(traffic["bytes"] / 1024 / 1024, 2),
+            })
+    report(f"number mode | records={RECORDS} | prices per record={PRICES} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Output sink benchmark : MB/s of a whole json ingestion per sink, null:// (read + parse + serialize ceiling of the
+service), file:/// NDJSON and spooled files with and without fsync, and http to the in-process mock pim-core.
+
+The sinks write into a temporary directory, the fsync rows measure the disk it lives on.
+"""
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+from app.core.config import MicroServiceConfigurations
+from app.schemas.request_model import IngestionRequest
+from app.services import chunk_sinks
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, Timer, report
+
+RECORDS = 100000
+FIELDS = 10
+CHUNK_SIZE_BY_RECORDS = 1000
+
+
+class NoFsyncConfigurations:
+    FILE_SINK_FSYNC = type("Value", (), {"value": False})
+    STREAM_FRAGMENT_BYTES = MicroServiceConfigurations.STREAM_FRAGMENT_BYTES
+
+
+async def ingest(source, state_db, ingestion_id, callback_url):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(file_path=source, callback_url=callback_url, chunk_size_by_records=CHUNK_SIZE_BY_RECORDS)
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_json_source(Path(tmp) / "source.json", RECORDS, FIELDS)
+        mb = os.path.getsize(source) / 1024 / 1024
+        out = Path(tmp) / "out"
+        sinks = (
+            ("null", "null://", True),
+            ("file ndjson", f"file://{out}", True),
+            ("file ndjson, no fsync", f"file://{out}", False),
+            ("file spooled", f"file://{out}?format=files", True),
+            ("http mock pim-core", "http://pim-core/callback", True),
+        )
+        for number, (name, callback_url, fsync) in enumerate(sinks):
+            configurations = chunk_sinks.MicroServiceConfigurations
+            if not fsync:
+                chunk_sinks.MicroServiceConfigurations = NoFsyncConfigurations
+            try:
+                with mock_pim_core_transport(), Timer() as timer:
+                    asyncio.run(ingest(source, str(Path(tmp) / "state.db"), f"bench-{number}", callback_url))
+            finally:
+                chunk_sinks.MicroServiceConfigurations = configurations
+            rows.append({"sink": name, "fsync": fsync if name.startswith("file") else "-", "seconds": round(timer.seconds, 3), "mb_s": round(mb / timer.seconds, 1)})
+    report(f"output sinks | {round(mb, 1)} MB | records={RECORDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Reconciliation benchmark : time and bytes to bring pim-core back in sync after it rolled back the last LOST_PERCENT
+of the chunks of an ingestion, full re_ingestion (every chunk under a new ingestion_id) vs POST /reconcile path
+(resend_chunks : records before the first lost chunk are parsed and skipped, only the lost chunks are rebuilt and sent).
+
+The rollback is done on the mock pim-core : the lost chunk_ids are forgotten and its chunk sequence is moved back.
+"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_ledger import chunks_to_resend, resend_chunks
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, write_json_source, Timer, report
+
+RECORDS = 100000
+FIELDS = 10
+CHUNK_SIZE_BY_RECORDS = 1000
+LOST_PERCENT = (1, 10, 50)
+
+
+def rollback(mock, ledger, lost):
+    """
+    pim-core loses the last lost chunks of the ingestion.
+    """
+    validator = mock.chunk_validator
+    kept = ledger[:-lost]
+    for chunk in ledger[-lost:]:
+        validator.processed_chunks.discard(chunk["chunk_id"])
+    validator.last_chunk_number[ledger[0]["chunk_id"].rsplit(":", 1)[0]] = kept[-1]["chunk_number"] if kept else -1
+    return {chunk["chunk_id"]: chunk["checksum"] for chunk in kept}
+
+
+async def ingest(service, ingestion_id, request):
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_json_source(Path(tmp) / "source.json", RECORDS, FIELDS)
+        request = IngestionRequest(file_path=source, callback_url="http://pim-core/callback", chunk_size_by_records=CHUNK_SIZE_BY_RECORDS)
+        service = JsonIngestionService()
+        service.state_store = IngestionStateStore(db_path=str(Path(tmp) / "state.db"))
+        for lost_percent in LOST_PERCENT:
+            ingestion_id = f"bench-{lost_percent}"
+            traffic = {}
+            with mock_pim_core_transport(traffic=traffic) as mock:
+                asyncio.run(ingest(service, ingestion_id, request))
+                ledger = service.state_store.get_ledger(ingestion_id)
+                lost = max(1, len(ledger) * lost_percent // 100)
+
+                traffic.clear()
+                with Timer() as full:
+                    asyncio.run(ingest(service, f"{ingestion_id}-re-ingestion", request))
+                full_bytes = traffic["bytes"]
+
+                held = rollback(mock, ledger, lost)
+                traffic.clear()
+                with Timer() as reconcile:
+                    asyncio.run(resend_chunks(service, ingestion_id, request, chunks_to_resend(ledger, held)))
+            rows.append({
+                "lost_chunks": f"{lost}/{len(ledger)}",
+                "re_ingestion_seconds": round(full.seconds, 3),
+                "re_ingestion_mb": round(full_bytes / 1024 / 1024, 2),
+                "reconcile_seconds": round(reconcile.seconds, 3),
+                "reconcile_mb": round(traffic["bytes"] / 1024 / 1024, 2),
+            })
+    report(f"reconciliation | records={RECORDS} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
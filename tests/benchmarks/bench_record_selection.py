@@ -0,0 +1,82 @@
+"""
+Record selection benchmark : a supplier feed with 400 attributes per record ingested whole, with fields (30 attributes)
+and with fields + filter (a third of the records discontinued).
+
+Left out fields and filtered records are dropped right after parsing, they are never encoded, checksummed or sent.
+"""
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_metrics import ingestion_metrics
+from app.services.ingestion_state_store import IngestionStateStore
+from app.services.json_reader import JsonIngestionService
+
+from tests.benchmarks.harness import mock_pim_core_transport, Timer, report
+
+RECORDS = 5000
+ATTRIBUTES = 400
+KEPT_ATTRIBUTES = 30
+CHUNK_SIZE_BY_RECORDS = 500
+
+VARIANTS = {
+    "everything": {},
+    "fields": {"fields": {"include": ["sku", "status"] + [f"attribute_{j}" for j in range(KEPT_ATTRIBUTES)]}},
+    "fields+filter": {
+        "fields": {"include": ["sku", "status"] + [f"attribute_{j}" for j in range(KEPT_ATTRIBUTES)]},
+        "filter": 'status != "discontinued"',
+    },
+}
+
+
+def write_feed(path: Path) -> str:
+    with open(path, "w") as f:
+        json.dump(
+            [
+                {
+                    "sku": f"SKU-{i}",
+                    "status": "discontinued" if i % 3 == 0 else "active",
+                    **{f"attribute_{j}": f"value {i}-{j}" for j in range(ATTRIBUTES)},
+                }
+                for i in range(RECORDS)
+            ],
+            f,
+        )
+    return str(path)
+
+
+async def run(source, state_db, ingestion_id, selection):
+    service = JsonIngestionService()
+    service.state_store = IngestionStateStore(db_path=state_db)
+    request = IngestionRequest(
+        file_path=source,
+        callback_url="http://pim-core/callback",
+        chunk_size_by_records=CHUNK_SIZE_BY_RECORDS,
+        **selection,
+    )
+    await service.stream_and_push(ingestion_id, request)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source = write_feed(Path(tmp) / "feed.json")
+        for name, selection in VARIANTS.items():
+            traffic = {}
+            with mock_pim_core_transport(traffic=traffic), Timer() as timer:
+                asyncio.run(run(source, str(Path(tmp) / "state.db"), f"bench-{name}", selection))
+            metrics = ingestion_metrics.for_ingestion(f"bench-{name}")
+            rows.append({
+                "variant": name,
+                "seconds": round(timer.seconds, 3),
+                "wire_mb": round(traffic["bytes"] / 1024 / 1024, 2),
+                "records_filtered": int(metrics.get("records_filtered", 0)),
+                "bytes_saved_mb": round(metrics.get("bytes_saved", 0) / 1024 / 1024, 2),
+            })
+    report(f"record selection | records={RECORDS} | attributes={ATTRIBUTES} | kept={KEPT_ATTRIBUTES} | chunk_size_by_records={CHUNK_SIZE_BY_RECORDS}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared-strings benchmark : peak memory of opening a workbook with millions of unique strings and reading its first rows,
+openpyxl's in-memory list vs the table spilled to memory-mapped files.
+
+Every variant runs in a fresh process, peak RSS is the process high-water mark (ru_maxrss).
+python -m tests.benchmarks.bench_shared_strings [unique_strings]   (default 5000000)
+"""
+import multiprocessing
+import resource
+import sys
+import tempfile
+from pathlib import Path
+
+from tests.benchmarks.harness import write_shared_strings_xlsx, Timer, report
+
+UNIQUE_STRINGS = 5_000_000
+COLUMNS = 5
+ROWS_READ = 1000
+
+
+def measure(variant: str, path: str, results) -> None:
+    import openpyxl
+    from app.services.excel_shared_strings import load_workbook
+
+    loader = openpyxl.load_workbook if variant == "openpyxl" else load_workbook
+    before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with Timer() as timer:
+        wb = loader(filename=path, read_only=True, data_only=True)
+        for index, _ in enumerate(wb.active.iter_rows(values_only=True)):
+            if index >= ROWS_READ:
+                break
+        wb.close()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({
+        "variant": variant,
+        "seconds_to_first_rows": round(timer.seconds, 2),
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "peak_rss_growth_mb": round((peak_kb - before_kb) / 1024, 1),
+    })
+
+
+def main():
+    unique_strings = int(sys.argv[1]) if len(sys.argv) > 1 else UNIQUE_STRINGS
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_shared_strings_xlsx(
+            Path(tmp) / "unique_strings.xlsx",
+            (f"unique value {i:09d} of the shared strings table" for i in range(unique_strings)),
+            ([(row * COLUMNS + column) % unique_strings for column in range(COLUMNS)] for row in range(unique_strings // COLUMNS)),
+        )
+        for variant in ("openpyxl", "spilled"):
+            results = ctx.Queue()
+            process = ctx.Process(target=measure, args=(variant, path, results))
+            process.start()
+            rows.append(results.get())
+            process.join()
+    report(f"shared strings | unique_strings={unique_strings} | columns={COLUMNS} | rows_read={ROWS_READ}", rows)
+
+
+if __name__ == "__main__":
+    main()
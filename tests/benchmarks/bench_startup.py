@@ -0,0 +1,116 @@
+"""
+Cold start benchmark : import time of app.main and time to the first healthy /health of a fresh process, against a budget.
+
+The format engines (openpyxl, ijson), fsspec and httpx are imported on first use, not by app.main : the benchmark
+lists the heavy modules a bare import still loads and how long the deferred ones take, paid by the first ingestion.
+Every measure runs in a new interpreter, the state store is a throwaway SQLite database (INGESTION_STATE_STORE_URL)
+so no ingestion of the local state file is resumed. Exits with 1 when a median is over its budget,
+the budgets can be overridden with STARTUP_IMPORT_BUDGET_SECONDS / STARTUP_HEALTHY_BUDGET_SECONDS.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from tests.benchmarks.harness import report
+
+RUNS = 5
+IMPORT_BUDGET_SECONDS = float(os.environ.get("STARTUP_IMPORT_BUDGET_SECONDS", 1.5))
+HEALTHY_BUDGET_SECONDS = float(os.environ.get("STARTUP_HEALTHY_BUDGET_SECONDS", 3.0))
+DEFERRED_MODULES = ("openpyxl", "ijson", "fsspec", "httpx", "msgpack", "sqlalchemy")
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+IMPORT_APP = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "loaded": [name for name in %r if name in sys.modules]}))
+""" % (DEFERRED_MODULES,)
+
+IMPORT_DEFERRED = """
+import json, time
+started = time.perf_counter()
+import openpyxl, ijson, fsspec, httpx
+print(json.dumps({"seconds": time.perf_counter() - started}))
+"""
+
+# lifespan startup then GET /health straight through the ASGI app (no client library), the work uvicorn does before it answers
+FIRST_HEALTHY = """
+import asyncio
+import app.main
+
+async def first_health():
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http", "path": "/health",
+             "raw_path": b"/health", "query_string": b"", "root_path": "", "headers": [], "client": None, "server": None}
+    async with app.main.lifespan(app.main.app):
+        await app.main.app(scope, receive, send)
+        print(messages[0]["status"], flush=True)
+
+asyncio.run(first_health())
+"""
+
+
+def python(code: str, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def measure(env: dict) -> dict:
+    imports = [json.loads(python(IMPORT_APP, env).stdout) for _ in range(RUNS)]
+    deferred = [json.loads(python(IMPORT_DEFERRED, env).stdout)["seconds"] for _ in range(RUNS)]
+    healthy = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-c", FIRST_HEALTHY], cwd=PROJECT_DIR, env=env, stdout=subprocess.PIPE, text=True)
+        status = process.stdout.readline().strip()
+        healthy.append(time.perf_counter() - started)
+        process.wait()
+        if status != "200":
+            raise RuntimeError(f"/health answered {status!r}")
+    return {
+        "import_seconds": statistics.median(run["seconds"] for run in imports),
+        "loaded": sorted({name for run in imports for name in run["loaded"]}),
+        "deferred_seconds": statistics.median(deferred),
+        "healthy_seconds": statistics.median(healthy),
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "INGESTION_STATE_STORE_URL": f"sqlite:///{Path(tmp) / 'state.db'}"}
+        result = measure(env)
+    rows = [
+        {
+            "measure": "import app.main",
+            "median_seconds": round(result["import_seconds"], 3),
+            "budget_seconds": IMPORT_BUDGET_SECONDS,
+            "heavy_modules_loaded": ",".join(result["loaded"]) or "none",
+        },
+        {"measure": "deferred to first use (openpyxl, ijson, fsspec, httpx)", "median_seconds": round(result["deferred_seconds"], 3)},
+        {
+            "measure": "process start to first healthy /health",
+            "median_seconds": round(result["healthy_seconds"], 3),
+            "budget_seconds": HEALTHY_BUDGET_SECONDS,
+        },
+    ]
+    report(f"cold start | runs={RUNS}", rows)
+    over_budget = result["import_seconds"] > IMPORT_BUDGET_SECONDS or result["healthy_seconds"] > HEALTHY_BUDGET_SECONDS
+    if over_budget:
+        print("\ncold start over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
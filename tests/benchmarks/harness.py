@@ -0,0 +1,150 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks run the real ingestion services against the mock pim-core app in-process (httpx ASGI transport),
+so they measure the service and the protocol without a real network in the way.
+Run a benchmark from the project root, e.g. : python -m tests.benchmarks.bench_batch_envelope
+"""
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+import httpx
+
+MOCK_DIR = Path(__file__).resolve().parents[1] / "pim_core_mock_test"
+
+
+def load_mock_pim_core():
+    # the mock pim-core uses imports relative to its own directory
+    if str(MOCK_DIR) not in sys.path:
+        sys.path.insert(0, str(MOCK_DIR))
+    import pim_core_mock_test
+    return pim_core_mock_test
+
+
+class SlowASGITransport(httpx.ASGITransport):
+    """
+    ASGI transport that adds a fixed latency per request (time pim-core spends committing a chunk).
+    """
+    def __init__(self, *args, latency_seconds: float = 0.0, traffic: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency_seconds = latency_seconds
+        self.traffic = traffic
+
+    async def handle_async_request(self, request):
+        if self.traffic is not None:
+            # request bodies are streamed with a precomputed Content-Length
+            self.traffic["requests"] = self.traffic.get("requests", 0) + 1
+            self.traffic["bytes"] = self.traffic.get("bytes", 0) + int(request.headers.get("content-length", 0))
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return await super().handle_async_request(request)
+
+
+@contextlib.contextmanager
+def mock_pim_core_transport(latency_seconds: float = 0.0, traffic: Optional[dict] = None):
+    """
+    Routes every httpx.AsyncClient created inside the block to the in-process mock pim-core,
+    requests and request bytes are counted into traffic when it is given.
+    """
+    mock = load_mock_pim_core()
+    original_client = httpx.AsyncClient
+
+    class MockPimCoreClient(original_client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = SlowASGITransport(app=mock.app, latency_seconds=latency_seconds, traffic=traffic)
+            super().__init__(*args, **kwargs)
+
+    httpx.AsyncClient = MockPimCoreClient
+    try:
+        # the mock prints every chunk it receives
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield mock
+    finally:
+        httpx.AsyncClient = original_client
+
+
+def write_json_source(path: Path, records: int, fields: int = 10) -> str:
+    with open(path, "w") as f:
+        json.dump(
+            [{**{f"attribute_{j}": f"value {i}-{j}" for j in range(fields)}, "sku": f"SKU-{i}", "price": i * 1.25} for i in range(records)],
+            f
+        )
+    return str(path)
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def write_shared_strings_xlsx(path: Path, strings: Iterable[str], rows: Iterable[List[int]]) -> str:
+    """
+    Minimal xlsx whose cells all reference the shared-strings table, the way Excel writes text cells
+    (openpyxl writes inline strings). Every cell of rows is an index into strings, both are streamed to the file.
+    """
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/sharedStrings.xml", "w") as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">')
+            for text in strings:
+                f.write(f"<si><t>{escape(text)}</t></si>".encode("utf-8"))
+            f.write(b"</sst>")
+        with archive.open("xl/worksheets/sheet1.xml", "w") as f:
+            f.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            for row_number, row in enumerate(rows, start=1):
+                cells = "".join(f'<c t="s"><v>{index}</v></c>' for index in row)
+                f.write(f'<row r="{row_number}">{cells}</row>'.encode("utf-8"))
+            f.write(b"</sheetData></worksheet>")
+    return str(path)
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+
+
+def report(title: str, rows):
+    print(f"\n{title}")
+    for row in rows:
+        print("  " + " | ".join(f"{key}={value}" for key, value in row.items()))
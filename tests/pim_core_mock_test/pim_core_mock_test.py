@@ -7,7 +7,7 @@ from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.responses import JSONResponse
 
 # import response model
-from schemas.response_model import PimCoreCallBackResponse
+from schemas.response_model import PimCoreCallBackResponse, PimCoreBatchCallBackResponse
 
 # import chunk data integrity validator
 from services.chunk_data_integrity_validator import ChunkValidator
@@ -15,6 +15,9 @@ from services.chunk_data_integrity_validator import ChunkValidator
 # import error message from utils
 from utility.error_messages import ErrorMessages
 
+# msgpack chunks (payload_encoding=msgpack)
+from utility.msgpack_decoder import unpackb
+
 app = FastAPI()
 
 # chunk validator
@@ -22,10 +25,86 @@ chunk_validator = ChunkValidator()
 
 # new code with ACK/NACK implementation to make the ingestion pipeline resilient to failures
 total_records_recieved = 0
+
+def process_chunk(payload, encoding: str = "json") -> PimCoreCallBackResponse:
+    global total_records_recieved
+
+    # columnar chunks carry the header row once and the records as value rows
+    columnar = payload.get("payload_format") == "columnar"
+    records = payload.get("rows" if columnar else "records", [])
+
+    # integrity_mode=merkle : a repair message only carries the records named in the NACK, put them back in the chunk
+    if payload.get("repair"):
+        records = chunk_validator.repair(payload.get("chunk_id"), payload.get("leaf_indices", []), records)
+        if records is None:
+            return PimCoreCallBackResponse(
+                ack=False,
+                ingestion_id=payload.get("ingestion_id"),
+                chunk_number=payload.get("chunk_number"),
+                error=ErrorMessages.UNKNOWN_REPAIR_CHUNK.value
+            )
+        print(f">>>>> REPAIRED CHUNK <<<<< Chunk: {payload.get('chunk_number')}, Records repaired: {len(payload.get('leaf_indices', []))}")
+
+    # validate chunks recieved from the fast-api microservice
+    ack, chunk_validity_error = chunk_validator.validate(
+        ingestion_id=payload.get("ingestion_id"),
+        chunk_id=payload.get("chunk_id"),
+        chunk_number=payload.get("chunk_number"),
+        records=records,
+        checksum=payload.get("checksum"),
+        checksum_algorithm=payload.get("checksum_algorithm", "sha256"),
+        sheet=payload.get("sheet"),
+        columns=payload.get("columns") if columnar else None,
+        encoding=encoding,
+    )
+
+    ingestion_id = payload.get("ingestion_id")
+    chunk_number = payload.get("chunk_number")
+    
+    print(">>>>> RECEIVED CHUNK <<<<<")
+    total_records_recieved = total_records_recieved + len(records)
+    print(f"Ingestion: {ingestion_id}, Sheet: {payload.get('sheet')}, Chunk: {chunk_number}, Records: {len(records)}, Total_records_recieved : {total_records_recieved}")
+
+    # Simulate validation / processing
+    if not records:
+        return PimCoreCallBackResponse(
+            ack=False,
+            ingestion_id=ingestion_id,
+            chunk_number=chunk_number,
+            error=ErrorMessages.EMPTY_CHUNK.value
+        )
+    if chunk_validity_error:
+        # merkle chunks name the records that did not arrive intact, only those are sent again
+        mismatched_leaves = None
+        if chunk_validity_error == ErrorMessages.CHECKSUM_MISMATCH.value and payload.get("leaf_hashes"):
+            mismatched_leaves = chunk_validator.mismatched_leaves(
+                chunk_id=payload.get("chunk_id"),
+                records=records,
+                leaf_hashes=payload.get("leaf_hashes"),
+                merkle_root=payload.get("merkle_root"),
+                checksum_algorithm=payload.get("checksum_algorithm", "sha256"),
+                encoding=encoding,
+            )
+        return PimCoreCallBackResponse(
+            ack=False,
+            ingestion_id=ingestion_id,
+            chunk_number=chunk_number,
+            error=chunk_validity_error,
+            mismatched_leaves=mismatched_leaves
+        )
+
+    return PimCoreCallBackResponse(
+        ack=True,
+        ingestion_id=ingestion_id,
+        chunk_number=chunk_number
+    )
+
 @app.post("/callback")
 async def receive_chunk(request: Request) -> PimCoreCallBackResponse:
     global total_records_recieved
-    payload = await request.json()
+    # chunks are json or msgpack (payload_encoding), the completion event is always json
+    encoding = "msgpack" if request.headers.get("content-type") == "application/msgpack" else "json"
+    payload = unpackb(await request.body()) if encoding == "msgpack" else await request.json()
 
     if payload.get("status") == "COMPLETED":
         ingestion_id = payload.get("ingestion_id")
@@ -37,6 +116,8 @@ async def receive_chunk(request: Request) -> PimCoreCallBackResponse:
         print(f"Ingestion: {payload.get('ingestion_id')}")
         print(f"Total records: {payload.get('total_records')}")
         print(f"Last chunk: {payload.get('chunk_number')}")
+        if payload.get("sheets"):
+            print(f"Sheets: {payload.get('sheets')}")
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
@@ -47,52 +128,22 @@ async def receive_chunk(request: Request) -> PimCoreCallBackResponse:
             }
         )
 
-    # validate chunks recieved from the fast-api microservice
-    ack, chunk_validity_error = chunk_validator.validate(
-        ingestion_id=payload.get("ingestion_id"),
-        chunk_id=payload.get("chunk_id"),
-        chunk_number=payload.get("chunk_number"),
-        records=payload.get("records", []),
-        checksum=payload.get("checksum"),
-    )
-
-    ingestion_id = payload.get("ingestion_id")
-    chunk_number = payload.get("chunk_number")
-    records = payload.get("records", [])
-    
-    print(">>>>> RECEIVED CHUNK <<<<<")
-    total_records_recieved = total_records_recieved + len(records)
-    print(f"Ingestion: {ingestion_id}, Chunk: {chunk_number}, Records: {len(records)}, Total_records_recieved : {total_records_recieved}")
-
-    # Simulate validation / processing
-    if not records:
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content=PimCoreCallBackResponse(
-                ack=False,
-                ingestion_id=ingestion_id,
-                chunk_number=chunk_number,
-                error=ErrorMessages.EMPTY_CHUNK.value
-            ).model_dump()
-        )
-    if chunk_validity_error:
+    # batch mode : an ordered list of chunk envelopes, answered with one ACK/NACK per chunk
+    if "batch" in payload:
+        results = [process_chunk(envelope, encoding) for envelope in payload.get("batch", [])]
+        print(f">>>>> RECEIVED BATCH <<<<< Chunks: {len(results)}, ACKed: {sum(result.ack for result in results)}")
         return JSONResponse(
             status_code=status.HTTP_200_OK,
-            content=PimCoreCallBackResponse(
-                ack=False,
-                ingestion_id=ingestion_id,
-                chunk_number=chunk_number,
-                error=chunk_validity_error
+            content=PimCoreBatchCallBackResponse(
+                ack=all(result.ack for result in results),
+                ingestion_id=payload.get("ingestion_id"),
+                results=results
             ).model_dump()
         )
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
-        content=PimCoreCallBackResponse(
-            ack=True,
-            ingestion_id=ingestion_id,
-            chunk_number=chunk_number
-        ).model_dump()
+        content=process_chunk(payload, encoding).model_dump()
     )
 
 
@@ -102,4 +153,4 @@ async def receive_chunk(request: Request) -> PimCoreCallBackResponse:
 
 
 http://127.0.0.1:9000/callback
-"""
\ No newline at end of file
+"""
@@ -6,4 +6,10 @@ class PimCoreCallBackResponse(BaseModel):
     ingestion_id: str
     chunk_number : int 
     error : Optional[str] = None
-    
\ No newline at end of file
+    # integrity_mode=merkle : records of the chunk that have to be sent again in a repair message
+    mismatched_leaves : Optional[List[int]] = None
+    
+class PimCoreBatchCallBackResponse(BaseModel):
+    ack: bool
+    ingestion_id: str
+    results: List[PimCoreCallBackResponse]
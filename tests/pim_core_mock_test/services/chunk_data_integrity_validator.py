@@ -2,20 +2,42 @@
 The code below will validate if the data sent by the fast-api microservice is the exactly the same or not 
 """
 import hashlib
+import zlib
 import orjson
-from typing import Dict, Any, Set
+from typing import Dict, Any, List, Set
 
 # import error messages
 from utility.error_messages import ErrorMessages
 
 from utility.json_decimal_encoder import orjson_default
 
+from utility.msgpack_decoder import canonical_packb
+
 CANONICAL_OPTS = orjson.OPT_SORT_KEYS
 
+class Crc32Hash:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+# same set of checksum algorithms the fast-api microservice can negotiate
+CHECKSUM_ALGORITHMS = {
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+    "crc32": Crc32Hash,
+}
+
 class ChunkValidator:
     def __init__(self):
         self.processed_chunks: Set[str] = set()
         self.last_chunk_number: Dict[str, int] = {}
+        # integrity_mode=merkle : records of the chunks waiting for their repair message, by chunk_id
+        self.pending_repairs: Dict[str, list] = {}
 
     def canonical_dumps(self,obj) -> bytes:
         return orjson.dumps(
@@ -30,7 +52,11 @@ class ChunkValidator:
         chunk_id: str,
         chunk_number: int,
         records,
-        checksum: str
+        checksum: str,
+        checksum_algorithm: str = "sha256",
+        sheet: str | None = None,
+        columns: list | None = None,
+        encoding: str = "json"
     ) -> tuple[bool, str | None]:
         """
         Returns (ack, error_message)
@@ -40,21 +66,84 @@ class ChunkValidator:
         if chunk_id in self.processed_chunks:
             return True, None
 
-        # Out-of-order detection
-        last = self.last_chunk_number.get(ingestion_id, -1)
+        # Out-of-order detection (every sheet of a multi-sheet excel ingestion has its own chunk sequence)
+        sequence = f"{ingestion_id}:{sheet}" if sheet is not None else ingestion_id
+        last = self.last_chunk_number.get(sequence, -1)
         if chunk_number != last + 1:
             return False, ErrorMessages.OUT_OF_ORDER_CHUNK.value
 
         # Checksum validation
-        calculated = hashlib.sha256(
-            self.canonical_dumps(records)
-        ).hexdigest()
+        if checksum_algorithm not in CHECKSUM_ALGORITHMS:
+            return False, ErrorMessages.UNSUPPORTED_CHECKSUM_ALGORITHM.value
+
+        hasher = CHECKSUM_ALGORITHMS[checksum_algorithm]()
+        if encoding == "msgpack":
+            # msgpack chunks are checksummed over the canonical bytes of the columns (columnar) and of every record, back to back
+            if columns is not None:
+                hasher.update(canonical_packb(columns))
+            for record in records:
+                hasher.update(canonical_packb(record))
+        else:
+            # a columnar chunk is checksummed over {"columns": [...], "rows": [...]}
+            hasher.update(self.canonical_dumps(records if columns is None else {"columns": columns, "rows": records}))
+        calculated = hasher.hexdigest()
 
         if calculated != checksum:
             return False, ErrorMessages.CHECKSUM_MISMATCH.value
 
         # Mark as processed
         self.processed_chunks.add(chunk_id)
-        self.last_chunk_number[ingestion_id] = chunk_number
+        self.last_chunk_number[sequence] = chunk_number
 
         return True, None
+
+    def digest(self, checksum_algorithm: str, *parts: bytes) -> bytes:
+        hasher = CHECKSUM_ALGORITHMS[checksum_algorithm]()
+        for part in parts:
+            hasher.update(part)
+        return bytes.fromhex(hasher.hexdigest())
+
+    def merkle_root(self, leaf_hashes: List[str], checksum_algorithm: str) -> str:
+        """
+        Root of the tree over the leaf hashes : H(0x01 + left + right), an odd node is carried up unchanged
+        """
+        if not leaf_hashes:
+            return self.digest(checksum_algorithm).hex()
+        level = [bytes.fromhex(leaf) for leaf in leaf_hashes]
+        while len(level) > 1:
+            parents = [self.digest(checksum_algorithm, b"\x01", level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            level = parents
+        return level[0].hex()
+
+    def mismatched_leaves(self, chunk_id: str, records, leaf_hashes, merkle_root: str, checksum_algorithm: str = "sha256", encoding: str = "json") -> List[int] | None:
+        """
+        Indices of the records whose leaf hash H(0x00 + canonical record) differs from the one that was sent,
+        the chunk is kept until its repair message brings them. None when the whole chunk has to be sent again
+        (no leaf hashes, a record count that differs, leaf hashes that do not add up to the merkle root)
+        """
+        if not leaf_hashes or len(leaf_hashes) != len(records) or checksum_algorithm not in CHECKSUM_ALGORITHMS:
+            return None
+        if self.merkle_root(leaf_hashes, checksum_algorithm) != merkle_root:
+            return None
+        encode = canonical_packb if encoding == "msgpack" else self.canonical_dumps
+        mismatched = [
+            index for index, (record, leaf) in enumerate(zip(records, leaf_hashes))
+            if self.digest(checksum_algorithm, b"\x00", encode(record)).hex() != leaf
+        ]
+        if not mismatched:
+            return None
+        self.pending_repairs[chunk_id] = list(records)
+        return mismatched
+
+    def repair(self, chunk_id: str, leaf_indices: List[int], records) -> list | None:
+        """
+        Records of a pending chunk with the repaired ones put back in place, None when no repair was expected
+        """
+        pending = self.pending_repairs.pop(chunk_id, None)
+        if pending is None or len(leaf_indices) != len(records) or not all(0 <= index < len(pending) for index in leaf_indices):
+            return None
+        for index, record in zip(leaf_indices, records):
+            pending[index] = record
+        return pending
@@ -3,6 +3,8 @@ class ErrorMessages(Enum):
     # CHUNK DATA INTEGRITY ERRORS
     OUT_OF_ORDER_CHUNK = "Out-of-order chunk"
     CHECKSUM_MISMATCH = "Checksum mismatch"
+    UNSUPPORTED_CHECKSUM_ALGORITHM = "Unsupported checksum algorithm"
+    UNKNOWN_REPAIR_CHUNK = "Unknown chunk for repair"
 
     # CHUNK drop error 
     EMPTY_CHUNK = "Empty chunk"
\ No newline at end of file
@@ -0,0 +1,50 @@
+# msgpack decoder
+"""
+This file allows us to read the chunks sent with payload_encoding=msgpack (application/msgpack)
+and to rebuild their canonical bytes for the checksum validation
+"""
+import datetime
+import decimal
+import msgpack
+
+# same extension type codes as the fast-api microservice
+EXT_DECIMAL = 1
+EXT_DATETIME = 2
+EXT_DATE = 3
+EXT_TIME = 4
+
+def ext_hook(code, data):
+    text = data.decode("utf-8")
+    if code == EXT_DECIMAL:
+        return decimal.Decimal(text)
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(text)
+    if code == EXT_DATE:
+        return datetime.date.fromisoformat(text)
+    if code == EXT_TIME:
+        return datetime.time.fromisoformat(text)
+    return msgpack.ExtType(code, data)
+
+def msgpack_default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return msgpack.ExtType(EXT_DECIMAL, str(obj).encode("utf-8"))
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(EXT_DATE, obj.isoformat().encode("utf-8"))
+    if isinstance(obj, datetime.time):
+        return msgpack.ExtType(EXT_TIME, obj.isoformat().encode("utf-8"))
+    raise TypeError
+
+def sorted_keys(obj):
+    if isinstance(obj, dict):
+        return {key: sorted_keys(obj[key]) for key in sorted(obj)}
+    if isinstance(obj, list):
+        return [sorted_keys(value) for value in obj]
+    return obj
+
+def unpackb(body: bytes):
+    return msgpack.unpackb(body, ext_hook=ext_hook, raw=False, strict_map_key=False)
+
+def canonical_packb(obj) -> bytes:
+    return msgpack.packb(sorted_keys(obj), default=msgpack_default, use_bin_type=True, datetime=False)
@@ -8,4 +8,7 @@ from .utils.logger import (
 
 from .fixtures.state_store import state_store
 from .fixtures.fake_pim_core import pim_core
-from .fixtures.ingestion_service import ingestion_service
\ No newline at end of file
+from .fixtures.ingestion_service import ingestion_service
+from .fixtures.ingestion_supervisor import supervisor
+from .fixtures.json_source import write_json_source, json_source
+from .fixtures.excel_workbook import excel_service, write_workbook, workbook_path, excel_request
@@ -0,0 +1,44 @@
+import pytest
+
+@pytest.fixture
+def excel_service(state_store):
+    from app.services.excel_reader import ExcelIngestionService
+
+    service = ExcelIngestionService()
+    service.state_store = state_store.store
+    return service
+
+@pytest.fixture
+def write_workbook(tmp_path):
+    # writes {sheet name: (headers, rows)} in that order, returns its path
+    def write(sheets, name="workbook"):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for sheet_name, (headers, rows) in sheets.items():
+            sheet = workbook.create_sheet(sheet_name)
+            sheet.append(headers)
+            for row in rows:
+                sheet.append(row)
+        path = tmp_path / f"{name}.xlsx"
+        workbook.save(path)
+        return str(path)
+    return write
+
+@pytest.fixture
+def workbook_path(write_workbook):
+    # products (7 rows), prices (3 rows) and an empty notes sheet
+    return write_workbook({
+        "products": (["sku", "qty"], [[f"P-{i}", i] for i in range(7)]),
+        "prices": (["sku", "price", "currency"], [[f"P-{i}", i * 1.5, "EUR"] for i in range(3)]),
+        "notes": (["text"], []),
+    }, "multi")
+
+@pytest.fixture
+def excel_request():
+    def build(path, **kwargs):
+        from app.schemas.request_model import IngestionRequest
+
+        return IngestionRequest(file_path=path, file_type="excel", callback_url="http://pim/callback", **kwargs)
+    return build
@@ -7,16 +7,31 @@ def pim_core(monkeypatch):
 
     async def fake_post(self, url, *args, **kwargs):
         payload = kwargs.get("json") or kwargs.get("content")
+        # chunk envelopes are streamed as an async generator of fragments
+        if hasattr(payload, "__aiter__"):
+            payload = b"".join([fragment async for fragment in payload])
         if isinstance(payload, bytes):
-            import orjson
-            payload = orjson.loads(payload)
+            if (kwargs.get("headers") or {}).get("Content-Type") == "application/msgpack":
+                from app.utils.msgpack_codec import unpackb
+                payload = unpackb(payload)
+            else:
+                import orjson
+                payload = orjson.loads(payload)
 
         class Resp:
+            def __init__(self, status_code, headers):
+                self.status_code = status_code
+                self.headers = headers
+
             def json(self):
                 return payload_response
 
-        payload_response = await core.handle(payload)
-        return Resp()
+        status_code, headers, payload_response = await core.respond(payload)
+        return Resp(status_code, headers)
 
     monkeypatch.setattr("httpx.AsyncClient.post", fake_post)
+    # no real backoff sleeps and a fresh AIMD / retry budget state per test
+    monkeypatch.setattr("app.services.callback_host_controller.BACKOFF_BASE_SECONDS", 0)
+    from app.services.callback_host_controller import callback_hosts
+    monkeypatch.setattr(callback_hosts, "hosts", {})
     return core
@@ -0,0 +1,11 @@
+import pytest
+from app.services.ingestion_supervisor import ingestion_supervisor
+
+@pytest.fixture
+def supervisor(monkeypatch, state_store):
+    # the process wide supervisor (its shutdown flag is read by the chunk sender) on the test database
+    monkeypatch.setattr(ingestion_supervisor, "_state_store", state_store.store)
+    monkeypatch.setattr(ingestion_supervisor, "tasks", {})
+    monkeypatch.setattr(ingestion_supervisor, "reserved", set())
+    monkeypatch.setattr(ingestion_supervisor, "stopping", False)
+    return ingestion_supervisor
@@ -0,0 +1,18 @@
+import json
+
+import pytest
+
+@pytest.fixture
+def write_json_source(tmp_path):
+    # writes a json array source of record(i) for i in range(records), {"sku": "S-<i>"} by default, returns its path
+    def write(records, name="source", record=None):
+        record = record or (lambda i: {"sku": f"S-{i}"})
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps([record(i) for i in range(records)]))
+        return str(path)
+    return write
+
+@pytest.fixture
+def json_source(write_json_source):
+    # 10 records {"sku": "S-<i>", "qty": i}
+    return write_json_source(10, record=lambda i: {"sku": f"S-{i}", "qty": i})
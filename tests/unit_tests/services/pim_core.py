@@ -1,17 +1,90 @@
 class FakePimCore:
     def __init__(self):
         self.received_chunks = []
+        self.received_payloads = []
+        self.completions = []
         self.fail_on = set()
+        self.requests = 0
+        self.overloaded = 0
+        self.retry_after = None
+        # integrity_mode=merkle : records damaged on their first delivery, the pending chunks and the repair messages
+        self.corrupt_on = {}
+        self.pending_repairs = {}
+        self.repairs = []
+
+    def overload_next(self, n, retry_after=None, status_code=429):
+        self.overloaded = n
+        self.retry_after = retry_after
+        self.overload_status = status_code
 
     def reject_chunk(self, n):
         self.fail_on.add(n)
 
+    def corrupt_records(self, chunk_number, indices):
+        self.corrupt_on[chunk_number] = indices
+
+    def _damaged_leaves(self, payload):
+        """
+        Damages the records of a chunk set up with corrupt_records and names them by comparing the leaf hashes.
+        """
+        from app.services.data_integrity_manager import ChunkIntegrityManager
+
+        key = "rows" if "columns" in payload else "records"
+        for index in self.corrupt_on.pop(payload["chunk_number"]):
+            payload[key][index] = {"damaged": True}
+        leaves = ChunkIntegrityManager.merkle_leaves(
+            [ChunkIntegrityManager.canonical_record_bytes(record) for record in payload[key]], payload["checksum_algorithm"]
+        )
+        self.pending_repairs[payload["chunk_id"]] = payload
+        return [index for index, (leaf, sent) in enumerate(zip(leaves, payload["leaf_hashes"])) if leaf != sent]
+
+    def _handle_chunk(self, payload):
+        if payload.get("repair"):
+            self.repairs.append(payload)
+            pending = self.pending_repairs.pop(payload["chunk_id"], None)
+            if pending is None:
+                return {"ack": False, "chunk_number": payload["chunk_number"], "error": "Unknown chunk for repair"}
+            key = "rows" if "columns" in payload else "records"
+            for index, record in zip(payload["leaf_indices"], payload[key]):
+                pending[key][index] = record
+            payload = pending
+
+        if payload["chunk_number"] in self.corrupt_on:
+            mismatched = self._damaged_leaves(payload)
+            return {"ack": False, "chunk_number": payload["chunk_number"], "error": "Checksum mismatch", "mismatched_leaves": mismatched}
+
+        if payload["chunk_number"] in self.fail_on:
+            return {"ack": False, "chunk_number": payload["chunk_number"], "error": "SIMULATED_FAILURE"}
+
+        self.received_chunks.append(payload["chunk_number"])
+        self.received_payloads.append(payload)
+        return {"ack": True, "chunk_number": payload["chunk_number"]}
+
+    async def respond(self, payload):
+        """
+        (status_code, headers, body) of the callback answer, simulates an overloaded pim-core first.
+        """
+        if self.overloaded:
+            self.overloaded -= 1
+            self.requests += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            return self.overload_status, headers, {"detail": "overloaded"}
+        return 200, {}, await self.handle(payload)
+
     async def handle(self, payload):
+        self.requests += 1
         if payload.get("status") == "COMPLETED":
+            self.completions.append(payload)
             return {"ack": True}
 
-        if payload["chunk_number"] in self.fail_on:
-            return {"ack": False, "error": "SIMULATED_FAILURE"}
+        if "batch" in payload:
+            results = []
+            for envelope in payload["batch"]:
+                # chunks after a rejected one are out of order for pim-core
+                if results and not results[-1]["ack"]:
+                    results.append({"ack": False, "chunk_number": envelope["chunk_number"], "error": "Out-of-order chunk"})
+                    continue
+                results.append(self._handle_chunk(envelope))
+            return {"ack": all(result["ack"] for result in results), "results": results}
 
-        self.received_chunks.append(payload["chunk_number"])
-        return {"ack": True}
\ No newline at end of file
+        return self._handle_chunk(payload)
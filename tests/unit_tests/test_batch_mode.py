@@ -0,0 +1,51 @@
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+
+
+@pytest.mark.asyncio
+class TestBatchMode:
+
+    async def test_many_chunks_per_request(self, ingestion_service, state_store, pim_core, write_json_source):
+        request = IngestionRequest(
+            file_path=write_json_source(10),
+            callback_url="http://pim/callback",
+            chunk_size_by_records=2,
+            batch_size=3,
+        )
+
+        await ingestion_service.stream_and_push("ing-batch", request)
+
+        assert pim_core.received_chunks == [0, 1, 2, 3, 4]
+        # two batch requests and the completion event
+        assert pim_core.requests == 3
+        assert state_store.last_chunk("ing-batch") == 4
+
+    async def test_checkpoint_up_to_highest_contiguous_ack(self, ingestion_service, state_store, pim_core, write_json_source):
+        pim_core.reject_chunk(1)
+        request = IngestionRequest(
+            file_path=write_json_source(10),
+            callback_url="http://pim/callback",
+            chunk_size_by_records=2,
+            batch_size=3,
+        )
+
+        with pytest.raises(Exception):
+            await ingestion_service.stream_and_push("ing-nack", request)
+
+        assert pim_core.received_chunks == [0]
+        assert state_store.last_chunk("ing-nack") == 0
+        assert state_store.store.get_total_records("ing-nack") == 2
+
+    async def test_batch_is_flushed_before_completion(self, ingestion_service, state_store, pim_core, write_json_source):
+        request = IngestionRequest(
+            file_path=write_json_source(4),
+            callback_url="http://pim/callback",
+            chunk_size_by_records=2,
+            batch_size=10,
+        )
+
+        await ingestion_service.stream_and_push("ing-partial", request)
+
+        assert pim_core.received_chunks == [0, 1]
+        assert state_store.last_chunk("ing-partial") == 1
@@ -0,0 +1,96 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+from app.services.callback_host_controller import CallbackHostController, parse_retry_after
+from app.services.ingestion_metrics import ingestion_metrics
+
+
+class TestRetryAfter:
+
+    def test_delay_seconds(self):
+        assert parse_retry_after("7") == 7.0
+
+    def test_http_date(self):
+        when = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        assert 25 <= parse_retry_after(when) <= 30
+
+    def test_missing_or_invalid(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+
+class TestAimdLimit:
+
+    def test_halves_on_overload_and_grows_on_success(self, monkeypatch):
+        monkeypatch.setattr("app.services.callback_host_controller.BACKOFF_BASE_SECONDS", 0)
+        host = CallbackHostController("pim")
+        host.limit = 8.0
+
+        host.on_overload()
+        assert host.limit == 4.0
+
+        for _ in range(4):
+            host.on_success()
+        assert 4.0 < host.limit <= 5.0
+
+    def test_never_below_minimum(self, monkeypatch):
+        monkeypatch.setattr("app.services.callback_host_controller.BACKOFF_BASE_SECONDS", 0)
+        host = CallbackHostController("pim")
+        for _ in range(20):
+            host.on_overload()
+        assert host.limit == host.min_limit
+
+    def test_retry_budget_is_limited(self):
+        host = CallbackHostController("pim")
+        spent = 0
+        while host.try_spend_retry():
+            spent += 1
+        assert spent == 10
+        assert host.retry_budget_exhausted == 1
+
+
+@pytest.mark.asyncio
+class TestBackpressure:
+
+    async def test_overload_is_waited_out(self, ingestion_service, state_store, pim_core, write_json_source):
+        pim_core.overload_next(5, retry_after=0)
+        request = IngestionRequest(
+            file_path=write_json_source(6),
+            callback_url="http://pim/callback",
+            chunk_size_by_records=2,
+        )
+
+        await ingestion_service.stream_and_push("ing-429", request)
+
+        assert pim_core.received_chunks == [0, 1, 2]
+        assert state_store.last_chunk("ing-429") == 2
+        metrics = ingestion_metrics.for_ingestion("ing-429")
+        assert metrics["overload_events"] == 5
+        # overload waits don't spend the retry budget
+        assert "retries" not in metrics
+
+    async def test_completion_event_is_waited_out(self, ingestion_service, state_store, pim_core, write_json_source):
+        request = IngestionRequest(
+            file_path=write_json_source(2),
+            callback_url="http://pim/callback",
+            chunk_size_by_records=2,
+        )
+        original_respond = pim_core.respond
+        answered = []
+
+        async def overloaded_completion(payload):
+            # the first COMPLETED event is answered with 503
+            if payload.get("status") == "COMPLETED" and not answered:
+                answered.append(payload)
+                return 503, {"Retry-After": "0"}, {"detail": "overloaded"}
+            return await original_respond(payload)
+
+        pim_core.respond = overloaded_completion
+
+        await ingestion_service.stream_and_push("ing-503", request)
+
+        assert len(answered) == 1
+        assert state_store.store.get_state("ing-503")["status"] == "COMPLETED"
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.request_model import IngestionRequest
+from app.services.callback_host_controller import CallbackHostController, TokenBucket
+
+
+class TestTokenBucket:
+
+    def test_waits_for_missing_tokens(self):
+        bucket = TokenBucket(100, 1.0)
+        now = bucket.updated
+
+        assert bucket.wait_seconds(100, now) == 0
+        bucket.take(100)
+        assert bucket.wait_seconds(50, now) == pytest.approx(0.5)
+        assert bucket.wait_seconds(50, now + 0.5) == 0
+
+    def test_request_larger_than_the_burst_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(10, 1.0)
+        now = bucket.updated
+
+        assert bucket.wait_seconds(1000, now) == 0
+        bucket.take(1000)
+        # the debt is paid by the requests that follow
+        assert bucket.wait_seconds(1, now) == pytest.approx(99.1)
+
+
+@pytest.mark.asyncio
+class TestWeightedFairQueuing:
+
+    async def test_priority_ingestion_goes_first(self):
+        host = CallbackHostController("pim")
+        host.limit = 1.0
+        admitted = []
+
+        async def send(flow, weight, name):
+            async with host.slot(flow, weight, 1000):
+                admitted.append(name)
+
+        await host.acquire("holder")
+        tasks = [asyncio.create_task(send("catalogue", 1, f"catalogue-{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(send("prices", 10, f"prices-{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        assert host.snapshot()["waiting"] == 6
+
+        host.release()
+        await asyncio.gather(*tasks)
+
+        # equal start tags keep their arrival order, then the prices feed is served 10x faster
+        assert admitted == ["catalogue-0", "prices-0", "prices-1", "prices-2", "catalogue-1", "catalogue-2"]
+
+    async def test_equal_priorities_share_by_bytes(self):
+        host = CallbackHostController("pim")
+        host.limit = 1.0
+        admitted = []
+
+        async def send(flow, cost):
+            async with host.slot(flow, 1, cost):
+                admitted.append(flow)
+
+        await host.acquire("holder")
+        tasks = [asyncio.create_task(send("big", 4000)) for _ in range(2)]
+        tasks += [asyncio.create_task(send("small", 1000)) for _ in range(4)]
+        await asyncio.sleep(0)
+
+        host.release()
+        await asyncio.gather(*tasks)
+
+        assert admitted == ["big", "small", "small", "small", "small", "big"]
+
+    async def test_cancelled_waiter_is_skipped(self):
+        host = CallbackHostController("pim")
+        host.limit = 1.0
+        await host.acquire("holder")
+        cancelled = asyncio.create_task(host.acquire("a"))
+        waiting = asyncio.create_task(host.acquire("b"))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        host.release()
+        await waiting
+
+        assert host.in_flight == 1
+        assert host.snapshot()["waiting"] == 0
+
+    async def test_cancelled_waiter_gives_back_its_share(self):
+        host = CallbackHostController("pim")
+        host.limit = 1.0
+        await host.acquire("holder")
+        queued = asyncio.create_task(host.acquire("a", 1, 1000))
+        await asyncio.sleep(0)
+        assert host._finish_tags["a"] == 1000
+
+        queued.cancel()
+        await asyncio.sleep(0)
+
+        # the cancelled waiter left the queue, the ingestion is idle again
+        assert host._waiters == []
+        assert "a" not in host._finish_tags
+        assert host._start_tag("a", 1, 1000) == 0
+
+    async def test_cancelled_waiter_does_not_block_the_fast_path(self):
+        host = CallbackHostController("pim")
+        host.limit = 1.0
+        await host.acquire("holder")
+        queued = asyncio.create_task(host.acquire("a"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0)
+        # AIMD opened a slot, nothing released one
+        host.limit = 2.0
+
+        # a free slot is taken right away, the request never waits on a future
+        with pytest.raises(StopIteration):
+            host.acquire("b").send(None)
+        assert host.in_flight == 2
+
+    async def test_requests_per_second_limit(self):
+        host = CallbackHostController("pim")
+        host.request_bucket = TokenBucket(100, 0.01)
+        started = time.monotonic()
+
+        for _ in range(11):
+            async with host.slot("a"):
+                pass
+
+        assert time.monotonic() - started >= 0.09
+        assert host.snapshot()["rate_limited"] >= 1
+
+    async def test_rate_limits_from_the_environment(self, monkeypatch):
+        monkeypatch.setenv("INGESTION_CALLBACK_BYTES_PER_SECOND", "1048576")
+
+        snapshot = CallbackHostController("pim").snapshot()
+
+        assert snapshot["bytes_per_second_limit"] == 1048576
+        assert snapshot["requests_per_second_limit"] is None
+
+
+class TestPriorityValidation:
+
+    @pytest.mark.parametrize("priority", [0, 101])
+    def test_priority_out_of_range(self, priority):
+        with pytest.raises(ValidationError):
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, priority=priority)
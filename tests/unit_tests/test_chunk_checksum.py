@@ -0,0 +1,44 @@
+import hashlib
+import zlib
+from decimal import Decimal
+
+import orjson
+import pytest
+
+from app.services.data_integrity_manager import ChunkIntegrityManager, CHECKSUM_ALGORITHMS
+from app.utils.json_decimal_encoder import orjson_default
+
+RECORDS = [
+    {"sku": "A-1", "price": Decimal("10.5"), "attrs": {"z": 1, "a": [1, 2]}},
+    {"name": "second", "sku": "A-2"},
+]
+
+
+def whole_chunk_dump(records):
+    return orjson.dumps(records, option=orjson.OPT_SORT_KEYS, default=orjson_default)
+
+
+class TestChunkChecksum:
+
+    def test_default_is_sha256_over_canonical_dump(self):
+        expected = hashlib.sha256(whole_chunk_dump(RECORDS)).hexdigest()
+        assert ChunkIntegrityManager.compute_checksum(RECORDS) == expected
+
+    @pytest.mark.parametrize("algorithm", sorted(CHECKSUM_ALGORITHMS))
+    def test_incremental_matches_whole_chunk(self, algorithm):
+        hasher = CHECKSUM_ALGORITHMS[algorithm]()
+        hasher.update(whole_chunk_dump(RECORDS))
+
+        chunk_checksum = ChunkIntegrityManager.new_checksum(algorithm)
+        for record in RECORDS:
+            chunk_checksum.update(ChunkIntegrityManager.canonical_record_bytes(record))
+
+        assert chunk_checksum.algorithm == algorithm
+        assert chunk_checksum.hexdigest() == hasher.hexdigest()
+
+    def test_crc32_matches_zlib(self):
+        expected = f"{zlib.crc32(whole_chunk_dump(RECORDS)):08x}"
+        assert ChunkIntegrityManager.compute_checksum(RECORDS, "crc32") == expected
+
+    def test_empty_chunk(self):
+        assert ChunkIntegrityManager.compute_checksum([]) == hashlib.sha256(b"[]").hexdigest()
@@ -0,0 +1,81 @@
+import datetime
+import decimal
+import json
+
+import orjson
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import encode_chunk, shutdown_pool
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.utils.json_decimal_encoder import orjson_default
+
+
+@pytest.fixture
+def encode_pool(monkeypatch):
+    monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+    yield
+    shutdown_pool()
+
+
+class TestEncodeChunk:
+
+    def test_same_bytes_and_checksum_as_in_process(self):
+        records = [{"sku": "S-1", "price": decimal.Decimal("1.25"), "tags": ["a", "b"]}, {"b": 2, "a": None}]
+        payload = orjson.dumps(records, default=orjson_default)
+
+        encoded, checksum, count = encode_chunk(payload, None, "sha256")
+
+        assert encoded == b",".join(ChunkIntegrityManager.canonical_record_bytes(record) for record in records)
+        assert checksum == ChunkIntegrityManager.compute_checksum(records, "sha256")
+        assert count == 2
+
+    def test_value_rows_with_headers(self):
+        headers = ["sku", "updated", "qty"]
+        rows = [("S-1", datetime.datetime(2025, 1, 2, 3, 4, 5), 3), ("S-2",)]
+        records = [
+            {"sku": "S-1", "updated": datetime.datetime(2025, 1, 2, 3, 4, 5), "qty": 3},
+            {"sku": "S-2", "updated": None, "qty": None},
+        ]
+
+        encoded, checksum, _ = encode_chunk(orjson.dumps(rows, default=orjson_default), headers, "crc32")
+
+        assert encoded == b",".join(ChunkIntegrityManager.canonical_record_bytes(record) for record in records)
+        assert checksum == ChunkIntegrityManager.compute_checksum(records, "crc32")
+
+
+@pytest.mark.asyncio
+class TestPooledIngestion:
+
+    async def test_json_chunks_match_in_process_encoding(self, ingestion_service, state_store, pim_core, tmp_path, monkeypatch):
+        source = tmp_path / "source.json"
+        source.write_text(json.dumps([{"sku": f"S-{i}", "price": i * 1.5} for i in range(25)]))
+
+        def request():
+            return IngestionRequest(file_path=str(source), callback_url="http://pim/callback", chunk_size_by_records=4)
+
+        await ingestion_service.stream_and_push("ing-in-process", request())
+        in_process = [(payload["chunk_number"], payload["checksum"], payload["records"]) for payload in pim_core.received_payloads]
+        pim_core.received_payloads.clear()
+
+        monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+        try:
+            await ingestion_service.stream_and_push("ing-pooled", request())
+        finally:
+            shutdown_pool()
+        pooled = [(payload["chunk_number"], payload["checksum"], payload["records"]) for payload in pim_core.received_payloads]
+
+        assert pooled == in_process
+        assert len(pooled) == 7
+        assert state_store.store.get_state("ing-pooled")["total_records"] == 25
+
+    async def test_excel_rows_are_encoded_in_the_pool(self, encode_pool, pim_core, excel_service, write_workbook, excel_request):
+        path = write_workbook({"products": (["sku", "qty"], [[f"S-{i}", i] for i in range(10)])})
+
+        request = excel_request(path, chunk_size_by_records=3)
+
+        await excel_service.stream_and_push("ing-excel-pool", request)
+
+        assert pim_core.received_chunks == [0, 1, 2, 3]
+        assert pim_core.received_payloads[0]["records"] == [{"qty": 0, "sku": "S-0"}, {"qty": 1, "sku": "S-1"}, {"qty": 2, "sku": "S-2"}]
+        assert pim_core.received_payloads[0]["checksum"] == ChunkIntegrityManager.compute_checksum(pim_core.received_payloads[0]["records"])
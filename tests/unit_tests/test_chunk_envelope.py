@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import json
+
+import orjson
+import pytest
+
+from app.services.chunk_envelope import ChunkEnvelope
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+HEADER = {
+    "ingestion_id": "ing-1",
+    "chunk_number": 0,
+    "chunk_id": "ing-1:0",
+    "checksum": "abc",
+    "checksum_algorithm": "sha256",
+    "is_last": False,
+}
+
+
+def collect(envelope):
+    async def _collect():
+        return [fragment async for fragment in envelope.iter_body()]
+    return asyncio.run(_collect())
+
+
+class TestChunkEnvelope:
+
+    def test_streamed_body_is_valid_envelope(self):
+        records = [{"sku": f"A-{i}", "value": i} for i in range(5)]
+        fragments = [ChunkIntegrityManager.canonical_record_bytes(r) for r in records]
+        envelope = ChunkEnvelope(HEADER, fragments)
+
+        body = b"".join(collect(envelope))
+
+        assert json.loads(body) == {**HEADER, "records": records}
+        assert len(body) == envelope.content_length
+        assert envelope.headers()["Content-Length"] == str(len(body))
+
+    def test_checksum_of_streamed_records_matches(self):
+        records = [{"b": 2, "a": 1}, {"c": [1, 2]}]
+        fragments = [ChunkIntegrityManager.canonical_record_bytes(r) for r in records]
+        envelope = ChunkEnvelope(HEADER, fragments)
+
+        received = orjson.loads(b"".join(collect(envelope)))["records"]
+
+        assert ChunkIntegrityManager.compute_checksum(received) == hashlib.sha256(
+            b"[" + b",".join(fragments) + b"]"
+        ).hexdigest()
+
+    def test_body_can_be_regenerated_for_retries(self):
+        fragments = [b'{"v":%d}' % i for i in range(20000)]
+        envelope = ChunkEnvelope(HEADER, fragments)
+
+        first = collect(envelope)
+        second = collect(envelope)
+
+        assert first == second
+        assert len(first) > 1
+        assert b"".join(first) == envelope.to_bytes()
+
+    def test_empty_chunk(self):
+        envelope = ChunkEnvelope(HEADER, [])
+        body = b"".join(collect(envelope))
+        assert orjson.loads(body)["records"] == []
+        assert len(body) == envelope.content_length
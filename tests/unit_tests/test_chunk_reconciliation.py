@@ -0,0 +1,237 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app.controllers.ingestion_controllers import IngestionController
+from app.services import ingestion_state_store
+from app.schemas.request_model import IngestionRequest, ReconcileRequest
+from app.services.chunk_ledger import chunks_to_resend, resend_chunks
+from app.services.chunk_sender import SourceChangedError
+
+
+def json_request(path, **kwargs):
+    return IngestionRequest(file_path=path, callback_url="http://pim/callback", chunk_size_by_records=4, **kwargs)
+
+
+def held(ledger, *chunk_numbers):
+    return {chunk["chunk_id"]: chunk["checksum"] for chunk in ledger if chunk["chunk_number"] in chunk_numbers}
+
+
+class TestChunksToResend:
+
+    LEDGER = [
+        {"chunk_id": "ing:0", "checksum": "a"},
+        {"chunk_id": "ing:1", "checksum": "b"},
+        {"chunk_id": "ing:2", "checksum": "c"},
+    ]
+
+    def test_missing_and_mismatched_chunks(self):
+        resend = chunks_to_resend(self.LEDGER, {"ing:0": "a", "ing:2": "other"})
+
+        assert [(chunk["chunk_id"], chunk["reason"]) for chunk in resend] == [("ing:1", "missing"), ("ing:2", "mismatched")]
+
+    def test_presence_only(self):
+        assert chunks_to_resend(self.LEDGER, {"ing:0": None, "ing:1": None, "ing:2": None}) == []
+
+
+@pytest.mark.asyncio
+class TestChunkLedger:
+
+    async def test_every_acked_chunk_is_recorded(self, ingestion_service, state_store, pim_core, json_source):
+        await ingestion_service.stream_and_push("ing-ledger", json_request(json_source))
+
+        ledger = state_store.store.get_ledger("ing-ledger")
+        assert [(chunk["chunk_id"], chunk["first_record"], chunk["record_count"], chunk["is_last"]) for chunk in ledger] == [
+            ("ing-ledger:0", 0, 4, False), ("ing-ledger:1", 4, 4, False), ("ing-ledger:2", 8, 2, True),
+        ]
+        assert [chunk["checksum"] for chunk in ledger] == [payload["checksum"] for payload in pim_core.received_payloads]
+        assert all(chunk["byte_size"] > 0 and chunk["acked_at"] for chunk in ledger)
+
+    async def test_batch_records_every_chunk_of_the_batch(self, ingestion_service, state_store, pim_core, json_source):
+        await ingestion_service.stream_and_push("ing-ledger-batch", json_request(json_source, batch_size=2))
+
+        assert [chunk["chunk_number"] for chunk in state_store.store.get_ledger("ing-ledger-batch")] == [0, 1, 2]
+
+    async def test_checkpoint_rows_are_written_together(self, state_store):
+        chunks = [
+            {"chunk_number": i, "chunk_id": f"ing-rows:{i}", "checksum": "c", "checksum_algorithm": "sha256", "first_record": i, "record_count": 1, "byte_size": 10, "is_last": i == 2}
+            for i in range(3)
+        ]
+
+        state_store.store.record_chunks("ing-rows", None, chunks)
+        state_store.store.record_chunks("ing-rows", None, [])
+
+        assert [chunk["chunk_id"] for chunk in state_store.store.get_ledger("ing-rows")] == ["ing-rows:0", "ing-rows:1", "ing-rows:2"]
+
+    async def test_no_commit_lands_inside_a_checkpoint(self, state_store, tmp_path):
+        store = state_store.store
+        chunks = [
+            {"chunk_number": i, "chunk_id": f"ing-rows:{i}", "checksum": "c", "checksum_algorithm": "sha256", "first_record": i, "record_count": 1, "byte_size": 10, "is_last": i == 2}
+            for i in range(3)
+        ]
+        seen = {}
+
+        class CheckpointConnection:
+            def __init__(self, conn):
+                self.conn = conn
+
+            def __getattr__(self, name):
+                return getattr(self.conn, name)
+
+            def executemany(self, *args):
+                cursor = self.conn.executemany(*args)
+                # a request thread writes while the rows are not committed yet
+                writer = threading.Thread(target=store.update_chunk, args=("ing-other", 0, 1))
+                writer.start()
+                writer.join(0.2)
+                seen["writer_waited"] = writer.is_alive()
+                seen["writer"] = writer
+                with sqlite3.connect(tmp_path / "ingestion.db") as reader:
+                    seen["committed_rows"] = reader.execute("SELECT COUNT(*) FROM ingestion_chunk_ledger").fetchone()[0]
+                return cursor
+
+        store.conn = CheckpointConnection(store.conn)
+        store.record_chunks("ing-rows", None, chunks)
+        seen["writer"].join()
+
+        assert seen["writer_waited"] and seen["committed_rows"] == 0
+        assert len(store.get_ledger("ing-rows")) == 3
+        assert store.get_last_chunk("ing-other") == 0
+
+    async def test_ledger_of_a_completed_ingestion_is_pruned_after_its_retention(self, ingestion_service, state_store, pim_core, json_source, monkeypatch):
+        await ingestion_service.stream_and_push("ing-kept", json_request(json_source))
+        state_store.store.register("ing-running", json_request(json_source).model_dump_json())
+        state_store.store.record_chunks("ing-running", None, [
+            {"chunk_number": 0, "chunk_id": "ing-running:0", "checksum": "c", "checksum_algorithm": "sha256", "first_record": 0, "record_count": 4, "byte_size": 10, "is_last": False},
+        ])
+        assert len(state_store.store.get_ledger("ing-kept")) == 3
+
+        class Configurations:
+            CHUNK_LEDGER_RETENTION_SECONDS = type("Retention", (), {"value": 0})
+
+        monkeypatch.setattr(ingestion_state_store, "MicroServiceConfigurations", Configurations)
+        await ingestion_service.stream_and_push("ing-pruned", json_request(json_source))
+
+        # completed ingestions lose their ledger, a running one keeps it (resume seeks with it)
+        assert state_store.store.get_ledger("ing-pruned") == []
+        assert state_store.store.get_ledger("ing-kept") == []
+        assert len(state_store.store.get_ledger("ing-running")) == 1
+
+
+@pytest.mark.asyncio
+class TestReconciliation:
+
+    async def test_only_missing_chunks_are_resent(self, ingestion_service, state_store, pim_core, json_source):
+        request = json_request(json_source)
+        await ingestion_service.stream_and_push("ing-lost", request)
+        ledger = state_store.store.get_ledger("ing-lost")
+        pim_core.received_chunks.clear()
+        pim_core.received_payloads.clear()
+
+        resent = await resend_chunks(ingestion_service, "ing-lost", request, chunks_to_resend(ledger, held(ledger, 0, 2)))
+
+        assert resent == 1
+        assert pim_core.received_chunks == [1]
+        assert pim_core.received_payloads[0]["records"] == [{"qty": i, "sku": f"S-{i}"} for i in range(4, 8)]
+        assert pim_core.received_payloads[0]["checksum"] == ledger[1]["checksum"]
+        # no second completion, the ingestion state is untouched
+        assert len(pim_core.completions) == 1
+        assert state_store.store.get_state("ing-lost") == {"ingestion_id": "ing-lost", "last_chunk": 2, "total_records": 10, "status": "COMPLETED"}
+        assert ingestion_service.state_store is state_store.store
+
+    async def test_gaps_are_resent_in_one_stream(self, ingestion_service, state_store, pim_core, json_source):
+        request = json_request(json_source, batch_size=2)
+        await ingestion_service.stream_and_push("ing-gaps", request)
+        ledger = state_store.store.get_ledger("ing-gaps")
+        pim_core.received_chunks.clear()
+
+        await resend_chunks(ingestion_service, "ing-gaps", request, chunks_to_resend(ledger, held(ledger, 1)))
+
+        assert pim_core.received_chunks == [0, 2]
+
+    async def test_changed_source_is_refused(self, ingestion_service, state_store, pim_core, json_source):
+        request = json_request(json_source)
+        await ingestion_service.stream_and_push("ing-changed", request)
+        ledger = state_store.store.get_ledger("ing-changed")
+        pim_core.received_chunks.clear()
+        with open(json_source, "w") as f:
+            json.dump([{"sku": f"S-{i}", "qty": i * 2} for i in range(10)], f)
+
+        with pytest.raises(SourceChangedError):
+            await resend_chunks(ingestion_service, "ing-changed", request, chunks_to_resend(ledger, held(ledger, 0, 2)))
+
+        assert pim_core.received_chunks == []
+
+    async def test_sheet_chunks_are_resent_per_sheet(self, state_store, pim_core, excel_service, write_workbook, excel_request):
+        path = write_workbook({"products": (["sku", "qty"], [[f"P-{i}", i] for i in range(5)]), "prices": (["sku", "price"], [["P-0", 1.5]])})
+        request = excel_request(path, chunk_size_by_records=2, sheets="all")
+        await excel_service.stream_and_push("ing-sheets-lost", request)
+        ledger = state_store.store.get_ledger("ing-sheets-lost")
+        pim_core.received_payloads.clear()
+
+        lost = [chunk["chunk_id"] for chunk in ledger if chunk["sheet"] == "products" and chunk["chunk_number"] == 1]
+        await resend_chunks(excel_service, "ing-sheets-lost", request, [chunk for chunk in chunks_to_resend(ledger, {}) if chunk["chunk_id"] in lost])
+
+        assert [(payload["sheet"], payload["chunk_number"]) for payload in pim_core.received_payloads] == [("products", 1)]
+        assert pim_core.received_payloads[0]["records"] == [{"qty": 2, "sku": "P-2"}, {"qty": 3, "sku": "P-3"}]
+
+
+@pytest.mark.asyncio
+class TestReconcileEndpoint:
+
+    @pytest.fixture
+    def controller(self, state_store, monkeypatch):
+        monkeypatch.setattr("app.controllers.ingestion_controllers.get_state_store", lambda: state_store.store)
+        return IngestionController()
+
+    async def test_missing_chunks_are_resent_in_the_background(self, controller, supervisor, ingestion_service, state_store, pim_core, json_source):
+        request = json_request(json_source)
+        state_store.store.register("ing-reconcile", request.model_dump_json())
+        await ingestion_service.stream_and_push("ing-reconcile", request)
+        ledger = state_store.store.get_ledger("ing-reconcile")
+        pim_core.received_chunks.clear()
+        bg = BackgroundTasks()
+
+        response = controller.reconcile("ing-reconcile", ReconcileRequest(chunks=[{"chunk_id": "ing-reconcile:0"}, {"chunk_id": "ing-reconcile:1", "checksum": "stale"}]), bg)
+        await bg()
+        await supervisor.tasks["ing-reconcile"]
+
+        assert response.status == "RECONCILING"
+        assert response.missing == ["ing-reconcile:2"]
+        assert response.mismatched == ["ing-reconcile:1"]
+        assert response.resend_bytes == ledger[1]["byte_size"] + ledger[2]["byte_size"]
+        assert pim_core.received_chunks == [1, 2]
+        assert supervisor.tasks == {}
+        assert state_store.store.lease_owner("ing-reconcile") is None
+
+    async def test_in_sync_unknown_and_without_ledger(self, controller, supervisor, ingestion_service, state_store, pim_core, json_source):
+        request = json_request(json_source)
+        state_store.store.register("ing-no-ledger", request.model_dump_json())
+        state_store.store.register("ing-in-sync", request.model_dump_json())
+        await ingestion_service.stream_and_push("ing-in-sync", request)
+        bg = BackgroundTasks()
+
+        in_sync = controller.reconcile("ing-in-sync", ReconcileRequest(chunks=[{"chunk_id": f"ing-in-sync:{i}"} for i in range(3)]), bg)
+
+        with pytest.raises(HTTPException) as unknown:
+            controller.reconcile("ing-unknown", ReconcileRequest(), BackgroundTasks())
+        with pytest.raises(HTTPException) as no_ledger:
+            controller.reconcile("ing-no-ledger", ReconcileRequest(), BackgroundTasks())
+
+        assert in_sync.status == "IN_SYNC"
+        assert in_sync.ledger_chunks == 3
+        assert bg.tasks == []
+        assert unknown.value.status_code == 404
+        assert no_ledger.value.status_code == 409
+
+    async def test_running_ingestion_is_refused(self, controller, supervisor, state_store, json_source):
+        state_store.store.register("ing-running", json_request(json_source).model_dump_json())
+        state_store.store.acquire_lease("ing-running", "other-worker", 60)
+
+        with pytest.raises(HTTPException) as running:
+            controller.reconcile("ing-running", ReconcileRequest(), BackgroundTasks())
+
+        assert running.value.status_code == 409
@@ -0,0 +1,42 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from app.utils import log_initializer
+from app.utils.log_initializer import LogInitializer
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+
+class TestColdStart:
+
+    def test_app_import_defers_the_format_engines(self):
+        code = (
+            "import json, sys; import app.main; "
+            "print(json.dumps([name for name in ('openpyxl', 'ijson', 'fsspec', 'httpx', 'msgpack') if name in sys.modules]))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+    def test_local_excel_source_does_not_import_fsspec(self, tmp_path):
+        code = (
+            "import sys; from app.services.excel_source import ExcelSource; "
+            f"ExcelSource({str(tmp_path / 'feed.xlsx')!r}).open(); print('fsspec' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip().splitlines()[-1] == "False"
+
+    def test_logging_is_initialized_once(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(log_initializer, "BASE_LOG_DIR", tmp_path / "logs")
+        monkeypatch.setattr(LogInitializer, "_initialized", False)
+
+        LogInitializer.initialize()
+        assert (tmp_path / "logs").is_dir()
+
+        # later calls (every module asking for its loggers) don't touch the filesystem again
+        (tmp_path / "logs").rename(tmp_path / "moved")
+        LogInitializer.initialize()
+        assert not (tmp_path / "logs").exists()
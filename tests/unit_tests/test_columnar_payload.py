@@ -0,0 +1,91 @@
+import hashlib
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import shutdown_pool
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+
+@pytest.fixture
+def columnar_workbook(write_workbook):
+    return write_workbook({
+        # short rows are padded with None, like the records built from them
+        "products": (["sku", "name", "price"], [[f"S-{i}", f"name {i}", i * 1.5] if i % 4 else [f"S-{i}", f"name {i}"] for i in range(11)]),
+        "stock": (["sku", "qty"], [[f"S-{i}", i] for i in range(3)]),
+    }, "columnar")
+
+
+def as_records(payload):
+    return [dict(zip(payload["columns"], row)) for row in payload["rows"]]
+
+
+class TestColumnarChecksum:
+
+    def test_checksum_over_the_canonical_columnar_form(self):
+        columns = ["sku", "price"]
+        rows = [["S-1", 1.5], ["S-2", None]]
+        canonical = orjson.dumps({"rows": rows, "columns": columns}, option=orjson.OPT_SORT_KEYS)
+
+        assert ChunkIntegrityManager.compute_columnar_checksum(columns, rows, "sha256") == hashlib.sha256(canonical).hexdigest()
+        assert ChunkIntegrityManager.compute_columnar_checksum(columns, rows, "sha256") != ChunkIntegrityManager.compute_checksum(rows, "sha256")
+
+
+@pytest.mark.asyncio
+class TestColumnarIngestion:
+
+    async def test_same_records_as_the_records_format(self, excel_service, pim_core, columnar_workbook, excel_request):
+        await excel_service.stream_and_push("ing-records", excel_request(columnar_workbook, chunk_size_by_records=4))
+        records = [record for payload in pim_core.received_payloads for record in payload["records"]]
+        pim_core.received_payloads.clear()
+
+        await excel_service.stream_and_push("ing-columnar", excel_request(columnar_workbook, chunk_size_by_records=4, payload_format="columnar"))
+        payloads = pim_core.received_payloads
+
+        assert [payload["chunk_number"] for payload in payloads] == [0, 1, 2]
+        for payload in payloads:
+            assert "records" not in payload
+            assert payload["payload_format"] == "columnar"
+            assert payload["columns"] == ["sku", "name", "price"]
+            assert all(len(row) == 3 for row in payload["rows"])
+            assert payload["checksum"] == ChunkIntegrityManager.compute_columnar_checksum(payload["columns"], payload["rows"], payload["checksum_algorithm"])
+        assert [record for payload in payloads for record in as_records(payload)] == records
+
+    async def test_columnar_chunks_by_memory(self, excel_service, state_store, pim_core, columnar_workbook, excel_request):
+        await excel_service.stream_and_push("ing-memory", excel_request(columnar_workbook, chunk_size_by_memory=60, payload_format="columnar"))
+
+        assert len(pim_core.received_payloads) > 1
+        assert sum(len(payload["rows"]) for payload in pim_core.received_payloads) == 11
+        assert state_store.store.get_state("ing-memory")["total_records"] == 11
+
+    async def test_pooled_encoding_matches(self, excel_service, pim_core, columnar_workbook, monkeypatch, excel_request):
+        await excel_service.stream_and_push("ing-in-process", excel_request(columnar_workbook, chunk_size_by_records=4, payload_format="columnar"))
+        in_process = [(payload["checksum"], payload["rows"]) for payload in pim_core.received_payloads]
+        pim_core.received_payloads.clear()
+
+        monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+        try:
+            await excel_service.stream_and_push("ing-pooled", excel_request(columnar_workbook, chunk_size_by_records=4, payload_format="columnar"))
+        finally:
+            shutdown_pool()
+
+        assert [(payload["checksum"], payload["rows"]) for payload in pim_core.received_payloads] == in_process
+
+    async def test_every_sheet_sends_its_own_columns(self, excel_service, pim_core, columnar_workbook, excel_request):
+        await excel_service.stream_and_push("ing-sheets", excel_request(columnar_workbook, chunk_size_by_records=20, payload_format="columnar", sheets="all"))
+
+        columns = {payload["sheet"]: payload["columns"] for payload in pim_core.received_payloads}
+        assert columns == {"products": ["sku", "name", "price"], "stock": ["sku", "qty"]}
+        stock = next(payload for payload in pim_core.received_payloads if payload["sheet"] == "stock")
+        assert stock["rows"] == [["S-0", 0], ["S-1", 1], ["S-2", 2]]
+        assert stock["checksum"] == ChunkIntegrityManager.compute_columnar_checksum(stock["columns"], stock["rows"], stock["checksum_algorithm"])
+
+
+class TestColumnarValidation:
+
+    def test_columnar_only_for_excel(self):
+        with pytest.raises(HTTPException) as error:
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, payload_format="columnar")
+        assert error.value.status_code == 400
@@ -0,0 +1,242 @@
+import csv
+import io
+
+import pytest
+from fastapi import HTTPException
+from openpyxl import Workbook
+
+from app.schemas.request_model import IngestionRequest
+from app.services import csv_reader
+from app.services.chunk_encoder_pool import shutdown_pool
+from app.services.chunk_ledger import chunks_to_resend, resend_chunks
+from app.services.csv_format import ByteOffsetLines, csv_records, detect_format, read_headers, split_ranges
+from app.services.csv_reader import CsvIngestionService
+from app.services.ingestion_supervisor import IngestionSupervisor
+
+ROWS = [
+    ["sku", "name", "", "color"],
+    ["S-0", "plain", "a", "red"],
+    [],
+    ["S-1", "multi\nline \"quoted\"", "b", ""],
+    ["", "", "", ""],
+    ["S-2", "comma, inside", "c"],
+    ["S-3", "café", "d", "blue", "extra"],
+]
+
+
+def csv_bytes(rows, delimiter=",", encoding="utf-8", bom=False):
+    text = io.StringIO()
+    csv.writer(text, delimiter=delimiter, lineterminator="\n").writerows(rows)
+    return (b"\xef\xbb\xbf" if bom else b"") + text.getvalue().encode(encoding)
+
+
+def product_rows(count):
+    rows = [["sku", "name", "qty"]]
+    for i in range(count):
+        # every third record spans two lines, every fifth has a quote inside a quoted field
+        name = f"product {i}\nsecond line" if i % 3 == 0 else f"product \"{i}\"" if i % 5 == 0 else f"product {i}"
+        rows.append([f"S-{i}", name, str(i)])
+    return rows
+
+
+@pytest.fixture
+def csv_service(state_store):
+    service = CsvIngestionService()
+    service.state_store = state_store.store
+    return service
+
+
+@pytest.fixture
+def small_ranges(monkeypatch):
+    class Configurations:
+        CSV_SNIFF_BYTES = type("Sniff", (), {"value": 64 * 1024})
+        CSV_PARSE_RANGE_BYTES = type("Range", (), {"value": 256})
+
+    monkeypatch.setattr(csv_reader, "MicroServiceConfigurations", Configurations)
+    monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+    yield
+    shutdown_pool()
+
+
+def csv_request(path, **kwargs):
+    kwargs.setdefault("chunk_size_by_records", 2)
+    return IngestionRequest(file_path=str(path), file_type="csv", callback_url="http://pim/callback", **kwargs)
+
+
+def sent(pim_core):
+    return [(payload["chunk_number"], payload["checksum"], payload.get("records", payload.get("rows"))) for payload in pim_core.received_payloads]
+
+
+class TestCsvFormat:
+
+    def test_encoding_and_delimiter_detection(self):
+        assert detect_format(csv_bytes(ROWS, ";", bom=True)) == ("utf-8", ";", '"', 3)
+        assert detect_format(csv_bytes(ROWS, "\t", encoding="cp1252")) == ("cp1252", "\t", '"', 0)
+        assert detect_format(b"sku|name\nS-1|\xff\n".replace(b"\xff", b"\x81")).encoding == "latin-1"
+        assert detect_format(csv_bytes(ROWS, ";"), csv_delimiter=",", csv_encoding="latin-1")[:2] == ("latin-1", ",")
+
+    def test_headers_rows_and_offsets(self):
+        data = csv_bytes(ROWS, bom=True)
+        fmt = detect_format(data)
+        f = io.BytesIO(data)
+
+        headers, offset = read_headers(f, fmt)
+        fragments, ends = next(csv_records(ByteOffsetLines(f, fmt.encoding, offset), fmt, headers, None, False, "json"))
+
+        assert headers == ["sku", "name", "column_2", "color"]
+        assert fragments == [
+            b'{"color":"red","column_2":"a","name":"plain","sku":"S-0"}',
+            b'{"color":null,"column_2":"b","name":"multi\\nline \\"quoted\\"","sku":"S-1"}',
+            b'{"color":null,"column_2":"c","name":"comma, inside","sku":"S-2"}',
+            '{"color":"blue","column_2":"d","name":"café","sku":"S-3"}'.encode(),
+        ]
+        # the offset after a record is where the next one starts, quoted line breaks included
+        assert ends[-1] == len(data)
+        assert data[ends[0]:].startswith(b"\n\"S-1\"") or data[ends[0]:].startswith(b"\nS-1")
+
+    def test_ranges_end_on_record_boundaries(self):
+        data = csv_bytes(product_rows(200))
+        fmt = detect_format(data)
+        f = io.BytesIO(data)
+        _, offset = read_headers(f, fmt)
+        f.seek(offset)
+        ends = set(end for _, batch_ends in csv_records(ByteOffsetLines(f, fmt.encoding, offset), fmt, ["sku", "name", "qty"], None, False, "json") for end in batch_ends)
+
+        ranges = [(start, start + len(range_data), range_data) for start, range_data in split_ranges(f, offset, fmt, 300)]
+
+        assert len(ranges) > 10
+        assert ranges[0][0] == offset and ranges[-1][1] == len(data)
+        assert all(end in ends and data[start:end] == range_data for start, end, range_data in ranges)
+        assert all(end == following for (_, end, _), (following, _, _) in zip(ranges, ranges[1:]))
+        # a range is handed out once its end is read, not after the whole file was scanned
+        next(split_ranges(f, offset, fmt, 300))
+        assert f.tell() < len(data) / 4
+
+
+class TestCsvRequest:
+
+    def test_csv_options_are_validated(self, tmp_path):
+        for kwargs in ({"file_type": "json", "csv_delimiter": ";"}, {"csv_delimiter": ";;"}, {"csv_quotechar": "\n"}, {"csv_delimiter": "'", "csv_quotechar": "'"}, {"csv_encoding": "utf-16"}):
+            kwargs.setdefault("file_type", "csv")
+            with pytest.raises(HTTPException) as e:
+                IngestionRequest(file_path="products.csv", callback_url="http://pim/callback", chunk_size_by_records=2, **kwargs)
+            assert e.value.status_code == 400
+
+        assert csv_request("products.csv", payload_format="columnar", csv_delimiter="\t", csv_encoding="cp1252")
+
+    def test_supervisor_runs_csv_with_the_csv_reader(self):
+        assert isinstance(IngestionSupervisor._service_for("CSV"), CsvIngestionService)
+
+
+@pytest.mark.asyncio
+class TestCsvIngestion:
+
+    async def test_same_chunks_as_the_excel_sheet_with_the_same_cells(self, csv_service, state_store, pim_core, tmp_path, excel_service, excel_request):
+        # extra cells would widen the sheet, excel gives the widest row a header
+        rows = [row[:4] for row in ROWS]
+        path = tmp_path / "products.csv"
+        path.write_bytes(csv_bytes(rows))
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append([value or None for value in row])
+        workbook.save(tmp_path / "products.xlsx")
+
+        await csv_service.stream_and_push("ing-csv", csv_request(path))
+        from_csv = sent(pim_core)
+        pim_core.received_payloads.clear()
+        await excel_service.stream_and_push("ing-xlsx", excel_request(str(tmp_path / "products.xlsx"), chunk_size_by_records=2))
+
+        assert from_csv == sent(pim_core)
+        assert state_store.store.get_state("ing-csv")["status"] == "COMPLETED"
+
+    async def test_ledger_holds_the_source_range_of_every_chunk(self, csv_service, state_store, pim_core, tmp_path):
+        path = tmp_path / "products.csv"
+        data = csv_bytes(product_rows(7), ";")
+        path.write_bytes(data)
+
+        await csv_service.stream_and_push("ing-ranges", csv_request(path, chunk_size_by_records=3))
+
+        ledger = state_store.store.get_ledger("ing-ranges")
+        assert [chunk["record_count"] for chunk in ledger] == [3, 3, 1]
+        assert ledger[0]["source_offset"] == len(b"sku;name;qty\n")
+        assert all(chunk["source_offset"] + chunk["source_length"] == following["source_offset"] for chunk, following in zip(ledger, ledger[1:]))
+        assert ledger[-1]["source_offset"] + ledger[-1]["source_length"] == len(data)
+        assert data[ledger[1]["source_offset"]:].startswith(b"S-3;")
+
+    async def test_resume_seeks_to_the_next_chunk(self, csv_service, state_store, pim_core, tmp_path):
+        path = tmp_path / "products.csv"
+        data = csv_bytes(product_rows(7))
+        path.write_bytes(data)
+        await csv_service.stream_and_push("ing-resume", csv_request(path, chunk_size_by_records=3))
+        expected = sent(pim_core)[1:]
+        first = state_store.store.get_ledger("ing-resume")[0]
+        # the records of the ACKed chunk become blank lines : skipping records by count would skip the wrong ones
+        path.write_bytes(data[:first["source_offset"]] + b"\n" * first["source_length"] + data[first["source_offset"] + first["source_length"]:])
+        state_store.ack_chunk("ing-resume", 0, 3)
+        pim_core.received_payloads.clear()
+        pim_core.received_chunks.clear()
+
+        await csv_service.stream_and_push("ing-resume", csv_request(path, chunk_size_by_records=3))
+
+        assert sent(pim_core) == expected
+        assert state_store.store.get_state("ing-resume")["total_records"] == 7
+
+    async def test_reconciliation_seeks_to_the_lost_chunk(self, csv_service, state_store, pim_core, tmp_path):
+        path = tmp_path / "products.csv"
+        path.write_bytes(csv_bytes(product_rows(9)))
+        request = csv_request(path, chunk_size_by_records=3)
+        await csv_service.stream_and_push("ing-lost", request)
+        ledger = state_store.store.get_ledger("ing-lost")
+        pim_core.received_payloads.clear()
+
+        await resend_chunks(csv_service, "ing-lost", request, chunks_to_resend(ledger, {ledger[0]["chunk_id"]: None, ledger[2]["chunk_id"]: None}))
+
+        assert [(payload["chunk_number"], payload["checksum"]) for payload in pim_core.received_payloads] == [(1, ledger[1]["checksum"])]
+        assert [record["sku"] for record in pim_core.received_payloads[0]["records"]] == ["S-3", "S-4", "S-5"]
+
+    async def test_pool_ranges_match_in_process_parsing(self, csv_service, state_store, pim_core, tmp_path, small_ranges, monkeypatch):
+        path = tmp_path / "products.csv"
+        path.write_bytes(csv_bytes(product_rows(60)))
+        request = csv_request(path, chunk_size_by_records=None, chunk_size_by_memory=700, filter="qty != \"7\"", fields={"exclude": ["name"]})
+
+        await csv_service.stream_and_push("ing-pooled", request)
+        pooled = sent(pim_core)
+        pooled_ledger = [(chunk["source_offset"], chunk["source_length"]) for chunk in state_store.store.get_ledger("ing-pooled")]
+        pim_core.received_payloads.clear()
+        monkeypatch.delenv("INGESTION_ENCODE_POOL_WORKERS")
+
+        await csv_service.stream_and_push("ing-in-process", request)
+
+        assert len(pooled) > 2
+        assert pooled == sent(pim_core)
+        assert pooled_ledger == [(chunk["source_offset"], chunk["source_length"]) for chunk in state_store.store.get_ledger("ing-in-process")]
+
+    async def test_stray_quotes_fall_back_to_in_process_parsing(self, csv_service, pim_core, tmp_path, small_ranges):
+        path = tmp_path / "screens.csv"
+        # quote characters inside unquoted fields are literal for csv, they throw the quote count of the range scan off
+        lines = ["sku,name,size"] + [f"S-{i},screen {i},{i}\" wide" if i % 4 else f"S-{i},\"screen\n{i}\",{i}" for i in range(80)]
+        path.write_text("\n".join(lines) + "\n")
+
+        await csv_service.stream_and_push("ing-stray", csv_request(path))
+
+        records = [record for payload in pim_core.received_payloads for record in payload["records"]]
+        assert [record["sku"] for record in records] == [f"S-{i}" for i in range(80)]
+        assert records[1]["size"] == "1\" wide"
+        assert records[4]["name"] == "screen\n4"
+
+    async def test_numeric_filter_compares_number_cells_as_numbers(self, csv_service, state_store, pim_core, tmp_path, small_ranges, monkeypatch):
+        path = tmp_path / "products.csv"
+        rows = product_rows(60)
+        # a cell that is no number stays text, the comparison is false
+        rows[9][2] = "n/a"
+        path.write_bytes(csv_bytes(rows))
+        request = csv_request(path, chunk_size_by_records=5, filter="qty >= 52 or qty in [3, 8.0] or qty == 7.50")
+
+        await csv_service.stream_and_push("ing-numeric-pooled", request)
+        pooled = sent(pim_core)
+        pim_core.received_payloads.clear()
+        monkeypatch.delenv("INGESTION_ENCODE_POOL_WORKERS")
+        await csv_service.stream_and_push("ing-numeric", request)
+
+        assert [record["sku"] for _, _, records in sent(pim_core) for record in records] == ["S-3"] + [f"S-{i}" for i in range(52, 60)]
+        assert pooled == sent(pim_core)
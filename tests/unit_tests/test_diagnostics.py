@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.core.config import MicroServiceConfigurations
+from app.main import app
+from app.services import diagnostics
+from app.services.diagnostics import DiagnosticsBusyError, LoopLagWatchdog, SamplingProfiler
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def busy_ingestion_part(seconds):
+    # long stretches between awaits, like a parser filling a chunk : the sampler gets the GIL in the middle of them
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        spin(0.03)
+        await asyncio.sleep(0)
+
+
+async def busy_other_part(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        spin(0.03)
+        await asyncio.sleep(0)
+
+
+def admin_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://service")
+
+
+@pytest.mark.asyncio
+class TestProfiler:
+
+    async def test_process_profile_samples_every_thread(self):
+        worker = threading.Thread(target=spin, args=(0.4,), name="busy-worker")
+        worker.start()
+        result = await diagnostics.profile(0.3, interval=0.005)
+        worker.join()
+
+        assert result["scope"] == "process"
+        assert result["samples"] > 0
+        assert any(line.startswith("busy-worker;") and "spin (tests/unit_tests/test_diagnostics.py" in line for line in result["profile"])
+
+    async def test_ingestion_profile_only_samples_its_tasks(self):
+        ingestion = asyncio.create_task(busy_ingestion_part(0.5), name="ingestion-ing-1")
+        sheet = asyncio.create_task(busy_ingestion_part(0.5), name="ingestion-ing-1:sheet-products")
+        other = asyncio.create_task(busy_other_part(0.5), name="ingestion-ing-10")
+
+        result = await diagnostics.profile(0.3, "collapsed", "ing-1", interval=0.005)
+        await asyncio.gather(ingestion, sheet, other)
+
+        stacks = result["profile"]
+        assert stacks and result["scope"] == "ingestion"
+        assert all(line.startswith("ingestion-ing-1;") for line in stacks)
+        assert any("busy_ingestion_part" in line for line in stacks)
+        assert not any("busy_other_part" in line for line in stacks)
+
+    async def test_one_profile_at_a_time(self):
+        running = asyncio.create_task(diagnostics.profile(0.2))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(DiagnosticsBusyError):
+            await diagnostics.profile(0.1)
+        await running
+
+
+class TestProfileOutput:
+
+    def test_flamegraph_tree(self):
+        profiler = SamplingProfiler()
+        profiler.stacks.update({"main;a (x.py:1);b (x.py:2)": 3, "main;a (x.py:1)": 1, "worker;c (y.py:1)": 2})
+
+        tree = profiler.flamegraph()
+
+        assert tree["value"] == 6
+        main = next(child for child in tree["children"] if child["name"] == "main")
+        assert main["value"] == 4
+        assert main["children"][0]["children"][0] == {"name": "b (x.py:2)", "value": 3, "children": []}
+
+
+@pytest.mark.asyncio
+class TestAllocationsAndLoopLag:
+
+    async def test_allocation_window_reports_the_sites_of_the_window(self):
+        kept = []
+
+        async def allocate():
+            await asyncio.sleep(0.05)
+            kept.append([bytearray(1024) for _ in range(2000)])
+
+        task = asyncio.create_task(allocate())
+        result = await diagnostics.trace_allocations(0.2, top=5)
+        await task
+
+        assert result["traced_peak_bytes"] >= 2000 * 1024
+        assert result["process_peak_rss_bytes"] > 0
+        assert result["top_allocators"][0]["site"].startswith("tests/unit_tests/test_diagnostics.py:")
+        assert result["top_allocators"][0]["size_bytes"] >= 2000 * 1024
+
+    async def test_watchdog_measures_a_blocked_loop(self):
+        watchdog = LoopLagWatchdog(interval=0.01, log_seconds=0.05)
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        # synchronous work on the event loop (e.g. a big chunk parsed without yielding)
+        time.sleep(0.15)
+        await asyncio.sleep(0.05)
+        await watchdog.stop()
+
+        snapshot = watchdog.snapshot()
+        assert not snapshot["running"]
+        assert snapshot["max_seconds"] >= 0.1
+        assert snapshot["over_log_threshold"] == 1
+        assert snapshot["p50_seconds"] < 0.05
+
+
+@pytest.mark.asyncio
+class TestAdminEndpoints:
+
+    async def test_off_by_default(self, monkeypatch):
+        monkeypatch.delenv(MicroServiceConfigurations.ADMIN_ENDPOINTS_ENV.value, raising=False)
+
+        async with admin_client() as client:
+            response = await client.get("/api/admin/loop-lag")
+
+        assert response.status_code == 404
+
+    async def test_enabled(self, monkeypatch, supervisor):
+        monkeypatch.setenv(MicroServiceConfigurations.ADMIN_ENDPOINTS_ENV.value, "1")
+
+        async with admin_client() as client:
+            lag = await client.get("/api/admin/loop-lag")
+            profile = await client.post("/api/admin/profile", params={"seconds": 0.1, "format": "flamegraph"})
+            not_running = await client.post("/api/admin/profile", params={"seconds": 0.1, "ingestion_id": "not-here"})
+
+        assert lag.status_code == 200 and lag.json()["running"] is False
+        assert profile.status_code == 200 and profile.json()["profile"]["name"] == "root"
+        assert not_running.status_code == 404
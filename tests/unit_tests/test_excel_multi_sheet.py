@@ -0,0 +1,117 @@
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.request_model import IngestionRequest
+from app.services import excel_reader
+from app.services.chunk_sender import ChunkRejectedError
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.services.excel_reader import SheetReaderError
+
+
+def by_sheet(payloads):
+    sheets = {}
+    for payload in payloads:
+        sheets.setdefault(payload["sheet"], []).append(payload)
+    return sheets
+
+
+@pytest.mark.asyncio
+class TestMultiSheetIngestion:
+
+    async def test_all_sheets_with_their_own_headers_and_chunk_sequence(self, excel_service, state_store, pim_core, workbook_path, excel_request):
+        await excel_service.stream_and_push("ing-sheets", excel_request(workbook_path, sheets="all", chunk_size_by_records=3))
+
+        sheets = by_sheet(pim_core.received_payloads)
+        assert set(sheets) == {"products", "prices"}
+        assert [payload["chunk_number"] for payload in sheets["products"]] == [0, 1, 2]
+        assert [payload["is_last"] for payload in sheets["products"]] == [False, False, True]
+        assert [payload["chunk_number"] for payload in sheets["prices"]] == [0]
+        assert sheets["prices"][0]["is_last"] is True
+        assert sheets["prices"][0]["records"][1] == {"sku": "P-1", "price": 1.5, "currency": "EUR"}
+        assert sheets["products"][2]["records"] == [{"sku": "P-6", "qty": 6}]
+        assert sheets["products"][1]["chunk_id"] == "ing-sheets:products:1"
+
+        for payload in pim_core.received_payloads:
+            assert payload["checksum"] == ChunkIntegrityManager.compute_checksum(payload["records"], payload["checksum_algorithm"])
+
+        completion = pim_core.completions[-1]
+        assert completion["total_records"] == 10
+        assert completion["sheets"] == {
+            "products": {"last_chunk": 2, "total_records": 7},
+            "prices": {"last_chunk": 0, "total_records": 3},
+            "notes": {"last_chunk": -1, "total_records": 0},
+        }
+        state = state_store.store.get_state("ing-sheets")
+        assert state["status"] == "COMPLETED"
+        assert state["total_records"] == 10
+
+    async def test_named_sheets_only(self, excel_service, pim_core, workbook_path, excel_request):
+        await excel_service.stream_and_push("ing-named", excel_request(workbook_path, sheets=["prices"], chunk_size_by_memory=100))
+
+        assert {payload["sheet"] for payload in pim_core.received_payloads} == {"prices"}
+        assert sum(len(payload["records"]) for payload in pim_core.received_payloads) == 3
+        assert list(pim_core.completions[-1]["sheets"]) == ["prices"]
+
+    async def test_unknown_sheet_fails(self, excel_service, pim_core, workbook_path, excel_request):
+        with pytest.raises(SheetReaderError):
+            await excel_service.stream_and_push("ing-unknown", excel_request(workbook_path, sheets=["missing"], chunk_size_by_records=3))
+        assert pim_core.received_payloads == []
+
+    async def test_failed_sheet_keeps_its_checkpoint(self, excel_service, state_store, pim_core, workbook_path, excel_request):
+        pim_core.reject_chunk(1)
+        with pytest.raises(ChunkRejectedError):
+            await excel_service.stream_and_push("ing-failed", excel_request(workbook_path, sheets=["products"], chunk_size_by_records=3))
+
+        sheet_state = state_store.store.get_sheet_states("ing-failed")["products"]
+        assert sheet_state["last_chunk"] == 0
+        assert sheet_state["total_records"] == 3
+        assert sheet_state["status"] == "IN_PROGRESS"
+
+    async def test_failed_single_sheet_closes_the_workbook(self, excel_service, pim_core, workbook_path, excel_request, monkeypatch):
+        closed = []
+        original = excel_reader.load_workbook
+
+        def load_workbook(*args, **kwargs):
+            wb = original(*args, **kwargs)
+            close = wb.close
+            wb.close = lambda: closed.append(True) or close()
+            return wb
+
+        monkeypatch.setattr(excel_reader, "load_workbook", load_workbook)
+        pim_core.reject_chunk(1)
+        with pytest.raises(ChunkRejectedError):
+            await excel_service.stream_and_push("ing-closed", excel_request(workbook_path, chunk_size_by_records=3))
+
+        assert closed == [True]
+
+    async def test_resume_skips_completed_sheets(self, excel_service, state_store, pim_core, workbook_path, excel_request):
+        # previous run : prices finished, products was stopped after chunk 0
+        state_store.store.update_sheet_chunk("ing-resume", "prices", 0, 3)
+        state_store.store.mark_sheet_completed("ing-resume", "prices")
+        state_store.store.update_sheet_chunk("ing-resume", "products", 0, 3)
+        assert state_store.store.get_total_records("ing-resume") == 6
+
+        await excel_service.stream_and_push("ing-resume", excel_request(workbook_path, sheets="all", chunk_size_by_records=3))
+
+        assert [(payload["sheet"], payload["chunk_number"]) for payload in pim_core.received_payloads] == [("products", 1), ("products", 2)]
+        assert pim_core.received_payloads[0]["records"][0] == {"sku": "P-3", "qty": 3}
+        assert pim_core.completions[-1]["total_records"] == 10
+        assert state_store.store.get_state("ing-resume")["status"] == "COMPLETED"
+
+
+class TestSheetsValidation:
+
+    def test_sheets_only_for_excel(self):
+        with pytest.raises(HTTPException) as error:
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, sheets="all")
+        assert error.value.status_code == 400
+
+    def test_empty_sheet_list(self, excel_request):
+        with pytest.raises(HTTPException) as error:
+            excel_request("a.xlsx", chunk_size_by_records=3, sheets=[])
+        assert error.value.status_code == 400
+
+    def test_sheet_named_twice(self, excel_request):
+        with pytest.raises(HTTPException) as error:
+            excel_request("a.xlsx", chunk_size_by_records=3, sheets=["prices", "products", "prices"])
+        assert error.value.status_code == 400
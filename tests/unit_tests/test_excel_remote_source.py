@@ -0,0 +1,80 @@
+import fsspec
+import pytest
+from fsspec.spec import AbstractBufferedFile, AbstractFileSystem
+from openpyxl import Workbook
+
+from app.services.excel_source import ExcelSource
+from app.services.ingestion_metrics import ingestion_metrics
+
+
+class RangeFile(AbstractBufferedFile):
+    def _fetch_range(self, start, end):
+        self.fs.range_requests.append((start, end))
+        return self.fs.blobs[self.path][start:end]
+
+
+class RangeFileSystem(AbstractFileSystem):
+    """
+    Remote object store stand-in : every read is a ranged request.
+    """
+    protocol = "rangetest"
+    blobs = {}
+    range_requests = []
+
+    def info(self, path, **kwargs):
+        path = self._strip_protocol(path)
+        return {"name": path, "size": len(self.blobs[path]), "type": "file"}
+
+    def _open(self, path, mode="rb", block_size=None, autocommit=True, cache_options=None, **kwargs):
+        return RangeFile(self, path, mode, block_size=block_size, cache_options=cache_options, **kwargs)
+
+
+@pytest.fixture
+def remote_workbook(tmp_path):
+    fsspec.register_implementation("rangetest", RangeFileSystem, clobber=True)
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["sku", "name"])
+    for i in range(2000):
+        sheet.append([f"S-{i}", f"product name {i}"])
+    path = tmp_path / "remote.xlsx"
+    workbook.save(path)
+    RangeFileSystem.blobs = {"bucket/remote.xlsx": path.read_bytes()}
+    RangeFileSystem.range_requests = []
+    yield "rangetest://bucket/remote.xlsx"
+    RangeFileSystem.blobs = {}
+
+
+class TestExcelSource:
+
+    def test_local_path_is_passed_through(self, tmp_path):
+        path = str(tmp_path / "local.xlsx")
+        source = ExcelSource(path)
+        assert source.open() == path
+        assert source.stats() is None
+
+    def test_remote_source_reads_the_central_directory_first(self, remote_workbook):
+        size = len(RangeFileSystem.blobs["bucket/remote.xlsx"])
+        with ExcelSource(remote_workbook, block_size=4096):
+            requests_on_open = list(RangeFileSystem.range_requests)
+        # only the blocks holding the last 4096 bytes are fetched before openpyxl reads anything
+        assert min(start for start, _ in requests_on_open) > size - 2 * 4096
+        assert max(end for _, end in requests_on_open) >= size
+
+
+@pytest.mark.asyncio
+class TestRemoteExcelIngestion:
+
+    async def test_remote_workbook_through_the_block_cache(self, pim_core, remote_workbook, excel_service, excel_request):
+        request = excel_request(remote_workbook, chunk_size_by_records=500)
+
+        await excel_service.stream_and_push("ing-remote", request)
+
+        assert sum(len(payload["records"]) for payload in pim_core.received_payloads) == 2000
+        assert pim_core.received_payloads[0]["records"][0] == {"sku": "S-0", "name": "product name 0"}
+        metrics = ingestion_metrics.for_ingestion("ing-remote")
+        size = len(RangeFileSystem.blobs["bucket/remote.xlsx"])
+        # the zip reader seeks back and forth, every byte is fetched once
+        assert 0 < metrics["source_bytes_fetched"] <= size
+        assert metrics["source_cache_hits"] > 0
+        assert 0 < metrics["source_cache_hit_rate"] <= 1
@@ -0,0 +1,93 @@
+import pytest
+
+from app.services import excel_shared_strings
+from app.services.excel_shared_strings import SharedStringTable, load_workbook
+from tests.benchmarks.harness import write_shared_strings_xlsx
+
+
+def write_workbook(path, records):
+    # strings : header, then sku / name of every record, rows reference them by index
+    strings = ["sku", "name"]
+    rows = [[0, 1]]
+    for sku, name in records:
+        rows.append([len(strings), len(strings) + 1])
+        strings += [sku, name]
+    return write_shared_strings_xlsx(path, strings, rows)
+
+
+class TestSharedStringTable:
+
+    def test_stays_in_memory_below_the_threshold(self):
+        table = SharedStringTable(spill_bytes=1024 * 1024)
+        for text in ("a", "b", ""):
+            table.append(text)
+        table.seal()
+
+        assert not table.spilled
+        assert [table[i] for i in range(len(table))] == ["a", "b", ""]
+
+    def test_spills_past_the_threshold(self, tmp_path):
+        strings = [f"value-{i}-ü€" for i in range(1000)] + ["", "last"]
+        table = SharedStringTable(spill_bytes=4096, spill_dir=str(tmp_path))
+        for text in strings:
+            table.append(text)
+        table.seal()
+
+        assert table.spilled
+        assert table.strings is None
+        assert len(table) == len(strings)
+        assert [table[i] for i in range(len(table))] == strings
+        assert table[-1] == "last"
+        with pytest.raises(IndexError):
+            table[len(strings)]
+        table.close()
+
+    def test_only_empty_strings(self):
+        table = SharedStringTable(spill_bytes=0)
+        for _ in range(3):
+            table.append("")
+        table.seal()
+
+        assert table.spilled
+        assert table[2] == ""
+        table.close()
+
+
+@pytest.fixture
+def spill_everything(monkeypatch):
+    class Spill:
+        value = 0
+
+    class Configurations:
+        SHARED_STRINGS_SPILL_BYTES = Spill
+        SHARED_STRINGS_SPILL_DIR = type("Dir", (), {"value": None})
+
+    monkeypatch.setattr(excel_shared_strings, "MicroServiceConfigurations", Configurations)
+
+
+class TestBoundedStringsWorkbook:
+
+    def test_rows_read_through_the_spilled_table(self, tmp_path, spill_everything):
+        path = write_workbook(tmp_path / "strings.xlsx", [(f"S-{i}", f"name {i % 7}") for i in range(200)])
+
+        wb = load_workbook(filename=path, read_only=True, data_only=True)
+        rows = list(wb.active.iter_rows(values_only=True))
+        assert wb.active._shared_strings.spilled
+        wb.close()
+
+        assert rows[0] == ("sku", "name")
+        assert rows[150] == ("S-149", "name 2")
+        assert len(rows) == 201
+
+
+@pytest.mark.asyncio
+class TestSpilledIngestion:
+
+    async def test_ingestion_with_spilled_strings(self, pim_core, tmp_path, spill_everything, excel_service, excel_request):
+        path = write_workbook(tmp_path / "strings.xlsx", [(f"S-{i}", f"name {i} & <more>") for i in range(25)])
+
+        await excel_service.stream_and_push("ing-spill", excel_request(path, chunk_size_by_records=10))
+
+        records = [record for payload in pim_core.received_payloads for record in payload["records"]]
+        assert len(records) == 25
+        assert records[24] == {"sku": "S-24", "name": "name 24 & <more>"}
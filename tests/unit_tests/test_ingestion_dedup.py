@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.controllers.ingestion_controllers import IngestionController
+from app.schemas.request_model import IngestionRequest
+
+
+class TestIngestionLease:
+
+    def test_live_lease_is_exclusive(self, state_store):
+        assert state_store.store.acquire_lease("ing-1", "worker-a", 30)
+        assert not state_store.store.acquire_lease("ing-1", "worker-b", 30)
+        # re-acquiring an own lease renews it
+        assert state_store.store.acquire_lease("ing-1", "worker-a", 30)
+        assert state_store.store.lease_owner("ing-1") == "worker-a"
+
+    def test_expired_lease_is_taken_over(self, state_store):
+        state_store.store.acquire_lease("ing-1", "worker-a", -1)
+
+        assert state_store.store.lease_owner("ing-1") is None
+        assert state_store.store.acquire_lease("ing-1", "worker-b", 30)
+        # the previous owner notices on its next heartbeat
+        assert not state_store.store.renew_lease("ing-1", "worker-a", 30)
+
+    def test_release_only_own_lease(self, state_store):
+        state_store.store.acquire_lease("ing-1", "worker-a", 30)
+        state_store.store.release_lease("ing-1", "worker-b")
+        assert state_store.store.lease_owner("ing-1") == "worker-a"
+
+        state_store.store.release_lease("ing-1", "worker-a")
+        assert state_store.store.lease_owner("ing-1") is None
+
+
+class OverlapCountingConnection:
+    """
+    SQLite connection counting the statements a thread starts while another thread's transaction is not committed yet.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.owner = None
+        self.overlaps = 0
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def _enter(self):
+        if self.owner not in (None, threading.get_ident()):
+            self.overlaps += 1
+        self.owner = threading.get_ident()
+        # widens the window between the statement and its commit
+        time.sleep(0.0005)
+
+    def execute(self, *args):
+        self._enter()
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        self._enter()
+        return self.conn.executemany(*args)
+
+    def commit(self):
+        self.owner = None
+        self.conn.commit()
+
+
+@pytest.mark.asyncio
+class TestDuplicateRequests:
+
+    async def test_duplicate_request_attaches_to_running_job(self, supervisor, state_store, pim_core, write_json_source):
+        request = IngestionRequest(file_path=write_json_source(10), callback_url="http://pim/callback", chunk_size_by_records=2)
+
+        first = supervisor.start("ing-dup", request)
+        second = supervisor.start("ing-dup", request)
+        assert first is second
+        assert supervisor.is_running("ing-dup")
+
+        await first
+
+        # the file was parsed and sent once
+        assert pim_core.received_chunks == [0, 1, 2, 3, 4]
+        assert not supervisor.is_running("ing-dup")
+
+    async def test_concurrent_identical_requests_start_once(self, supervisor, state_store, pim_core, write_json_source, monkeypatch):
+        monkeypatch.setattr("app.controllers.ingestion_controllers.get_state_store", lambda: state_store.store)
+        request = IngestionRequest(file_path=write_json_source(10), callback_url="http://pim/callback", chunk_size_by_records=2)
+        first_bg, second_bg = BackgroundTasks(), BackgroundTasks()
+
+        # the second request arrives before the background task of the first one started the ingestion
+        first = IngestionController().ingest(request, first_bg)
+        second = IngestionController().ingest(request, second_bg)
+        assert first.status == "STARTED"
+        assert second.status == "IN_PROGRESS" and second.attached
+        assert second_bg.tasks == []
+
+        await first_bg()
+        await supervisor.tasks[first.ingestion_id]
+
+        # the file was parsed and sent once
+        assert pim_core.received_chunks == [0, 1, 2, 3, 4]
+        assert not supervisor.is_running(first.ingestion_id)
+
+    async def test_request_threads_share_the_store_with_a_running_ingestion(self, supervisor, state_store, pim_core, write_json_source, monkeypatch):
+        monkeypatch.setattr("app.controllers.ingestion_controllers.get_state_store", lambda: state_store.store)
+        request = IngestionRequest(file_path=write_json_source(200), callback_url="http://pim/callback", chunk_size_by_records=2)
+        controller = IngestionController()
+        connection = state_store.store.conn = OverlapCountingConnection(state_store.store.conn)
+        task = supervisor.start("ing-busy", request)
+        errors = []
+
+        def requests(worker):
+            # /api/ingest and /status run in the threadpool while the event loop checkpoints
+            try:
+                while not task.done():
+                    assert supervisor.reserve(f"ing-probe-{worker}")
+                    supervisor.release(f"ing-probe-{worker}")
+                    controller.status("ing-busy")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=requests, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        await task
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        # no statement ran inside the transaction of another thread
+        assert connection.overlaps == 0
+        assert pim_core.received_chunks == list(range(100))
+        assert state_store.last_chunk("ing-busy") == 99
+        assert len(state_store.store.get_ledger("ing-busy")) == 100
+
+    async def test_ingestion_leased_by_another_worker_is_not_started(self, supervisor, state_store, pim_core, write_json_source):
+        request = IngestionRequest(file_path=write_json_source(4), callback_url="http://pim/callback", chunk_size_by_records=2)
+        state_store.store.acquire_lease("ing-other", "other-worker", 30)
+
+        assert supervisor.start("ing-other", request) is None
+        assert supervisor.is_running("ing-other")
+        await asyncio.sleep(0)
+        assert pim_core.received_chunks == []
+
+    async def test_lost_lease_cancels_the_run(self, supervisor, state_store, pim_core, write_json_source, monkeypatch):
+        request = IngestionRequest(file_path=write_json_source(10), callback_url="http://pim/callback", chunk_size_by_records=2)
+        monkeypatch.setattr(supervisor, "heartbeat_interval", 0)
+        original_handle = pim_core.handle
+
+        async def takeover_during_chunk_0(payload):
+            if payload.get("chunk_number") == 0:
+                # this worker stalled, its lease expired and another worker took over
+                state_store.store.release_lease("ing-lost", supervisor.worker_id)
+                state_store.store.acquire_lease("ing-lost", "other-worker", 30)
+                await asyncio.sleep(0.01)
+            return await original_handle(payload)
+
+        pim_core.handle = takeover_during_chunk_0
+        task = supervisor.start("ing-lost", request)
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert pim_core.received_chunks == []
+        # the lease of the other worker is left alone
+        assert state_store.store.lease_owner("ing-lost") == "other-worker"
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_state_store import IngestionStateStore
+
+
+class TestPersistedRequest:
+
+    def test_register_and_list_in_progress(self, state_store):
+        state_store.store.register("ing-1", '{"file_path": "a.json"}')
+        state_store.store.register("ing-2", '{"file_path": "b.json"}')
+        state_store.mark_completed("ing-2")
+        # re-registering a completed ingestion keeps it completed
+        state_store.store.register("ing-2", '{"file_path": "b.json"}')
+
+        assert state_store.store.list_in_progress() == [("ing-1", '{"file_path": "a.json"}')]
+
+    def test_failed_ingestion_is_not_resumed(self, state_store):
+        state_store.store.register("ing-1", "{}")
+        state_store.store.mark_failed("ing-1")
+
+        assert state_store.store.list_in_progress() == []
+        assert state_store.store.get_state("ing-1")["status"] == "FAILED"
+
+    def test_existing_database_is_migrated(self, tmp_path):
+        db_path = tmp_path / "old.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE ingestion_state (ingestion_id TEXT PRIMARY KEY, last_chunk INTEGER, total_records INTEGER, status TEXT)")
+        conn.execute("INSERT INTO ingestion_state VALUES ('ing-old', 3, 30, 'IN_PROGRESS')")
+        conn.commit()
+        conn.close()
+
+        store = IngestionStateStore(db_path=str(db_path))
+
+        assert store.get_last_chunk("ing-old") == 3
+        # without a persisted request there is nothing to resume
+        assert store.list_in_progress() == []
+
+
+@pytest.mark.asyncio
+class TestResumeAndShutdown:
+
+    async def test_in_progress_ingestion_is_resumed_on_startup(self, supervisor, state_store, pim_core, write_json_source):
+        request = IngestionRequest(file_path=write_json_source(10), callback_url="http://pim/callback", chunk_size_by_records=2)
+        state_store.store.register("ing-resume", request.model_dump_json())
+        state_store.ack_chunk("ing-resume", 2, 6)
+
+        assert supervisor.resume_in_progress() == 1
+        await supervisor.tasks["ing-resume"]
+
+        assert pim_core.received_chunks == [3, 4]
+        assert state_store.store.get_state("ing-resume")["status"] == "COMPLETED"
+
+    async def test_shutdown_stops_at_last_ack_and_next_start_resumes(self, supervisor, state_store, pim_core, write_json_source):
+        request = IngestionRequest(file_path=write_json_source(10), callback_url="http://pim/callback", chunk_size_by_records=2)
+        original_handle = pim_core.handle
+
+        async def sigterm_during_chunk_1(payload):
+            # shutdown starts while chunk 1 is in flight
+            if payload.get("chunk_number") == 1:
+                supervisor.stopping = True
+            return await original_handle(payload)
+
+        pim_core.handle = sigterm_during_chunk_1
+        await supervisor.start("ing-drain", request)
+
+        # the chunk in flight was ACKed and checkpointed, nothing after it was sent
+        assert pim_core.received_chunks == [0, 1]
+        assert state_store.store.get_state("ing-drain")["status"] == "IN_PROGRESS"
+        assert state_store.last_chunk("ing-drain") == 1
+
+        pim_core.handle = original_handle
+        supervisor.stopping = False
+        supervisor.resume_in_progress()
+        await supervisor.tasks["ing-drain"]
+
+        assert pim_core.received_chunks == [0, 1, 2, 3, 4]
+        assert state_store.store.get_state("ing-drain")["status"] == "COMPLETED"
+
+    async def test_failed_ingestion_is_marked_failed(self, supervisor, state_store, pim_core, write_json_source):
+        pim_core.reject_chunk(0)
+        request = IngestionRequest(file_path=write_json_source(4), callback_url="http://pim/callback", chunk_size_by_records=2)
+
+        await supervisor.start("ing-failed", request)
+
+        assert state_store.store.get_state("ing-failed")["status"] == "FAILED"
+        assert supervisor.tasks == {}
@@ -0,0 +1,102 @@
+from collections import Counter
+
+import httpx
+import pytest
+
+from app.main import app
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_tracer import IngestionTracer, NULL_TRACER, ingestion_traces
+
+
+def spans(trace, name):
+    return [event for event in trace["traceEvents"] if event["name"] == name and event["ph"] in ("X", "i")]
+
+
+def track_names(trace):
+    return {event["tid"]: event["args"]["name"] for event in trace["traceEvents"] if event["name"] == "thread_name"}
+
+
+@pytest.mark.asyncio
+class TestIngestionTrace:
+
+    async def test_json_run_timeline(self, ingestion_service, pim_core, json_source):
+        request = IngestionRequest(file_path=json_source, callback_url="http://pim/callback", chunk_size_by_records=3, trace=True)
+
+        await ingestion_service.stream_and_push("ing-trace", request)
+
+        trace = ingestion_traces.get("ing-trace").chrome_trace()
+        counts = Counter(event["name"] for event in trace["traceEvents"] if event["ph"] in ("X", "i"))
+        # 4 chunks of 3, 3, 3 and 1 records, then the completion event
+        assert counts["build chunk"] == counts["checksum"] == counts["checkpoint"] == counts["ACK"] == 4
+        assert counts["send"] == 5
+        assert counts["read"] >= 1 and counts["ingestion"] == 1
+        assert [span["args"]["records"] for span in spans(trace, "build chunk")] == [3, 3, 3, 1]
+        assert spans(trace, "send")[0]["args"]["bytes"] > 0 and spans(trace, "send")[0]["args"]["status_code"] == 200
+        assert spans(trace, "send")[-1]["args"]["event"] == "COMPLETED"
+
+        tracks = track_names(trace)
+        assert {tracks[span["tid"]] for span in spans(trace, "build chunk")} == {"reader"}
+        assert {tracks[span["tid"]] for span in spans(trace, "send")} == {"sender"}
+        # the run span covers every other span
+        run = spans(trace, "ingestion")[0]
+        assert all(run["ts"] <= event["ts"] <= run["ts"] + run["dur"] for event in trace["traceEvents"] if event["ph"] == "X")
+        assert trace["otherData"]["dropped_spans"] == 0
+
+    async def test_untraced_run_records_nothing(self, ingestion_service, pim_core, json_source):
+        request = IngestionRequest(file_path=json_source, callback_url="http://pim/callback", chunk_size_by_records=3)
+
+        await ingestion_service.stream_and_push("ing-untraced", request)
+
+        assert ingestion_service.tracer is NULL_TRACER
+        assert ingestion_traces.get("ing-untraced") is None
+
+    async def test_excel_sheets_have_their_own_tracks(self, pim_core, excel_service, write_workbook, excel_request):
+        path = write_workbook({"products": (["sku"], [[f"S-{i}"] for i in range(5)]), "stock": (["sku"], [["S-0"]])})
+        request = excel_request(path, chunk_size_by_records=2, sheets="all", trace=True)
+
+        await excel_service.stream_and_push("ing-sheets-trace", request)
+
+        trace = ingestion_traces.get("ing-sheets-trace").chrome_trace()
+        tracks = track_names(trace)
+        waits = Counter(tracks[span["tid"]] for span in spans(trace, "wait sheet chunk"))
+        assert waits == {"sheet products / reader": 3, "sheet stock / reader": 1}
+        assert {tracks[span["tid"]] for span in spans(trace, "ACK")} == {"sheet products / sender", "sheet stock / sender"}
+
+
+class TestTraceBuffer:
+
+    def test_ring_buffer_keeps_the_latest_spans(self):
+        tracer = IngestionTracer("ing-ring", capacity=3)
+        for chunk_number in range(5):
+            with tracer.span("send", "sender", chunk_number=chunk_number):
+                pass
+
+        trace = tracer.chrome_trace()
+        assert [span["args"]["chunk_number"] for span in spans(trace, "send")] == [2, 3, 4]
+        assert trace["otherData"]["dropped_spans"] == 2
+
+    def test_failed_span_records_the_error(self):
+        tracer = IngestionTracer("ing-error")
+        with pytest.raises(ValueError):
+            with tracer.span("checkpoint", "sender"):
+                raise ValueError("database is locked")
+
+        assert spans(tracer.chrome_trace(), "checkpoint")[0]["args"]["error"] == "ValueError"
+
+
+@pytest.mark.asyncio
+class TestTraceEndpoint:
+
+    async def test_export_and_missing_trace(self, state_store, monkeypatch):
+        monkeypatch.setattr("app.controllers.ingestion_controllers.get_state_store", lambda: state_store.store)
+        tracer = ingestion_traces.start("ing-export")
+        tracer.instant("ACK", "sender", chunk_number=0)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://service") as client:
+            exported = await client.get("/api/ingest/ing-export/trace")
+            missing = await client.get("/api/ingest/ing-missing/trace")
+
+        assert exported.status_code == 200
+        assert "trace-ing-export.json" in exported.headers["content-disposition"]
+        assert spans(exported.json(), "ACK")[0]["args"] == {"chunk_number": 0}
+        assert missing.status_code == 404
@@ -0,0 +1,46 @@
+import json
+import mmap
+
+import fsspec
+import ijson
+
+from app.services import json_source
+from app.services.json_source import open_json_source
+
+
+class TestJsonSource:
+
+    def test_local_file_is_memory_mapped(self, tmp_path):
+        path = tmp_path / "feed.json"
+        path.write_text(json.dumps([{"sku": "S-1"}, {"sku": "S-2"}]))
+
+        with open_json_source(fsspec.filesystem("file"), str(path)) as f:
+            assert isinstance(f, mmap.mmap)
+            assert [record["sku"] for record in ijson.items(f, "item", buf_size=4)] == ["S-1", "S-2"]
+
+    def test_empty_local_file_is_opened_as_a_file(self, tmp_path):
+        path = tmp_path / "empty.json"
+        path.write_bytes(b"")
+
+        with open_json_source(fsspec.filesystem("file"), str(path)) as f:
+            assert not isinstance(f, mmap.mmap)
+            assert f.read() == b""
+
+    def test_other_filesystems_go_through_fsspec(self):
+        fs = fsspec.filesystem("memory")
+        fs.pipe("/feed.json", b'[{"sku": "S-1"}]')
+
+        with open_json_source(fs, "/feed.json") as f:
+            assert not isinstance(f, mmap.mmap)
+            assert [record["sku"] for record in ijson.items(f, "item")] == ["S-1"]
+
+    def test_memory_mapping_can_be_turned_off(self, tmp_path, monkeypatch):
+        path = tmp_path / "feed.json"
+        path.write_text("[]")
+        class Configurations:
+            JSON_MMAP_LOCAL_SOURCES = type("Mmap", (), {"value": False})
+
+        monkeypatch.setattr(json_source, "MicroServiceConfigurations", Configurations)
+
+        with open_json_source(fsspec.filesystem("file"), str(path)) as f:
+            assert not isinstance(f, mmap.mmap)
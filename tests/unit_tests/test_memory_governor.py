@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.request_model import IngestionRequest
+from app.services.memory_governor import MemoryGovernor
+
+
+class TestMemoryGovernor:
+
+    def test_reservations_are_tracked(self):
+        async def scenario():
+            governor = MemoryGovernor(budget_bytes=100)
+            await governor.reserve("a", 40)
+            await governor.reserve("b", 60)
+            assert governor.snapshot()["reservations"] == {"a": 40, "b": 60}
+            governor.release("a")
+            assert governor.reserved_bytes == 60
+            assert governor.peak_reserved_bytes == 100
+        asyncio.run(scenario())
+
+    def test_backpressure_until_release(self):
+        async def scenario():
+            governor = MemoryGovernor(budget_bytes=100)
+            await governor.reserve("a", 80)
+
+            waiter = asyncio.create_task(governor.reserve("b", 50))
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            assert governor.snapshot()["waiting_ingestions"] == 1
+
+            governor.release("a")
+            await asyncio.wait_for(waiter, 1)
+            assert governor.reservations == {"b": 50}
+        asyncio.run(scenario())
+
+    def test_waiters_are_served_in_order(self):
+        async def scenario():
+            governor = MemoryGovernor(budget_bytes=100)
+            await governor.reserve("a", 100)
+            granted = []
+
+            async def reserve(ingestion_id, nbytes):
+                await governor.reserve(ingestion_id, nbytes)
+                granted.append(ingestion_id)
+
+            big = asyncio.create_task(reserve("big", 90))
+            await asyncio.sleep(0)
+            small = asyncio.create_task(reserve("small", 10))
+            await asyncio.sleep(0)
+            governor.release("a")
+            await asyncio.gather(big, small)
+            assert granted == ["big", "small"]
+        asyncio.run(scenario())
+
+    def test_cancelled_waiter_does_not_leak(self):
+        async def scenario():
+            governor = MemoryGovernor(budget_bytes=100)
+            await governor.reserve("a", 100)
+            waiter = asyncio.create_task(governor.reserve("b", 10))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            governor.release("a")
+            assert governor.reserved_bytes == 0
+            assert governor.reservations == {}
+        asyncio.run(scenario())
+
+    def test_request_that_can_never_fit_is_refused(self, monkeypatch):
+        from app.services import memory_governor as module
+        monkeypatch.setattr(module.memory_governor, "budget_bytes", 1024)
+
+        with pytest.raises(HTTPException) as exc:
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_memory=4096)
+        assert exc.value.status_code == 400
+
+        IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_memory=512)
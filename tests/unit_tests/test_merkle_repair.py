@@ -0,0 +1,110 @@
+import hashlib
+
+import orjson
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import encode_chunk, shutdown_pool
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.services.ingestion_metrics import ingestion_metrics
+
+
+def merkle_request(path, **kwargs):
+    return IngestionRequest(file_path=path, callback_url="http://pim/callback", chunk_size_by_records=4, integrity_mode="merkle", **kwargs)
+
+
+class TestMerkleTree:
+
+    def test_leaves_and_root(self):
+        fragments = [b'{"a":1}', b'{"a":2}', b'{"a":3}']
+
+        leaves = ChunkIntegrityManager.merkle_leaves(fragments)
+
+        assert leaves == [hashlib.sha256(b"\x00" + fragment).hexdigest() for fragment in fragments]
+        left = hashlib.sha256(b"\x01" + bytes.fromhex(leaves[0]) + bytes.fromhex(leaves[1])).digest()
+        # the odd leaf is carried up unchanged
+        assert ChunkIntegrityManager.merkle_root(leaves) == hashlib.sha256(b"\x01" + left + bytes.fromhex(leaves[2])).hexdigest()
+
+    def test_single_leaf_and_empty_tree(self):
+        leaves = ChunkIntegrityManager.merkle_leaves([b'{"a":1}'], "crc32")
+
+        assert ChunkIntegrityManager.merkle_root(leaves, "crc32") == leaves[0]
+        assert ChunkIntegrityManager.merkle_root([], "blake2b") == hashlib.blake2b().hexdigest()
+
+    def test_pool_keeps_one_fragment_per_record(self):
+        records = [{"sku": "S-1"}, {"sku": "S-2"}]
+
+        fragments, checksum, count = encode_chunk(orjson.dumps(records), None, "sha256", merkle=True)
+
+        assert fragments == [ChunkIntegrityManager.canonical_record_bytes(record) for record in records]
+        assert checksum == ChunkIntegrityManager.compute_checksum(records)
+        assert count == 2
+
+
+@pytest.mark.asyncio
+class TestMerkleRepair:
+
+    async def test_envelope_carries_root_and_leaf_hashes(self, ingestion_service, pim_core, json_source):
+        await ingestion_service.stream_and_push("ing-merkle", merkle_request(json_source))
+
+        payload = pim_core.received_payloads[0]
+        assert payload["leaf_hashes"] == ChunkIntegrityManager.merkle_leaves(
+            [ChunkIntegrityManager.canonical_record_bytes(record) for record in payload["records"]]
+        )
+        assert payload["merkle_root"] == ChunkIntegrityManager.merkle_root(payload["leaf_hashes"])
+
+    async def test_only_damaged_records_are_resent(self, ingestion_service, state_store, pim_core, json_source):
+        pim_core.corrupt_records(1, [0, 2])
+
+        await ingestion_service.stream_and_push("ing-repair", merkle_request(json_source))
+
+        repair = pim_core.repairs[0]
+        assert repair["leaf_indices"] == [0, 2]
+        assert repair["records"] == [{"qty": 4, "sku": "S-4"}, {"qty": 6, "sku": "S-6"}]
+        assert "leaf_hashes" not in repair
+        assert pim_core.received_chunks == [0, 1, 2]
+        assert pim_core.received_payloads[1]["records"] == [{"qty": i, "sku": f"S-{i}"} for i in range(4, 8)]
+        assert state_store.store.get_state("ing-repair")["total_records"] == 10
+        metrics = ingestion_metrics.for_ingestion("ing-repair")
+        assert metrics["chunks_repaired"] == 1
+        assert metrics["records_repaired"] == 2
+
+    async def test_nack_without_usable_leaves_resends_the_chunk(self, ingestion_service, pim_core, json_source):
+        # every record damaged : the repair would be the whole chunk
+        pim_core.corrupt_records(0, [0, 1, 2, 3])
+
+        await ingestion_service.stream_and_push("ing-full", merkle_request(json_source))
+
+        assert pim_core.repairs == []
+        assert pim_core.received_chunks == [0, 1, 2]
+        assert "chunks_repaired" not in ingestion_metrics.for_ingestion("ing-full")
+
+    async def test_checksum_mode_sends_no_leaf_hashes(self, ingestion_service, pim_core, json_source):
+        await ingestion_service.stream_and_push("ing-checksum", IngestionRequest(file_path=json_source, callback_url="http://pim/callback", chunk_size_by_records=4))
+
+        assert "leaf_hashes" not in pim_core.received_payloads[0]
+        assert "merkle_root" not in pim_core.received_payloads[0]
+
+    async def test_sheet_processes_send_one_fragment_per_record(self, pim_core, excel_service, write_workbook, excel_request):
+        path = write_workbook({"products": (["sku", "qty"], [[f"P-{i}", i] for i in range(5)]), "prices": (["sku", "price"], [["P-0", 1.5]])})
+        pim_core.corrupt_records(1, [1])
+
+        await excel_service.stream_and_push("ing-sheets-merkle", excel_request(
+            path, chunk_size_by_records=3,
+            sheets=["products"], integrity_mode="merkle",
+        ))
+
+        assert pim_core.repairs[0]["records"] == [{"qty": 4, "sku": "P-4"}]
+        assert [record["sku"] for payload in pim_core.received_payloads for record in payload["records"]] == [f"P-{i}" for i in range(5)]
+
+    async def test_pooled_chunks_are_repaired(self, ingestion_service, pim_core, json_source, monkeypatch):
+        monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+        pim_core.corrupt_records(0, [3])
+
+        try:
+            await ingestion_service.stream_and_push("ing-pool-merkle", merkle_request(json_source))
+        finally:
+            shutdown_pool()
+
+        assert pim_core.repairs[0]["records"] == [{"qty": 3, "sku": "S-3"}]
+        assert pim_core.received_chunks == [0, 1, 2]
@@ -0,0 +1,140 @@
+import datetime
+import decimal
+import hashlib
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas import request_model
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import shutdown_pool
+from app.services.chunk_envelope import MsgpackChunkEnvelope, MsgpackChunkBatchEnvelope
+from app.services.data_integrity_manager import ChunkIntegrityManager
+from app.utils.msgpack_codec import canonical_msgpack_bytes, packb, unpackb
+
+HEADER = {"ingestion_id": "ing-1", "chunk_number": 0, "chunk_id": "ing-1:0", "checksum": "abc", "checksum_algorithm": "sha256", "is_last": True}
+
+
+@pytest.fixture
+def prices_source(tmp_path):
+    # prices written as 1.10 etc., the decimals json.dumps would shorten
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps([{"sku": f"S-{i}", "price": f"__{i}.10__", "qty": i} for i in range(7)]).replace('"__', "").replace('__"', ""))
+    return str(path)
+
+
+def json_request(path, **kwargs):
+    return IngestionRequest(file_path=path, callback_url="http://pim/callback", payload_encoding="msgpack", **kwargs)
+
+
+class TestMsgpackCodec:
+
+    def test_decimal_and_dates_round_trip_exactly(self):
+        record = {
+            "price": decimal.Decimal("19.990000000000000001"),
+            "updated": datetime.datetime(2025, 1, 2, 3, 4, 5, 6),
+            "day": datetime.date(2025, 1, 2),
+            "at": datetime.time(3, 4),
+        }
+
+        assert unpackb(packb(record)) == record
+
+    def test_canonical_bytes_ignore_key_order(self):
+        assert canonical_msgpack_bytes({"b": 1, "a": {"d": 2, "c": 3}}) == canonical_msgpack_bytes({"a": {"c": 3, "d": 2}, "b": 1})
+
+    def test_checksum_over_the_concatenated_canonical_records(self):
+        records = [{"sku": "S-1", "price": decimal.Decimal("1.25")}, {"b": 2, "a": None}]
+        canonical = b"".join(canonical_msgpack_bytes(record) for record in records)
+
+        assert ChunkIntegrityManager.compute_checksum(records, "sha256", "msgpack") == hashlib.sha256(canonical).hexdigest()
+        assert ChunkIntegrityManager.compute_checksum(records, "sha256", "msgpack") != ChunkIntegrityManager.compute_checksum(records, "sha256")
+
+
+@pytest.mark.asyncio
+class TestMsgpackEnvelope:
+
+    async def test_streamed_body_is_one_msgpack_map(self):
+        records = [{"sku": f"S-{i}"} for i in range(5)]
+        envelope = MsgpackChunkEnvelope(HEADER, [canonical_msgpack_bytes(record) for record in records])
+
+        body = b"".join([fragment async for fragment in envelope.iter_body()])
+
+        assert body == envelope.to_bytes()
+        assert envelope.content_length == len(body)
+        assert envelope.headers()["Content-Type"] == "application/msgpack"
+        assert unpackb(body) == {**HEADER, "records": records}
+
+    async def test_joined_fragments_with_record_count(self):
+        records = [{"sku": f"S-{i}"} for i in range(3)]
+        envelope = MsgpackChunkEnvelope(HEADER, [b"".join(canonical_msgpack_bytes(record) for record in records)], record_count=3)
+
+        assert unpackb(envelope.to_bytes())["records"] == records
+
+    async def test_batch(self):
+        envelopes = [MsgpackChunkEnvelope({**HEADER, "chunk_number": n}, [canonical_msgpack_bytes({"n": n})]) for n in range(2)]
+        batch = MsgpackChunkBatchEnvelope("ing-1", envelopes, is_last=True)
+
+        body = b"".join([fragment async for fragment in batch.iter_body()])
+
+        assert body == batch.to_bytes()
+        assert batch.content_length == len(body)
+        assert [envelope["records"] for envelope in unpackb(body)["batch"]] == [[{"n": 0}], [{"n": 1}]]
+
+
+@pytest.mark.asyncio
+class TestMsgpackIngestion:
+
+    async def test_decimals_reach_pim_core_exactly(self, ingestion_service, pim_core, prices_source):
+        await ingestion_service.stream_and_push("ing-msgpack", json_request(prices_source, chunk_size_by_records=3))
+
+        payloads = pim_core.received_payloads
+        assert [payload["chunk_number"] for payload in payloads] == [0, 1, 2]
+        records = [record for payload in payloads for record in payload["records"]]
+        assert records[6] == {"sku": "S-6", "price": decimal.Decimal("6.10"), "qty": 6}
+        for payload in payloads:
+            assert payload["checksum"] == ChunkIntegrityManager.compute_checksum(payload["records"], payload["checksum_algorithm"], "msgpack")
+        # the completion event stays json
+        assert pim_core.completions[0]["total_records"] == 7
+
+    async def test_chunks_by_memory_and_batches(self, ingestion_service, pim_core, prices_source):
+        await ingestion_service.stream_and_push("ing-batch", json_request(prices_source, chunk_size_by_memory=80, batch_size=2))
+
+        assert len(pim_core.received_payloads) > 1
+        assert sum(len(payload["records"]) for payload in pim_core.received_payloads) == 7
+
+    async def test_pooled_encoding_matches(self, ingestion_service, pim_core, prices_source, monkeypatch):
+        await ingestion_service.stream_and_push("ing-in-process", json_request(prices_source, chunk_size_by_records=3))
+        in_process = [(payload["checksum"], payload["records"]) for payload in pim_core.received_payloads]
+        pim_core.received_payloads.clear()
+
+        monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+        try:
+            await ingestion_service.stream_and_push("ing-pooled", json_request(prices_source, chunk_size_by_records=3))
+        finally:
+            shutdown_pool()
+
+        assert [(payload["checksum"], payload["records"]) for payload in pim_core.received_payloads] == in_process
+
+    async def test_columnar_excel_sheets(self, pim_core, excel_service, write_workbook, excel_request):
+        path = write_workbook({"products": (["sku", "updated"], [[f"S-{i}", datetime.datetime(2025, 1, i + 1)] for i in range(4)])})
+
+        await excel_service.stream_and_push("ing-excel", excel_request(
+            path, chunk_size_by_records=3,
+            payload_format="columnar", payload_encoding="msgpack", sheets="all",
+        ))
+
+        payloads = pim_core.received_payloads
+        assert [len(payload["rows"]) for payload in payloads] == [3, 1]
+        assert payloads[1]["rows"] == [["S-3", datetime.datetime(2025, 1, 4)]]
+        for payload in payloads:
+            assert payload["checksum"] == ChunkIntegrityManager.compute_columnar_checksum(payload["columns"], payload["rows"], payload["checksum_algorithm"], "msgpack")
+
+
+class TestMsgpackValidation:
+
+    def test_msgpack_must_be_installed(self, monkeypatch):
+        monkeypatch.setattr(request_model, "msgpack_available", lambda: False)
+        with pytest.raises(HTTPException) as error:
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, payload_encoding="msgpack")
+        assert error.value.status_code == 400
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.request_model import IngestionRequest
+from app.services.chunk_encoder_pool import shutdown_pool
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+
+@pytest.fixture
+def price_feed(tmp_path):
+    path = tmp_path / "prices.json"
+    # written by hand : 19.99 and 0.1 are kept as they are in the source text
+    path.write_text("[" + ",".join(f'{{"sku": "S-{i}", "price": {i}.99, "rate": 0.1, "qty": {i}}}' for i in range(7)) + "]")
+    return str(path)
+
+
+def price_request(path, **kwargs):
+    return IngestionRequest(file_path=path, callback_url="http://pim/callback", chunk_size_by_records=3, **kwargs)
+
+
+def sent(pim_core):
+    return [(payload["checksum"], payload["records"]) for payload in pim_core.received_payloads]
+
+
+@pytest.mark.asyncio
+class TestNumberMode:
+
+    async def test_float_sends_the_same_chunks_as_decimal(self, ingestion_service, pim_core, price_feed):
+        await ingestion_service.stream_and_push("ing-decimal", price_request(price_feed))
+        decimal_chunks = sent(pim_core)
+        pim_core.received_payloads.clear()
+
+        await ingestion_service.stream_and_push("ing-float", price_request(price_feed, number_mode="float"))
+
+        assert sent(pim_core) == decimal_chunks
+        assert pim_core.received_payloads[0]["records"][1] == {"price": 1.99, "qty": 1, "rate": 0.1, "sku": "S-1"}
+
+    async def test_decimal_string_keeps_the_exact_text(self, ingestion_service, pim_core, price_feed):
+        await ingestion_service.stream_and_push("ing-exact", price_request(price_feed, number_mode="decimal_string"))
+
+        payload = pim_core.received_payloads[0]
+        assert payload["records"][1] == {"price": "1.99", "qty": 1, "rate": "0.1", "sku": "S-1"}
+        # pim-core checks the chunk over the records as it received them
+        assert payload["checksum"] == ChunkIntegrityManager.compute_checksum(payload["records"])
+
+    async def test_pool_encodes_the_same_decimal_strings(self, ingestion_service, pim_core, price_feed, monkeypatch):
+        await ingestion_service.stream_and_push("ing-exact-in-process", price_request(price_feed, number_mode="decimal_string"))
+        in_process = sent(pim_core)
+        pim_core.received_payloads.clear()
+
+        monkeypatch.setenv("INGESTION_ENCODE_POOL_WORKERS", "2")
+        try:
+            await ingestion_service.stream_and_push("ing-exact-pooled", price_request(price_feed, number_mode="decimal_string"))
+        finally:
+            shutdown_pool()
+
+        assert sent(pim_core) == in_process
+
+    async def test_filter_on_float_values(self, ingestion_service, pim_core, price_feed):
+        await ingestion_service.stream_and_push("ing-float-filter", price_request(price_feed, number_mode="float", filter="price >= 4.99 and rate == 0.1"))
+
+        assert [record["sku"] for payload in pim_core.received_payloads for record in payload["records"]] == ["S-4", "S-5", "S-6"]
+
+
+class TestNumberModeValidation:
+
+    def test_unknown_number_mode(self):
+        with pytest.raises(ValidationError):
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, number_mode="double")
@@ -0,0 +1,126 @@
+import json
+import os
+
+import msgpack
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.request_model import IngestionRequest
+from app.services import chunk_sinks
+from app.services.chunk_sinks import parse_sink_url
+from app.services.data_integrity_manager import ChunkIntegrityManager
+
+
+def sink_request(path, callback_url, **kwargs):
+    return IngestionRequest(file_path=path, callback_url=callback_url, chunk_size_by_records=4, **kwargs)
+
+
+def ndjson_lines(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestSinkUrl:
+
+    def test_sink_of_each_scheme(self):
+        assert parse_sink_url("https://pim/callback").kind == "http"
+        assert parse_sink_url("null://").kind == "null"
+        assert parse_sink_url("file:///data/out") == ("file", "/data/out", False)
+        assert parse_sink_url("file:///data/out?format=files") == ("file", "/data/out", True)
+
+    def test_unsupported_callback_url_is_refused(self, json_source):
+        for callback_url in ("ftp://pim/callback", "file://"):
+            with pytest.raises(HTTPException) as e:
+                sink_request(json_source, callback_url)
+            assert e.value.status_code == 400
+
+    def test_msgpack_needs_spooled_files(self, json_source, tmp_path):
+        with pytest.raises(HTTPException) as e:
+            sink_request(json_source, f"file://{tmp_path}/out", payload_encoding="msgpack")
+
+        assert e.value.status_code == 400
+        assert sink_request(json_source, f"file://{tmp_path}/out?format=files", payload_encoding="msgpack")
+
+
+@pytest.mark.asyncio
+class TestOutputSinks:
+
+    async def test_file_sink_writes_one_ndjson_line_per_chunk(self, ingestion_service, state_store, json_source, tmp_path):
+        await ingestion_service.stream_and_push("ing-file", sink_request(json_source, f"file://{tmp_path}/out"))
+
+        lines = ndjson_lines(tmp_path / "out" / "ing-file.ndjson")
+        chunks, completed = lines[:-1], lines[-1]
+        assert [chunk["chunk_id"] for chunk in chunks] == ["ing-file:0", "ing-file:1", "ing-file:2"]
+        assert [record for chunk in chunks for record in chunk["records"]] == [{"sku": f"S-{i}", "qty": i} for i in range(10)]
+        assert chunks[0]["checksum"] == ChunkIntegrityManager.compute_checksum(chunks[0]["records"])
+        assert completed["status"] == "COMPLETED"
+        assert completed["total_records"] == 10
+        assert state_store.store.get_state("ing-file")["status"] == "COMPLETED"
+
+    async def test_batch_is_written_with_one_fsync(self, ingestion_service, json_source, tmp_path, monkeypatch):
+        fsyncs = []
+        monkeypatch.setattr(chunk_sinks.os, "fsync", fsyncs.append)
+
+        await ingestion_service.stream_and_push("ing-batch", sink_request(json_source, f"file://{tmp_path}/out", batch_size=2))
+
+        lines = ndjson_lines(tmp_path / "out" / "ing-batch.ndjson")
+        assert [[chunk["chunk_number"] for chunk in line["batch"]] for line in lines[:-1]] == [[0, 1], [2]]
+        # two batches and the COMPLETED event
+        assert len(fsyncs) == 3
+
+    async def test_resume_appends_only_unacked_chunks(self, ingestion_service, state_store, json_source, tmp_path):
+        state_store.ack_chunk("ing-resume", 0, 4)
+
+        await ingestion_service.stream_and_push("ing-resume", sink_request(json_source, f"file://{tmp_path}/out"))
+
+        lines = ndjson_lines(tmp_path / "out" / "ing-resume.ndjson")
+        assert [line.get("chunk_number") for line in lines[:-1]] == [1, 2]
+        assert lines[-1]["total_records"] == 10
+
+    async def test_spooled_files(self, ingestion_service, json_source, tmp_path):
+        await ingestion_service.stream_and_push("ing-spool", sink_request(json_source, f"file://{tmp_path}/out?format=files", payload_encoding="msgpack"))
+
+        directory = tmp_path / "out" / "ing-spool"
+        assert sorted(os.listdir(directory)) == ["chunk-00000000.msgpack", "chunk-00000001.msgpack", "chunk-00000002.msgpack", "completed.json"]
+        chunk = msgpack.unpackb((directory / "chunk-00000002.msgpack").read_bytes())
+        assert chunk["records"] == [{"qty": 8, "sku": "S-8"}, {"qty": 9, "sku": "S-9"}]
+        assert chunk["is_last"] is True
+
+    async def test_null_sink_acks_every_chunk(self, ingestion_service, state_store, json_source):
+        await ingestion_service.stream_and_push("ing-null", sink_request(json_source, "null://"))
+
+        state = state_store.store.get_state("ing-null")
+        assert state["status"] == "COMPLETED"
+        assert state["last_chunk"] == 2
+        assert state["total_records"] == 10
+
+    async def test_failed_body_is_removed_and_partial_line_is_closed(self, tmp_path, monkeypatch):
+        class Configurations:
+            STREAM_FRAGMENT_BYTES = type("Fragment", (), {"value": 8})
+            FILE_SINK_FSYNC = type("Fsync", (), {"value": False})
+
+        class Body:
+            chunk_number = 1
+
+            def __init__(self, fail):
+                self.fail = fail
+
+            async def iter_body(self):
+                for fragment in (b'{"chunk_id":', b'"ing-x:1",', b'"records":[]}'):
+                    yield fragment
+                if self.fail:
+                    raise RuntimeError("body generation failed")
+
+        monkeypatch.setattr(chunk_sinks, "MicroServiceConfigurations", Configurations)
+        path = tmp_path / "out" / "ing-x.ndjson"
+        path.parent.mkdir()
+        # the previous process crashed in the middle of a line
+        path.write_bytes(b'{"chunk_id":"ing-x:0"}\n{"chunk_id":"ing-x:1","rec')
+        sink = chunk_sinks.FileSink(parse_sink_url(f"file://{tmp_path}/out"), "ing-x")
+
+        with pytest.raises(RuntimeError):
+            await sink.send(Body(fail=True))
+        assert path.read_bytes() == b'{"chunk_id":"ing-x:0"}\n{"chunk_id":"ing-x:1","rec\n'
+
+        await sink.send(Body(fail=False))
+        assert path.read_bytes().split(b"\n")[2:] == [b'{"chunk_id":"ing-x:1","records":[]}', b""]
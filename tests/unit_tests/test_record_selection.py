@@ -0,0 +1,167 @@
+import decimal
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.request_model import IngestionRequest
+from app.services.ingestion_metrics import ingestion_metrics
+from app.services.record_selection import RecordFilter, RecordSelection, SelectionError
+
+
+def matches(expression, record):
+    selection = RecordSelection(filter_expression=expression)
+    return selection.select(record) is not None
+
+
+@pytest.fixture
+def feed_source(write_json_source):
+    return write_json_source(10, "feed", lambda i: {
+        "sku": f"S-{i}",
+        "status": "discontinued" if i % 3 == 0 else "active",
+        "price": i + 0.5,
+        "dimensions": {"weight": i, "height": 2 * i},
+        **{f"attribute_{j}": f"value {i}-{j}" for j in range(20)},
+    })
+
+
+@pytest.fixture
+def feed_workbook(write_workbook):
+    return write_workbook({
+        "products": (["sku", "status", "Product Name", "price", "unused"], [[f"S-{i}", "discontinued" if i % 3 == 0 else "active", f"name {i}", i * 1.5, "x" * 50] for i in range(10)]),
+        "stock": (["sku", "status"], [["S-0", "active"]]),
+    }, "feed")
+
+
+def json_request(path, **kwargs):
+    return IngestionRequest(file_path=path, callback_url="http://pim/callback", chunk_size_by_records=3, **kwargs)
+
+
+def sent_records(pim_core, key="records"):
+    return [record for payload in pim_core.received_payloads for record in payload[key]]
+
+
+class TestRecordFilter:
+
+    def test_comparisons(self):
+        record = {"status": "active", "price": decimal.Decimal("10.5"), "dimensions": {"weight": 3}}
+
+        assert matches('status != "discontinued"', record)
+        assert matches("price >= 10.5 and dimensions.weight < 4", record)
+        assert not matches("price > 10.5", record)
+        assert matches('status in ["active", "new"]', record)
+        assert matches("dimensions.weight not in [1, 2]", record)
+
+    def test_and_binds_tighter_than_or(self):
+        record = {"a": 1, "b": 2}
+
+        assert matches("a == 0 and b == 0 or b == 2", record)
+        assert not matches("a == 0 and b == 2 or b == 0", record)
+
+    def test_missing_paths_and_incompatible_types(self):
+        assert matches("missing == null", {})
+        assert not matches("missing > 1", {})
+        assert not matches('price < "cheap"', {"price": 1})
+
+    def test_paths_starting_with_a_keyword_literal(self):
+        record = {"true_price": 5, "nullable": True, "falsey": None}
+
+        assert matches("true_price == 5 and nullable == true and falsey == null", record)
+
+    def test_quoted_paths_and_float_values(self):
+        assert matches('`Product Name` == "x" and price == 0.1', {"Product Name": "x", "price": 0.1})
+
+    @pytest.mark.parametrize("expression", ["status", 'status = "a"', 'status == "a" and', "price in 3", 'status == "a" xor b == 1', "== 1"])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(SelectionError):
+            RecordFilter(expression)
+
+
+class TestFieldProjection:
+
+    def test_include_nested_paths_and_arrays(self):
+        selection = RecordSelection(include=["sku", "dimensions.weight", "variants.ean"])
+        record = {"sku": "S-1", "name": "n", "dimensions": {"weight": 1, "height": 2}, "variants": [{"ean": "1", "size": "M"}, "scalar"]}
+
+        assert selection.project(record) == {"sku": "S-1", "dimensions": {"weight": 1}, "variants": [{"ean": "1"}]}
+
+    def test_include_of_a_parent_keeps_the_subtree(self):
+        selection = RecordSelection(include=["dimensions.weight", "dimensions"])
+
+        assert selection.project({"dimensions": {"weight": 1, "height": 2}}) == {"dimensions": {"weight": 1, "height": 2}}
+
+    def test_exclude_after_include(self):
+        selection = RecordSelection(include=["sku", "dimensions"], exclude=["dimensions.height"])
+
+        assert selection.project({"sku": "S-1", "name": "n", "dimensions": {"weight": 1, "height": 2}}) == {"sku": "S-1", "dimensions": {"weight": 1}}
+
+    def test_excel_columns_by_index(self):
+        selection = RecordSelection(include=["sku", "price", "status"], exclude=["status"], filter_expression="price > 1")
+        headers, select_row = selection.bind_headers(["sku", "status", "price", "unused"])
+
+        assert headers == ["sku", "price"]
+        assert select_row(("S-1", "active", 2.5, "x")) == ("S-1", 2.5)
+        assert select_row(("S-2", "active", 0.5, "x")) is None
+        # short rows are padded like the records built from them
+        assert select_row(("S-3", "active", 3)) == ("S-3", 3)
+
+
+@pytest.mark.asyncio
+class TestSelectionIngestion:
+
+    async def test_json_fields_and_filter(self, ingestion_service, state_store, pim_core, feed_source):
+        await ingestion_service.stream_and_push("ing-json", json_request(
+            feed_source, fields={"include": ["sku", "price", "dimensions.weight"]}, filter='status != "discontinued"',
+        ))
+
+        records = sent_records(pim_core)
+        assert [record["sku"] for record in records] == [f"S-{i}" for i in range(10) if i % 3]
+        assert records[0] == {"sku": "S-1", "price": decimal.Decimal("1.5"), "dimensions": {"weight": 1}}
+        assert state_store.store.get_state("ing-json")["total_records"] == 6
+        assert pim_core.completions[0]["total_records"] == 6
+        metrics = ingestion_metrics.for_ingestion("ing-json")
+        assert metrics["records_filtered"] == 4
+        assert metrics["bytes_saved"] > 0
+
+    async def test_json_resume_counts_only_selected_records(self, ingestion_service, state_store, pim_core, feed_source):
+        state_store.ack_chunk("ing-resume", 0, 3)
+
+        await ingestion_service.stream_and_push("ing-resume", json_request(feed_source, filter='status != "discontinued"'))
+
+        # selected records : S-1 S-2 S-4 | S-5 S-7 S-8, the first three were ACKed with chunk 0
+        assert [record["sku"] for record in sent_records(pim_core)] == ["S-5", "S-7", "S-8"]
+        assert pim_core.received_chunks == [1]
+
+    async def test_excel_columns_dropped_by_index(self, excel_service, pim_core, feed_workbook, excel_request):
+        await excel_service.stream_and_push("ing-excel", excel_request(
+            feed_workbook, fields={"exclude": ["unused", "status"]}, filter='status == "active" and `Product Name` != "name 2"', chunk_size_by_records=3,
+        ))
+
+        records = sent_records(pim_core)
+        assert [record["sku"] for record in records] == ["S-1", "S-4", "S-5", "S-7", "S-8"]
+        assert records[0] == {"sku": "S-1", "Product Name": "name 1", "price": 1.5}
+        assert ingestion_metrics.for_ingestion("ing-excel")["records_filtered"] == 5
+
+    async def test_excel_sheets_and_columnar(self, excel_service, pim_core, feed_workbook, excel_request):
+        await excel_service.stream_and_push("ing-sheets", excel_request(
+            feed_workbook, sheets="all", payload_format="columnar", fields={"include": ["sku", "status"]}, filter='status == "active"', chunk_size_by_records=3,
+        ))
+
+        columns = {payload["sheet"]: payload["columns"] for payload in pim_core.received_payloads}
+        assert columns == {"products": ["sku", "status"], "stock": ["sku", "status"]}
+        products = [row for payload in pim_core.received_payloads if payload["sheet"] == "products" for row in payload["rows"]]
+        assert products[0] == ["S-1", "active"]
+        assert len(products) == 6
+        assert ingestion_metrics.for_ingestion("ing-sheets")["records_filtered"] == 4
+
+
+class TestSelectionValidation:
+
+    @pytest.mark.parametrize("kwargs", [
+        {"filter": "status ="},
+        {"fields": {"include": []}},
+        {"fields": {}},
+    ])
+    def test_invalid_selection(self, kwargs):
+        with pytest.raises(HTTPException) as error:
+            IngestionRequest(file_path="a.json", callback_url="http://pim/callback", chunk_size_by_records=3, **kwargs)
+        assert error.value.status_code == 400
@@ -0,0 +1,123 @@
+import pytest
+
+from app.schemas.request_model import IngestionRequest
+from app.services import ingestion_state_store
+from app.services.ingestion_state_store import IngestionStateStore, SqlAlchemyIngestionStateStore, get_state_store
+from app.services.ingestion_supervisor import IngestionSupervisor
+
+
+def request_json(write_json_source, name, records=4):
+    return IngestionRequest(
+        file_path=write_json_source(records, name),
+        callback_url="http://pim/callback",
+        chunk_size_by_records=2,
+    ).model_dump_json()
+
+
+@pytest.fixture(params=["sqlite", "sqlalchemy"])
+def store(request, tmp_path):
+    # both backends run the same statements, the SQLAlchemy one is exercised here through its SQLite dialect
+    db_path = tmp_path / "shared.db"
+    if request.param == "sqlite":
+        return IngestionStateStore(db_path=str(db_path))
+    return SqlAlchemyIngestionStateStore(f"sqlite:///{db_path}")
+
+
+def worker(store, max_ingestions=1):
+    supervisor = IngestionSupervisor()
+    supervisor._state_store = store
+    supervisor.max_ingestions = max_ingestions
+    return supervisor
+
+
+class TestClaimQueue:
+
+    def test_claims_oldest_unleased_ingestion(self, store):
+        store.register("ing-1", "{}")
+        store.register("ing-2", "{}")
+
+        assert store.claim_next("worker-a", 30) == ("ing-1", "{}")
+        assert store.claim_next("worker-b", 30) == ("ing-2", "{}")
+        assert store.claim_next("worker-c", 30) is None
+
+    def test_orphaned_ingestion_is_taken_over(self, store):
+        store.register("ing-1", "{}")
+        store.update_chunk("ing-1", 3, 8)
+        # the worker running it crashed, its lease is no longer renewed
+        store.acquire_lease("ing-1", "crashed-worker", -1)
+
+        assert store.claim_next("worker-b", 30) == ("ing-1", "{}")
+        assert store.lease_owner("ing-1") == "worker-b"
+        assert store.get_last_chunk("ing-1") == 3
+
+    def test_finished_ingestions_are_not_claimed(self, store):
+        store.register("ing-1", "{}")
+        store.mark_completed("ing-1")
+        store.register("ing-2", "{}")
+        store.mark_failed("ing-2")
+
+        assert store.claim_next("worker-a", 30) is None
+
+    def test_one_store_and_one_migration_per_process(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("INGESTION_STATE_STORE_URL", f"sqlite:///{tmp_path / 'shared.db'}")
+        monkeypatch.setattr(ingestion_state_store, "_process_store", None)
+        migrations = []
+        original_init = SqlAlchemyIngestionStateStore._init
+        monkeypatch.setattr(SqlAlchemyIngestionStateStore, "_init", lambda self: migrations.append(self) or original_init(self))
+
+        stores = {id(get_state_store()) for _ in range(5)}
+
+        assert len(stores) == 1 and len(migrations) == 1
+
+
+@pytest.mark.asyncio
+class TestWorkSharing:
+
+    async def test_queued_ingestions_are_shared_between_workers(self, store, pim_core, write_json_source):
+        for name in ("a", "b", "c"):
+            store.register(f"ing-{name}", request_json(write_json_source, name))
+        worker_a, worker_b = worker(store), worker(store)
+
+        assert worker_a.resume_in_progress() == 1
+        assert worker_b.resume_in_progress() == 1
+        running = set(worker_a.tasks) | set(worker_b.tasks)
+        assert running == {"ing-a", "ing-b"}
+
+        for task in list(worker_a.tasks.values()) + list(worker_b.tasks.values()):
+            await task
+        # the worker that is free again picks up the rest
+        assert worker_a.resume_in_progress() == 1
+        await worker_a.tasks["ing-c"]
+
+        assert all(store.get_state(f"ing-{name}")["status"] == "COMPLETED" for name in ("a", "b", "c"))
+
+    async def test_launch_queues_when_worker_is_full(self, store, pim_core, write_json_source):
+        worker_a = worker(store, max_ingestions=1)
+        first = IngestionRequest.model_validate_json(request_json(write_json_source, "a"))
+        second = IngestionRequest.model_validate_json(request_json(write_json_source, "b"))
+
+        await worker_a.launch("ing-a", first)
+        await worker_a.launch("ing-b", second)
+
+        assert list(worker_a.tasks) == ["ing-a"]
+        assert store.get_state("ing-b")["status"] == "IN_PROGRESS"
+        assert store.lease_owner("ing-b") is None
+
+        await worker_a.tasks["ing-a"]
+        assert worker_a.resume_in_progress() == 1
+        await worker_a.tasks["ing-b"]
+        assert store.get_state("ing-b")["status"] == "COMPLETED"
+
+    async def test_crashed_worker_is_taken_over_from_last_ack(self, store, pim_core, write_json_source):
+        store.register("ing-crash", request_json(write_json_source, "crash", records=10))
+        store.update_chunk("ing-crash", 1, 4)
+        store.acquire_lease("ing-crash", "crashed-worker", -1)
+        survivor = worker(store)
+
+        assert survivor.resume_in_progress() == 1
+        await survivor.tasks["ing-crash"]
+
+        assert pim_core.received_chunks == [2, 3, 4]
+        assert store.get_state("ing-crash") == {"ingestion_id": "ing-crash", "last_chunk": 4, "total_records": 10, "status": "COMPLETED"}
+        # the lease is released once the ingestion is done
+        assert store.lease_owner("ing-crash") is None